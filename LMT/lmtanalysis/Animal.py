@@ -11,6 +11,7 @@ from lmtanalysis.Detection import *
 
 import matplotlib.pyplot as plt
 from lmtanalysis.Chronometer import *
+from lmtanalysis.Metrics import MetricSpan, addMetricCounter
 import matplotlib as mpl
 import numpy as np
 import pandas as pd
@@ -28,6 +29,10 @@ from statistics import mean
 from lmtanalysis.Event import EventTimeLine
 from lmtanalysis.Point import Point
 from lmtanalysis.Mask import Mask
+from lmtanalysis.DetectionStore import DetectionStore, DetectionDictionaryView
+from lmtanalysis.AnonymousDetectionIndex import AnonymousDetectionIndex
+from lmtanalysis.Kinematics import Kinematics, getMassArrays
+from lmtanalysis.ColumnarExport import getDetectionDataFrame, getEventColumns, getEventDataFrame
 from lmtanalysis.Util import *
 import matplotlib.patches as mpatches
 from lxml import etree
@@ -41,6 +46,9 @@ from lmtanalysis.ParametersRat import ParametersRat
 
 idAnimalColor = [ None, "red","green","purple","orange"]
 
+''' number of detection rows read from the base at a time '''
+DETECTION_CHUNK_SIZE = 100000
+
 from enum import Enum
 
 
@@ -63,6 +71,9 @@ class Animal():
         self.setup = setup
         self.conn = conn
         self.detectionDictionary = {}
+        self.detectionStore = None
+        self.maskCache = None
+        self.kinematics = None
         self.parameters = None
         self.setAnimalType(animalType)
         
@@ -105,35 +116,35 @@ class Animal():
             return self.detectionDictionary[t]
         return None
 
-    def loadDetection(self, start=None, end=None, lightLoad = False ):
+    def loadDetection(self, start=None, end=None, lightLoad = False, columnar = False ):
         '''
         lightLoad only loads massX and massY to speed up the load. Then one can only compute basic features such as global speed of the animals
+        columnar stores the detections in a DetectionStore (one numpy array per field) instead of one Detection object per frame.
+        detectionDictionary is then a dict-compatible view on the store, and the raw arrays are available in self.detectionStore
         '''
         print ( self.__str__(), ": Loading detection.")
-        chrono = Chronometer("Load detection")
+        chrono = MetricSpan( "Load detection", animal=self.baseId )
 
         self.detectionDictionary.clear()
+        self.detectionStore = None
+        self.kinematics = None
 
-        cursor = self.conn.cursor()
-        query =""
-        if lightLoad == True :
-            query = "SELECT FRAMENUMBER, MASS_X, MASS_Y FROM DETECTION WHERE ANIMALID={}".format( self.baseId )
-        else:
-            query = "SELECT FRAMENUMBER, MASS_X, MASS_Y, MASS_Z, FRONT_X, FRONT_Y, FRONT_Z, BACK_X, BACK_Y, BACK_Z,REARING,LOOK_UP,LOOK_DOWN FROM DETECTION WHERE ANIMALID={}".format( self.baseId )
-
-        if ( start != None ):
-            query += " AND FRAMENUMBER>={}".format(start )
-        if ( end != None ):
-            query += " AND FRAMENUMBER<={}".format(end )
-
-        print( query )
         print( self.conn )
-        cursor.execute( query )
+        chunks = self.iterDetectionRows( start = start, end = end, lightLoad = lightLoad )
+
+        if columnar:
+            self.detectionStore = DetectionStore( lightLoad = lightLoad )
+            self.detectionStore.loadFromChunks( chunks )
+            self.detectionDictionary = DetectionDictionaryView( self.detectionStore )
+            addMetricCounter( "detectionsLoaded", len( self.detectionDictionary ) )
+            chrono.stop()
+            print ( self.__str__(), " ", len( self.detectionDictionary ) , " detections loaded (columnar, {} MB) in {} seconds.".format( round( self.detectionStore.getNbBytes() / 1000000, 1 ), chrono.getTimeInS( )) )
+            return
 
-        rows = cursor.fetchall()
-        cursor.close()
+        if isinstance( self.detectionDictionary, DetectionDictionaryView ):
+            self.detectionDictionary = {}
 
-        for row in rows:
+        for row in ( row for rows in chunks for row in rows ):
             frameNumber = row[0]
             massX = row[1]
             massY = row[2]
@@ -164,8 +175,49 @@ class Animal():
 
             self.detectionDictionary[frameNumber] = detection
 
+        addMetricCounter( "detectionsLoaded", len( self.detectionDictionary ) )
+        chrono.stop()
         print ( self.__str__(), " ", len( self.detectionDictionary ) , " detections loaded in {} seconds.".format( chrono.getTimeInS( )) )
 
+    def iterDetectionRows(self, start=None, end=None, lightLoad = False, chunkSize = DETECTION_CHUNK_SIZE ):
+        '''
+        yields the rows of the DETECTION table for this animal, sorted by frame, by lists of at most chunkSize rows.
+        Pages are read with a keyset on ( FRAMENUMBER, ID ) (rows after the last row read) so that only one chunk of raw
+        rows is in memory at a time. The ID makes the keyset unique when an animal has several detections in a frame.
+        '''
+        if lightLoad == True :
+            query = "SELECT FRAMENUMBER, MASS_X, MASS_Y, ID FROM DETECTION WHERE ANIMALID={}".format( self.baseId )
+        else:
+            query = "SELECT FRAMENUMBER, MASS_X, MASS_Y, MASS_Z, FRONT_X, FRONT_Y, FRONT_Z, BACK_X, BACK_Y, BACK_Z,REARING,LOOK_UP,LOOK_DOWN, ID FROM DETECTION WHERE ANIMALID={}".format( self.baseId )
+
+        if ( end != None ):
+            query += " AND FRAMENUMBER<={}".format(end )
+
+        print( query )
+        cursor = self.conn.cursor()
+        try:
+            lastKey = None
+            while True:
+                pageQuery = query
+                if ( lastKey != None ):
+                    pageQuery += " AND ( FRAMENUMBER>{0} OR ( FRAMENUMBER={0} AND ID>{1} ) )".format( *lastKey )
+                elif ( start != None ):
+                    pageQuery += " AND FRAMENUMBER>={}".format( start )
+                pageQuery += " ORDER BY FRAMENUMBER, ID LIMIT {}".format( chunkSize )
+
+                cursor.execute( pageQuery )
+                rows = cursor.fetchall()
+                addMetricCounter( "rowsFetched", len( rows ) )
+                if len( rows ) == 0:
+                    break
+                lastKey = ( rows[-1][0], rows[-1][-1] )
+                # the ID is only used for the keyset
+                yield [ row[:-1] for row in rows ]
+                if len( rows ) < chunkSize:
+                    break
+        finally:
+            cursor.close()
+
     def loadMask(self , frame ):
         self.setMask( self.getBinaryDetectionMask( frame ) )
 
@@ -186,6 +238,7 @@ class Animal():
                 self.detectionDictionary.pop( key )
                 nbRemoved+=1
         print( "Filtering head tail detection. number of detection removed:", nbRemoved )
+        self.kinematics = None
         
     def filterDetectionByInstantSpeed(self , minSpeed, maxSpeed ):
         """
@@ -208,6 +261,7 @@ class Animal():
                 nbRemoved+=1
 
         print( "Filtering Instant speed min:",minSpeed, "max:",maxSpeed, "number of detection removed:", nbRemoved )
+        self.kinematics = None
 
     def filterDetectionByArea(self, x1, y1, x2, y2 ):
         '''
@@ -228,6 +282,7 @@ class Animal():
                 nbRemoved+=1
 
         print( "Filtering area, number of detection removed:", nbRemoved )
+        self.kinematics = None
 
     def filterDetectionByEventTimeLine( self, eventTimeLineVoc ):
         '''
@@ -246,10 +301,29 @@ class Animal():
                 nbRemoved+=1
 
         print( "Filtering area, number of detection removed:", nbRemoved )
+        self.kinematics = None
 
     def clearDetection(self):
 
         self.detectionDictionary.clear()
+        self.kinematics = None
+
+    def getDetectionSignature(self):
+        '''
+        changes when the detections are reloaded or filtered. Used to invalidate what is computed from them.
+        '''
+        if isinstance( self.detectionDictionary, DetectionDictionaryView ):
+            return ( id( self.detectionDictionary.store ), self.detectionDictionary.store.version )
+        return ( id( self.detectionDictionary ), len( self.detectionDictionary ) )
+
+    def getKinematics(self):
+        '''
+        frame to frame distance, speed and vertical speed of the animal as arrays (see Kinematics.py),
+        computed on first use and recomputed when the detections change.
+        '''
+        if self.kinematics == None or self.kinematics.signature != self.getDetectionSignature():
+            self.kinematics = Kinematics( self )
+        return self.kinematics
 
     def getMaxDetectionT(self):
         """
@@ -259,6 +333,9 @@ class Animal():
         if len ( self.detectionDictionary.keys() ) == 0:
             return None
 
+        if isinstance( self.detectionDictionary, DetectionDictionaryView ):
+            return int( self.detectionDictionary.store.getFrames()[-1] )
+
         return sorted(self.detectionDictionary.keys())[-1]
 
     def getTrajectoryData( self , maskingEventTimeLine=None ):
@@ -423,13 +500,11 @@ class Animal():
         if ( maxFrame==None ):
             maxFrame= self.getMaxDetectionT()
 
-        distanceList = []
-        t = minFrame
-        while ( t < maxFrame ):
-            distanceBin = self.getDistance( t , t+binFrameSize )
+        # all the bins in one call: getDistance( t , t+binFrameSize ) for each bin
+        binStartList = list( range( minFrame, maxFrame, binFrameSize ) )
+        distanceList = self.intervalStats( binStartList, [ t+binFrameSize for t in binStartList ] )["distance"].tolist()
+        for t, distanceBin in zip( binStartList, distanceList ):
             print( "Distance bin n:{} value:{}".format ( t , distanceBin ) )
-            distanceList.append( distanceBin )
-            t=t+binFrameSize
 
         return distanceList
 
@@ -449,30 +524,32 @@ class Animal():
         if ( tmax==None ):
             tmax= self.getMaxDetectionT()
 
-        totalDistance = 0
-        for t in range( tmin , tmax ):
-        #for key in keyList:
-            '''
-            if ( key <= tmin or key >= tmax ):
-                continue
-            '''
+        # moves t -> t+1 for t in [tmin, tmax[, moves of more than 85.5 pixels between two frames are discarded
+        totalDistance = self.getKinematics().getDistance( tmin, tmax )
 
-            a = self.detectionDictionary.get( t )
-            b = self.detectionDictionary.get( t+1 )
+        totalDistance *= self.parameters.scaleFactor
 
-            if b==None or a==None:
-                continue
-            distance = math.hypot( a.massX - b.massX, a.massY - b.massY )
-            #print('distance: ', distance)
-            if ( distance >85.5): #if the distance calculated between two frames is too large, discard
-                continue
+        return totalDistance
 
-            totalDistance += distance
 
-        totalDistance *= self.parameters.scaleFactor
+    def intervalStats(self, starts, ends, zone = None ):
+        '''
+        statistics of the frame intervals [start, end] (included) in constant time per interval.
+        starts and ends are frame numbers, or lists/arrays of frame numbers ( one result per interval ).
+        Returns a dictionary:
+        distance: distance traveled in cm ( same as getDistance( start, end ) )
+        nbDetection: number of frames with a detection
+        speedSum, nbSpeed: sum (cm/s) and number of the speeds available ( same as getSpeedOverTimePeriod )
+        nbFrameInZone: if zone = ( xa, ya, xb, yb ) (pixels) is given, number of frames with the mass center in the zone
+        '''
+        stats = self.getKinematics().intervalStats( starts, ends, zone = zone )
+        stats["distance"] = stats["distance"] * self.parameters.scaleFactor
 
-        return totalDistance
+        if np.ndim( starts ) == 0 and np.ndim( ends ) == 0:
+            for key in stats:
+                stats[key] = stats[key].item()
 
+        return stats
 
     def getOrientationVector(self, t):
 
@@ -785,35 +862,18 @@ class Animal():
         '''
         calculate the instantaneous speed of the animal at each frame
         '''
-        a = self.detectionDictionary.get( t-1 )
-        b = self.detectionDictionary.get( t+1 )
-
-        if ( b==None or a==None):
-            return None
-
-        speed = math.hypot( a.massX - b.massX, a.massY - b.massY )*self.parameters.scaleFactor/(2/30)
-        
-
-        return speed
+        return self.getKinematics().getSpeed( t )
     
     
     def getSpeedOverTimePeriod(self, tmin, tmax):
         '''Compute the speed of the animal over a time period'''          
         duration = tmax - tmin
-        sum = 0
-        speedList = []
+        speedArray = self.getKinematics().getSpeedArray( tmin, tmax )
         
-        for t in range ( tmin, tmax+1 ) :
-            speed = self.getSpeed(t)
-            #print('speed: ', speed)
-            if ( speed != None ):
-                sum+= speed
-                speedList.append( speed )
-        
-        if speedList != []:
-            meanSpeed = sum / duration
-            maxSpeed = max(speedList)
-            minSpeed = min(speedList)
+        if len( speedArray ) > 0:
+            meanSpeed = float( speedArray.sum() ) / duration
+            maxSpeed = float( speedArray.max() )
+            minSpeed = float( speedArray.min() )
         else:
             meanSpeed = None
             maxSpeed = None
@@ -826,15 +886,7 @@ class Animal():
         '''
         calculate the instantaneous vertical speed of the mass center of the animal at each frame
         '''
-        a = self.detectionDictionary.get( t-1 )
-        b = self.detectionDictionary.get( t+1 )
-
-        if ( b==None or a==None):
-            return None
-
-        verticalSpeed = (b.massZ - a.massZ)/2
-
-        return verticalSpeed
+        return self.getKinematics().getVerticalSpeed( t )
 
 
     def getSap(self, tmin=0, tmax=None, xa=None, ya=None, xb=None, yb=None):
@@ -972,10 +1024,65 @@ class Animal():
             plt.show()
 
 
+    def enableMaskCache(self, enable = True ):
+        '''
+        keeps the decoded masks in memory (frame -> Mask), filled by getBinaryDetectionMask and iterBinaryDetectionMasks.
+        '''
+        self.maskCache = {} if enable else None
+
+    def clearMaskCache(self):
+        if self.maskCache != None:
+            self.maskCache.clear()
+
+    def iterBinaryDetectionMasks(self, tmin, tmax ):
+        '''
+        yields ( t, mask ) for the frames of [tmin, tmax] with a mask, in frame order.
+        The masks are read with one query and decoded with numpy, instead of one query per frame.
+        As in getBinaryDetectionMask, frames with several detections of the animal are skipped.
+        '''
+        query = "SELECT FRAMENUMBER, DATA FROM DETECTION WHERE ANIMALID={} AND FRAMENUMBER>={} AND FRAMENUMBER<={} ORDER BY FRAMENUMBER".format( self.baseId , tmin, tmax )
+
+        cursor = self.conn.cursor()
+        cursor.execute( query )
+
+        previousRow = None
+        duplicate = False
+        for rows in iter( lambda: cursor.fetchmany( DETECTION_CHUNK_SIZE ), [] ):
+            for row in rows:
+                if previousRow != None and row[0] == previousRow[0]:
+                    duplicate = True
+                    continue
+                if previousRow != None and not duplicate:
+                    mask = self._decodeMaskRow( previousRow )
+                    if mask != None:
+                        yield previousRow[0], mask
+                previousRow = row
+                duplicate = False
+
+        cursor.close()
+
+        if previousRow != None and not duplicate:
+            mask = self._decodeMaskRow( previousRow )
+            if mask != None:
+                yield previousRow[0], mask
+
+    def _decodeMaskRow(self, row ):
+
+        t, data = row
+        if data == None:
+            return None
+        mask = Mask( data, self.getColor( ) )
+        if self.maskCache != None:
+            self.maskCache[t] = mask
+        return mask
+
     def getBinaryDetectionMask(self , t):
         '''
         returns the mask of a detection at a given T.
         '''
+        if self.maskCache != None and t in self.maskCache:
+            return self.maskCache[t]
+
         query = "SELECT DATA FROM DETECTION WHERE ANIMALID={} AND FRAMENUMBER={}".format( self.baseId , t )
 
         cursor = self.conn.cursor()
@@ -992,6 +1099,8 @@ class Animal():
         data = row[0]
 
         mask = Mask( data, self.getColor( ) )
+        if self.maskCache != None:
+            self.maskCache[t] = mask
 
         return mask
 
@@ -1006,6 +1115,9 @@ class AnimalPool():
         self.animalDictionary = {}
         self.detectionStartFrame = None
         self.detectionEndFrame   = None
+        self.anonymousDetection = {}
+        self.anonymousDetectionIndex = None
+        self.anonymousDetectionColumnar = False
 
     def getAnimalDictionary(self):
         return self.animalDictionary
@@ -1111,18 +1223,46 @@ class AnimalPool():
                 print ( "Animal loader : error while loading animal.")
 
     def getAnonymousDetection(self, frame ):
+        if self.anonymousDetectionColumnar:
+            massX, massY = self.anonymousDetectionIndex.getDetections( frame )
+            if len( massX ) == 0:
+                return None
+            return [ Detection( x, y, lightLoad = True ) for x, y in zip( massX.tolist(), massY.tolist() ) ]
+
         if frame not in self.anonymousDetection:
             return None
 
         return self.anonymousDetection[frame]
 
-    def loadAnonymousDetection(self, start = None, end=None ):
+    def getAnonymousDetectionIndex(self):
+        '''
+        anonymous detections as an AnonymousDetectionIndex (see AnonymousDetectionIndex.py), built from the
+        dictionary on first use if they were not loaded with columnar=True
+        '''
+        if self.anonymousDetectionIndex == None:
+            frameList = []
+            massXList = []
+            massYList = []
+            for frame, detectionList in self.anonymousDetection.items():
+                for detection in detectionList:
+                    frameList.append( frame )
+                    massXList.append( detection.massX )
+                    massYList.append( detection.massY )
+            self.anonymousDetectionIndex = AnonymousDetectionIndex( frameList, massXList, massYList )
+
+        return self.anonymousDetectionIndex
+
+    def loadAnonymousDetection(self, start = None, end=None, columnar = False ):
         '''
         Load the dictionary of anonymous detection.
         each entry get a list of detection
         clear previous anonymous detection dictionary
+        columnar only builds an AnonymousDetectionIndex (no Detection object, the dictionary stays empty):
+        getAnonymousDetection still works, getAnonymousDetectionIndex gives the arrays.
         '''
         self.anonymousDetection = {}
+        self.anonymousDetectionIndex = None
+        self.anonymousDetectionColumnar = columnar
 
         chrono = Chronometer("Load anonymous detection")
         cursor = self.conn.cursor()
@@ -1138,10 +1278,14 @@ class AnimalPool():
         print( query )
         cursor.execute( query )
 
-        rows = cursor.fetchall()
-        cursor.close()
+        if columnar:
+            self.anonymousDetectionIndex = AnonymousDetectionIndex.loadFromChunks( iter( lambda: cursor.fetchmany( DETECTION_CHUNK_SIZE ), [] ) )
+            cursor.close()
+            print ( len( self.anonymousDetectionIndex.frame ) , " frames containing anonymous detections loaded (columnar) in {} seconds.".format( chrono.getTimeInS( )) )
+            return
 
-        for row in rows:
+        # rows are converted page by page instead of keeping the whole result list
+        for row in ( row for rows in iter( lambda: cursor.fetchmany( DETECTION_CHUNK_SIZE ), [] ) for row in rows ):
             frameNumber = row[0]
             massX = row[1]
             massY = row[2]
@@ -1181,11 +1325,35 @@ class AnimalPool():
         return tDic
         
 
-    def loadDetection (self , start = None, end=None , lightLoad = False ):
+    def loadDetection (self , start = None, end=None , lightLoad = False, columnar = False ):
         self.detectionStartFrame = start
         self.detectionEndFrame   = end
         for animal in self.animalDictionary.keys():
-            self.animalDictionary[animal].loadDetection( start = start, end = end , lightLoad=lightLoad )
+            self.animalDictionary[animal].loadDetection( start = start, end = end , lightLoad=lightLoad, columnar=columnar )
+
+    def iterDetectionWindows(self, start, end = None, chunkSize = oneDay, halo = 0, lightLoad = False, columnar = False ):
+        '''
+        processes [start, end] chunk by chunk, with only the detections of one chunk in memory.
+        For each chunk, the detections of [ chunkStart - halo, chunkEnd + halo ] are loaded in the animals of the pool,
+        then ( chunkStart, chunkEnd ) is yielded.
+        The halo gives the neighbouring frames needed by derivative features (getSpeed uses t-1 and t+1).
+        The caller must only produce results for the frames of [ chunkStart, chunkEnd ] so that the chunks do not overlap.
+        '''
+        if ( end == None ):
+            cursor = self.conn.cursor()
+            cursor.execute( "SELECT MAX(FRAMENUMBER) FROM DETECTION" )
+            end = cursor.fetchall()[0][0]
+            cursor.close()
+            if end == None:
+                return
+
+        chunkStart = start
+        while chunkStart <= end:
+            chunkEnd = min( chunkStart + chunkSize - 1, end )
+            print( "Detection chunk: {} to {} (halo: {})".format( chunkStart, chunkEnd, halo ) )
+            self.loadDetection( start = max( 0, chunkStart - halo ), end = chunkEnd + halo, lightLoad = lightLoad, columnar = columnar )
+            yield chunkStart, chunkEnd
+            chunkStart = chunkEnd + 1
 
     def filterDetectionByInstantSpeed(self, minSpeed, maxSpeed):
         for animal in self.animalDictionary.keys():
@@ -1517,36 +1685,26 @@ class AnimalPool():
         * adds location also in cm
         * adds time column in pandas timedelta
         * adds column to indicate detections in center region
+        The table is built from the detection arrays of the animals (see ColumnarExport.py).
         Returns:
             pd.DataFrame: detections as pandas table
         """
 
-        data = defaultdict(list)
-        for animal in self.getAnimalList():
-            for frame, detection in animal.detectionDictionary.items():
-                data["RFID"]         .append(f"{animal.name}_{animal.RFID}")
-                data["name"]         .append(f"{animal.name}")
-                data["genotype"]     .append(f"{animal.genotype}")
-                data['frame']        .append(frame)
-                data['sec']          .append(frame / oneSecond)
-                data['x']            .append(detection.massX)
-                data['y']            .append(detection.massY)
-                data['z']            .append(detection.massZ)
-
-        df = pd.DataFrame(data)
-
-
-        df["x_cm"] = (df.x - self.parameters.cornerCoordinatesOpenFieldArea[0][0]) / (self.parameters.cornerCoordinatesOpenFieldArea[1][0] - self.parameters.cornerCoordinatesOpenFieldArea[0][0]) * self.parameters.ARENA_SIZE
-        df["y_cm"] = (df.y - self.parameters.cornerCoordinatesOpenFieldArea[1][1]) / (self.parameters.cornerCoordinatesOpenFieldArea[2][1] - self.parameters.cornerCoordinatesOpenFieldArea[1][1]) * self.parameters.ARENA_SIZE
+        animalList = self.getAnimalList()
+        frameList, idList, xList, yList, zList = [ np.zeros( 0, dtype=np.int64 ) ], [ np.zeros( 0, dtype=np.int64 ) ], [ np.zeros( 0 ) ], [ np.zeros( 0 ) ], [ np.zeros( 0 ) ]
+        for animal in animalList:
+            frames, massX, massY, massZ = getMassArrays( animal )
+            frameList.append( frames )
+            idList.append( np.full( len( frames ), animal.baseId, dtype=np.int64 ) )
+            xList.append( massX )
+            yList.append( massY )
+            zList.append( massZ )
 
-        df[f"in_arena_center"] = (df["x_cm"] > self.parameters.CENTER_MARGIN) & \
-                                 (df["y_cm"] > self.parameters.CENTER_MARGIN) & \
-                                 (df["x_cm"] < (self.parameters.ARENA_SIZE - self.parameters.CENTER_MARGIN)) & \
-                                 (df["y_cm"] < (self.parameters.ARENA_SIZE - self.parameters.CENTER_MARGIN))
+        columns = { "animalId": np.concatenate( idList ), "frame": np.concatenate( frameList ), "massX": np.concatenate( xList ), "massY": np.concatenate( yList ), "massZ": np.concatenate( zList ) }
 
-        df.insert(3, "time", pd.to_timedelta(df.sec, unit="s"))
-
-        return df.sort_values("time").reset_index(drop=True)
+        # the pool has no parameters of its own: the arena is the one of the animals
+        parameters = animalList[0].parameters if len( animalList ) > 0 else ParametersMouse()
+        return getDetectionDataFrame( animalList, parameters, columns )
 
 
     def getSingleEventTable(self, event_name):
@@ -1561,28 +1719,8 @@ class AnimalPool():
         Returns:
             DataFrame
         """
-        data = defaultdict(list)
-        for animal in self.getAnimalList():
-            with mute_prints():
-                eventTimeLine = EventTimeLine(self.conn,
-                                                event_name,
-                                                idA=animal.baseId,
-                                                minFrame=self.detectionStartFrame,
-                                                maxFrame=self.detectionEndFrame)
-
-            for e in eventTimeLine.getEventList():
-                data["RFID"]         .append(f"{animal.name}_{animal.RFID}")
-                data["name"]         .append(f"{animal.name}")
-                data["genotype"]     .append(f"{animal.genotype}")
-                data["event_name"]   .append(event_name)
-                data["start_sec"]    .append(e.startFrame / oneSecond)
-                data["end_sec"]      .append(e.endFrame   / oneSecond)
-                data["duration"]     .append(e.duration() / oneSecond)
-
-        df = pd.DataFrame(data)
-        df.insert(2, "time", pd.to_timedelta(df["start_sec"], unit="s"))
-
-        return df.sort_values("time").reset_index(drop=True)
+        columns = getEventColumns( self.conn, self.animalDictionary.keys(), self.detectionStartFrame, self.detectionEndFrame, eventNameList = [ event_name ] )
+        return getEventDataFrame( self.getAnimalList(), columns )
 
 
     def getAllEventsTable(self):
@@ -1592,13 +1730,9 @@ class AnimalPool():
             * Events' start time
             * Events' end time
             * Events' duration
+        All the events are read with one query (see ColumnarExport.py).
         Returns:
             DataFrame
         """
-        with mute_prints():
-            all_event_names = getAllEvents(connection=self.conn)
-
-        event_table =  pd.concat([self.getSingleEventTable(event_name)
-                                    for event_name in all_event_names]
-                                , axis=0)
-        return event_table.sort_values("time").reset_index(drop=True)
\ No newline at end of file
+        columns = getEventColumns( self.conn, self.animalDictionary.keys(), self.detectionStartFrame, self.detectionEndFrame )
+        return getEventDataFrame( self.getAnimalList(), columns )
\ No newline at end of file
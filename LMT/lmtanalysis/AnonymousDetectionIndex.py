@@ -0,0 +1,271 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Compact index of the anonymous detections (DETECTION rows with no ANIMALID).
+
+The detections are sorted by frame and stored as numpy arrays (massX, massY). For each frame with anonymous
+detections, offset gives the range of its detections (compressed sparse row layout):
+
+    detections of frame[i]: massX[ offset[i] : offset[i+1] ]
+
+Queries work on arrays of frames at once: number of detections per frame, frames with k detections,
+detections within a radius of given points (for instance the animals at these frames), and pairs of close
+detections of a same frame. With setGrid( cellSize ), the radius queries only test the detections of the
+neighbouring cells of a uniform grid, which matters when there are many anonymous detections per frame.
+'''
+
+import unittest
+import numpy as np
+
+
+class AnonymousDetectionIndex():
+
+    def __init__(self, frames = None, massX = None, massY = None ):
+        '''
+        frames, massX, massY: one value per detection, in any order (the order of the detections of a frame is kept)
+        '''
+        frames = np.zeros( 0, dtype=np.int64 ) if frames is None else np.asarray( frames, dtype=np.int64 )
+        massX = np.zeros( 0 ) if massX is None else np.asarray( massX, dtype=np.float64 )
+        massY = np.zeros( 0 ) if massY is None else np.asarray( massY, dtype=np.float64 )
+
+        order = np.argsort( frames, kind="stable" )
+        self.detectionFrame = frames[order]
+        self.massX = massX[order]
+        self.massY = massY[order]
+
+        self.frame, counts = np.unique( self.detectionFrame, return_counts=True )
+        self.offset = np.zeros( len( self.frame ) + 1, dtype=np.int64 )
+        np.cumsum( counts, out=self.offset[1:] )
+
+        self.cellSize = None
+
+    @classmethod
+    def loadFromChunks(cls, chunks ):
+        '''
+        chunks: successive lists of rows FRAMENUMBER, MASS_X, MASS_Y. Detections with massX < 10 are discarded,
+        as in AnimalPool.loadAnonymousDetection.
+        '''
+        tableList = []
+        for rows in chunks:
+            if len( rows ) == 0:
+                continue
+            table = np.array( rows, dtype=np.float64 )
+            tableList.append( table[ table[:, 1] >= 10 ] )
+
+        if len( tableList ) == 0:
+            return cls()
+
+        table = np.concatenate( tableList )
+        return cls( table[:, 0].astype( np.int64 ), table[:, 1], table[:, 2] )
+
+    def __len__(self):
+        return len( self.detectionFrame )
+
+    def getNbBytes(self):
+        return self.detectionFrame.nbytes + self.massX.nbytes + self.massY.nbytes + self.frame.nbytes + self.offset.nbytes
+
+    def getFrameIndex(self, frames ):
+        '''
+        row of each frame in self.frame, -1 if the frame has no anonymous detection
+        '''
+        frames = np.asarray( frames, dtype=np.int64 )
+        if len( self.frame ) == 0:
+            return np.full( frames.shape, -1, dtype=np.int64 )
+        index = np.minimum( np.searchsorted( self.frame, frames ), len( self.frame ) - 1 )
+        return np.where( self.frame[index] == frames, index, -1 )
+
+    def getDetections(self, frame ):
+        '''
+        massX and massY of the anonymous detections of one frame
+        '''
+        i = int( self.getFrameIndex( [ frame ] )[0] )
+        if i < 0:
+            return self.massX[:0], self.massY[:0]
+        return self.massX[ self.offset[i]:self.offset[i+1] ], self.massY[ self.offset[i]:self.offset[i+1] ]
+
+    def getNbDetection(self, frames ):
+        '''
+        number of anonymous detections of each frame
+        '''
+        # index -1 (no detection) reads the last count, which is 0
+        counts = np.append( np.diff( self.offset ), 0 )
+        return counts[ self.getFrameIndex( frames ) ]
+
+    def getFramesWithNbDetection(self, minNumber, maxNumber = None ):
+        '''
+        frames with at least minNumber (and at most maxNumber) anonymous detections.
+        Frames without anonymous detection are not returned.
+        '''
+        counts = np.diff( self.offset )
+        keep = counts >= minNumber
+        if maxNumber != None:
+            keep &= counts <= maxNumber
+        return self.frame[keep]
+
+    def restrict(self, minFrame = None, maxFrame = None ):
+        '''
+        index of the detections of [minFrame, maxFrame]
+        '''
+        keep = np.ones( len( self.detectionFrame ), dtype=bool )
+        if minFrame != None:
+            keep &= self.detectionFrame >= minFrame
+        if maxFrame != None:
+            keep &= self.detectionFrame <= maxFrame
+        index = AnonymousDetectionIndex( self.detectionFrame[keep], self.massX[keep], self.massY[keep] )
+        if self.cellSize != None:
+            index.setGrid( self.cellSize )
+        return index
+
+    def setGrid(self, cellSize ):
+        '''
+        builds a uniform grid (cells of cellSize pixels) over the detections of each frame. None removes the grid.
+        '''
+        self.cellSize = cellSize
+        if cellSize == None:
+            return
+
+        self.cellX = np.floor( self.massX / cellSize ).astype( np.int64 )
+        self.cellY = np.floor( self.massY / cellSize ).astype( np.int64 )
+        self.cellKey = self.getCellKey( self.detectionFrame, self.cellX, self.cellY )
+        # detections sorted by frame and cell
+        self.cellOrder = np.argsort( self.cellKey, kind="stable" )
+        self.sortedCellKey = self.cellKey[ self.cellOrder ]
+
+    def getCellKey(self, frames, cellX, cellY ):
+        ''' one integer per frame and cell (cell coordinates of a cage stay far below 2^20) '''
+        return ( frames << 40 ) + ( ( cellY + ( 1 << 19 ) ) << 20 ) + ( cellX + ( 1 << 19 ) )
+
+    def getDetectionsWithinRadius(self, frames, x, y, radius ):
+        '''
+        for points given by frames, x and y: the anonymous detections of the same frame closer than radius
+        (distance < radius). Returns two arrays ( point index, detection index ), one entry per close detection.
+        Points with nan coordinates have no close detection.
+        '''
+        frames = np.asarray( frames, dtype=np.int64 )
+        x = np.asarray( x, dtype=np.float64 )
+        y = np.asarray( y, dtype=np.float64 )
+
+        if self.cellSize != None and radius <= self.cellSize:
+            pointIndex, detectionIndex = self.getGridCandidates( frames, x, y )
+        else:
+            pointIndex, detectionIndex = self.getFrameCandidates( frames )
+
+        close = np.hypot( x[pointIndex] - self.massX[detectionIndex], y[pointIndex] - self.massY[detectionIndex] ) < radius
+        return pointIndex[close], detectionIndex[close]
+
+    def getFrameCandidates(self, frames ):
+        ''' all the detections of the frame of each point '''
+        index = self.getFrameIndex( frames )
+        pointIndex = np.flatnonzero( index >= 0 )
+        index = index[pointIndex]
+        starts = self.offset[index]
+        counts = self.offset[index + 1] - starts
+        return self.expandRanges( pointIndex, starts, counts )
+
+    def getGridCandidates(self, frames, x, y ):
+        ''' detections of the 9 cells around each point '''
+        valid = np.flatnonzero( np.isfinite( x ) & np.isfinite( y ) )
+        cellX = np.floor( x[valid] / self.cellSize ).astype( np.int64 )
+        cellY = np.floor( y[valid] / self.cellSize ).astype( np.int64 )
+
+        pointIndexList = []
+        detectionIndexList = []
+        for dx in ( -1, 0, 1 ):
+            for dy in ( -1, 0, 1 ):
+                key = self.getCellKey( frames[valid], cellX + dx, cellY + dy )
+                starts = np.searchsorted( self.sortedCellKey, key, side="left" )
+                counts = np.searchsorted( self.sortedCellKey, key, side="right" ) - starts
+                pointIndex, sortedIndex = self.expandRanges( valid, starts, counts )
+                pointIndexList.append( pointIndex )
+                detectionIndexList.append( self.cellOrder[sortedIndex] )
+
+        return np.concatenate( pointIndexList ), np.concatenate( detectionIndexList )
+
+    def expandRanges(self, pointIndex, starts, counts ):
+        '''
+        ( point index, i ) for i in range( start, start + count ) of each point
+        '''
+        total = int( counts.sum() )
+        repeatedPoint = np.repeat( pointIndex, counts )
+        position = np.arange( total ) - np.repeat( np.cumsum( counts ) - counts, counts )
+        return repeatedPoint, np.repeat( starts, counts ) + position
+
+    def getClosePairs(self, radius ):
+        '''
+        pairs ( i, j ), i < j, of anonymous detections of the same frame closer than radius
+        '''
+        if self.cellSize != None and radius <= self.cellSize:
+            pointIndex, detectionIndex = self.getDetectionsWithinRadius( self.detectionFrame, self.massX, self.massY, radius )
+            keep = pointIndex < detectionIndex
+            return pointIndex[keep], detectionIndex[keep]
+
+        # detections of a frame are contiguous: pairs at offset 1, 2... in the arrays
+        counts = np.diff( self.offset )
+        maxPerFrame = int( counts.max() ) if len( counts ) > 0 else 0
+        nbDetection = len( self.detectionFrame )
+        pairAList = [ np.zeros( 0, dtype=np.int64 ) ]
+        pairBList = [ np.zeros( 0, dtype=np.int64 ) ]
+        for shift in range( 1, maxPerFrame ):
+            a = np.arange( nbDetection - shift )
+            b = a + shift
+            close = self.detectionFrame[a] == self.detectionFrame[b]
+            close &= np.hypot( self.massX[a] - self.massX[b], self.massY[a] - self.massY[b] ) < radius
+            pairAList.append( a[close] )
+            pairBList.append( b[close] )
+        return np.concatenate( pairAList ), np.concatenate( pairBList )
+
+
+class TestAnonymousDetectionIndex ( unittest.TestCase ):
+
+    def getIndex(self):
+        '''
+        0 to 8 anonymous detections per frame, grouped around a few points so that some are close
+        '''
+        rng = np.random.default_rng( 7 )
+        frames = []
+        for frame in range( 300 ):
+            frames += [ frame ] * int( rng.integers( 0, 9 ) )
+        frames = np.array( frames )
+        centers = rng.uniform( 0, 500, ( 300, 3, 2 ) )
+        group = rng.integers( 0, 3, len( frames ) )
+        massX = centers[frames, group, 0] + rng.normal( 0, 25, len( frames ) )
+        massY = centers[frames, group, 1] + rng.normal( 0, 25, len( frames ) )
+        # detections given in any order
+        order = rng.permutation( len( frames ) )
+        return AnonymousDetectionIndex( frames[order], massX[order], massY[order] ), rng
+
+    def test_DetectionsWithinRadiusAsBruteForce(self):
+
+        index, rng = self.getIndex()
+        # points close to detections, points anywhere (frames without detection too), and points with nan coordinates
+        near = rng.integers( 0, len( index ), 1000 )
+        frames = np.concatenate( [ index.detectionFrame[near], rng.integers( 0, 320, 1000 ) ] )
+        x = np.concatenate( [ index.massX[near] + rng.normal( 0, 20, 1000 ), rng.uniform( 0, 500, 1000 ) ] )
+        y = np.concatenate( [ index.massY[near] + rng.normal( 0, 20, 1000 ), rng.uniform( 0, 500, 1000 ) ] )
+        x[::50] = np.nan
+
+        for radius in ( 20, 30, 60 ):
+            reference = sorted( ( p, d ) for p in range( len( frames ) ) for d in range( len( index ) )
+                                if index.detectionFrame[d] == frames[p] and np.hypot( x[p] - index.massX[d], y[p] - index.massY[d] ) < radius )
+            self.assertTrue( len( reference ) > 100 )
+            for cellSize in ( None, 30, 45 ):
+                index.setGrid( cellSize )
+                pointIndex, detectionIndex = index.getDetectionsWithinRadius( frames, x, y, radius )
+                self.assertEqual( sorted( zip( pointIndex.tolist(), detectionIndex.tolist() ) ), reference, ( radius, cellSize ) )
+
+    def test_ClosePairsAsBruteForce(self):
+
+        index, rng = self.getIndex()
+        for radius in ( 20, 30, 60 ):
+            reference = sorted( ( i, j ) for i in range( len( index ) ) for j in range( i + 1, len( index ) )
+                                if index.detectionFrame[i] == index.detectionFrame[j] and np.hypot( index.massX[i] - index.massX[j], index.massY[i] - index.massY[j] ) < radius )
+            self.assertTrue( len( reference ) > 100 )
+            for cellSize in ( None, 30, 45 ):
+                index.setGrid( cellSize )
+                pairA, pairB = index.getClosePairs( radius )
+                self.assertEqual( sorted( zip( pairA.tolist(), pairB.tolist() ) ), reference, ( radius, cellSize ) )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,250 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Benchmark of the rebuild of the events, to follow the performance of the analysis across versions.
+
+Each BuildEvent module is built on the whole database (one time window), then each event is loaded and saved
+with EventTimeLine. For each step, the result gives:
+    time: duration in seconds
+    sqlTime: time spent in sqlite (execute, fetch and commit on the connection of the benchmark)
+    writeTime: time spent saving events (EventTimeLine.saveTimeLine)
+    peakRSS: peak resident memory of the process during the step, in bytes (on Linux the peak is reset before each step,
+    elsewhere it is the peak since the start of the process)
+    framesPerSecond: number of frames processed per second
+
+Use scripts/Benchmark_Rebuild.py to run it on a synthetic database ( see SyntheticDatabase.py ) and write the json file.
+'''
+
+import os
+import sys
+import time
+import json
+import sqlite3
+import platform
+import datetime
+import subprocess
+
+from lmtanalysis.Animal import AnimalPool
+from lmtanalysis.AnimalType import AnimalType
+from lmtanalysis.Event import EventTimeLine, EventTransaction, getEventWriteTime, resetEventWriteTime
+from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache
+from lmtanalysis.IncrementalRebuild import getLastFrame
+from lmtanalysis import BuildEventScheduler
+
+
+class TimedCursor( sqlite3.Cursor ):
+    '''
+    cursor adding the time spent in sqlite to its connection (rows read by iterating on the cursor are not counted)
+    '''
+    def _timed(self, function, *args ):
+        start = time.perf_counter()
+        try:
+            return function( *args )
+        finally:
+            self.connection.sqlTime += time.perf_counter() - start
+
+    def execute(self, *args ):
+        return self._timed( super().execute, *args )
+
+    def executemany(self, *args ):
+        return self._timed( super().executemany, *args )
+
+    def executescript(self, *args ):
+        return self._timed( super().executescript, *args )
+
+    def fetchone(self):
+        return self._timed( super().fetchone )
+
+    def fetchmany(self, *args ):
+        return self._timed( super().fetchmany, *args )
+
+    def fetchall(self):
+        return self._timed( super().fetchall )
+
+
+class TimedConnection( sqlite3.Connection ):
+    '''
+    connection measuring the time spent in sqlite: sqlite3.connect( file, factory=TimedConnection )
+    '''
+    def __init__(self, *args, **kwargs ):
+        super().__init__( *args, **kwargs )
+        self.sqlTime = 0
+
+    def cursor(self, factory = TimedCursor ):
+        return super().cursor( factory )
+
+    def execute(self, *args ):
+        return self.cursor().execute( *args )
+
+    def executemany(self, *args ):
+        return self.cursor().executemany( *args )
+
+    def commit(self):
+        start = time.perf_counter()
+        super().commit()
+        self.sqlTime += time.perf_counter() - start
+
+
+def resetPeakRSS():
+    '''
+    resets the peak resident memory of the process (Linux only). Returns False if it is not possible.
+    '''
+    try:
+        with open( "/proc/self/clear_refs", "w" ) as file:
+            file.write( "5" )
+        return True
+    except OSError:
+        return False
+
+def getPeakRSS():
+    ''' peak resident memory of the process in bytes, or None '''
+    try:
+        with open( "/proc/self/status" ) as file:
+            for line in file:
+                if line.startswith( "VmHWM:" ):
+                    return int( line.split()[1] ) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def getCodeVersion():
+    ''' git commit of the analysis code, or None '''
+    try:
+        return subprocess.run( [ "git", "rev-parse", "HEAD" ], cwd=os.path.dirname( os.path.abspath( __file__ ) ), capture_output=True, text=True, check=True ).stdout.strip()
+    except ( OSError, subprocess.CalledProcessError ):
+        return None
+
+
+class BenchmarkStep():
+    '''
+    measures a step of the benchmark:
+
+        with BenchmarkStep( connection, "Load detection", nbFrame ) as step:
+            ...
+        step.result
+    '''
+    def __init__(self, connection, name, nbFrame ):
+        self.connection = connection
+        self.name = name
+        self.nbFrame = nbFrame
+        self.result = None
+
+    def __enter__(self):
+        resetPeakRSS()
+        resetEventWriteTime()
+        self.sqlTimeStart = self.connection.sqlTime
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback ):
+        duration = time.perf_counter() - self.start
+        self.result = { "name": self.name,
+                       "time": duration,
+                       "sqlTime": self.connection.sqlTime - self.sqlTimeStart,
+                       "writeTime": getEventWriteTime(),
+                       "peakRSS": getPeakRSS(),
+                       "framesPerSecond": self.nbFrame / duration if duration > 0 else None }
+        return False
+
+
+class BenchmarkRollback( Exception ):
+    pass
+
+
+def countEvents( connection, eventNameList ):
+    if len( eventNameList ) == 0:
+        return 0
+    cursor = connection.cursor()
+    cursor.execute( "SELECT COUNT(*) FROM EVENT WHERE NAME IN ({})".format( ",".join( "?" * len( eventNameList ) ) ), list( eventNameList ) )
+    nbEvent = cursor.fetchall()[0][0]
+    cursor.close()
+    return nbEvent
+
+def benchmarkFile( file, eventClassList, animalType = AnimalType.MOUSE, tmin = 0, tmax = None ):
+    '''
+    rebuilds the events of eventClassList in file (the events of the modules are replaced) and measures each step.
+    returns the result as a dictionary.
+    '''
+    connection = sqlite3.connect( file, factory=TimedConnection )
+    if tmax == None:
+        tmax = getLastFrame( connection )
+    nbFrame = tmax - tmin + 1
+
+    result = { "date": datetime.datetime.now().isoformat( timespec="seconds" ),
+              "version": getCodeVersion(),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "file": file,
+              "tmin": tmin,
+              "tmax": tmax,
+              "nbFrame": nbFrame,
+              "peakRSSReset": resetPeakRSS() }
+
+    startTime = time.perf_counter()
+    flushEventTimeLineCache()
+
+    with BenchmarkStep( connection, "Load detection", nbFrame ) as step:
+        pool = AnimalPool()
+        pool.loadAnimals( connection )
+        pool.loadDetection( start = tmin, end = tmax )
+    result["loadDetection"] = step.result
+
+    with EventTransaction( connection, deferDelete=True ):
+        for ev in eventClassList:
+            ev.flush( connection )
+
+    result["modules"] = []
+    for ev in BuildEventScheduler.getOrderedEventClassList( eventClassList ):
+        print( "Benchmark:", ev.__name__ )
+        with BenchmarkStep( connection, ev.__name__, nbFrame ) as step:
+            with EventTransaction( connection ):
+                ev.reBuildEvent( connection, file, tmin=tmin, tmax=tmax, pool = pool, animalType = animalType )
+        step.result["nbEvent"] = countEvents( connection, getattr( ev, "producedEvents", [] ) )
+        result["modules"].append( step.result )
+
+    # events read and written by the modules
+    eventNameList = []
+    for ev in eventClassList:
+        for eventName in getattr( ev, "consumedEvents", [] ) + getattr( ev, "producedEvents", [] ):
+            if eventName not in eventNameList:
+                eventNameList.append( eventName )
+
+    result["eventTimeLine"] = []
+    for eventName in eventNameList:
+
+        with BenchmarkStep( connection, "Load " + eventName, nbFrame ) as loadStep:
+            timeLine = EventTimeLine( connection, eventName, minFrame=tmin, maxFrame=tmax )
+
+        # the events saved are removed with a rollback
+        try:
+            with EventTransaction( connection ):
+                with BenchmarkStep( connection, "Save " + eventName, nbFrame ) as saveStep:
+                    timeLine.saveTimeLine( connection )
+                raise BenchmarkRollback()
+        except BenchmarkRollback:
+            pass
+
+        result["eventTimeLine"].append( { "name": eventName, "nbEvent": timeLine.getNbEvent(), "load": loadStep.result, "save": saveStep.result } )
+
+    totalTime = time.perf_counter() - startTime
+    result["total"] = { "time": totalTime,
+                       "sqlTime": connection.sqlTime,
+                       "peakRSS": max( [ step["peakRSS"] or 0 for step in [ result["loadDetection"] ] + result["modules"] ] ),
+                       "framesPerSecond": nbFrame / totalTime if totalTime > 0 else None }
+
+    connection.close()
+    return result
+
+def saveBenchmark( result, file ):
+    with open( file, "w" ) as jsonFile:
+        json.dump( result, jsonFile, indent=4 )
+    print( "Benchmark saved in", file )
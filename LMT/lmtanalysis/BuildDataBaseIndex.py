@@ -53,6 +53,9 @@ def buildDataBaseIndex( connection , force=False):
     executeLog( c , "CREATE INDEX `eventstartendIndex` ON `EVENT` (`STARTFRAME` ASC,`ENDFRAME` ASC);" )     
         
     executeLog( c , "CREATE INDEX `indexeventidIndex` ON `EVENT` (`ID` ASC);" )     
+
+    # state of the events of a name ( EventTimeLineCache.getEventTableState )
+    executeLog( c , "CREATE INDEX `eventNameIdIndex` ON `EVENT` (`NAME` ASC,`ID` ASC);" )     
     
     executeLog( c , "CREATE INDEX 'detectionFastLoadXYIndex' ON 'DETECTION' ('ANIMALID' ,'FRAMENUMBER' ASC,'MASS_X' ,'MASS_Y' );" )
     
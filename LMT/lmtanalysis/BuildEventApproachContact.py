@@ -13,9 +13,15 @@ import matplotlib.pyplot as plt
 import numpy as np
 from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Contact", "Approach" ]
+producedEvents = [ "Approach contact" ]
+# frames of context needed around a frame: whole Approach events are saved (Approach events of LMT are expected to last less than 300 frames),
+# merge (1 frame) and length filter (3 frames) of the contacts
+halo = 300 + 1 + 3
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Approach contact" )
@@ -42,7 +48,9 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
     print ( eventName )
     print('Computing ', eventName)
             
-    #upload the timelines of interest
+    #upload the timelines of interest (one query per event name)
+    nbAnimal = pool.getNbAnimals()
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( name, animal, idAnimalB ) for name in ( "Contact", "Approach" ) for animal in range( 1 , nbAnimal+1 ) for idAnimalB in range( 1 , nbAnimal+1 ) if animal != idAnimalB ], minFrame=tmin, maxFrame=tmax )
     contactDico = {}
     approachDico = {}
     for animal in range( 1 , pool.getNbAnimals()+1 ):
@@ -50,9 +58,9 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
             if ( animal == idAnimalB ):
                 continue
             #charge the contact timelines as a dictionary of timelines
-            contactDico[animal, idAnimalB] = EventTimeLineCached( connection, file, "Contact", animal, idAnimalB, minFrame=tmin, maxFrame=tmax )
+            contactDico[animal, idAnimalB] = timeLineDic[ "Contact", animal, idAnimalB ]
             #charge the approach timelines as a dictionary of timelines
-            approachDico[animal, idAnimalB] = EventTimeLineCached( connection, file, "Approach", animal, idAnimalB, minFrame=tmin, maxFrame=tmax ) #fait une matrice de toutes les approches à deux possibles
+            approachDico[animal, idAnimalB] = timeLineDic[ "Approach", animal, idAnimalB ] #fait une matrice de toutes les approches à deux possibles
     
     #initiate the timeline of approach before a contact
     appContactTimeLineDico = {}
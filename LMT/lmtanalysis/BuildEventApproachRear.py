@@ -16,6 +16,12 @@ from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Rear in contact", "Social approach" ]
+producedEvents = [ "Approach rear" ]
+# frames of context needed around a frame: whole Social approach events are saved (Approach events of LMT are expected to last less than 300 frames),
+# and rears are searched 15 frames around their end
+halo = 300 + 15
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Approach rear" )
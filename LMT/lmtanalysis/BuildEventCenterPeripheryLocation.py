@@ -17,6 +17,11 @@ import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = []
+producedEvents = [ "Center Zone", "Periphery Zone" ]
+# frames of context needed around a frame: position of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Center Zone" )
@@ -16,6 +16,11 @@ from lmtanalysis.Measure import *
 from lmtanalysis.Chronometer import Chronometer
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = []
+producedEvents = [ "Detection" ]
+# frames of context needed around a frame: the detections of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Detection" )
@@ -18,14 +18,21 @@ from lmtanalysis.Measure import *
 
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
 import copy
 from copy import deepcopy
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.FollowDetection import FollowEngine
+from lmtanalysis.Interval import intervalsFromFrames, subtractIntervals
 
 #eventName = "FollowZone New4"
 eventName = "FollowZone"
+
+consumedEvents = [ "Contact", "Oral-genital Contact" ]
+producedEvents = [ "FollowZone", "FollowZone Isolated" ]
+# frames of context needed around a frame: corridor duration (up to 50 frames for rats), length filter and merge
+halo = 50 + 7 + 10
             
 def flush( connection ):
     ''' flush event in database '''
@@ -136,81 +143,37 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
     pool.filterDetectionToKeepOnlyHeadTailDetection()
     
     
-    # load the contact matrix dictionary    
-    contactDic = {}    
-    oralGenitalDic = {}
+    # direction vectors and headings of the animals, computed once (see FollowDetection.py)
+    followEngine = FollowEngine( pool, parameters )
+
+    # contact timelines of all the pairs, one query per event name
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( name, idA, idB ) for name in consumedEvents for idA in pool.animalDictionary for idB in pool.animalDictionary if idA != idB ], minFrame=tmin, maxFrame=tmax )
+
     for idAnimalA in pool.animalDictionary:
         print(pool.animalDictionary[idAnimalA])
         for idAnimalB in pool.animalDictionary:
-            if( idAnimalA == idAnimalB ):
-                continue
-            contactDic[idAnimalA, idAnimalB] = EventTimeLineCached( connection, file, "Contact", idAnimalA, idAnimalB, minFrame=tmin, maxFrame=tmax ).getDictionary()    
-            oralGenitalDic[idAnimalA, idAnimalB] = EventTimeLineCached( connection, file, "Oral-genital Contact", idAnimalA, idAnimalB, minFrame=tmin, maxFrame=tmax ).getDictionary()
-            
-    #init empty result EventTimeLine matrix
-    followIsolatedTimeLine = {}
-    for idAnimalA in pool.animalDictionary:
-        for idAnimalB in pool.animalDictionary:
-            if( idAnimalA == idAnimalB ):
-                continue                                        
-            followIsolatedTimeLine[idAnimalA, idAnimalB] = EventTimeLine( None, eventName , idAnimalA , idAnimalB , None , None , loadEvent=False )
 
-    # init empty result timeline Dictionary.
-    followIsolatedTimeLineDic = {}
-    
-    for idAnimalA in pool.animalDictionary:
-
-        animalA = pool.animalDictionary[idAnimalA]
-        dicA = animalA.detectionDictionary
-        
-        for idAnimalB in pool.animalDictionary:
-            
             # discard if animals are the same.
             if( idAnimalA == idAnimalB ):
                 continue
-            
-            # result dictionary for the current pair tested.            
-            resultDic = {}
 
-            animalB = pool.animalDictionary[idAnimalB]
-            dicB = animalB.detectionDictionary
-            
             # Starting "is A following B ?"
-                        
-            for t in dicB:            
-                if isAFollowingB( t , dicA , dicB, parameters ):
-                    resultDic[t]=True
+            starts, ends = intervalsFromFrames( followEngine.getFollowFrames( idAnimalA, idAnimalB ) )
 
             # remove all contact situation
-            for t in contactDic[idAnimalA, idAnimalB]:
-                if t in resultDic:
-                    resultDic.pop( t )
-            
-            for t in oralGenitalDic[idAnimalA, idAnimalB]:
-                if t in resultDic:
-                    resultDic.pop( t )
-            
-            for t in oralGenitalDic[idAnimalB, idAnimalA]:
-                if t in resultDic:
-                    resultDic.pop( t )
-            
-            followIsolatedTimeLineDic[idAnimalA, idAnimalB] = resultDic
+            for idContactA, idContactB, contactName in ( ( idAnimalA, idAnimalB, "Contact" ), ( idAnimalA, idAnimalB, "Oral-genital Contact" ), ( idAnimalB, idAnimalA, "Oral-genital Contact" ) ):
+                starts, ends = subtractIntervals( starts, ends, *timeLineDic[ contactName, idContactA, idContactB ].getIntervals() )
+
+            followIsolatedTimeLine = EventTimeLine( None, eventName , idAnimalA , idAnimalB , None , None , loadEvent=False )
+            followIsolatedTimeLine.reBuildWithIntervals( starts, ends )
 
-            
-    #rebuild timelines with dictionaries
-    for idAnimalA in pool.animalDictionary:
-        for idAnimalB in pool.animalDictionary:
-            if( idAnimalB == idAnimalA ):
-                continue
-            followIsolatedTimeLine[idAnimalA, idAnimalB].reBuildWithDictionary( followIsolatedTimeLineDic[idAnimalA, idAnimalB] )
-                        
             # filter out accidental events
-            followIsolatedTimeLine[idAnimalA, idAnimalB].removeEventsBelowLength( parameters.FOLLOW_REMOVE_EVENT_BELOW_LEN )
+            followIsolatedTimeLine.removeEventsBelowLength( parameters.FOLLOW_REMOVE_EVENT_BELOW_LEN )
             # create continuity in the events
-            followIsolatedTimeLine[idAnimalA, idAnimalB].mergeCloseEvents( parameters.FOLLOW_MERGE_EVENT_LEN_CRITERIA )
-                        
-            followIsolatedTimeLine[idAnimalA, idAnimalB].endRebuildEventTimeLine(connection)
-                
+            followIsolatedTimeLine.mergeCloseEvents( parameters.FOLLOW_MERGE_EVENT_LEN_CRITERIA )
+
+            followIsolatedTimeLine.endRebuildEventTimeLine(connection)
+
     # log process
     
     t = TaskLogger( connection )
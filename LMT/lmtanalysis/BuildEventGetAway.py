@@ -17,6 +17,11 @@ from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = []
+producedEvents = [ "Get away" ]
+# frames of context needed around a frame: speeds and distances of the frames t-1 and t+1
+halo = 1
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Get away" )
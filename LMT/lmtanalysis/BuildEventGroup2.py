@@ -15,6 +15,13 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.ContactGroups import getContactGroups
+import itertools
+
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Group2" ]
+# frames of context needed around a frame: Contact events of the frame only
+halo = 0
 
 def flush( connection ):
     ''' flush event in database '''
@@ -22,67 +29,26 @@ def flush( connection ):
 
 
 def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalType = None  ):
- 
+    '''
+    two animals in contact, and not in contact with any other animal (see ContactGroups.py)
+    '''
 
     pool = AnimalPool( )
     pool.loadAnimals( connection )
     #pool.loadDetection( start = tmin, end = tmax )
-    
-    
-    contact = {}
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if ( animal == idAnimalB ):
-                continue
-            contact[animal, idAnimalB] = EventTimeLineCached( connection, file, "Contact", animal, idAnimalB, minFrame=tmin, maxFrame=tmax ) #fait une matrice de tous les contacts à deux possibles
 
-    for animal in range( 1 , 5 ):
-        
-        for idAnimalB in range( 1 , 5 ):
-            if( animal == idAnimalB ):
-                continue
-            
-            for idAnimalC in range( 1 , 5 ):
-                if( animal == idAnimalC ):
-                    continue
-                if( idAnimalB == idAnimalC ):
-                    continue
-                
-                for idAnimalD in range( 1 , 5 ):
-                    if( animal == idAnimalD ):
-                        continue
-                    if( idAnimalB == idAnimalD ):
-                        continue
-                    if( idAnimalC == idAnimalD ):
-                        continue
-                
-                    eventName = "Group2"        
-                    print ( eventName )
-                    
-                    groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , None , None , loadEvent=False )
-                    
-                    result={}
-                    
-                    dicAB = contact[ animal , idAnimalB ].getDictionary()
-                    dicAC = contact[ animal , idAnimalC ].getDictionary()
-                    dicAD = contact[ animal , idAnimalD ].getDictionary()
-                    dicBC = contact[ idAnimalB , idAnimalC ].getDictionary()
-                    dicBD = contact[ idAnimalB , idAnimalD ].getDictionary()
-                    
-                    
-                    for t in dicAB.keys():
-                        if ( t in dicAC or t in dicAD or t in dicBC or t in dicBD ):
-                            continue
-                        
-                        else:
-                            result[t]=True
-                    
-                    
-            groupTimeLine.reBuildWithDictionary(result )
-            
-            groupTimeLine.endRebuildEventTimeLine(connection)
-    
-        
+    animalIdList = sorted( pool.animalDictionary.keys() )
+    groups = getContactGroups( connection, file, animalIdList, tmin, tmax )
+
+    for animal, idAnimalB in itertools.permutations( animalIdList, 2 ):
+
+        eventName = "Group2"
+        print ( eventName )
+
+        groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , None , None , loadEvent=False )
+        groupTimeLine.reBuildWithIntervals( *groups.getGroupIntervals( [ animal, idAnimalB ] ) )
+        groupTimeLine.endRebuildEventTimeLine(connection)
+
     # log process
     
     t = TaskLogger( connection )
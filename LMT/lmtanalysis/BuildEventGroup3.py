@@ -15,6 +15,13 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.ContactGroups import getContactGroups
+import itertools
+
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Group3" ]
+# frames of context needed around a frame: Contact events of the frame only
+halo = 0
 
 def flush( connection ):
     ''' flush event in database '''
@@ -31,66 +38,18 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
         print( "Not enough animals to process group 3")
         return
 
-    contact = {}
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if ( animal == idAnimalB ):
-                continue
-            contact[animal, idAnimalB] = EventTimeLineCached( connection, file, "Contact", animal, idAnimalB, minFrame=tmin, maxFrame=tmax )
+    animalIdList = sorted( pool.animalDictionary.keys() )
+    groups = getContactGroups( connection, file, animalIdList, tmin, tmax )
+
+    for animal, idAnimalB, idAnimalC in itertools.permutations( animalIdList, 3 ):
+
+        eventName = "Group3"
+        print ( eventName )
+
+        groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , idAnimalC , None , loadEvent=False )
+        groupTimeLine.reBuildWithIntervals( *groups.getGroupIntervals( [ animal, idAnimalB, idAnimalC ] ) )
+        groupTimeLine.endRebuildEventTimeLine(connection)
 
-    for animal in range( 1 , 5 ):
-        
-        for idAnimalB in range( 1 , 5 ):
-            if( animal == idAnimalB ):
-                continue
-            
-            for idAnimalC in range( 1 , 5 ):
-                if( animal == idAnimalC ):
-                    continue
-                if( idAnimalB == idAnimalC ):
-                    continue
-                
-                for idAnimalD in range( 1 , 5 ):
-                    if( animal == idAnimalD ):
-                        continue
-                    if( idAnimalB == idAnimalD ):
-                        continue
-                    if( idAnimalC == idAnimalD ):
-                        continue
-                
-                    eventName = "Group3"        
-                    print ( eventName )
-                    
-                    groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , idAnimalC , None , loadEvent=False )
-                    
-                    result={}
-                    
-                    dicAB = contact[ animal , idAnimalB ].getDictionary()
-                    dicAC = contact[ animal , idAnimalC ].getDictionary()
-                    dicAD = contact[ animal , idAnimalD ].getDictionary()
-                    dicBC = contact[ idAnimalB , idAnimalC ].getDictionary()
-                    dicBD = contact[ idAnimalB , idAnimalD ].getDictionary()
-                    dicCD = contact[ idAnimalC , idAnimalD ].getDictionary()
-                    
-                    for t in dicAB.keys():
-                        if ( t in dicAC or t in dicBC ):
-                            if ( t in dicAD or t in dicBD or t in dicCD ):
-                                continue
-                            else:
-                                result[t]=True
-                    
-                    for t in dicAC.keys():   
-                        if ( t in dicBC ):
-                            if ( t in dicAD or t in dicBD or t in dicCD ):
-                                continue
-                            else:
-                                result[t]=True
-                    
-                groupTimeLine.reBuildWithDictionary( result )
-                
-                groupTimeLine.endRebuildEventTimeLine(connection)
-                    
-        
     # log process
     
     t = TaskLogger( connection )
@@ -15,6 +15,12 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.ContactGroups import getContactGroups
+
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Group 3 make", "Group 3 break" ]
+# frames of context needed around a frame: Contact events of the frames before and after the group
+halo = 1
 
 def flush( connection ):
     ''' flush event in database '''
@@ -30,70 +36,26 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
     #pool.loadDetection( start = tmin, end = tmax )
     
     
-    ''' load contact matrix '''
-    contact = {}
-    group3In = {}
-    group3Out = {}
-    
-    for animal in range( 1 , 5 ):
-        contact[animal] = EventTimeLineCached( connection, file, "Contact", animal, minFrame=tmin, maxFrame=tmax )
-        group3In[animal] = EventTimeLine( connection, "Group 3 make", animal, loadEvent=False )
-        group3Out[animal] = EventTimeLine( connection, "Group 3 break", animal, loadEvent=False )
-        
-
-    ''' process group '''
-    
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            for idAnimalC in range( 1 , 5 ):
-
-                ''' check impossible combination (avoid 2 animals with same id) '''
-                test = {}
-                test[animal] = True
-                test[idAnimalB] = True
-                test[idAnimalC] = True
-                
-                if not len ( test.keys() ) == 3:
-                    continue                
-
-                ''' process group '''
+    animalIdList = sorted( pool.animalDictionary.keys() )
+    groups = getContactGroups( connection, file, animalIdList, tmin, tmax )
 
-                group3 = EventTimeLineCached( connection, file, "Group3", animal, idAnimalB, idAnimalC, minFrame=tmin, maxFrame=tmax )
-                
-                eventList = group3.getEventList()
-                
-                for event in eventList:
-                    
-                    t = event.startFrame-1
+    ''' make and break of the groups of 3 animals '''
+    makeBreakDic = groups.getMakeBreakIntervals( 3 )
 
-                    if ( not contact[animal].hasEvent( t ) ):                        
-                        group3In[animal].addPunctualEvent( t )
-
-                    if ( not contact[idAnimalB].hasEvent( t ) ):                        
-                        group3In[idAnimalB].addPunctualEvent( t )
-
-                    if ( not contact[idAnimalC].hasEvent( t ) ):                        
-                        group3In[idAnimalC].addPunctualEvent( t )
-                        
-                    t = event.endFrame+1
+    ''' save all '''
+    for idAnimal in animalIdList:
 
-                    if ( not contact[animal].hasEvent( t ) ):                        
-                        group3Out[animal].addPunctualEvent( t )
+        makeIntervals, breakIntervals = makeBreakDic[idAnimal]
 
-                    if ( not contact[idAnimalB].hasEvent( t ) ):                        
-                        group3Out[idAnimalB].addPunctualEvent( t )
+        group3In = EventTimeLine( connection, "Group 3 make", idAnimal, loadEvent=False )
+        group3In.reBuildWithIntervals( *makeIntervals )
+        group3In.endRebuildEventTimeLine(connection)
 
-                    if ( not contact[idAnimalC].hasEvent( t ) ):                        
-                        group3Out[idAnimalC].addPunctualEvent( t )
+        group3Out = EventTimeLine( connection, "Group 3 break", idAnimal, loadEvent=False )
+        group3Out.reBuildWithIntervals( *breakIntervals )
+        group3Out.endRebuildEventTimeLine(connection)
 
-                
-    ''' save all '''
-    for idAnimal in range( 1 , 5 ):
-        
-        group3In[idAnimal].endRebuildEventTimeLine(connection)
-        group3Out[idAnimal].endRebuildEventTimeLine(connection)
 
-        
     # log process
     
     t = TaskLogger( connection )
@@ -15,6 +15,13 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.ContactGroups import getContactGroups
+import itertools
+
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Group4" ]
+# frames of context needed around a frame: Contact events of the frame only
+halo = 0
 
 def flush( connection ):
     ''' flush event in database '''
@@ -31,62 +38,20 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
     #pool.loadDetection( start = tmin, end = tmax )
     
     
-    contact = {}
-    group2 = {}
-    for animal in range( 1 , 5 ):    
-        contact[animal] = EventTimeLineCached( connection, file, "Contact", animal, minFrame=tmin, maxFrame=tmax ) #fait une matrice de tous les contacts à deux possibles
-        group2[animal] = EventTimeLineCached(connection, file, "Group2", animal, minFrame=tmin, maxFrame=tmax )
-        
-    for animal in range( 1 , 5 ):
-        
-        for idAnimalB in range( 1 , 5 ):
-            if( animal == idAnimalB ):
-                continue
-            
-            for idAnimalC in range( 1 , 5 ):
-                if( animal == idAnimalC ):
-                    continue
-                if( idAnimalB == idAnimalC ):
-                    continue
-                
-                for idAnimalD in range( 1 , 5 ):
-                    if( animal == idAnimalD ):
-                        continue
-                    if( idAnimalB == idAnimalD ):
-                        continue
-                    if( idAnimalC == idAnimalD ):
-                        continue
-                
-                    eventName = "Group4"        
-                    print ( eventName )
-                    
-                    groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , idAnimalC , idAnimalD , loadEvent=False )
-                    
-                    result={}
-                    
-                    dicA = contact[ animal ].getDictionary()
-                    dicB = contact[ idAnimalB ].getDictionary()
-                    dicC = contact[ idAnimalC ].getDictionary()
-                    dicD = contact[ idAnimalD ].getDictionary()
-                    
-                    dicGroup2A = group2[ animal ].getDictionary()
-                    dicGroup2B = group2[ idAnimalB ].getDictionary()
-                    dicGroup2C = group2[ idAnimalC ].getDictionary()
-                    dicGroup2D = group2[ idAnimalD ].getDictionary()
-                    
-                    for t in dicA.keys():
-                        if ( t in dicB and t in dicC and t in dicD ):
-                            if ( t in dicGroup2A or t in dicGroup2B or t in dicGroup2C or t in dicGroup2D):
-                                continue
-                            else:
-                                result[t]=True
-                    
-                    
-    groupTimeLine.reBuildWithDictionary (result )
-    
-    groupTimeLine.endRebuildEventTimeLine(connection)
-          
-        
+    animalIdList = sorted( pool.animalDictionary.keys() )
+    groups = getContactGroups( connection, file, animalIdList, tmin, tmax )
+
+    for idList in itertools.combinations( animalIdList, 4 ):
+
+        eventName = "Group4"
+        print ( eventName )
+
+        # one timeline per group, with the ids in decreasing order
+        animal, idAnimalB, idAnimalC, idAnimalD = sorted( idList, reverse = True )
+        groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , idAnimalC , idAnimalD , loadEvent=False )
+        groupTimeLine.reBuildWithIntervals( *groups.getGroupIntervals( idList ) )
+        groupTimeLine.endRebuildEventTimeLine(connection)
+
     # log process
     
     t = TaskLogger( connection )
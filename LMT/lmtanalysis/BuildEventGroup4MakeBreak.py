@@ -15,6 +15,12 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.ContactGroups import getContactGroups
+
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Group 4 make", "Group 4 break" ]
+# frames of context needed around a frame: Contact events of the frames before and after the group
+halo = 1
 
 def flush( connection ):
     ''' flush event in database '''
@@ -30,78 +36,26 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
     #pool.loadDetection( start = tmin, end = tmax )
     
     
-    ''' load contact matrix '''
-    contact = {}
-    group4In = {}
-    group4Out = {}
-    
-    for animal in range( 1 , 5 ):
-        contact[animal] = EventTimeLineCached( connection, file, "Contact", animal, minFrame=tmin, maxFrame=tmax )
-        group4In[animal] = EventTimeLine( connection, "Group 4 make", animal, loadEvent=False )
-        group4Out[animal] = EventTimeLine( connection, "Group 4 break", animal, loadEvent=False )
-        
+    animalIdList = sorted( pool.animalDictionary.keys() )
+    groups = getContactGroups( connection, file, animalIdList, tmin, tmax )
 
-    ''' process group '''
-    
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            for idAnimalC in range( 1 , 5 ):
-                for idAnimalD in range( 1 , 5 ):
+    ''' make and break of the groups of 4 animals '''
+    makeBreakDic = groups.getMakeBreakIntervals( 4 )
 
-                    ''' check impossible combination (avoid 2 animals with same id) '''
-                    
-                    test = {}
-                    test[animal] = True
-                    test[idAnimalB] = True
-                    test[idAnimalC] = True
-                    test[idAnimalD] = True
-                    if not len ( test.keys() ) == 4:
-                        continue 
-                    
-                    ''' process group '''
+    ''' save all '''
+    for idAnimal in animalIdList:
 
-                    group4 = EventTimeLineCached( connection, file, "Group4", animal, idAnimalB, idAnimalC, minFrame=tmin, maxFrame=tmax )
-                    
-                    eventList = group4.getEventList()
-                    
-                    for event in eventList:
-                        
-                        t = event.startFrame-1
-    
-                        if ( not contact[animal].hasEvent( t ) ):                        
-                            group4In[animal].addPunctualEvent( t )
-    
-                        if ( not contact[idAnimalB].hasEvent( t ) ):                        
-                            group4In[idAnimalB].addPunctualEvent( t )
-    
-                        if ( not contact[idAnimalC].hasEvent( t ) ):                        
-                            group4In[idAnimalC].addPunctualEvent( t )
+        makeIntervals, breakIntervals = makeBreakDic[idAnimal]
 
-                        if ( not contact[idAnimalD].hasEvent( t ) ):                        
-                            group4In[idAnimalD].addPunctualEvent( t )
-                            
-                        t = event.endFrame+1
-    
-                        if ( not contact[animal].hasEvent( t ) ):                        
-                            group4Out[animal].addPunctualEvent( t )
-    
-                        if ( not contact[idAnimalB].hasEvent( t ) ):                        
-                            group4Out[idAnimalB].addPunctualEvent( t )
-    
-                        if ( not contact[idAnimalC].hasEvent( t ) ):                        
-                            group4Out[idAnimalC].addPunctualEvent( t )
+        group4In = EventTimeLine( connection, "Group 4 make", idAnimal, loadEvent=False )
+        group4In.reBuildWithIntervals( *makeIntervals )
+        group4In.endRebuildEventTimeLine(connection)
 
-                        if ( not contact[idAnimalD].hasEvent( t ) ):                        
-                            group4Out[idAnimalD].addPunctualEvent( t )
+        group4Out = EventTimeLine( connection, "Group 4 break", idAnimal, loadEvent=False )
+        group4Out.reBuildWithIntervals( *breakIntervals )
+        group4Out.endRebuildEventTimeLine(connection)
 
-                
-    ''' save all '''
-    for idAnimal in range( 1 , 5 ):
-        
-        group4In[idAnimal].endRebuildEventTimeLine(connection)
-        group4Out[idAnimal].endRebuildEventTimeLine(connection)
 
-        
     # log process
     
     t = TaskLogger( connection )
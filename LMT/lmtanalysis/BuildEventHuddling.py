@@ -38,13 +38,11 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None , animalTy
 
         result = {}
         
-        for t in range( tmin, tmax+1 ):
+        # masks of the whole window read in one query
+        for t, mask in animal.iterBinaryDetectionMasks( tmin, tmax ):
             if t%10000 == 0:
                 print ( "current t", t )
                             
-            mask = animal.getBinaryDetectionMask( t )
-            if mask == None:
-                continue
             roundness = mask.getRoundness()
             if roundness == None:
                 continue
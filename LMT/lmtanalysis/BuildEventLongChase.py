@@ -6,13 +6,25 @@ Created on 13 nov. 2024
 from lmtanalysis.Event import deleteEventTimeLineInBase, EventTimeLine
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.Animal import AnimalPool
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
 
 
+consumedEvents = [ "Train2", "Contact", "FollowZone", "Break contact", "Escape contact" ]
+producedEvents = [ "longChase" ]
+# frames of context needed around a frame: prolongation of the trains, merge of close trains and dilation of contacts
+halo = 300 + 30 * 5 + 10
+
 def flush( connection ):
     ''' flush event in database '''
     print("Flushing longChase" )
     deleteEventTimeLineInBase(connection, "longChase" )
     
+def copyTimeLine( timeLine ):
+    ''' copy of a timeline of the cache, that can be dilated or cleaned '''
+    copy = EventTimeLine( None, timeLine.eventName, idA=timeLine.idA, idB=timeLine.idB, loadEvent=False )
+    copy.reBuildWithIntervals( *timeLine.getIntervals() )
+    return copy
+
 def prolongateTimeLine(timeLine, timeLineDic):
     for event in timeLine.eventList:
 
@@ -49,20 +61,23 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
     eventTimeLineBreak = {}
     eventTimeLineEscapeContact = {}
 
+    # all the timelines of the pairs with one query per event name. They are shared with the cache: they are copied before being modified
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( name, animalA, animalB ) for name in consumedEvents for animalA in pool.animalDictionary for animalB in pool.animalDictionary if animalA != animalB ], minFrame=tmin, maxFrame=tmax )
+
     for animalA in pool.animalDictionary.keys():
         for animalB in pool.animalDictionary.keys():
             if animalB == animalA:
                 print('idA is idB')
                 continue
             else:
-                eventTimeLineTrain2[(animalA, animalB)] = EventTimeLine(connection, "Train2", idA=animalA, idB=animalB, minFrame=tmin, maxFrame=tmax)
-                eventTimeLineContact[(animalA, animalB)] = EventTimeLine(connection, "Contact", idA=animalA, idB=animalB, minFrame=tmin, maxFrame=tmax)
-                eventTimeLineFollow[(animalA, animalB)] = EventTimeLine(connection, "FollowZone", idA=animalA, idB=animalB,  minFrame=tmin, maxFrame=tmax)
-                eventTimeLineBreak[(animalA, animalB)] = EventTimeLine(connection, "Break contact", idA=animalA, idB=animalB, minFrame=tmin, maxFrame=tmax)
-                eventTimeLineEscapeContact[(animalA, animalB)] = EventTimeLine(connection, "Escape contact", idA=animalA,idB=animalB, minFrame=tmin, maxFrame=tmax)
-                eventTimeLineFollow[(animalB, animalA)] = EventTimeLine(connection, "FollowZone", idA=animalB, idB=animalA, minFrame=tmin,maxFrame=tmax)
-                eventTimeLineBreak[(animalB, animalA)] = EventTimeLine(connection, "Break contact", idA=animalB,idB=animalA, minFrame=tmin, maxFrame=tmax)
-                eventTimeLineEscapeContact[(animalB, animalA)] = EventTimeLine(connection, "Escape contact", idA=animalB,idB=animalA, minFrame=tmin, maxFrame=tmax)
+                eventTimeLineTrain2[(animalA, animalB)] = copyTimeLine( timeLineDic["Train2", animalA, animalB] )
+                eventTimeLineContact[(animalA, animalB)] = copyTimeLine( timeLineDic["Contact", animalA, animalB] )
+                eventTimeLineFollow[(animalA, animalB)] = copyTimeLine( timeLineDic["FollowZone", animalA, animalB] )
+                eventTimeLineBreak[(animalA, animalB)] = copyTimeLine( timeLineDic["Break contact", animalA, animalB] )
+                eventTimeLineEscapeContact[(animalA, animalB)] = copyTimeLine( timeLineDic["Escape contact", animalA, animalB] )
+                eventTimeLineFollow[(animalB, animalA)] = copyTimeLine( timeLineDic["FollowZone", animalB, animalA] )
+                eventTimeLineBreak[(animalB, animalA)] = copyTimeLine( timeLineDic["Break contact", animalB, animalA] )
+                eventTimeLineEscapeContact[(animalB, animalA)] = copyTimeLine( timeLineDic["Escape contact", animalB, animalA] )
                 
                 eventTimeLineContact[(animalA, animalB)].dilateEvents(10)
                 eventTimeLineFollow[(animalA, animalB)].dilateEvents(5)
@@ -16,6 +16,11 @@ from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Stop", "Detection", "Contact" ]
+producedEvents = [ "Move", "Move isolated", "Move in contact" ]
+# frames of context needed around a frame: Stop, Detection and Contact events of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Move" )
@@ -18,6 +18,11 @@ from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
 
+consumedEvents = []
+producedEvents = [ "Move high speed" ]
+# frames of context needed around a frame: speed between the frames t and t+1
+halo = 1
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Move high speed" )
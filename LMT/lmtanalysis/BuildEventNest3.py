@@ -15,10 +15,15 @@ import numpy as np
 from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
-import networkx as nx
+from lmtanalysis.NestDetection import NestDetector
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Contact", "Stop" ]
+producedEvents = [ "Nest3_" ]
+# frames of context needed around a frame: length filter (2 frames) and merge (3 frames)
+halo = 2 + 3
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Nest3_" )
@@ -41,120 +46,22 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
         print( "[NEST3 Cancelled] 4 animals are required to build nest3.")
         return
     
-    contact = {}
-        
-    for idAnimalA in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if idAnimalA != idAnimalB:    
-                contact[idAnimalA, idAnimalB] = EventTimeLineCached( connection, file, "Contact", idAnimalA, idAnimalB, minFrame=tmin, maxFrame=tmax ).getDictionary()
+    pool.loadAnonymousDetection( start = tmin, end = tmax, columnar = True )
+
+    # contacts, stops and anonymous detections as bit arrays (see NestDetection.py)
+    nest = NestDetector( connection, file, pool, tmin, tmax, parameters )
 
-    stopDictionary = {}
-        
-    for idAnimalA in range( 1 , 5 ):
-        stopDictionary[idAnimalA] = EventTimeLineCached( 
-            connection, file, "Stop", idA=idAnimalA, minFrame=tmin, maxFrame=tmax ).getDictionary()
-    
-    nest3TimeLine = {}
-    
-    for idAnimalA in range( 1 , 5 ):
-        # the id will be the one excluded from nest.
-        nest3TimeLine[idAnimalA] = EventTimeLine( None, "Nest3_" , idA = idAnimalA , loadEvent=False )
-    
-    pool.loadAnonymousDetection()
-    
-    animalList = pool.getAnimalList() 
-    
-    result = {}
-    for idAnimalA in range( 1 , 5 ):
-        result[idAnimalA] = {}
-    
-    for t in range( tmin, tmax+1 ):
-                
-        isNest = False
-        
-        nbAnimalAtT = 0
-        animalDetectedList = []
-        
-        anonymousDetectionList = pool.getAnonymousDetection( t )
-        
-        for animal in animalList:
-            if t in animal.detectionDictionary:
-                nbAnimalAtT+=1
-                animalDetectedList.append( animal )
-        
-        #print( str(t) + " : " + str( nbAnimalAtT ) )
-                    
-    
-        #print("TEST")
-        graph = nx.Graph()
-        # add nodes
-        for animal in animalDetectedList:
-            graph.add_node( animal )
-        for animalA in animalDetectedList:
-            for animalB in animalDetectedList:
-                if animalA != animalB:
-                    # add an edge
-                    if t in contact[animalA.baseId,animalB.baseId]:
-                        graph.add_edge( animalA, animalB )
-        
-        # check with anonymous detection. Check contact
-        if anonymousDetectionList!= None:
-            # manage anonymous
-            # print( t , "manage anonymous")
-            '''
-            # load all masks
-            for animal in animalDetectedList:
-                animal.loadMask( t )
-            '''
-            
-            for detectionA in anonymousDetectionList: # anonymous with anonymous
-                for detectionB in anonymousDetectionList: # anonymous with anonymous
-                    if detectionA != detectionB:
-                        distance = detectionA.getDistanceTo( detectionB, parameters )
-                        if distance != None:
-                            if distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
-                                graph.add_edge( detectionA, detectionB )
-                                # print("Adding edge with mask (det anonymous to det anonymous)")
-                    
-            for detection in anonymousDetectionList:
-                for animal in animalDetectedList:
-                    distance = detection.getDistanceTo(animal.getDetectionAt( t ), parameters )
-                    if distance != None:
-                        if distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
-                            #if detection.getMask().isInContactWithMask( animal.getDetectionAt ( t ).getMask() ):
-                            graph.add_edge( animal, detection )
-                            # print("Adding edge with mask")
-        
-        # list of CC from the biggest to the smallest
-        listCC = sorted(nx.connected_components( graph ), key=len, reverse=True)
-        
-        if ( len( listCC ) == 2 ): # we have 2 groups
-            
-            # check if animals in the biggest group are stopped.
-            allStoppedInBiggestGroup = True
-            for animal in list( listCC[0] ):
-                if isinstance( animal , Animal ):
-                    if not ( t in stopDictionary[animal.baseId] ):
-                        allStoppedInBiggestGroup = False
-                        break
-                
-            if allStoppedInBiggestGroup:
-                if ( len( listCC[1] ) == 1 ): # the 2nd group (and the smallest) has only one mouse
-                    animal = list(listCC[1])[0]
-                    if isinstance( animal , Animal ):                
-                        result[ animal.baseId ][ t ] = True
-                 
-            
     for idAnimalA in range( 1 , 5 ):
-            
+
         # the id will be the one excluded from nest.
-        nest3TimeLine[idAnimalA].reBuildWithDictionary( result[idAnimalA] )
+        nest3TimeLine = EventTimeLine( None, "Nest3_" , idA = idAnimalA , loadEvent=False )
+        nest3TimeLine.reBuildWithIntervals( *nest.getNest3Intervals( idAnimalA ) )
         # remove very small events
-        nest3TimeLine[idAnimalA].removeEventsBelowLength( 2 )
+        nest3TimeLine.removeEventsBelowLength( 2 )
         # merge flashing events
-        nest3TimeLine[idAnimalA].mergeCloseEvents( 3 )
-        nest3TimeLine[idAnimalA].endRebuildEventTimeLine(connection)
-        
+        nest3TimeLine.mergeCloseEvents( 3 )
+        nest3TimeLine.endRebuildEventTimeLine(connection)
+
     # log process
     
     t = TaskLogger( connection )
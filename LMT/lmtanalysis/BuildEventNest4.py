@@ -14,10 +14,15 @@ import numpy as np
 from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
-import networkx as nx
+from lmtanalysis.NestDetection import NestDetector
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Contact", "Stop" ]
+producedEvents = [ "Nest4_" ]
+# frames of context needed around a frame: length filter (2 frames) and merge (3 frames)
+halo = 2 + 3
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Nest4_" )
@@ -60,248 +65,19 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None , animalT
         print( "[NEST4 Cancelled] 4 animals are required to build nest 4.")
         return
     
-    contact = {}
-    
-    
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if animal != idAnimalB:    
-                contact[animal,idAnimalB] = EventTimeLineCached( connection, file, "Contact", animal, idAnimalB, minFrame=tmin, maxFrame=tmax ).getDictionary() #fait une matrice de tous les contacts à deux possibles
-    
-    stopDictionary = {}
-        
-    for animal in range( 1 , 5 ):
-        stopDictionary[animal] = EventTimeLineCached( connection, file, "Stop", animal, minFrame=tmin, maxFrame=tmax ).getDictionary()
-    
-    
-    
-    '''
-    nest3TimeLine = {}
-    
-    for animal in range( 1 , 5 ):
-        nest3TimeLine = EventTimeLine( None, "Nest3" , animal, loadEvent=False )
-    '''
-    nest4TimeLine = EventTimeLine( None, "Nest4_" , loadEvent=False )
-    
-    pool.loadAnonymousDetection()
-    
-    '''
-    group2TimeLine = {}
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if ( animal != idAnimalB ):
-                group2TimeLine[animal,idAnimalB] = EventTimeLine( None, "Group2" , animal , idAnimalB , loadEvent=False )
-
-    group3TimeLine = {}
-    for animal in range( 1 , 5 ):
-        for idAnimalB in range( 1 , 5 ):
-            if( animal != idAnimalB ):
-                for idAnimalC in range( 1 , 5 ):
-                    if ( animal != idAnimalC and idAnimalB != idAnimalC ):
-                        group3TimeLine[animal,idAnimalB] = EventTimeLine( None, "Group3" , animal , idAnimalB , idAnimalC, loadEvent=False )
-    
-    group4TimeLine = EventTimeLine( None, "Group4" , loadEvent=False )
-    '''
-        
-    
-    animalList = pool.getAnimalList() 
-    
-    result = {}
-    
-    for t in range( tmin, tmax+1 ):
-        
-        
-        isNest = False
-        
-        nbAnimalAtT = 0
-        animalDetectedList = []
-        
-        
-        anonymousDetectionList = pool.getAnonymousDetection( t )
-        
-        for animal in animalList:
-            if t in animal.detectionDictionary:                
-                animalDetectedList.append( animal )
-        
-        #print( str(t) + " : " + str( nbAnimalAtT ) )
-                    
-    
-        #print("TEST")
-        graph = nx.Graph()
-        # add nodes
-        
-        for animal in animalDetectedList:
-            graph.add_node( animal )
-            nbAnimalAtT+=1
-            
-        for animalA in animalDetectedList:
-            for animalB in animalDetectedList:
-                if animalA != animalB:
-                    # add an edge
-                    if t in contact[animalA.baseId,animalB.baseId]:
-                        graph.add_edge( animalA, animalB )
-        
-        # check with anonymous detection. Check contact
-        if anonymousDetectionList!= None:
-            
-            nbAnimalAtT+=len(anonymousDetectionList)
-            
-            # manage anonymous
-            #print( t , "manage anonymous")
-            '''
-            # load all masks
-            for animal in animalDetectedList:
-                animal.loadMask( t )
-            '''
-            
-            for detectionA in anonymousDetectionList: # anonymous with anonymous
-                for detectionB in anonymousDetectionList: # anonymous with anonymous
-                    if detectionA != detectionB:
-                        distance = detectionA.getDistanceTo( detectionB, parameters )
-                        if distance != None:
-                            if distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
-                                graph.add_edge( detectionA, detectionB )
-                                #print("Adding edge with mask (det anonymous to det anonymous)")
-                    
-            for detection in anonymousDetectionList:
-                for animal in animalDetectedList:
-                    distance = detection.getDistanceTo(animal.getDetectionAt( t ) , parameters )
-                    if distance != None:
-                        if distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
-                            #if detection.getMask().isInContactWithMask( animal.getDetectionAt ( t ).getMask() ):
-                            graph.add_edge( animal, detection )
-                            #print("Adding edge with mask")
-        
-        # list of CC from the biggest to the smallest
-        #listCC = sorted(nx.connected_components( graph ), key=len, reverse=True)
-        
-        if nbAnimalAtT == 0:            
-            isNest = True
-        
-        # list of CC from the biggest to the smallest
-        listCC = sorted(nx.connected_components( graph ), key=len, reverse=True)
-        
-        #largestCC = len ( max(nx.connected_components( graph ), key=len) )
+    pool.loadAnonymousDetection( start = tmin, end = tmax, columnar = True )
 
-        '''
-        for animal in animalList:
-            if t in animal.detectionDictionary:
-                nbAnimalAtT+=1
-                animalDetectedList.append( animal )
-        
-        #print( str(t) + " : " + str( nbAnimalAtT ) )
-        
-        if nbAnimalAtT == 0:            
-            isNest = True
-            
-        if not isNest:
-            #print("TEST")
-            graph = nx.Graph();
-            # add nodes
-            for animal in animalDetectedList:
-                graph.add_node( animal )
-            for animalA in animalDetectedList:
-                for animalB in animalDetectedList:
-                    if animalA != animalB:
-                        # add an edge
-                        if t in contact[animalA.baseId,animalB.baseId]:
-                            graph.add_edge( animalA, animalB )
-            
-            
-            
-            
-            # check connected components. If the biggest group gets all animal, we got a nest4
-            largestCC = len ( max(nx.connected_components( graph ), key=len) )
-            
-            #print( str( t ) + " : " + str ( len( largestCC ) ) )
-            
-            #print( str( t ) + " : " + str ( largestCC ) + " / " + str( nbAnimalAtT ) )
-        '''    
-        if len ( listCC ) == 0 :
-            continue
-        
-        #print( t , len ( listCC[0] ) , nbAnimalAtT )
-        
-        if len ( listCC[0] ) == nbAnimalAtT:
-        
-        #if largestCC == nbAnimalAtT :
-            
-            # check if animals in the nest are stopped.
-            allStoppedInBiggestGroup = True
-            for animal in animalDetectedList:
-                if isinstance( animal , Animal ):
-                    if not ( t in stopDictionary[animal.baseId] ):
-                        allStoppedInBiggestGroup = False
-                        break
+    # contacts, stops and anonymous detections as bit arrays (see NestDetection.py)
+    nest = NestDetector( connection, file, pool, tmin, tmax, parameters )
 
-            if allStoppedInBiggestGroup:
-                isNest= True                     
-                     
-        if isNest == True:
-            #print( "ADD PUNCTUAL")
-            result[t] = True;
-            
-            
-            
-    nest4TimeLine.reBuildWithDictionary( result )
+    nest4TimeLine = EventTimeLine( None, "Nest4_" , loadEvent=False )
+    nest4TimeLine.reBuildWithIntervals( *nest.getNest4Intervals() )
     # remove very small events
     nest4TimeLine.removeEventsBelowLength( 2 )
     # merge flashing events
     nest4TimeLine.mergeCloseEvents( 3 )
     nest4TimeLine.endRebuildEventTimeLine(connection)
-        
-    
-    '''
-    for animal in range( 1 , 5 ):
-        
-        for idAnimalB in range( 1 , 5 ):
-            if( animal == idAnimalB ):
-                continue
-            
-            for idAnimalC in range( 1 , 5 ):
-                if( animal == idAnimalC ):
-                    continue
-                if( idAnimalB == idAnimalC ):
-                    continue
-                
-                for idAnimalD in range( 1 , 5 ):
-                    if( animal == idAnimalD ):
-                        continue
-                    if( idAnimalB == idAnimalD ):
-                        continue
-                    if( idAnimalC == idAnimalD ):
-                        continue
-                
-                    eventName = "Group4"        
-                    print ( eventName )
-                    
-                    groupTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , idAnimalC , idAnimalD , loadEvent=False )
-                    
-                    result={}
-                    
-                    dicA = contact[ animal ].getDictionary()
-                    dicB = contact[ idAnimalB ].getDictionary()
-                    dicC = contact[ idAnimalC ].getDictionary()
-                    dicD = contact[ idAnimalD ].getDictionary()
-                    
-                    dicGroup2A = group2[ animal ].getDictionary()
-                    dicGroup2B = group2[ idAnimalB ].getDictionary()
-                    dicGroup2C = group2[ idAnimalC ].getDictionary()
-                    dicGroup2D = group2[ idAnimalD ].getDictionary()
-                    
-                    for t in dicA.keys():
-                        if ( t in dicB and t in dicC and t in dicD ):
-                            if ( t in dicGroup2A or t in dicGroup2B or t in dicGroup2C or t in dicGroup2D):
-                                continue
-                            else:
-                                result[t]=True
-                    
-    groupTimeLine.reBuildWithDictionary( result )
-    
-    groupTimeLine.endRebuildEventTimeLine(connection)
-          
-    '''                
-        
+
     # log process
     
     t = TaskLogger( connection )
@@ -15,6 +15,13 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.PairGeometry import getPairGeometry
+
+consumedEvents = []
+producedEvents = [ "Oral-genital Contact" ]
+usesPairGeometry = True
+# frames of context needed around a frame: the geometry of the frame only
+halo = 0
 
 def flush( connection ):
     ''' flush event in database '''
@@ -42,6 +49,8 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
         pool.loadAnimals( connection )
         pool.loadDetection( start = tmin, end = tmax )
     
+    geometry = getPairGeometry( pool )
+    
     for animal in range( 1 , pool.getNbAnimals()+1 ):
         
         for idAnimalB in range( 1 , pool.getNbAnimals()+1 ):
@@ -53,22 +62,12 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
             eventName = "Oral-genital Contact"        
             print ( eventName )
             
-            result ={}
-            animalA = pool.animalDictionary.get( animal )
-            animalB = pool.animalDictionary.get( idAnimalB )            
-            
             OralGenitalTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , loadEvent=False )
 
-            for t in animalA.detectionDictionary.keys() :
-                
-                if ( t in animalB.detectionDictionary ):
-                    detA = animalA.detectionDictionary[t]
-                    detB = animalB.detectionDictionary[t]
-                    
-                    if distHeadBack( detA, detB ) < parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD:
-                        result[t] = True
+            # same test as distHeadBack( detA, detB ) < threshold, for all the frames at once
+            result = geometry.getDistance( "front", "back", animal, idAnimalB ) < parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD
             
-            OralGenitalTimeLine.reBuildWithDictionary( result )
+            OralGenitalTimeLine.reBuildWithIntervals( *geometry.getIntervals( result ) )
             OralGenitalTimeLine.endRebuildEventTimeLine(connection)
     
         
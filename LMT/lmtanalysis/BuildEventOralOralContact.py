@@ -15,6 +15,7 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.PairGeometry import getPairGeometry
 
 def distHeadHead( detA, detB ):
     
@@ -29,6 +30,12 @@ def distHeadHead( detA, detB ):
     return math.hypot( hx-bx, hy-by )
 
 
+consumedEvents = []
+producedEvents = [ "Oral-oral Contact" ]
+usesPairGeometry = True
+# frames of context needed around a frame: the geometry of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Oral-oral Contact" )
@@ -43,6 +50,8 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None , animalTy
         pool.loadAnimals( connection )
         pool.loadDetection( start = tmin, end = tmax )
     
+    geometry = getPairGeometry( pool )
+    
     ''' deleteEventTimeLineInBase(connection, "Oral-oral Contact" ) '''
         
     '''
@@ -68,24 +77,12 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None , animalTy
             eventName = "Oral-oral Contact"        
             print ( eventName )
             
-            result ={}
-            animalA = pool.animalDictionary.get( animal )
-            animalB = pool.animalDictionary.get( idAnimalB )            
-            
             OralOralTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , loadEvent=False )
 
-            for t in animalA.detectionDictionary.keys() :
-                
-                if ( t in animalB.detectionDictionary ):
-                    detA = animalA.detectionDictionary[t]
-                    detB = animalB.detectionDictionary[t]
-                            
-                  
-                                     
-                    if distHeadHead( detA, detB ) < parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD:
-                        result[t] = True
+            # same test as distHeadHead( detA, detB ) < threshold, for all the frames at once
+            result = geometry.getDistance( "front", "front", animal, idAnimalB ) < parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD
             
-            OralOralTimeLine.reBuildWithDictionary( result )
+            OralOralTimeLine.reBuildWithIntervals( *geometry.getIntervals( result ) )
             OralOralTimeLine.endRebuildEventTimeLine(connection)
             
         
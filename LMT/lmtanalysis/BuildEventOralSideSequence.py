@@ -18,6 +18,13 @@ import matplotlib.lines as mlines
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Contact", "Oral-oral Contact", "Oral-genital Contact" ]
+producedEvents = [ "seq oral oral - oral genital", "seq oral geni - oral oral" ]
+# frames of context needed around a frame: window after the end of the first contact
+halo = 60
+# the mean body length of the animals is computed over the whole time window (see BuildEventScheduler.py)
+usesWindowStatistics = True
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "seq oral oral - oral genital" )
@@ -19,6 +19,11 @@ from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Contact" ]
+producedEvents = [ "Rear isolated", "Rear in contact" ]
+# frames of context needed around a frame: body slope and Contact events of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Rear isolated" )
@@ -16,6 +16,11 @@ from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Rear isolated", "Center Zone", "Periphery Zone" ]
+producedEvents = [ "Rear in centerWindow", "Rear at periphery" ]
+# frames of context needed around a frame: Rear and zone events of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Rear in centerWindow" )
@@ -0,0 +1,209 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Schedules the BuildEvent modules from the events they read and write.
+
+Each BuildEvent module declares:
+    consumedEvents = [ ... ] # names of the events loaded from the base
+    producedEvents = [ ... ] # names of the events saved in the base
+
+Events that no module produces (Contact, Stop, Approach... built by LMT during the tracking) are inputs.
+A module without declaration is handled conservatively: it depends on all the modules placed before it
+in the list, and all the modules placed after it depend on it.
+
+A module using the geometry shared between the contact builders (see PairGeometry.py) declares usesPairGeometry = True:
+the geometry is dropped from the pool after the last of these modules.
+
+A module can also declare halo = n: the number of frames of context it needs before and after a frame
+to compute the events of this frame (used to rebuild only the end of a file, see IncrementalRebuild.py).
+There is no default halo: the end of a file is not rebuilt alone if a module does not declare it.
+
+A module computing statistics over the whole time window declares usesWindowStatistics = True (SocialApproach,
+SocialEscape and OralSideSequence use the mean body length of the animals). A halo does not cover these statistics:
+when only the end of a file is rebuilt, they are computed over the frames rebuilt instead of the whole window.
+'''
+
+import sqlite3
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from lmtanalysis.Chronometer import Chronometer
+from lmtanalysis.Metrics import MetricSpan
+from lmtanalysis.Event import EventTransaction, getEventWriteTime, resetEventWriteTime
+from lmtanalysis.PairGeometry import releasePairGeometry
+
+def isDeclared( ev ):
+    return hasattr( ev, "consumedEvents" ) and hasattr( ev, "producedEvents" )
+
+def getDependencies( eventClassList ):
+    '''
+    returns a dictionary: module -> list of the modules of eventClassList it depends on.
+    '''
+    producerDic = {}
+    for ev in eventClassList:
+        if isDeclared( ev ):
+            for eventName in ev.producedEvents:
+                producerDic.setdefault( eventName, [] ).append( ev )
+
+    dependencies = {}
+    for index, ev in enumerate( eventClassList ):
+
+        previousList = eventClassList[:index]
+        if not isDeclared( ev ):
+            dependencies[ev] = list( previousList )
+            continue
+
+        dependencyList = [ previous for previous in previousList if not isDeclared( previous ) ]
+        for eventName in ev.consumedEvents:
+            for producer in producerDic.get( eventName, [] ):
+                if producer != ev and producer not in dependencyList:
+                    dependencyList.append( producer )
+
+        dependencies[ev] = dependencyList
+
+    return dependencies
+
+def checkOrder( eventClassList ):
+    '''
+    checks that each module is placed after the modules producing the events it consumes.
+    returns the list of ( module, dependency placed after it )
+    '''
+    dependencies = getDependencies( eventClassList )
+    problemList = []
+    for index, ev in enumerate( eventClassList ):
+        for dependency in dependencies[ev]:
+            if eventClassList.index( dependency ) > index:
+                print( "Scheduler: {} is run before {} which produces events it consumes.".format( ev.__name__, dependency.__name__ ) )
+                problemList.append( ( ev, dependency ) )
+
+    return problemList
+
+def getOrderedEventClassList( eventClassList ):
+    '''
+    topological order of the modules. The order of eventClassList is kept when there is no constraint.
+    '''
+    dependencies = getDependencies( eventClassList )
+    orderedList = []
+    remainingList = list( eventClassList )
+
+    while len( remainingList ) > 0:
+        for ev in remainingList:
+            if all( dependency in orderedList for dependency in dependencies[ev] ):
+                orderedList.append( ev )
+                remainingList.remove( ev )
+                break
+        else:
+            raise ValueError( "Scheduler: cyclic dependency between {}".format( [ ev.__name__ for ev in remainingList ] ) )
+
+    return orderedList
+
+def getLevels( eventClassList ):
+    '''
+    groups the modules in levels. Modules of the same level do not depend on each other and can be built at the same time.
+    Level n only depends on levels < n.
+    '''
+    dependencies = getDependencies( eventClassList )
+    levelDic = {}
+    for ev in getOrderedEventClassList( eventClassList ):
+        levelDic[ev] = 1 + max( [ levelDic[dependency] for dependency in dependencies[ev] ], default=-1 )
+
+    levelList = []
+    for ev in eventClassList:
+        while len( levelList ) <= levelDic[ev]:
+            levelList.append( [] )
+        levelList[ levelDic[ev] ].append( ev )
+
+    return levelList
+
+def hasHalo( ev ):
+    return hasattr( ev, "halo" )
+
+def getHalo( ev ):
+    if not hasHalo( ev ):
+        raise ValueError( "Scheduler: {} does not declare its halo".format( ev.__name__ ) )
+    return ev.halo
+
+def getCumulativeHalos( eventClassList ):
+    '''
+    returns a dictionary: module -> frames of context needed, including the context of the modules producing its inputs.
+    '''
+    dependencies = getDependencies( eventClassList )
+    haloDic = {}
+    for ev in getOrderedEventClassList( eventClassList ):
+        haloDic[ev] = getHalo( ev ) + max( [ haloDic[dependency] for dependency in dependencies[ev] ], default=0 )
+
+    return haloDic
+
+def getDownstreamEventClassList( eventClassList, changedEventNameList ):
+    '''
+    returns the modules (in topological order) to rebuild when the events of changedEventNameList have changed:
+    the modules consuming them, and recursively the modules consuming what they produce.
+    '''
+    dependencies = getDependencies( eventClassList )
+    downstreamList = []
+    for ev in getOrderedEventClassList( eventClassList ):
+
+        if not isDeclared( ev ):
+            consumesChangedEvent = True
+        else:
+            consumesChangedEvent = any( eventName in changedEventNameList for eventName in ev.consumedEvents )
+
+        if consumesChangedEvent or any( dependency in downstreamList for dependency in dependencies[ev] ):
+            downstreamList.append( ev )
+
+    return downstreamList
+
+def _reBuildEventWorker( moduleName, file, tmin, tmax, animalType ):
+    '''
+    builds one module in a separate process, with its own connection and detection load.
+    Each saved timeline is committed on its own so that workers do not keep the write lock while computing.
+    '''
+    ev = importlib.import_module( moduleName )
+    connection = sqlite3.connect( file, timeout = 600 )
+    chrono = Chronometer( moduleName )
+    try:
+        ev.reBuildEvent( connection, file, tmin=tmin, tmax=tmax, pool = None, animalType = animalType )
+    finally:
+        connection.close()
+    return moduleName, chrono.getTimeInS()
+
+def reBuildEvents( connection, file, eventClassList, tmin, tmax, pool = None, animalType = None, nbWorker = 1, builtCallback = None ):
+    '''
+    builds the modules of eventClassList in dependency order.
+    nbWorker > 1 builds the modules of a same level in parallel processes (each process loads its own detections,
+    the pool is not used).
+    builtCallback( ev ) is called after each module is built (in its transaction when the modules are built sequentially).
+    '''
+    checkOrder( eventClassList )
+
+    if nbWorker <= 1:
+
+        orderedEventClassList = getOrderedEventClassList( eventClassList )
+        for n, ev in enumerate( orderedEventClassList ):
+
+            resetEventWriteTime()
+            # one transaction per builder and window
+            with MetricSpan( ev.__name__, tmin=tmin, tmax=tmax ) as chrono, EventTransaction( connection ):
+                ev.reBuildEvent( connection, file, tmin=tmin, tmax=tmax, pool = pool, animalType = animalType )
+                if builtCallback != None:
+                    builtCallback( ev )
+            totalTime = chrono.getTimeInS()
+            writeTime = getEventWriteTime()
+            print ( "[Chrono " , str( ev ) , " ] compute: " , totalTime - writeTime , " seconds, write: " , writeTime , " seconds" )
+
+            if pool != None and not any( getattr( nextEv, "usesPairGeometry", False ) for nextEv in orderedEventClassList[n+1:] ):
+                releasePairGeometry( pool )
+
+        return
+
+    connection.commit()
+    with ProcessPoolExecutor( max_workers = nbWorker ) as executor:
+        for level in getLevels( eventClassList ):
+            print( "Scheduler: building in parallel:", [ ev.__name__ for ev in level ] )
+            futureList = [ executor.submit( _reBuildEventWorker, ev.__name__, file, tmin, tmax, animalType ) for ev in level ]
+            for ev, future in zip( level, futureList ):
+                moduleName, duration = future.result()
+                print ( "[Chrono " , moduleName , " ] " , duration , " seconds" )
+                if builtCallback != None:
+                    builtCallback( ev )
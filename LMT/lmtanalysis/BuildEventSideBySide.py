@@ -15,6 +15,13 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.PairGeometry import getPairGeometry
+
+consumedEvents = []
+producedEvents = [ "Side by side Contact" ]
+usesPairGeometry = True
+# frames of context needed around a frame: the geometry of the frame only
+halo = 0
 
 def flush( connection ):
     ''' flush event in database '''
@@ -90,6 +97,9 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
         pool.loadAnimals( connection )
         pool.loadDetection( start = tmin, end = tmax )
     
+    geometry = getPairGeometry( pool )
+    maxDistance = parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD*2
+    
     for animal in range( 1 , pool.getNbAnimals()+1 ):
         
         for idAnimalB in range( 1 , pool.getNbAnimals()+1 ):
@@ -99,24 +109,15 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
             eventName = "Side by side Contact"        
             print ( eventName )
             
-            result ={}
-            animalA = pool.animalDictionary.get( animal )
-            animalB = pool.animalDictionary.get( idAnimalB )            
-            
             SideBySideTimeLine = EventTimeLine( None, eventName , animal , idAnimalB , loadEvent=False )
 
-            for t in animalA.detectionDictionary.keys() :
-                
-                if ( t in animalB.detectionDictionary ):
-
-                    detA = animalA.detectionDictionary[t]
-                    detB = animalB.detectionDictionary[t]
-                    
-                    if ( isSideBySide( detA, detB, parameters ) == True ):
-                                                
-                        result[t] = True
+            # same tests as isSideBySide( detA, detB, parameters ), for all the frames at once
+            result = geometry.getHeadAndTailDetected( animal, idAnimalB )
+            result &= geometry.getBodyAxisProduct( animal, idAnimalB ) >= 0
+            result &= geometry.getDistance( "front", "front", animal, idAnimalB ) <= maxDistance
+            result &= geometry.getDistance( "back", "back", animal, idAnimalB ) <= maxDistance
                         
-            SideBySideTimeLine.reBuildWithDictionary( result )
+            SideBySideTimeLine.reBuildWithIntervals( *geometry.getIntervals( result ) )
             SideBySideTimeLine.endRebuildEventTimeLine(connection)
             
         
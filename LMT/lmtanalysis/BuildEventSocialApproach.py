@@ -13,9 +13,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Approach" ]
+producedEvents = [ "Social approach" ]
+# frames of context needed around a frame: distance of the frame only
+halo = 0
+# the mean body length of the animals is computed over the whole time window (see BuildEventScheduler.py)
+usesWindowStatistics = True
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Social approach" )
@@ -30,12 +37,14 @@ def reBuildEvent( connection, file, tmin=None, tmax=None, pool = None, animalTyp
         pool.loadDetection( start = tmin, end = tmax )
     
     
+    nbAnimal = pool.getNbAnimals()
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( "Approach", animal, idAnimalB ) for animal in range( 1 , nbAnimal+1 ) for idAnimalB in range( 1 , nbAnimal+1 ) if animal != idAnimalB ], minFrame=tmin, maxFrame=tmax )
     approachDico = {}
     for animal in range( 1 , pool.getNbAnimals()+1 ):
         for idAnimalB in range( 1 , pool.getNbAnimals()+1 ):
             if ( animal == idAnimalB ):
                 continue
-            approachDico[animal, idAnimalB] = EventTimeLineCached( connection, file, "Approach", animal, idAnimalB, minFrame=tmin, maxFrame=tmax ) 
+            approachDico[animal, idAnimalB] = timeLineDic[ "Approach", animal, idAnimalB ]
             
     #cache mean body len
     twoMeanBodyLen = {}
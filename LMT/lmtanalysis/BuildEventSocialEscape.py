@@ -16,6 +16,13 @@ from lmtanalysis.Measure import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Get away" ]
+producedEvents = [ "Social escape" ]
+# frames of context needed around a frame: distance of the frame only
+halo = 0
+# the mean body length of the animals is computed over the whole time window (see BuildEventScheduler.py)
+usesWindowStatistics = True
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Social escape" )
@@ -12,10 +12,15 @@ from lmtanalysis.Measure import *
 import matplotlib.pyplot as plt
 import numpy as np
 from lmtanalysis.Event import *
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
 from lmtanalysis.Parameters import getAnimalTypeParameters
 from lmtanalysis.TaskLogger import TaskLogger
 
+consumedEvents = [ "Oral-genital Contact" ]
+producedEvents = [ "Train2" ]
+# frames of context needed around a frame: speed (frames t-1 and t+1) and length filter (5 frames)
+halo = 1 + 5
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Train2" )
@@ -40,12 +45,14 @@ def reBuildEvent( connection, file, tmin=None, tmax=None , pool = None, animalTy
     
 
                 
+    nbAnimal = pool.getNbAnimals()
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( "Oral-genital Contact", animal, idAnimalB ) for animal in range( 1 , nbAnimal+1 ) for idAnimalB in range( 1 , nbAnimal+1 ) if animal != idAnimalB ], minFrame=tmin, maxFrame=tmax )
     contactHeadGenital = {}
     for animal in range( 1,pool.getNbAnimals()+1 ):
         for idAnimalB in range( 1 , pool.getNbAnimals()+1 ):
             if ( animal == idAnimalB ):
                 continue
-            contactHeadGenital[animal, idAnimalB] = EventTimeLineCached( connection, file, "Oral-genital Contact", animal, idAnimalB, minFrame=tmin, maxFrame=tmax )
+            contactHeadGenital[animal, idAnimalB] = timeLineDic[ "Oral-genital Contact", animal, idAnimalB ]
 
 
     for animal in range( 1 , pool.getNbAnimals()+1 ):
@@ -22,6 +22,11 @@ class Train2():
         self.idB = idB
 
 
+consumedEvents = [ "Train2" ]
+producedEvents = [ "Train3" ]
+# frames of context needed around a frame: Train2 events of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Train3" )
@@ -21,6 +21,11 @@ class Train2():
         self.idA = idA
         self.idB = idB
 
+consumedEvents = [ "Train2" ]
+producedEvents = [ "Train4" ]
+# frames of context needed around a frame: Train2 events of the frame only
+halo = 0
+
 def flush( connection ):
     ''' flush event in database '''
     deleteEventTimeLineInBase(connection, "Train4" )
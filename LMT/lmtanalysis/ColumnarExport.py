@@ -0,0 +1,347 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Columnar access to the detections and events of a database, for pandas, polars or Arrow.
+
+The DETECTION and EVENT tables are read with one bulk query each (fetched by chunks) into numpy arrays,
+instead of one Detection object per frame or one EventTimeLine per event name and per animal.
+AnimalPool.getDetectionTable and AnimalPool.getAllEventsTable build their DataFrames from these arrays.
+
+exportParquet( file, folder ) writes the tables of a database as a Parquet dataset partitioned by file, animal and
+day (day 0 is the first 24 hours of the experiment):
+
+    folder/detection/file=xxx.sqlite/animal=1/day=0/...parquet
+    folder/event/file=xxx.sqlite/animal=1/day=0/...parquet
+
+The detections are read and written one chunk (a day by default) at a time. The dataset can be read with
+pandas.read_parquet( folder + "/detection" ) or polars.scan_parquet. Parquet export needs pyarrow.
+'''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from lmtanalysis.Measure import oneSecond, oneDay
+from lmtanalysis.Interval import normalizeGroupedIntervals
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+''' rows fetched from sqlite at once '''
+FETCH_SIZE = 1000000
+
+
+def fetchArray( cursor, nbColumn ):
+    '''
+    rows of the executed query as a float64 array ( NULL values become nan )
+    '''
+    tableList = [ np.zeros( ( 0, nbColumn ) ) ]
+    while True:
+        rows = cursor.fetchmany( FETCH_SIZE )
+        if len( rows ) == 0:
+            break
+        tableList.append( np.array( rows, dtype=np.float64 ).reshape( -1, nbColumn ) )
+    return np.concatenate( tableList )
+
+def getFrameCondition( startColumn, endColumn, minFrame, maxFrame ):
+    query = ""
+    parameterList = []
+    if minFrame != None:
+        query += " AND {}>=?".format( endColumn )
+        parameterList.append( int( minFrame ) )
+    if maxFrame != None:
+        query += " AND {}<=?".format( startColumn )
+        parameterList.append( int( maxFrame ) )
+    return query, parameterList
+
+def getDetectionColumns( connection, minFrame = None, maxFrame = None ):
+    '''
+    detections of the identified animals, as in Animal.loadDetection ( massX < 10 discarded, one detection per
+    animal and frame ). returns a dictionary of arrays: animalId, frame, massX, massY, massZ, sorted by animal and frame.
+    '''
+    condition, parameterList = getFrameCondition( "FRAMENUMBER", "FRAMENUMBER", minFrame, maxFrame )
+    cursor = connection.cursor()
+    cursor.execute( "SELECT ANIMALID, FRAMENUMBER, MASS_X, MASS_Y, MASS_Z FROM DETECTION WHERE ANIMALID IS NOT NULL" + condition, parameterList )
+    table = fetchArray( cursor, 5 )
+    cursor.close()
+
+    table = table[ table[:, 2] >= 10 ]
+    animalId = table[:, 0].astype( np.int64 )
+    frame = table[:, 1].astype( np.int64 )
+
+    # the last detection of an animal at a frame replaces the previous ones (as in the detection dictionary)
+    order = np.lexsort( ( np.arange( len( table ) ), frame, animalId ) )
+    last = np.ones( len( order ), dtype=bool )
+    last[:-1] = ( animalId[order][1:] != animalId[order][:-1] ) | ( frame[order][1:] != frame[order][:-1] )
+    order = order[last]
+
+    return { "animalId": animalId[order], "frame": frame[order], "massX": table[order, 2], "massY": table[order, 3], "massZ": table[order, 4] }
+
+def getEventColumns( connection, animalIdList, minFrame = None, maxFrame = None, eventNameList = None ):
+    '''
+    events of each animal (as animal A), for each event name: the events of EventTimeLine( connection, eventName,
+    idA = animalId, minFrame = minFrame, maxFrame = maxFrame ), clipped to the window and with overlapping events merged.
+    returns a dictionary of arrays: eventName, animalId, startFrame, endFrame, sorted by event name, animal and start.
+    '''
+    condition, parameterList = getFrameCondition( "STARTFRAME", "ENDFRAME", minFrame, maxFrame )
+    if eventNameList != None:
+        condition += " AND NAME IN ({})".format( ",".join( "?" * len( eventNameList ) ) )
+        parameterList += [ str( eventName ) for eventName in eventNameList ]
+
+    cursor = connection.cursor()
+    cursor.execute( "SELECT DISTINCT NAME FROM EVENT WHERE IDANIMALA IS NOT NULL" + condition, parameterList )
+    nameList = sorted( row[0] for row in cursor.fetchall() )
+    nameIndex = { name: i for i, name in enumerate( nameList ) }
+
+    # names are sent as indexes, so that the rows are only numbers
+    cursor.execute( "SELECT NAME, IDANIMALA, STARTFRAME, ENDFRAME FROM EVENT WHERE IDANIMALA IS NOT NULL" + condition, parameterList )
+    tableList = [ np.zeros( ( 0, 4 ), dtype=np.int64 ) ]
+    while True:
+        rows = cursor.fetchmany( FETCH_SIZE )
+        if len( rows ) == 0:
+            break
+        tableList.append( np.array( [ ( nameIndex[row[0]], row[1], row[2], row[3] ) for row in rows ], dtype=np.int64 ) )
+    cursor.close()
+    table = np.concatenate( tableList )
+
+    table = table[ np.isin( table[:, 1], list( animalIdList ) ) ]
+    starts = table[:, 2]
+    ends = table[:, 3]
+    if minFrame != None:
+        starts = np.maximum( starts, minFrame )
+    if maxFrame != None:
+        ends = np.minimum( ends, maxFrame )
+
+    # one set of intervals per event name and animal
+    maxAnimalId = int( table[:, 1].max() ) + 1 if len( table ) > 0 else 1
+    groups, starts, ends = normalizeGroupedIntervals( table[:, 0] * maxAnimalId + table[:, 1], starts, ends )
+
+    return { "eventName": np.array( nameList, dtype=object )[ groups // maxAnimalId ], "animalId": groups % maxAnimalId, "startFrame": starts, "endFrame": ends }
+
+def getAnimalColumns( animalList, animalId ):
+    '''
+    RFID, name and genotype columns ( as in AnimalPool.getDetectionTable ) for each value of animalId
+    '''
+    animalId = np.asarray( animalId, dtype=np.int64 )
+    # index of each id in animalList, -1 (None values) for unknown ids
+    lookup = np.full( max( [ animal.baseId for animal in animalList ] + [ int( animalId.max() ) if len( animalId ) > 0 else 0 ] ) + 1, -1 )
+    for i, animal in enumerate( animalList ):
+        lookup[animal.baseId] = i
+    index = lookup[animalId]
+    columnDic = {}
+    columnDic["RFID"] = np.array( [ f"{animal.name}_{animal.RFID}" for animal in animalList ] + [ None ], dtype=object )[index]
+    columnDic["name"] = np.array( [ f"{animal.name}" for animal in animalList ] + [ None ], dtype=object )[index]
+    columnDic["genotype"] = np.array( [ f"{animal.genotype}" for animal in animalList ] + [ None ], dtype=object )[index]
+    return columnDic
+
+def getDetectionDataFrame( animalList, parameters, columns ):
+    '''
+    DataFrame of AnimalPool.getDetectionTable from detection columns ( see getDetectionColumns )
+    parameters: parameters of the animals (arena coordinates)
+    '''
+    df = pd.DataFrame( getAnimalColumns( animalList, columns["animalId"] ) )
+    df["frame"] = columns["frame"]
+    df["sec"] = columns["frame"] / oneSecond
+    df["x"] = columns["massX"]
+    df["y"] = columns["massY"]
+    df["z"] = columns["massZ"]
+
+    corner = parameters.cornerCoordinatesOpenFieldArea
+    df["x_cm"] = (df.x - corner[0][0]) / (corner[1][0] - corner[0][0]) * parameters.ARENA_SIZE
+    df["y_cm"] = (df.y - corner[1][1]) / (corner[2][1] - corner[1][1]) * parameters.ARENA_SIZE
+
+    df["in_arena_center"] = (df["x_cm"] > parameters.CENTER_MARGIN) & \
+                            (df["y_cm"] > parameters.CENTER_MARGIN) & \
+                            (df["x_cm"] < (parameters.ARENA_SIZE - parameters.CENTER_MARGIN)) & \
+                            (df["y_cm"] < (parameters.ARENA_SIZE - parameters.CENTER_MARGIN))
+
+    df.insert(3, "time", pd.to_timedelta(df.sec, unit="s"))
+
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
+
+def getEventDataFrame( animalList, columns ):
+    '''
+    DataFrame of AnimalPool.getAllEventsTable from event columns ( see getEventColumns )
+    '''
+    df = pd.DataFrame( getAnimalColumns( animalList, columns["animalId"] ) )
+    df["event_name"] = columns["eventName"]
+    df["start_sec"] = columns["startFrame"] / oneSecond
+    df["end_sec"] = columns["endFrame"] / oneSecond
+    df["duration"] = ( columns["endFrame"] - columns["startFrame"] + 1 ) / oneSecond
+
+    df.insert(2, "time", pd.to_timedelta(df["start_sec"], unit="s"))
+
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
+
+def writeParquet( df, folder, file, animalId, frame, part ):
+    '''
+    adds the rows of df to the dataset in folder, partitioned by file, animal and day.
+    part names the files written (one per partition), so that the parts of a day do not replace each other.
+    '''
+    df = df.copy()
+    df["file"] = os.path.basename( str( file ) )
+    df["animal"] = animalId
+    df["day"] = frame // oneDay
+    table = pyarrow.Table.from_pandas( df, preserve_index=False )
+    pyarrow.parquet.write_to_dataset( table, folder, partition_cols=[ "file", "animal", "day" ], basename_template="part-{}-{{i}}.parquet".format( part ), existing_data_behavior="overwrite_or_ignore" )
+
+def exportParquet( file, folder, minFrame = None, maxFrame = None, chunkSize = oneDay ):
+    '''
+    writes the detections and the events of the animals of file in folder/detection and folder/event (see above).
+    The detections are read chunkSize frames at a time. A previous export of file in folder is replaced.
+    '''
+    if pyarrow == None:
+        raise ImportError( "Parquet export needs pyarrow ( pip install pyarrow )" )
+
+    # AnimalPool imports this module
+    from lmtanalysis.Animal import AnimalPool
+
+    connection = getReadOnlyConnection( file )
+    pool = AnimalPool( )
+    pool.loadAnimals( connection )
+    animalList = sorted( pool.getAnimalList(), key=lambda animal: animal.baseId )
+    if len( animalList ) == 0:
+        print( "No animal in", file )
+        return
+    parameters = animalList[0].parameters
+
+    if minFrame == None or maxFrame == None:
+        cursor = connection.cursor()
+        cursor.execute( "SELECT MIN(FRAMENUMBER), MAX(FRAMENUMBER) FROM DETECTION" )
+        firstFrame, lastFrame = cursor.fetchone()
+        cursor.close()
+        if firstFrame == None:
+            firstFrame, lastFrame = 0, -1
+        minFrame = firstFrame if minFrame == None else minFrame
+        maxFrame = lastFrame if maxFrame == None else maxFrame
+
+    for table in ( "detection", "event" ):
+        shutil.rmtree( os.path.join( folder, table, "file=" + os.path.basename( str( file ) ) ), ignore_errors=True )
+
+    chunkStart = minFrame
+    while chunkStart <= maxFrame:
+        chunkEnd = min( chunkStart + chunkSize - 1, maxFrame )
+        columns = getDetectionColumns( connection, chunkStart, chunkEnd )
+        print( "Parquet export: {} detections, frames {} to {}".format( len( columns["frame"] ), chunkStart, chunkEnd ) )
+        if len( columns["frame"] ) > 0:
+            df = getDetectionDataFrame( animalList, parameters, columns )
+            # getDetectionDataFrame sorts by time
+            order = np.argsort( columns["frame"], kind="stable" )
+            writeParquet( df, os.path.join( folder, "detection" ), file, columns["animalId"][order], columns["frame"][order], chunkStart )
+        chunkStart = chunkEnd + 1
+
+    columns = getEventColumns( connection, [ animal.baseId for animal in animalList ], minFrame, maxFrame )
+    print( "Parquet export: {} events".format( len( columns["startFrame"] ) ) )
+    if len( columns["startFrame"] ) > 0:
+        df = getEventDataFrame( animalList, columns )
+        order = np.argsort( columns["startFrame"], kind="stable" )
+        writeParquet( df, os.path.join( folder, "event" ), file, columns["animalId"][order], columns["startFrame"][order], "event" )
+
+
+class TestColumnarExport ( unittest.TestCase ):
+
+    def getReferenceDetectionTable(self, pool, parameters ):
+        '''
+        AnimalPool.getDetectionTable built from the Detection objects, as before ColumnarExport
+        '''
+        data = { "RFID": [], "name": [], "genotype": [], "frame": [], "sec": [], "x": [], "y": [], "z": [] }
+        for animal in pool.getAnimalList():
+            for frame, detection in animal.detectionDictionary.items():
+                data["RFID"].append( f"{animal.name}_{animal.RFID}" )
+                data["name"].append( f"{animal.name}" )
+                data["genotype"].append( f"{animal.genotype}" )
+                data["frame"].append( frame )
+                data["sec"].append( frame / oneSecond )
+                data["x"].append( detection.massX )
+                data["y"].append( detection.massY )
+                data["z"].append( detection.massZ )
+        df = pd.DataFrame( data )
+        corner = parameters.cornerCoordinatesOpenFieldArea
+        df["x_cm"] = (df.x - corner[0][0]) / (corner[1][0] - corner[0][0]) * parameters.ARENA_SIZE
+        df["y_cm"] = (df.y - corner[1][1]) / (corner[2][1] - corner[1][1]) * parameters.ARENA_SIZE
+        df["in_arena_center"] = (df["x_cm"] > parameters.CENTER_MARGIN) & (df["y_cm"] > parameters.CENTER_MARGIN) & \
+                                (df["x_cm"] < (parameters.ARENA_SIZE - parameters.CENTER_MARGIN)) & (df["y_cm"] < (parameters.ARENA_SIZE - parameters.CENTER_MARGIN))
+        df.insert(3, "time", pd.to_timedelta(df.sec, unit="s"))
+        return df
+
+    def getReferenceEventsTable(self, pool, connection ):
+        '''
+        AnimalPool.getAllEventsTable built from one EventTimeLine per event name and animal, as before ColumnarExport
+        '''
+        from lmtanalysis.Event import EventTimeLine
+        from lmtanalysis.Util import getAllEvents
+
+        data = { "RFID": [], "name": [], "genotype": [], "event_name": [], "start_sec": [], "end_sec": [], "duration": [] }
+        for eventName in getAllEvents( connection=connection ):
+            for animal in pool.getAnimalList():
+                eventTimeLine = EventTimeLine( connection, eventName, idA=animal.baseId, minFrame=pool.detectionStartFrame, maxFrame=pool.detectionEndFrame )
+                for event in eventTimeLine.getEventList():
+                    data["RFID"].append( f"{animal.name}_{animal.RFID}" )
+                    data["name"].append( f"{animal.name}" )
+                    data["genotype"].append( f"{animal.genotype}" )
+                    data["event_name"].append( eventName )
+                    data["start_sec"].append( event.startFrame / oneSecond )
+                    data["end_sec"].append( event.endFrame / oneSecond )
+                    data["duration"].append( event.duration() / oneSecond )
+        df = pd.DataFrame( data )
+        df.insert(2, "time", pd.to_timedelta(df["start_sec"], unit="s"))
+        return df
+
+    def assertSameRows(self, df, referenceDf, keyList ):
+        # rows at the same time are not in the same order
+        df = df.sort_values( keyList ).reset_index( drop=True )
+        referenceDf = referenceDf.sort_values( keyList ).reset_index( drop=True )
+        pd.testing.assert_frame_equal( df, referenceDf, check_dtype=False )
+
+    def test_SameTablesAsDetectionsAndTimeLines(self):
+
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, withMask = False, seed = 3 )
+                connection = sqlite3.connect( file )
+                try:
+                    # a detection written twice ( the last one is kept ) and a detection discarded ( massX < 10 )
+                    connection.execute( "INSERT INTO DETECTION ( FRAMENUMBER, ANIMALID, MASS_X, MASS_Y ) VALUES ( 2000, 1, 123, 45 )" )
+                    connection.execute( "INSERT INTO DETECTION ( FRAMENUMBER, ANIMALID, MASS_X, MASS_Y ) VALUES ( 2001, 2, 5, 45 )" )
+                    connection.execute( "DELETE FROM DETECTION WHERE FRAMENUMBER=2001 AND ANIMALID=2 AND MASS_X>=10" )
+                    connection.commit()
+                    for start, end in ( ( None, None ), ( 1000, 4499 ) ):
+                        pool = AnimalPool( )
+                        pool.loadAnimals( connection )
+                        pool.loadDetection( start = start, end = end )
+                        referenceDetectionDf = self.getReferenceDetectionTable( pool, pool.getAnimalList()[0].parameters )
+                        referenceEventDf = self.getReferenceEventsTable( pool, connection )
+                        eventDf = pool.getAllEventsTable()
+                        detectionDfList = [ pool.getDetectionTable() ]
+                        pool.loadDetection( start = start, end = end, columnar = True )
+                        detectionDfList.append( pool.getDetectionTable() )
+                        columns = getDetectionColumns( connection, start, end )
+                        detectionDfList.append( getDetectionDataFrame( pool.getAnimalList(), pool.getAnimalList()[0].parameters, columns ) )
+
+                        self.assertTrue( len( referenceDetectionDf ) > 10000 and len( referenceEventDf ) > 100 )
+                        for detectionDf in detectionDfList:
+                            self.assertSameRows( detectionDf, referenceDetectionDf, [ "RFID", "frame" ] )
+                            self.assertTrue( ( detectionDf["time"].diff().dropna() >= pd.Timedelta( 0 ) ).all() )
+                        self.assertSameRows( eventDf, referenceEventDf, [ "event_name", "RFID", "start_sec" ] )
+                        self.assertTrue( ( eventDf["time"].diff().dropna() >= pd.Timedelta( 0 ) ).all() )
+                finally:
+                    connection.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Groups of animals in contact, computed once from the "Contact" timelines for BuildEventGroup2/3/4 and the
+make/break modules.
+
+For each frame of [tmin, tmax], the contacts are stored as a bitmask: one bit per pair of animals
+(6 bits for 4 animals). The frames are cut in segments where the bitmask does not change, and the connected
+components of the contact graph are computed once per distinct bitmask. A group of animals is the set of frames
+where these animals form a connected component: they are linked by contacts, and no other animal is in contact with them.
+This is what the previous loops computed for 4 animals: Group2 (A,B) when A and B are in contact and neither A nor B
+are in contact with C or D, Group3 when 3 animals are linked and not in contact with the 4th, Group4 when the 4 are linked.
+
+Contact is saved for both orders of the animals: the contact between A and B is the union of Contact(A,B) and Contact(B,A).
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import itertools
+import sqlite3
+import numpy as np
+
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
+from lmtanalysis.Interval import normalizeIntervals, intervalsFromFrames, emptyIntervals
+
+''' groups computed for the last window (the contact timelines of the cache are reused from one builder to the next) '''
+contactGroupsCache_ = None
+
+''' one bit per pair in a 64 bits integer '''
+MAX_NB_ANIMAL = 11
+
+
+class ContactGroups():
+
+    def __init__(self, contactDic, animalIdList, tmin = None, tmax = None ):
+        '''
+        contactDic: ( idA, idB ) -> Contact EventTimeLine, for all ordered pairs of animalIdList.
+        '''
+        if len( animalIdList ) > MAX_NB_ANIMAL:
+            raise ValueError( "Contact groups: at most {} animals".format( MAX_NB_ANIMAL ) )
+
+        self.contactDic = contactDic
+        self.animalIdList = sorted( animalIdList )
+        self.indexDic = { animalId: i for i, animalId in enumerate( self.animalIdList ) }
+        self.pairList = list( itertools.combinations( range( len( self.animalIdList ) ), 2 ) )
+
+        intervalDic = {}
+        for p, ( i, j ) in enumerate( self.pairList ):
+            idA, idB = self.animalIdList[i], self.animalIdList[j]
+            startsAB, endsAB = contactDic[idA, idB].getIntervals()
+            startsBA, endsBA = contactDic[idB, idA].getIntervals()
+            intervalDic[p] = normalizeIntervals( np.concatenate( ( startsAB, startsBA ) ), np.concatenate( ( endsAB, endsBA ) ) )
+
+        # window asked (see getContactGroups)
+        self.window = ( tmin, tmax )
+        if tmin == None or tmax == None:
+            allStarts = np.concatenate( [ starts for starts, ends in intervalDic.values() ] + [ np.zeros( 0, dtype=np.int64 ) ] )
+            allEnds = np.concatenate( [ ends for starts, ends in intervalDic.values() ] + [ np.zeros( 0, dtype=np.int64 ) ] )
+            if tmin == None:
+                tmin = int( allStarts.min() ) if len( allStarts ) > 0 else 0
+            if tmax == None:
+                tmax = int( allEnds.max() ) if len( allEnds ) > 0 else tmin - 1
+
+        self.tmin = tmin
+        self.tmax = tmax
+        nbFrame = max( tmax - tmin + 1, 0 )
+
+        # bit p of adjacency[t - tmin]: the animals of pair p are in contact at t
+        self.adjacency = np.zeros( nbFrame, dtype=np.uint64 )
+        for p, ( starts, ends ) in intervalDic.items():
+            starts = np.clip( starts - tmin, 0, nbFrame )
+            ends = np.clip( ends - tmin + 1, 0, nbFrame )
+            change = np.zeros( nbFrame + 1, dtype=np.int64 )
+            np.add.at( change, starts, 1 )
+            np.add.at( change, ends, -1 )
+            inContact = np.cumsum( change[:-1] ) > 0
+            self.adjacency |= inContact.astype( np.uint64 ) << np.uint64( p )
+
+        # pairs of each animal
+        self.animalPairMask = [ 0 ] * len( self.animalIdList )
+        for p, ( i, j ) in enumerate( self.pairList ):
+            self.animalPairMask[i] |= 1 << p
+            self.animalPairMask[j] |= 1 << p
+
+        self.componentDic = {}
+        self.groupDic = self.computeGroups()
+
+    def getComponents(self, adjacency ):
+        '''
+        connected components (bitmask of animals) with at least 2 animals, for a contact bitmask
+        '''
+        if adjacency not in self.componentDic:
+
+            neighbourList = [ 0 ] * len( self.animalIdList )
+            for p, ( i, j ) in enumerate( self.pairList ):
+                if adjacency >> p & 1:
+                    neighbourList[i] |= 1 << j
+                    neighbourList[j] |= 1 << i
+
+            componentList = []
+            visited = 0
+            for i in range( len( self.animalIdList ) ):
+                if visited >> i & 1 or neighbourList[i] == 0:
+                    continue
+                component = 1 << i
+                frontier = component
+                while frontier != 0:
+                    reached = 0
+                    for j in range( len( self.animalIdList ) ):
+                        if frontier >> j & 1:
+                            reached |= neighbourList[j]
+                    frontier = reached & ~component
+                    component |= reached
+                visited |= component
+                componentList.append( component )
+
+            self.componentDic[adjacency] = componentList
+
+        return self.componentDic[adjacency]
+
+    def computeGroups(self):
+        '''
+        returns a dictionary: bitmask of the animals of a group -> intervals ( starts, ends ) of the group
+        '''
+        if len( self.adjacency ) == 0:
+            return {}
+
+        # segments of frames with the same contacts
+        change = np.flatnonzero( self.adjacency[1:] != self.adjacency[:-1] ) + 1
+        segmentStarts = np.concatenate( ( [0], change ) )
+        segmentEnds = np.concatenate( ( change - 1, [ len( self.adjacency ) - 1 ] ) )
+        segmentValues = self.adjacency[segmentStarts]
+
+        keep = segmentValues != 0
+        segmentStarts = segmentStarts[keep] + self.tmin
+        segmentEnds = segmentEnds[keep] + self.tmin
+        segmentValues = segmentValues[keep]
+
+        startListDic = {}
+        endListDic = {}
+        for value in np.unique( segmentValues ):
+            inValue = segmentValues == value
+            for component in self.getComponents( int( value ) ):
+                startListDic.setdefault( component, [] ).append( segmentStarts[inValue] )
+                endListDic.setdefault( component, [] ).append( segmentEnds[inValue] )
+
+        groupDic = {}
+        for component in startListDic:
+            groupDic[component] = normalizeIntervals( np.concatenate( startListDic[component] ), np.concatenate( endListDic[component] ) )
+        return groupDic
+
+    def getMask(self, idList ):
+        mask = 0
+        for animalId in idList:
+            mask |= 1 << self.indexDic[animalId]
+        return mask
+
+    def getIdList(self, mask ):
+        return [ animalId for i, animalId in enumerate( self.animalIdList ) if mask >> i & 1 ]
+
+    def getGroupIntervals(self, idList ):
+        '''
+        intervals where the animals of idList (in any order) form a group
+        '''
+        if any( animalId not in self.indexDic for animalId in idList ):
+            return emptyIntervals()
+        return self.groupDic.get( self.getMask( idList ), emptyIntervals() )
+
+    def getGroupList(self, size ):
+        '''
+        groups (sorted list of ids) of size animals found in the window
+        '''
+        return [ self.getIdList( mask ) for mask in sorted( self.groupDic ) if bin( mask ).count( "1" ) == size ]
+
+    def hasContact(self, animalId, frames ):
+        '''
+        for each frame: the animal is in contact with another animal (False outside [tmin, tmax])
+        '''
+        frames = np.asarray( frames, dtype=np.int64 )
+        result = np.zeros( len( frames ), dtype=bool )
+        index = frames - self.tmin
+        valid = ( index >= 0 ) & ( index < len( self.adjacency ) )
+        pairMask = np.uint64( self.animalPairMask[ self.indexDic[animalId] ] )
+        result[valid] = ( self.adjacency[ index[valid] ] & pairMask ) != 0
+        return result
+
+    def getMakeBreakIntervals(self, size ):
+        '''
+        for groups of size animals: the frame before a group starts is a "make" for the animals of the group that are
+        not in contact at this frame, and the frame after it ends is a "break" for the ones not in contact at this frame.
+        returns a dictionary: animal id -> ( make intervals, break intervals )
+        '''
+        makeFrameDic = { animalId: [] for animalId in self.animalIdList }
+        breakFrameDic = { animalId: [] for animalId in self.animalIdList }
+
+        for idList in self.getGroupList( size ):
+            starts, ends = self.getGroupIntervals( idList )
+            for animalId in idList:
+                makeFrames = starts - 1
+                breakFrames = ends + 1
+                makeFrameDic[animalId].append( makeFrames[ ~self.hasContact( animalId, makeFrames ) ] )
+                breakFrameDic[animalId].append( breakFrames[ ~self.hasContact( animalId, breakFrames ) ] )
+
+        result = {}
+        for animalId in self.animalIdList:
+            makeFrames = np.concatenate( makeFrameDic[animalId] + [ np.zeros( 0, dtype=np.int64 ) ] )
+            breakFrames = np.concatenate( breakFrameDic[animalId] + [ np.zeros( 0, dtype=np.int64 ) ] )
+            result[animalId] = ( intervalsFromFrames( makeFrames ), intervalsFromFrames( breakFrames ) )
+        return result
+
+
+def getContactGroups( connection, file, animalIdList, tmin = None, tmax = None ):
+    '''
+    returns the ContactGroups of the window. The groups are computed again only if the Contact timelines are not
+    the ones of the previous call (new window, or event cache disabled).
+    '''
+    global contactGroupsCache_
+
+    pairList = [ ( idA, idB ) for idA in animalIdList for idB in animalIdList if idA != idB ]
+    timeLineDic = loadEventTimeLinesCached( connection, file, [ ( "Contact", idA, idB ) for idA, idB in pairList ], minFrame=tmin, maxFrame=tmax )
+    contactDic = { ( idA, idB ): timeLineDic[ "Contact", idA, idB ] for idA, idB in pairList }
+
+    cache = contactGroupsCache_
+    if cache != None and cache.window == ( tmin, tmax ) and cache.contactDic.keys() == contactDic.keys():
+        if all( cache.contactDic[key] is contactDic[key] for key in contactDic ):
+            return cache
+
+    contactGroupsCache_ = ContactGroups( contactDic, animalIdList, tmin, tmax )
+    return contactGroupsCache_
+
+
+class TestContactGroups ( unittest.TestCase ):
+
+    def getFrameDic(self, connection, eventNameList ):
+        ''' ( name, idA, idB, idC, idD ) -> frames of the events saved '''
+        frameDic = {}
+        query = "SELECT NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, STARTFRAME, ENDFRAME FROM EVENT WHERE NAME IN ({})".format( ",".join( "?" * len( eventNameList ) ) )
+        for row in connection.execute( query, eventNameList ).fetchall():
+            frameDic.setdefault( row[:5], set() ).update( range( row[5], row[6] + 1 ) )
+        return frameDic
+
+    def getReferenceFrameDic(self, connection, tmin, tmax ):
+        '''
+        frames of the events computed frame by frame as the loops of BuildEventGroup2/3/4 and of the make/break
+        modules did before ContactGroups (4 animals)
+        '''
+        from lmtanalysis.Event import EventTimeLine
+
+        idList = [ 1, 2, 3, 4 ]
+        contact = {}
+        for idA, idB in itertools.permutations( idList, 2 ):
+            contact[idA, idB] = EventTimeLine( connection, "Contact", idA, idB, minFrame=tmin, maxFrame=tmax ).getDictionary()
+        anyContact = {}
+        for idA in idList:
+            anyContact[idA] = EventTimeLine( connection, "Contact", idA, minFrame=tmin, maxFrame=tmax ).getDictionary()
+
+        frameDic = {}
+        for idA, idB in itertools.permutations( idList, 2 ):
+            idC, idD = [ animalId for animalId in idList if animalId not in ( idA, idB ) ]
+            frameDic["Group2", idA, idB, None, None] = { t for t in contact[idA, idB]
+                                                          if not ( t in contact[idA, idC] or t in contact[idA, idD] or t in contact[idB, idC] or t in contact[idB, idD] ) }
+
+        for idA, idB, idC in itertools.permutations( idList, 3 ):
+            idD = [ animalId for animalId in idList if animalId not in ( idA, idB, idC ) ][0]
+            linked = { t for t in contact[idA, idB] if t in contact[idA, idC] or t in contact[idB, idC] }
+            linked |= { t for t in contact[idA, idC] if t in contact[idB, idC] }
+            frameDic["Group3", idA, idB, idC, None] = { t for t in linked if not ( t in contact[idA, idD] or t in contact[idB, idD] or t in contact[idC, idD] ) }
+
+        # Group4 was saved once, for the last permutation of the loops
+        group2 = { idA: set().union( *[ frameDic["Group2", idA, idB, None, None] for idB in idList if idB != idA ] ) for idA in idList }
+        frameDic["Group4", 4, 3, 2, 1] = { t for t in anyContact[1] if all( t in anyContact[idA] for idA in idList ) and not any( t in group2[idA] for idA in idList ) }
+
+        for size, groupKeyList in ( ( 3, [ key for key in frameDic if key[0] == "Group3" ] ), ( 4, [ ( "Group4", 4, 3, 2, 1 ) ] ) ):
+            for groupKey in groupKeyList:
+                starts, ends = intervalsFromFrames( list( frameDic[groupKey] ) )
+                for animalId in groupKey[1:size+1]:
+                    for eventName, frames in ( ( "Group {} make".format( size ), starts - 1 ), ( "Group {} break".format( size ), ends + 1 ) ):
+                        frameDic.setdefault( ( eventName, animalId, None, None, None ), set() ).update( int( t ) for t in frames if not int( t ) in anyContact[animalId] )
+
+        return { key: frames for key, frames in frameDic.items() if len( frames ) > 0 }
+
+    def test_SameEventsAsPerFrameLoops(self):
+
+        from lmtanalysis import BuildEventGroup2, BuildEventGroup3, BuildEventGroup4, BuildEventGroup3MakeBreak, BuildEventGroup4MakeBreak
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+        from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache
+
+        eventClassList = [ BuildEventGroup2, BuildEventGroup3, BuildEventGroup4, BuildEventGroup3MakeBreak, BuildEventGroup4MakeBreak ]
+        eventNameList = [ eventName for ev in eventClassList for eventName in ev.producedEvents ]
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, contactDensity = 0.6, withMask = False, seed = 2 )
+                connection = sqlite3.connect( file )
+                try:
+                    flushEventTimeLineCache()
+                    for ev in eventClassList:
+                        ev.reBuildEvent( connection, file, tmin=0, tmax=5999 )
+                    frameDic = self.getFrameDic( connection, eventNameList )
+                    referenceFrameDic = self.getReferenceFrameDic( connection, 0, 5999 )
+                finally:
+                    flushEventTimeLineCache()
+                    connection.close()
+
+        # the database has groups of each size
+        for eventName in eventNameList:
+            self.assertTrue( any( key[0] == eventName for key in referenceFrameDic ), eventName )
+        self.assertEqual( frameDic.keys(), referenceFrameDic.keys() )
+        for key in referenceFrameDic:
+            self.assertEqual( frameDic[key], referenceFrameDic[key], key )
+
+if __name__ == '__main__':
+    unittest.main()
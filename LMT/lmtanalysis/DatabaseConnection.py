@@ -0,0 +1,124 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Shared connections to the LMT databases.
+
+Analysis scripts open the same file many times (Util.getNumberOfFrames, getStartInDatetime, getEndInDatetime...),
+which is slow on network storage. getReadOnlyConnection( file ) returns one connection per file, opened once and
+kept for the life of the analysis:
+
+    connection = getReadOnlyConnection( file )
+    pool = AnimalPool( )
+    pool.loadAnimals( connection )
+
+Read-only connections are opened in sqlite URI mode ( mode=ro ): the file is never modified, and a script that
+tries to write gets an error. Writers use getConnection( file ), with the journal in WAL mode so that readers are
+not blocked while events are saved (WAL needs a local file system: set WRITER_JOURNAL_MODE to None for databases
+on network shares).
+
+Both set the page cache size ( CACHE_SIZE_KB ), memory mapped I/O ( MMAP_SIZE ) and temporary tables in memory.
+Shared connections should not be closed by the scripts: closeConnections() closes them all (also done at exit).
+A shared connection closed anyway is opened again on the next call.
+'''
+
+import os
+import atexit
+import pathlib
+import sqlite3
+import threading
+
+''' size of the memory map of the file, in bytes '''
+MMAP_SIZE = 256 * 1024 * 1024
+
+''' page cache of each connection, in KiB '''
+CACHE_SIZE_KB = 64 * 1024
+
+''' journal of the connections that write (None keeps the journal mode of the file) '''
+WRITER_JOURNAL_MODE = "WAL"
+
+''' busy timeout in seconds (another process writing) '''
+TIMEOUT = 60
+
+''' ( path, read only, process, thread ) -> connection '''
+connectionDic_ = {}
+connectionLock_ = threading.Lock()
+
+
+def getPath( file ):
+    return os.path.realpath( os.path.abspath( str( file ) ) )
+
+def setPragmas( connection ):
+    connection.execute( "PRAGMA cache_size=-{}".format( int( CACHE_SIZE_KB ) ) )
+    connection.execute( "PRAGMA mmap_size={}".format( int( MMAP_SIZE ) ) )
+    connection.execute( "PRAGMA temp_store=MEMORY" )
+
+def openConnection( file, readOnly = True, timeout = TIMEOUT, **kwargs ):
+    '''
+    new connection to file, not shared. kwargs are given to sqlite3.connect (for instance factory).
+    '''
+    path = getPath( file )
+
+    if readOnly:
+        if not os.path.isfile( path ):
+            # sqlite would report "unable to open database file"
+            raise FileNotFoundError( "Database not found: {}".format( path ) )
+        uri = pathlib.Path( path ).as_uri() + "?mode=ro"
+        connection = sqlite3.connect( uri, uri = True, timeout = timeout, **kwargs )
+        setPragmas( connection )
+        return connection
+
+    connection = sqlite3.connect( path, timeout = timeout, **kwargs )
+    setPragmas( connection )
+    if WRITER_JOURNAL_MODE != None:
+        connection.execute( "PRAGMA journal_mode={}".format( WRITER_JOURNAL_MODE ) )
+    return connection
+
+def isOpen( connection ):
+    try:
+        connection.total_changes
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+def getSharedConnection( file, readOnly ):
+    # connections can not be used by another thread, nor after a fork
+    key = ( getPath( file ), readOnly, os.getpid(), threading.get_ident() )
+    with connectionLock_:
+        connection = connectionDic_.get( key )
+        if connection == None or not isOpen( connection ):
+            connection = openConnection( file, readOnly = readOnly )
+            connectionDic_[key] = connection
+        return connection
+
+def getReadOnlyConnection( file ):
+    '''
+    shared read-only connection to file
+    '''
+    return getSharedConnection( file, True )
+
+def getConnection( file ):
+    '''
+    shared connection to file, for analyses that write in the database
+    '''
+    return getSharedConnection( file, False )
+
+def closeConnections( file = None ):
+    '''
+    closes the shared connections (of file only if given) opened by this process
+    '''
+    path = None if file == None else getPath( file )
+    with connectionLock_:
+        for key in list( connectionDic_.keys() ):
+            if key[2] != os.getpid():
+                # connection inherited from the parent process
+                connectionDic_.pop( key )
+                continue
+            if path == None or key[0] == path:
+                connection = connectionDic_.pop( key )
+                # a connection can only be closed by its thread
+                if key[3] == threading.get_ident():
+                    connection.close()
+
+atexit.register( closeConnections )
@@ -0,0 +1,277 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Columnar storage of the detections of one animal.
+
+Instead of one Detection object (and three Point objects) per frame, the detections are stored as
+one contiguous numpy array per field. DetectionDictionaryView gives a dict-compatible access
+( frame -> Detection ) on top of the arrays so that code using animal.detectionDictionary keeps working.
+Detection objects are only created when a frame is accessed.
+
+The detections returned by the view are read-only snapshots: a new Detection is created at each access, and what
+is set on it ( setMask, coordinates, attributes ) is not kept. A modified detection is stored with
+animal.detectionDictionary[frame] = detection.
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+
+from collections.abc import MutableMapping
+import numpy as np
+from lmtanalysis.Detection import Detection
+
+''' fields stored for a full load, in the order of the DETECTION query columns (after FRAMENUMBER) '''
+DETECTION_FIELDS = ( "massX", "massY", "massZ", "frontX", "frontY", "frontZ", "backX", "backY", "backZ", "rearing", "lookUp", "lookDown" )
+
+''' fields stored for a light load '''
+DETECTION_FIELDS_LIGHT = ( "massX", "massY" )
+
+
+class DetectionStore():
+    '''
+    one numpy array per detection field, sorted by frame.
+    valid is a boolean mask: detections removed by filters are only masked out.
+    '''
+
+    def __init__(self, lightLoad = False ):
+
+        self.lightLoad = lightLoad
+        self.fields = DETECTION_FIELDS_LIGHT if lightLoad else DETECTION_FIELDS
+        # incremented at each modification, so that what is computed from the store can be invalidated
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        self.version += 1
+        self.frame = np.zeros( 0, dtype=np.int64 )
+        self.valid = np.zeros( 0, dtype=bool )
+        self.data = {}
+        for field in self.fields:
+            self.data[field] = np.zeros( 0, dtype=np.float64 )
+
+    def loadFromRows(self, rows ):
+        '''
+        rows are the rows of the DETECTION query: FRAMENUMBER followed by the fields of the store.
+        detections with massX < 10 are discarded, as in Animal.loadDetection.
+        When a frame has several detections, the last row is kept, as in the detection dictionary.
+        '''
+        self.loadFromChunks( [ rows ] )
+
+    def loadFromChunks(self, chunks ):
+        '''
+        same as loadFromRows, with rows given by successive lists (see Animal.iterDetectionRows).
+        Each chunk is converted to numpy before the next one is read.
+        '''
+        tableList = []
+        for rows in chunks:
+            if len( rows ) == 0:
+                continue
+            # None values (not detected head/tail, missing fields) are converted to nan
+            table = np.array( rows, dtype=np.float64 )
+            tableList.append( table[ table[:,1] >= 10 ] )
+
+        if len( tableList ) == 0:
+            self.clear()
+            return
+
+        self.version += 1
+        table = np.concatenate( tableList )
+        table = table[ np.argsort( table[:,0], kind="stable" ) ]
+        # the last detection of a frame replaces the previous ones
+        last = np.ones( len( table ), dtype=bool )
+        last[:-1] = table[1:,0] != table[:-1,0]
+        table = table[ last ]
+
+        self.frame = table[:,0].astype( np.int64 )
+        self.valid = np.ones( len( self.frame ), dtype=bool )
+        self.data = {}
+        for i, field in enumerate( self.fields ):
+            self.data[field] = np.ascontiguousarray( table[:,i+1] )
+
+    def getNbBytes(self):
+        nbBytes = self.frame.nbytes + self.valid.nbytes
+        for field in self.fields:
+            nbBytes += self.data[field].nbytes
+        return nbBytes
+
+    def __len__(self):
+        return int( np.count_nonzero( self.valid ) )
+
+    def getIndex(self, frame ):
+        '''
+        returns the index of frame in the arrays, or None if the frame is not (or no longer) stored.
+        '''
+        i = int( np.searchsorted( self.frame, frame ) )
+        if i < len( self.frame ) and self.frame[i] == frame and self.valid[i]:
+            return i
+        return None
+
+    def getFrames(self):
+        ''' valid frames, sorted '''
+        return self.frame[ self.valid ]
+
+    def getArray(self, field ):
+        ''' values of field for the valid frames, aligned with getFrames() '''
+        return self.data[field][ self.valid ]
+
+    def getArrays(self):
+        ''' dictionary field -> array, including "frame", restricted to valid frames '''
+        arrays = { "frame": self.getFrames() }
+        for field in self.fields:
+            arrays[field] = self.getArray( field )
+        return arrays
+
+    def getDetection(self, i ):
+        ''' new Detection with the values at index i ( a snapshot, see the module description ) '''
+
+        if self.lightLoad:
+            return Detection( float( self.data["massX"][i] ), float( self.data["massY"][i] ), lightLoad = True )
+
+        values = []
+        for field in self.fields:
+            v = self.data[field][i]
+            values.append( None if np.isnan( v ) else float( v ) )
+
+        return Detection( *values )
+
+    def setDetection(self, frame, detection ):
+        '''
+        stores detection at frame. Inserting a new frame copies the arrays: this is meant for occasional edits only.
+        '''
+        self.version += 1
+        i = int( np.searchsorted( self.frame, frame ) )
+        if not ( i < len( self.frame ) and self.frame[i] == frame ):
+            self.frame = np.insert( self.frame, i, frame )
+            self.valid = np.insert( self.valid, i, True )
+            for field in self.fields:
+                self.data[field] = np.insert( self.data[field], i, np.nan )
+
+        self.valid[i] = True
+        for field in self.fields:
+            v = getattr( detection, field, None )
+            self.data[field][i] = np.nan if v is None else v
+
+    def copy(self):
+        ''' copy sharing the field arrays, with its own valid mask '''
+        store = DetectionStore( self.lightLoad )
+        store.frame = self.frame
+        store.valid = self.valid.copy()
+        store.data = self.data
+        return store
+
+
+class DetectionDictionaryView( MutableMapping ):
+    '''
+    dict-compatible view of a DetectionStore: frame -> Detection
+    '''
+
+    def __init__(self, store ):
+        self.store = store
+
+    def __getitem__(self, frame ):
+        i = self.store.getIndex( frame )
+        if i is None:
+            raise KeyError( frame )
+        return self.store.getDetection( i )
+
+    def get(self, frame, default = None ):
+        i = self.store.getIndex( frame )
+        if i is None:
+            return default
+        return self.store.getDetection( i )
+
+    def __contains__(self, frame ):
+        return self.store.getIndex( frame ) is not None
+
+    def __setitem__(self, frame, detection ):
+        self.store.setDetection( frame, detection )
+
+    def __delitem__(self, frame ):
+        i = self.store.getIndex( frame )
+        if i is None:
+            raise KeyError( frame )
+        self.store.valid[i] = False
+        self.store.version += 1
+
+    def __iter__(self):
+        return iter( self.store.getFrames().tolist() )
+
+    def __len__(self):
+        return len( self.store )
+
+    def clear(self):
+        self.store.clear()
+
+    def copy(self):
+        return DetectionDictionaryView( self.store.copy() )
+
+    def __repr__(self):
+        return "DetectionDictionaryView({} detections)".format( len( self ) )
+
+
+class TestDetectionStore ( unittest.TestCase ):
+
+    def test_LastDetectionOfAFrameIsKept(self):
+
+        store = DetectionStore( lightLoad = True )
+        store.loadFromChunks( [ [ ( 5, 100, 10 ), ( 3, 200, 20 ) ], [ ( 5, 300, 30 ), ( 4, 5, 40 ) ] ] )
+        detectionDictionary = DetectionDictionaryView( store )
+
+        self.assertEqual( list( detectionDictionary ), [ 3, 5 ] )
+        self.assertEqual( ( detectionDictionary[5].massX, detectionDictionary[5].massY ), ( 300, 30 ) )
+
+    def test_SameDetectionsAsDictionary(self):
+
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 3000, withMask = False, seed = 1 )
+                connection = sqlite3.connect( file )
+                try:
+                    # one detection of animal 1 is written twice, the last one must be kept
+                    connection.execute( "INSERT INTO DETECTION ( FRAMENUMBER, ANIMALID, MASS_X, MASS_Y ) VALUES ( 100, 1, 123, 45 )" )
+                    connection.commit()
+                    pool = AnimalPool( )
+                    pool.loadAnimals( connection )
+                    pool.loadDetection( start = 0, end = 2999, columnar = False )
+                    dictionaryPool = { animalId: dict( animal.detectionDictionary ) for animalId, animal in pool.animalDictionary.items() }
+                    pool.loadDetection( start = 0, end = 2999, columnar = True )
+                finally:
+                    connection.close()
+
+        for animalId, animal in pool.animalDictionary.items():
+            view = animal.detectionDictionary
+            reference = dictionaryPool[animalId]
+            self.assertEqual( list( view ), sorted( reference ) )
+            for frame, detection in reference.items():
+                for field in DETECTION_FIELDS:
+                    self.assertEqual( getattr( view[frame], field ), getattr( detection, field ), ( animalId, frame, field ) )
+
+        self.assertEqual( pool.animalDictionary[1].detectionDictionary[100].massX, 123 )
+
+    def test_ModifiedDetectionIsStored(self):
+
+        store = DetectionStore( lightLoad = True )
+        store.loadFromRows( [ ( 1, 100, 10 ), ( 2, 200, 20 ) ] )
+        detectionDictionary = DetectionDictionaryView( store )
+
+        # a snapshot: changing it does not change the store
+        detection = detectionDictionary[2]
+        detection.massX = 250
+        self.assertEqual( detectionDictionary[2].massX, 200 )
+
+        detectionDictionary[2] = detection
+        self.assertEqual( detectionDictionary[2].massX, 250 )
+        self.assertEqual( store.getArray( "massX" ).tolist(), [ 100, 250 ] )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ import sqlite3
 import unittest
 from time import *
 from lmtanalysis.Chronometer import Chronometer
+from lmtanalysis.Metrics import MetricSpan, addMetricCounter
 
 import matplotlib
 #matplotlib fix for mac
@@ -15,10 +16,96 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 from lmtanalysis.Measure import *
+from lmtanalysis.Interval import *
+from lmtanalysis.EventTransactionRegistry import getEventTransaction, setEventTransaction, removeEventTransaction
 import sys
 import json
 from numpy import NaN
 
+''' cumulated time (in s) spent writing or deleting events in base, see getEventWriteTime() '''
+eventWriteTime_ = 0
+
+def getEventWriteTime():
+    return eventWriteTime_
+
+def resetEventWriteTime():
+    global eventWriteTime_
+    eventWriteTime_ = 0
+
+def addEventWriteTime( seconds ):
+    global eventWriteTime_
+    eventWriteTime_ += seconds
+
+def hasEventIdSequence( connection ):
+    '''
+    True if the ids of the EVENT table are never reused: the table is created with AUTOINCREMENT and its last id is kept
+    in sqlite_sequence. With a plain INTEGER PRIMARY KEY, the ids of the last events deleted are given again.
+    '''
+    cursor = connection.cursor()
+    try:
+        cursor.execute( "SELECT COUNT(*) FROM sqlite_sequence WHERE UPPER(name)='EVENT'" )
+        nbSequence = cursor.fetchone()[0]
+    except sqlite3.OperationalError:
+        # no table created with AUTOINCREMENT in the base
+        nbSequence = 0
+    cursor.close()
+    return nbSequence > 0
+
+class EventTransaction:
+    '''
+    Groups the event writes done on a connection (saveTimeLine, deleteEventTimeLineInBase) in a single transaction:
+
+        with EventTransaction( connection ):
+            BuildEventStop.reBuildEvent( connection, ... )
+
+    the commit is done once when leaving the block, or a rollback if an exception is raised.
+    With deferDelete=True, deletion of full event names (no animal id) are collected and performed
+    with one DELETE ... WHERE NAME IN (...) statement when leaving the block (or before saving an event with the same name).
+    Nested blocks join the outer transaction.
+    '''
+    def __init__(self, connection, deferDelete=False ):
+        self.connection = connection
+        self.deferDelete = deferDelete
+        self.deferredEventNameList = []
+        self.outerTransaction = None
+
+    def __enter__(self):
+        self.outerTransaction = getEventTransaction( self.connection )
+        if self.outerTransaction != None:
+            return self.outerTransaction
+
+        self.connection.commit()
+        self.connection.execute( "BEGIN" )
+        setEventTransaction( self.connection, self )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback ):
+        if self.outerTransaction != None:
+            return False
+
+        removeEventTransaction( self.connection )
+        if exc_type != None:
+            self.connection.rollback()
+            return False
+
+        self.flushDeferredDelete()
+        self.connection.commit()
+        return False
+
+    def deferDeleteEventName(self, eventName ):
+        if eventName not in self.deferredEventNameList:
+            self.deferredEventNameList.append( eventName )
+
+    def flushDeferredDelete(self, eventName=None ):
+        '''
+        performs deferred deletes. If eventName is given, only does it if this name is waiting to be deleted.
+        '''
+        if eventName != None and eventName not in self.deferredEventNameList:
+            return
+        eventNameList = self.deferredEventNameList
+        self.deferredEventNameList = []
+        deleteEventTimeLinesInBase( self.connection, eventNameList )
+
 class Event:
     '''
     an event represent the interval of frame where the event is
@@ -159,7 +246,7 @@ class EventTimeLine:
             print( "Event " + str( eventName ) + " created. eventNameWithId = " +  str( self.eventNameWithId ) + " loadEvent: False" )
             return;
 
-        chrono = Chronometer( "Load event " + str ( self.eventName ) )
+        chrono = MetricSpan( "Load event", event=self.eventName )
         c = conn.cursor()
 
         query = "SELECT * FROM EVENT WHERE NAME='{0}'".format( self.eventName );
@@ -194,6 +281,7 @@ class EventTimeLine:
         print( query )
         c.execute( query )
         all_rows = c.fetchall()
+        addMetricCounter( "rowsFetched", len( all_rows ) )
 
         if loadEventIndependently == True: # load events without using the rebuild dictionnary.
 
@@ -224,39 +312,25 @@ class EventTimeLine:
 
         else:
 
-            eventBool = {}
-
-            for row in all_rows:
-                start = row[3]
-                end = row[4]
-                for t in range( start, end+1 ):
-
-                    if ( minFrame != None ):
-                        if ( t < minFrame ):
-                            continue
-
-                    if ( maxFrame != None ):
-                        if ( t > maxFrame ):
-                            continue
-
-                    eventBool[t] = True
+            # clip the events to [minFrame,maxFrame] and merge overlapping/adjacent ones
+            starts = [ row[3] for row in all_rows ]
+            ends = [ row[4] for row in all_rows ]
+            starts, ends = clipIntervals( starts, ends, minFrame, maxFrame )
 
             if ( inverseEvent == True ):
 
                 if ( minFrame == None ):
                     print("To inverse event, need a minFrame")
+                    chrono.stop()
                     return
                 if ( maxFrame == None ):
                     print("To inverse event, need a maxFrame")
+                    chrono.stop()
                     return
 
-                for t in range( minFrame , maxFrame +1 ):
-                    if ( t in eventBool ):
-                        eventBool.pop( t )
-                    else:
-                        eventBool[t] = True
+                starts, ends = complementIntervals( starts, ends, minFrame, maxFrame )
 
-            self.reBuildWithDictionary(eventBool)
+            self.reBuildWithIntervals( starts, ends )
 
         #keyList = sorted(eventBool.keys())
 
@@ -270,22 +344,46 @@ class EventTimeLine:
         #        self.eventList.append( Event( start, key ) )
         #        start = -1
 
+        addMetricCounter( "eventsLoaded", len( self.eventList ) )
+        chrono.stop()
         print ( eventName , " Id(",idA ,",", idB, ",", idC, "," , idD , ") Min/maxFrame: (",minFrame,"/",maxFrame ,") Loaded (" , len( self.eventList ) , " records loaded in ", chrono.getTimeInS() , "S )")
 
     def __str__(self):
         return self.eventName + " Id(" + str(self.idA) + ","+  str(self.idB)+ ","+ str(self.idC)+ "," + str(self.idD) + ")"
 
-    def saveTimeLine(self , conn , saveDescriptionPerEvent=False ):
-        c = conn.cursor()
+    def saveTimeLine(self , conn , saveDescriptionPerEvent=False, saveMetaData=True ):
+        '''
+        saves all events with a single executemany.
+        commits, unless an EventTransaction is open on the connection.
+        saveMetaData=False stores NULL instead of the json metadata (loaded back as an empty metadata).
+        '''
+        chrono = MetricSpan( "Save event", event=self.eventName )
+
+        transaction = getEventTransaction( conn )
+        if transaction != None:
+            transaction.flushDeferredDelete( self.eventName )
+
+        query = "INSERT INTO EVENT (NAME, DESCRIPTION, STARTFRAME, ENDFRAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, METADATA ) VALUES (?,?,?,?,?,?,?,?,?);"
+
+        rows = []
         for event in self.eventList:
-            query = "INSERT INTO EVENT (NAME, DESCRIPTION, STARTFRAME, ENDFRAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, METADATA ) VALUES (?,?,?,?,?,?,?,?,?);"
 
-            jsonToStore = json.dumps( event.metadata )
+            jsonToStore = None
+            if saveMetaData:
+                jsonToStore = json.dumps( event.metadata )
             description = "" # self.eventNameWithId
             if saveDescriptionPerEvent:
                 description = event.description
-            c.execute( query , ( self.eventName, description, event.startFrame, event.endFrame , self.idA, self.idB, self.idC, self.idD, jsonToStore ) )
-        conn.commit()
+            rows.append( ( self.eventName, description, event.startFrame, event.endFrame , self.idA, self.idB, self.idC, self.idD, jsonToStore ) )
+
+        c = conn.cursor()
+        c.executemany( query , rows )
+        c.close()
+        if transaction == None:
+            conn.commit()
+
+        addMetricCounter( "eventsWritten", len( rows ) )
+        addEventWriteTime( chrono.stop() )
 
 
     def addEvent(self , eventToAdd , noCheck =False ):
@@ -437,13 +535,8 @@ class EventTimeLine:
         '''
         return total duration between min and max t value.
         '''
-        duration = 0
-        dicEvent = self.getDictionary()
-        for t in range( tmin, tmax + 1):
-            if t in dicEvent:
-                duration+=1
-
-        return duration
+        starts, ends = self.getIntervals()
+        return totalIntervalLength( *clipIntervals( starts, ends, tmin, tmax ) )
 
     def getDurationEventInTimeBin(self, tmin=0, tmax=None, binSize=1*oneMinute):
         '''
@@ -531,42 +624,40 @@ class EventTimeLine:
         return stdIntervalLength
         
     def getDictionary(self , minFrame=None, maxFrame=None ):
-        frameDico = {}
-        for event in self.eventList:
-            for t in range( event.startFrame, event.endFrame +1):
-                frameDico[t] = True;
+        '''
+        returns a dictionary with one entry per frame covered by an event.
+        Prefer getIntervals() when possible: this dictionary gets very large on long experiments.
+        '''
+        starts, ends = self.getIntervals()
+        starts, ends = clipIntervals( starts, ends, minFrame, maxFrame )
 
-        if ( minFrame !=None ):
-            for key in dict ( frameDico ).keys() :
-                if ( key < minFrame ):
-                    frameDico.pop( key )
+        return dict.fromkeys( intervalsToFrames( starts, ends ).tolist(), True )
 
-        if ( maxFrame !=None ):
-            for key in dict ( frameDico ).keys():
-                if ( key > maxFrame ):
-                    frameDico.pop( key )
+    def getIntervals(self):
+        '''
+        returns the events as normalized intervals: two numpy arrays ( starts, ends ), sorted, ends included.
+        Overlapping or adjacent events are merged.
+        '''
+        starts = [ event.startFrame for event in self.eventList ]
+        ends = [ event.endFrame for event in self.eventList ]
+        return normalizeIntervals( starts, ends )
 
+    def reBuildWithIntervals(self, starts, ends ):
+        '''
+        rebuilds the event list from intervals ( see Interval.py ).
+        '''
+        self.eventList.clear()
 
-        return frameDico
+        starts, ends = normalizeIntervals( starts, ends )
+        for start, end in zip( starts.tolist(), ends.tolist() ):
+            self.eventList.append( Event( start, end ) )
 
     def clearEvents(self):
         self.eventList.clear()
 
     def reBuildWithDictionary(self, eventBool ):
 
-        self.eventList.clear()
-
-        keyList = sorted(eventBool.keys())
-
-        start = -1
-        for key in keyList:
-
-            if ( start == -1 ):
-                start = key
-
-            if ( eventBool.get( key+1 ) == None ):
-                self.eventList.append( Event( start, key ) )
-                start = -1
+        self.reBuildWithIntervals( *intervalsFromFrames( list( eventBool.keys() ) ) )
 
 
     def checkEventHole( self, frameNumber ):
@@ -595,27 +686,8 @@ class EventTimeLine:
             print("No event in timeLine")
             return
 
-        eventDictionary = self.getDictionary( minT, maxT )
-
-        nbFrameOutOfEvent = 0
-        lastEventEndFrame = minT
-        for t in range( minT , maxT+1 ):
-            #print( "t: " + str(t) )
-            if t in eventDictionary:
-
-                if nbFrameOutOfEvent > 0:
-                    if nbFrameOutOfEvent <= numberOfFrameBetweenEvent:
-                        # fill
-                        for tt in range ( lastEventEndFrame , t ):
-                            #print( "filling " + str( tt ))
-                            eventDictionary[tt] = True
-
-                nbFrameOutOfEvent = 0
-                lastEventEndFrame = t
-            else:
-                nbFrameOutOfEvent += 1
-
-        self.reBuildWithDictionary( eventDictionary )
+        starts, ends = self.getIntervals()
+        self.reBuildWithIntervals( *mergeIntervalGaps( starts, ends, numberOfFrameBetweenEvent ) )
 
     def dilateEvents(self, numberOfFrame):
         '''
@@ -630,42 +702,20 @@ class EventTimeLine:
             print("No event in timeLine")
             return
 
-        #eventDictionary = self.getDictionary( minT, maxT )
-        eventDictionaryDilated = {}
+        starts = [ event.startFrame for event in self.eventList ]
+        ends = [ event.endFrame for event in self.eventList ]
+        self.reBuildWithIntervals( *dilateIntervals( starts, ends, numberOfFrame ) )
 
-        for event in self.eventList:            
-            for tt in range ( event.startFrame - numberOfFrame, event.endFrame +numberOfFrame+1 ):
-                eventDictionaryDilated[tt]=True
-            
-
-        '''
-        #faster algo:
-        
-        # copy original to dilated
-        eventDictionaryDilated = eventDictionary.copy()
-        for d in range( numberOfFrame ):
-            print("Dilate " , d)
-            for t in eventDictionaryDilated.copy().keys():    
-                
-                if t-1 not in eventDictionaryDilated:
-                    eventDictionaryDilated[t-1] = True
-                    
-                if t+1 not in eventDictionaryDilated:
-                    eventDictionaryDilated[t+1] = True
-                
-        '''
-        
-        
+    def erodeEvents(self, numberOfFrame):
         '''
-        #slow:
-        for t in eventDictionary.keys():
-        #for t in range( minT , maxT+1 ):
-            for tt in range ( t - numberOfFrame, t+numberOfFrame+1 ):
-                eventDictionaryDilated[tt]=True
+        Erode events in time. Events shorter than 2*numberOfFrame+1 disappear.
         '''
-        
-        self.reBuildWithDictionary( eventDictionaryDilated )
+        if ( self.getNbEvent() == 0 ):
+            print("No event in timeLine")
+            return
 
+        starts, ends = self.getIntervals()
+        self.reBuildWithIntervals( *erodeIntervals( starts, ends, numberOfFrame ) )
 
 
     def mergeEvent( self , eventA, eventB ):
@@ -747,25 +797,25 @@ class EventTimeLine:
         '''
         perform a AND logic with timeLineAnd
         '''        
-        andDico = timeLineAnd.getDictionary()
-        self.keepOnlyEventCommonWithKeyDictionary( andDico )
+        starts, ends = self.getIntervals()
+        self.reBuildWithIntervals( *intersectIntervals( starts, ends, *timeLineAnd.getIntervals() ) )
 
     def removeEventOfTimeLine(self , timeLineToRemove ):
         '''
         remove events that match timeLineToRemove
         '''
-        dico = self.getDictionary()
-        removeDico = timeLineToRemove.getDictionary()
+        starts, ends = self.getIntervals()
+        self.reBuildWithIntervals( *subtractIntervals( starts, ends, *timeLineToRemove.getIntervals() ) )
 
-        for k in removeDico:
-            dico.pop( k , None )
-
-        self.reBuildWithDictionary( dico )
+    def addEventOfTimeLine(self , timeLineToAdd ):
+        '''
+        perform a OR logic with timeLineToAdd
+        '''
+        starts, ends = self.getIntervals()
+        self.reBuildWithIntervals( *unionIntervals( starts, ends, *timeLineToAdd.getIntervals() ) )
     
     def removeEventsBelowLength(self , maxLen ):
-        for event in self.eventList[:]:
-            if ( event.duration() < maxLen ):
-                self.eventList.remove( event )
+        self.eventList[:] = [ event for event in self.eventList if event.duration() >= maxLen ]
 
     def printEventList(self):
         print( "Event list of {} / {} / nbEvent: {}".format( self.eventName , self.eventNameWithId, len( self.eventList ) ) )
@@ -1048,7 +1098,15 @@ class EventTimeLine:
 def deleteEventTimeLineInBase( connection, eventName, idA=None, idB=None, idC=None, idD=None ):
     '''
     delete an event in dataBase
+    commits, unless an EventTransaction is open on the connection.
     '''
+    transaction = getEventTransaction( connection )
+    if transaction != None and transaction.deferDelete and idA == None and idB == None and idC == None and idD == None:
+        print ( "Deferring delete of event {} from base.".format( eventName ) )
+        transaction.deferDeleteEventName( eventName )
+        return
+
+    chrono = Chronometer( "Delete event " + str( eventName ) )
     cursor = connection.cursor()
     print ( "Deleting event {} (idA:{},idB:{},idC:{},idD:{}) from base...".format( eventName , idA, idB, idC, idD ) )
     query = "DELETE FROM EVENT WHERE NAME=\"{0}\"".format( eventName )
@@ -1067,8 +1125,28 @@ def deleteEventTimeLineInBase( connection, eventName, idA=None, idB=None, idC=No
     print(query)
 
     cursor.execute( query )
-    connection.commit()
+    if transaction == None:
+        connection.commit()
     print ( "Number of event deleted: {} ".format ( cursor.rowcount ) )
+    addEventWriteTime( chrono.getTimeInS() )
+
+def deleteEventTimeLinesInBase( connection, eventNameList ):
+    '''
+    delete all events with a name in eventNameList in dataBase, with a single query.
+    commits, unless an EventTransaction is open on the connection.
+    '''
+    if len( eventNameList ) == 0:
+        return
+
+    chrono = Chronometer( "Delete events" )
+    cursor = connection.cursor()
+    print ( "Deleting events {} from base...".format( eventNameList ) )
+    query = "DELETE FROM EVENT WHERE NAME IN ({})".format( ",".join( "?" * len( eventNameList ) ) )
+    cursor.execute( query, list( eventNameList ) )
+    if getEventTransaction( connection ) == None:
+        connection.commit()
+    print ( "Number of event deleted: {} ".format ( cursor.rowcount ) )
+    addEventWriteTime( chrono.getTimeInS() )
 
 def plotMultipleTimeLine( timeLineList , colorList=None , show=True , minValue=0 ):
     '''
@@ -1207,6 +1285,57 @@ class TestEventTimeLine ( unittest.TestCase ):
         result = ( myEventTimeLine.getMinT() == 100 and myEventTimeLine.getMaxT() == 300 and len( myEventTimeLine.eventList ) == 1 )
         self.assertEqual( result, True )
 
+    def buildRandomTimeLine(self, seed ):
+
+        rng = np.random.default_rng( seed )
+        timeLine = EventTimeLine( None, "testEvent" , 1 , 2 , loadEvent=False )
+        for start in rng.integers( 0, 2000, 60 ).tolist():
+            timeLine.eventList.append( Event( start, start + int( rng.integers( 0, 40 ) ) ) )
+        return timeLine
+
+    def test_IntervalOperationsMatchDictionary(self):
+
+        for seed in range( 5 ):
+
+            timeLineA = self.buildRandomTimeLine( seed )
+            timeLineB = self.buildRandomTimeLine( seed + 100 )
+            dicA = timeLineA.getDictionary()
+            dicB = timeLineB.getDictionary()
+
+            expected = EventTimeLine( None, "expected" , loadEvent=False )
+
+            result = self.buildRandomTimeLine( seed )
+            result.keepOnlyEventCommonWithTimeLine( timeLineB )
+            expected.reBuildWithDictionary( { t: True for t in dicA if t in dicB } )
+            self.assertEqual( result.getDictionary(), expected.getDictionary() )
+
+            result = self.buildRandomTimeLine( seed )
+            result.removeEventOfTimeLine( timeLineB )
+            expected.reBuildWithDictionary( { t: True for t in dicA if t not in dicB } )
+            self.assertEqual( result.getDictionary(), expected.getDictionary() )
+            self.assertEqual( result.getNbEvent(), expected.getNbEvent() )
+
+            result = self.buildRandomTimeLine( seed )
+            result.dilateEvents( 3 )
+            dilated = {}
+            for t in dicA:
+                for tt in range( t-3, t+4 ):
+                    dilated[tt] = True
+            expected.reBuildWithDictionary( dilated )
+            self.assertEqual( [ ( e.startFrame, e.endFrame ) for e in result.eventList ], [ ( e.startFrame, e.endFrame ) for e in expected.eventList ] )
+
+            self.assertEqual( timeLineA.getTotalDurationEvent( 500, 1500 ), len( [ t for t in dicA if 500 <= t <= 1500 ] ) )
+
+    def test_ErodeEvents(self):
+
+        myEventTimeLine = EventTimeLine( None, "testEvent" , 1 , 2 , loadEvent=False )
+        myEventTimeLine.addEvent( Event( 50,55 ) )
+        myEventTimeLine.addEvent( Event( 100,200 ) )
+        myEventTimeLine.erodeEvents( 3 )
+
+        result = ( myEventTimeLine.getNbEvent() == 1 and myEventTimeLine.getMinT() == 103 and myEventTimeLine.getMaxT() == 197 )
+        self.assertEqual( result, True )
+
 
 if __name__ == '__main__':
     unittest.main()
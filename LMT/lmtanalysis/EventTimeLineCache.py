@@ -3,19 +3,198 @@ Created on 25 sept. 2018
 
 @author: Fab
 '''
-from lmtanalysis.Event import EventTimeLine
+from lmtanalysis.Event import EventTimeLine, hasEventIdSequence
+from lmtanalysis.Metrics import MetricSpan, addMetricCounter
+from lmtanalysis.Interval import clipIntervals
+from lmtanalysis.RebuildCheckpoint import INCREMENTAL_LOG_PROCESS
+import io
+import os
+import sys
+import hashlib
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+from collections import OrderedDict
 
-eventCacheDico_={}
+''' in memory cache, ordered from the least to the most recently used '''
+eventCacheDico_=OrderedDict()
 eventCacheEnable_ = True
 
+''' memory budget of the in memory cache (in bytes). None: no limit '''
+eventCacheBudget_ = None
+''' estimated size in bytes of each cached timeline '''
+eventCacheSizeDico_ = {}
+''' event names never evicted from the cache '''
+eventCachePinList_ = []
+eventCacheStats_ = { "hits": 0, "misses": 0, "evictions": 0 }
+
+''' persistent cache: timelines stored as interval arrays in a folder next to the database ( file + ".eventcache" ) '''
+eventPersistentCacheEnable_ = False
+''' files without AUTOINCREMENT event ids, for which the persistent cache is not used '''
+eventPersistentCacheDisabledFileList_ = []
+
 def disableEventTimeLineCache():
     ''' If you are using a computer with small amount of RAM, it might be better to disable cache '''
     eventCacheDico_.clear()
+    eventCacheSizeDico_.clear()
     global eventCacheEnable_
     eventCacheEnable_ = False
     print( "Cache event is disabled" )
     
     
+def setEventTimeLineCacheBudget( maxBytes, pinList = None ):
+    '''
+    limits the memory used by the cache. When the budget is exceeded, the least recently used timelines are evicted.
+    pinList: event names (for instance [ "Contact", "Detection" ]) never evicted.
+    maxBytes = None removes the limit.
+    '''
+    global eventCacheBudget_, eventCachePinList_
+    eventCacheBudget_ = maxBytes
+    if pinList != None:
+        eventCachePinList_ = list( pinList )
+    print( "Cache event budget (MB):", None if maxBytes == None else maxBytes / 1000000, "pinned:", eventCachePinList_ )
+    _evictEventTimeLines()
+
+def getEventTimeLineSize( eventTimeLine ):
+    '''
+    estimated memory used by a timeline (in bytes), measured on its first event.
+    '''
+    size = sys.getsizeof( eventTimeLine ) + sys.getsizeof( eventTimeLine.eventList )
+    if len( eventTimeLine.eventList ) > 0:
+        event = eventTimeLine.eventList[0]
+        eventSize = sys.getsizeof( event ) + sys.getsizeof( event.__dict__ ) + sys.getsizeof( event.metadata ) + 2 * sys.getsizeof( event.startFrame )
+        size += eventSize * len( eventTimeLine.eventList )
+    return size
+
+def getEventTimeLineCacheSize():
+    return sum( eventCacheSizeDico_.values() )
+
+def getEventTimeLineCacheStats():
+    stats = dict( eventCacheStats_ )
+    stats["entries"] = len( eventCacheDico_ )
+    stats["bytes"] = getEventTimeLineCacheSize()
+    return stats
+
+def printEventTimeLineCacheStats():
+    stats = getEventTimeLineCacheStats()
+    print( "Cache event: {} entries, {} MB, hits: {}, misses: {}, evictions: {}".format( stats["entries"], round( stats["bytes"] / 1000000, 1 ), stats["hits"], stats["misses"], stats["evictions"] ) )
+
+def resetEventTimeLineCacheStats():
+    for k in eventCacheStats_:
+        eventCacheStats_[k] = 0
+
+def _evictEventTimeLines():
+
+    if eventCacheBudget_ == None:
+        return
+
+    size = getEventTimeLineCacheSize()
+    for key in list( eventCacheDico_.keys() ):
+        if size <= eventCacheBudget_:
+            break
+        # key[1] is the event name
+        if key[1] in eventCachePinList_:
+            continue
+        eventCacheDico_.pop( key )
+        size -= eventCacheSizeDico_.pop( key, 0 )
+        eventCacheStats_["evictions"] += 1
+
+def enablePersistentEventTimeLineCache( enable = True ):
+    '''
+    Timelines loaded with EventTimeLineCached are also stored on disk next to the database, so that the next
+    analysis of the same file starts warm. Entries are checked against the state of the events (see getEventTableState).
+    Timelines loaded with loadEventIndependently (metadata, overlapping events) are not stored on disk.
+    The persistent cache is not used for the bases where event ids can be reused (EVENT without AUTOINCREMENT).
+    '''
+    global eventPersistentCacheEnable_
+    eventPersistentCacheEnable_ = enable
+    print( "Persistent cache event enabled:", enable )
+
+def getPersistentCacheFolder( file ):
+    return str( file ) + ".eventcache"
+
+def clearPersistentEventTimeLineCache( file ):
+    folder = getPersistentCacheFolder( file )
+    if not os.path.isdir( folder ):
+        return
+    for cacheFile in os.listdir( folder ):
+        if cacheFile.endswith( ".npz" ):
+            os.remove( os.path.join( folder, cacheFile ) )
+
+def isPersistentCacheUsable( connection, file ):
+    '''
+    the state of getEventTableState only detects the changes of the events if their ids are not reused
+    '''
+    if not eventPersistentCacheEnable_ or file == None:
+        return False
+    if hasEventIdSequence( connection ):
+        return True
+    if file not in eventPersistentCacheDisabledFileList_:
+        eventPersistentCacheDisabledFileList_.append( file )
+        print( "Persistent cache event not used: the event ids of", file, "can be reused (no AUTOINCREMENT)." )
+    return False
+
+def getEventTableState( connection, eventName ):
+    '''
+    returns the modification state of the events eventName: ( last incremental rebuild LOG id, number of events, last event id ).
+    Event ids are not reused (AUTOINCREMENT, checked by isPersistentCacheUsable): any insertion or deletion changes the count or the last id. Events are only
+    changed in place by an incremental rebuild (see IncrementalRebuild.py), which is logged.
+    The count and the last id are read in the index eventNameIdIndex ( NAME, ID ) built by BuildDataBaseIndex.
+    '''
+    cursor = connection.cursor()
+    try:
+        cursor.execute( "SELECT MAX(ID) FROM LOG WHERE PROCESS=?", ( INCREMENTAL_LOG_PROCESS, ) )
+        lastLogId = cursor.fetchone()[0]
+    except:
+        lastLogId = None
+    cursor.execute( "SELECT COUNT(*), MAX(ID) FROM EVENT WHERE NAME=?", ( str( eventName ), ) )
+    nbEvent, lastEventId = cursor.fetchone()
+    cursor.close()
+
+    state = []
+    for value in ( lastLogId, nbEvent, lastEventId ):
+        state.append( -1 if value == None else value )
+    return state
+
+def _getPersistentCacheFile( file, key ):
+    name = hashlib.sha1( repr( key ).encode( "utf-8" ) ).hexdigest()
+    return os.path.join( getPersistentCacheFolder( file ), name + ".npz" )
+
+def _loadPersistentEventTimeLine( file, key, state, eventName, idA, idB, idC, idD ):
+
+    cacheFile = _getPersistentCacheFile( file, key )
+    if not os.path.isfile( cacheFile ):
+        return None
+
+    try:
+        with np.load( cacheFile ) as data:
+            if str( data["key"] ) != repr( key ) or data["state"].tolist() != state:
+                return None
+            starts = data["starts"]
+            ends = data["ends"]
+    except Exception as e:
+        print( "Persistent cache: can't read", cacheFile, e )
+        return None
+
+    eventTimeLine = EventTimeLine( None, eventName, idA = idA, idB = idB, idC = idC, idD = idD, loadEvent = False )
+    eventTimeLine.reBuildWithIntervals( starts, ends )
+    return eventTimeLine
+
+def _savePersistentEventTimeLine( file, key, state, eventTimeLine ):
+
+    try:
+        os.makedirs( getPersistentCacheFolder( file ), exist_ok = True )
+        starts, ends = eventTimeLine.getIntervals()
+        cacheFile = _getPersistentCacheFile( file, key )
+        # write then rename, so that a concurrent reader never sees a partial file
+        tmpFile = cacheFile[:-4] + "_tmp.npz"
+        np.savez( tmpFile, starts = starts, ends = ends, state = np.array( state, dtype=np.int64 ), key = np.array( repr( key ) ) )
+        os.replace( tmpFile, cacheFile )
+    except Exception as e:
+        print( "Persistent cache: can't write cache for", eventTimeLine, e )
+
 def EventTimeLineCached( connection, file, eventName, idA=None, idB=None, idC=None, idD = None, minFrame=None, maxFrame=None, loadEventIndependently=False ):
             
     global eventCacheDico_
@@ -27,19 +206,173 @@ def EventTimeLineCached( connection, file, eventName, idA=None, idB=None, idC=No
         
         if (file, eventName, idA, idB, idC, idD, minFrame, maxFrame, loadEventIndependently ) in eventCacheDico_: 
             eventTimeLine = eventCacheDico_[ file, eventName, idA, idB, idC, idD, minFrame, maxFrame, loadEventIndependently ]
+            eventCacheDico_.move_to_end( ( file, eventName, idA, idB, idC, idD, minFrame, maxFrame, loadEventIndependently ) )
+            eventCacheStats_["hits"] += 1
+            addMetricCounter( "eventCacheHits" )
             print ( eventName , " Id(",idA ,",", idB, ",", idC, "," , idD , ") Loaded from cache (" , len( eventTimeLine.eventList ) , " records. )")
             return eventTimeLine
 
         
-    eventTimeLine = EventTimeLine( connection, eventName , idA = idA, idB = idB, idC = idC, idD = idD, minFrame = minFrame, maxFrame = maxFrame , loadEventIndependently = loadEventIndependently )
+    eventCacheStats_["misses"] += 1
+    addMetricCounter( "eventCacheMisses" )
+    usePersistentCache = not loadEventIndependently and isPersistentCacheUsable( connection, file )
+    eventTimeLine = None
+
+    if usePersistentCache:
+        key = ( os.path.basename( str( file ) ), str( eventName ), idA, idB, idC, idD, minFrame, maxFrame )
+        state = getEventTableState( connection, eventName )
+        eventTimeLine = _loadPersistentEventTimeLine( file, key, state, eventName, idA, idB, idC, idD )
+        if eventTimeLine != None:
+            print ( eventName , " Id(",idA ,",", idB, ",", idC, "," , idD , ") Loaded from persistent cache (" , len( eventTimeLine.eventList ) , " records. )")
+
+    if eventTimeLine == None:
+        eventTimeLine = EventTimeLine( connection, eventName , idA = idA, idB = idB, idC = idC, idD = idD, minFrame = minFrame, maxFrame = maxFrame , loadEventIndependently = loadEventIndependently )
+        if usePersistentCache:
+            _savePersistentEventTimeLine( file, key, state, eventTimeLine )
     
     if eventCacheEnable_ == True:
         print ( "Caching eventTimeLine")
         eventCacheDico_[ file, eventName, idA, idB, idC, idD, minFrame, maxFrame, loadEventIndependently ] = eventTimeLine
+        eventCacheSizeDico_[ file, eventName, idA, idB, idC, idD, minFrame, maxFrame, loadEventIndependently ] = getEventTimeLineSize( eventTimeLine )
+        _evictEventTimeLines()
     else:
         print( "Loading event from base (Cache event disabled)")
     
     return eventTimeLine
         
+def _getCachedEventTimeLine( key ):
+    if eventCacheEnable_ == True and key in eventCacheDico_:
+        eventCacheDico_.move_to_end( key )
+        eventCacheStats_["hits"] += 1
+        addMetricCounter( "eventCacheHits" )
+        return eventCacheDico_[key]
+    return None
+
+def _cacheEventTimeLine( key, eventTimeLine ):
+    if eventCacheEnable_ == True:
+        eventCacheDico_[key] = eventTimeLine
+        eventCacheSizeDico_[key] = getEventTimeLineSize( eventTimeLine )
+
+def loadEventTimeLinesCached( connection, file, keyList, minFrame=None, maxFrame=None ):
+    '''
+    loads many timelines of the window [minFrame, maxFrame] with one query per event name, instead of one query
+    per timeline. keyList: tuples ( eventName, idA, idB, idC, idD ), the missing ids are None
+    (for instance ( "Contact", 1, 2 ) ). A None id matches any animal. EventTimeLine turns the ids at 0 into None
+    (USV support): a 0 id matches any animal too, so that the timelines are the ones of EventTimeLineCached for the
+    same key.
+    The rows are split in memory, and the timelines are the same as the ones of EventTimeLineCached (clipped to the
+    window, overlapping events merged). They are stored in the cache, so that the next EventTimeLineCached calls
+    with the same parameters do not query the database.
+    returns a dictionary: key of keyList -> EventTimeLine
+    '''
+    result = {}
+    missingDic = {}
+    for key in keyList:
+        eventName, idA, idB, idC, idD = ( tuple( key ) + ( None, ) * 4 )[:5]
+        cacheKey = ( file, eventName, idA, idB, idC, idD, minFrame, maxFrame, False )
+        eventTimeLine = _getCachedEventTimeLine( cacheKey )
+        if eventTimeLine != None:
+            result[key] = eventTimeLine
+            continue
+        missingDic.setdefault( eventName, [] ).append( ( key, cacheKey ) )
+
+    for eventName, missingList in missingDic.items():
+
+        eventCacheStats_["misses"] += len( missingList )
+        addMetricCounter( "eventCacheMisses", len( missingList ) )
+        usePersistentCache = isPersistentCacheUsable( connection, file )
+        if usePersistentCache:
+            state = getEventTableState( connection, eventName )
+            loadList = []
+            for key, cacheKey in missingList:
+                persistentKey = ( os.path.basename( str( file ) ), str( eventName ) ) + cacheKey[2:8]
+                eventTimeLine = _loadPersistentEventTimeLine( file, persistentKey, state, *cacheKey[1:6] )
+                if eventTimeLine == None:
+                    loadList.append( ( key, cacheKey ) )
+                    continue
+                result[key] = eventTimeLine
+                _cacheEventTimeLine( cacheKey, eventTimeLine )
+            missingList = loadList
+
+        if len( missingList ) == 0:
+            continue
+
+        chrono = MetricSpan( "Load event", event=str( eventName ) )
+        query = "SELECT IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, STARTFRAME, ENDFRAME FROM EVENT WHERE NAME=?"
+        parameterList = [ str( eventName ) ]
+        if ( minFrame != None ):
+            query += " AND ENDFRAME>=?"
+            parameterList.append( minFrame )
+        if ( maxFrame != None ):
+            query += " AND STARTFRAME<=?"
+            parameterList.append( maxFrame )
+
+        cursor = connection.cursor()
+        cursor.execute( query, parameterList )
+        all_rows = cursor.fetchall()
+        cursor.close()
+        addMetricCounter( "rowsFetched", len( all_rows ) )
+
+        # NULL ids become -1: they only match the None ids of the keys
+        table = np.array( [ [ -1 if value == None else value for value in row ] for row in all_rows ], dtype=np.int64 ).reshape( -1, 6 )
+
+        for key, cacheKey in missingList:
+            keep = np.ones( len( table ), dtype=bool )
+            for column, animalId in enumerate( cacheKey[2:6] ):
+                # ids at 0 are not used in the query of EventTimeLine
+                if animalId != None and animalId != 0:
+                    keep &= table[:, column] == animalId
+            starts, ends = clipIntervals( table[keep, 4], table[keep, 5], minFrame, maxFrame )
+
+            eventTimeLine = EventTimeLine( None, eventName, *cacheKey[2:6], loadEvent = False )
+            eventTimeLine.reBuildWithIntervals( starts, ends )
+            if usePersistentCache:
+                persistentKey = ( os.path.basename( str( file ) ), str( eventName ) ) + cacheKey[2:8]
+                _savePersistentEventTimeLine( file, persistentKey, state, eventTimeLine )
+            result[key] = eventTimeLine
+            _cacheEventTimeLine( cacheKey, eventTimeLine )
+
+        chrono.stop()
+        print( eventName, ":", len( missingList ), "timelines loaded with one query (", len( all_rows ), "records in", chrono.getTimeInS(), "S )" )
+
+    _evictEventTimeLines()
+    return result
+
 def flushEventTimeLineCache():
-    eventCacheDico_.clear()
\ No newline at end of file
+    eventCacheDico_.clear()
+    eventCacheSizeDico_.clear()
+
+
+class TestEventTimeLineCache ( unittest.TestCase ):
+
+    def test_LoadedTimeLinesAsEventTimeLineCached(self):
+
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 3000, withMask = False, seed = 2 )
+                connection = sqlite3.connect( file )
+                try:
+                    # events stored with the id 0 (as the USV events) and without id B
+                    connection.executemany( "INSERT INTO EVENT ( NAME, STARTFRAME, ENDFRAME, IDANIMALA, IDANIMALB ) VALUES ( 'Contact', ?, ?, 0, ? )", [ ( 100, 120, 1 ), ( 500, 530, 0 ), ( 2990, 3100, 2 ) ] )
+                    connection.executemany( "INSERT INTO EVENT ( NAME, STARTFRAME, ENDFRAME, IDANIMALA ) VALUES ( 'Contact', ?, ?, ? )", [ ( 1000, 1010, 1 ), ( 1200, 1300, None ) ] )
+                    connection.commit()
+
+                    keyList = [ ( "Contact", idA, idB ) for idA in ( None, 0, 1, 2 ) for idB in ( None, 0, 1, 3 ) ] + [ ( "Stop", 1 ), ( "Stop", ), ( "Approach", 2, 1, None, None ), ( "Nothing", 1 ) ]
+                    for minFrame, maxFrame in ( ( None, None ), ( 400, 2999 ) ):
+                        flushEventTimeLineCache()
+                        loadedDic = loadEventTimeLinesCached( connection, file, keyList, minFrame=minFrame, maxFrame=maxFrame )
+                        flushEventTimeLineCache()
+                        for key in keyList:
+                            referenceTimeLine = EventTimeLineCached( connection, file, *key, minFrame=minFrame, maxFrame=maxFrame )
+                            self.assertEqual( [ ( event.startFrame, event.endFrame ) for event in loadedDic[key].eventList ],
+                                              [ ( event.startFrame, event.endFrame ) for event in referenceTimeLine.eventList ], ( key, minFrame, maxFrame ) )
+                            self.assertEqual( ( loadedDic[key].idA, loadedDic[key].idB ), ( referenceTimeLine.idA, referenceTimeLine.idB ) )
+                finally:
+                    flushEventTimeLineCache()
+                    connection.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+EventTransaction currently open on each connection ( see Event.EventTransaction ).
+
+Kept in a module without dependencies so that the modules writing in the base outside of the events (TaskLogger)
+can know if their writes are committed by an EventTransaction without importing Event (and matplotlib).
+'''
+
+''' EventTransaction currently open on a connection ( id( connection ) -> EventTransaction ) '''
+eventTransactionDico_ = {}
+
+
+def getEventTransaction( connection ):
+    return eventTransactionDico_.get( id( connection ) )
+
+def setEventTransaction( connection, transaction ):
+    eventTransactionDico_[ id( connection ) ] = transaction
+
+def removeEventTransaction( connection ):
+    eventTransactionDico_.pop( id( connection ), None )
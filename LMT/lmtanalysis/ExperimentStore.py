@@ -0,0 +1,486 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Consolidated columnar store of many LMT databases, for analyses over several experiments.
+
+Each database is read once ( addFiles ) and stored as numpy arrays in a folder:
+    animals: metadata of the animals ( RFID, name, genotype, sex, age, strain, scale factor )
+    events: all the events, as intervals ( event name, ids of the animals, start and end frames )
+    nights: the "night" events, merged
+    detections: frame and mass center of the detections of each animal ( per-frame kinematics )
+
+The store is keyed by experiment and file. A file already in the store is only read again if it changed
+( size or modification time ), so new files can be added to an existing store:
+
+    store = ExperimentStore( "/data/store" )
+    store.addFiles( files, experiment = "cohort 1" )
+    windowTable = store.getWindowTable( minFrame = 0, maxFrame = 3*oneDay, nights = True )
+    profileData = store.computeProfiles( behaviouralEventOneMouse, windowTable )
+
+The profiles are computed as grouped aggregations on the tables of all the files at once (see getEventProfileTable
+and getDistanceTable), and computeProfiles returns the dictionary of computeProfile in
+ComputeMeasuresIdentityProfileOneMouseAutomatic: profileData[file][window][rfid].
+'''
+
+import io
+import os
+import json
+import hashlib
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from lmtanalysis.Interval import normalizeGroupedIntervals
+from lmtanalysis.Kinematics import MAX_DISTANCE_BETWEEN_FRAMES
+from lmtanalysis.ColumnarExport import getDetectionColumns, FETCH_SIZE
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
+
+''' version of the layout of the parts (a part of another version is read again from its database) '''
+STORE_VERSION = 1
+
+''' fields of the animals kept in the store '''
+ANIMAL_FIELDS = ( "RFID", "name", "genotype", "sex", "age", "strain", "setup", "user1" )
+
+''' metadata of the animals in the profiles, in the order of computeProfile '''
+PROFILE_FIELDS = ( "animal", "file", "rfid", "genotype", "sex", "group", "strain", "age" )
+
+
+def getFileKey( file ):
+    return os.path.realpath( os.path.abspath( str( file ) ) )
+
+def getFileState( file ):
+    ''' size and modification time of the database '''
+    stat = os.stat( file )
+    return [ stat.st_size, stat.st_mtime_ns ]
+
+def loadEventRows( connection ):
+    '''
+    all the events of the database. returns the list of event names and an int64 array of rows:
+    name index, idA, idB, idC, idD ( 0 for no animal ), startFrame, endFrame
+    '''
+    cursor = connection.cursor()
+    cursor.execute( "SELECT DISTINCT NAME FROM EVENT" )
+    nameList = sorted( str( row[0] ) for row in cursor.fetchall() )
+    nameIndex = { name: i for i, name in enumerate( nameList ) }
+
+    cursor.execute( "SELECT NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, STARTFRAME, ENDFRAME FROM EVENT" )
+    tableList = [ np.zeros( ( 0, 7 ), dtype=np.int64 ) ]
+    while True:
+        rows = cursor.fetchmany( FETCH_SIZE )
+        if len( rows ) == 0:
+            break
+        tableList.append( np.array( [ [ nameIndex[str( row[0] )] ] + [ 0 if value == None else value for value in row[1:] ] for row in rows ], dtype=np.int64 ) )
+    cursor.close()
+
+    return nameList, np.concatenate( tableList )
+
+def getEventProfileTable( eventTable, windowTable, animalTable, eventNameList, perAnimal = True, mergeGap = 1, minLength = 3 ):
+    '''
+    for each window, animal and event name: the events of the animal (as animal A) in the window, merged when separated
+    by mergeGap frames or less, and without the events shorter than minLength frames (as computeProfile does with
+    mergeCloseEvents( 1 ) and removeEventsBelowLength( 3 )).
+    eventTable: file, eventName, idA, startFrame, endFrame ( see ExperimentStore.getEventTable )
+    windowTable: file, window, minFrame, maxFrame ( nan for no limit )
+    animalTable: file, animalId ( one row per animal )
+    perAnimal = False takes the events of all the animals together ( animalId is 0 ).
+    returns a DataFrame: file, window, animalId, eventName, TotalLen, Nb, MeanDur ( one row for each window,
+    animal and event name, with 0 events included )
+    '''
+    animalTable = animalTable[ [ "file", "animalId" ] ]
+    if not perAnimal:
+        animalTable = animalTable[ [ "file" ] ].drop_duplicates().assign( animalId = 0 )
+
+    targetTable = windowTable[ [ "file", "window", "minFrame", "maxFrame" ] ].merge( animalTable, on="file" )
+    targetTable = targetTable.merge( pd.DataFrame( { "eventName": list( eventNameList ) } ), how="cross" )
+    targetTable["target"] = np.arange( len( targetTable ) )
+
+    events = eventTable[ eventTable["eventName"].isin( eventNameList ) ]
+    events = events[ [ "file", "eventName", "idA", "startFrame", "endFrame" ] ].assign( eventName = events["eventName"].astype( str ) )
+    if perAnimal:
+        events = events.rename( columns = { "idA": "animalId" } )
+    else:
+        events = events.drop( columns = [ "idA" ] ).assign( animalId = 0 )
+    events = events.merge( targetTable, on=[ "file", "animalId", "eventName" ] )
+
+    # events clipped to their window
+    starts = np.fmax( events["startFrame"].to_numpy( dtype=np.float64 ), events["minFrame"].to_numpy( dtype=np.float64 ) )
+    ends = np.fmin( events["endFrame"].to_numpy( dtype=np.float64 ), events["maxFrame"].to_numpy( dtype=np.float64 ) )
+    targets, starts, ends = normalizeGroupedIntervals( events["target"].to_numpy(), starts.astype( np.int64 ), ends.astype( np.int64 ), maxGap = mergeGap )
+
+    duration = ends - starts + 1
+    keep = duration >= minLength
+    nbEvent = np.bincount( targets[keep], minlength=len( targetTable ) )
+    totalLength = np.bincount( targets[keep], weights=duration[keep], minlength=len( targetTable ) ).astype( np.int64 )
+
+    result = targetTable[ [ "file", "window", "animalId", "eventName" ] ].copy()
+    result["TotalLen"] = totalLength
+    result["Nb"] = nbEvent
+    result["MeanDur"] = totalLength / np.maximum( nbEvent, 1 )
+    return result
+
+def getDistanceTable( detectionTable, windowTable, animalTable ):
+    '''
+    for each window and animal: distance traveled in cm ( as Animal.getDistance( minFrame, maxFrame ) with the
+    detections of the window: moves t -> t+1 for t in [minFrame, maxFrame[, tracking jumps excluded ).
+    detectionTable: file, animalId, frame, massX, massY
+    animalTable: file, animalId, scaleFactor
+    returns a DataFrame: file, window, animalId, distance
+    '''
+    targetTable = windowTable[ [ "file", "window", "minFrame", "maxFrame" ] ].merge( animalTable[ [ "file", "animalId", "scaleFactor" ] ], on="file" )
+
+    # one integer per file and animal, detections sorted by track then frame
+    trackTable = animalTable[ [ "file", "animalId" ] ].drop_duplicates().reset_index( drop=True )
+    trackTable["track"] = np.arange( len( trackTable ) )
+    detections = detectionTable[ [ "file", "animalId", "frame", "massX", "massY" ] ].merge( trackTable, on=[ "file", "animalId" ] )
+    detections = detections.sort_values( [ "track", "frame" ], kind="stable" )
+    track = detections["track"].to_numpy( dtype=np.int64 )
+    frame = detections["frame"].to_numpy( dtype=np.int64 )
+    massX = detections["massX"].to_numpy( dtype=np.float64 )
+    massY = detections["massY"].to_numpy( dtype=np.float64 )
+
+    # moves between detections of consecutive frames of the same animal
+    step = np.hypot( np.diff( massX ), np.diff( massY ) )
+    valid = ( track[1:] == track[:-1] ) & ( frame[1:] == frame[:-1] + 1 ) & ( step <= MAX_DISTANCE_BETWEEN_FRAMES )
+    stepTrack = track[:-1][valid]
+    stepFrame = frame[:-1][valid]
+    cumulative = np.concatenate( ( [0], np.cumsum( step[valid] ) ) )
+
+    # moves t -> t+1 with t in [minFrame, maxFrame[ of each window, found by binary search on ( track, frame )
+    targets = targetTable.merge( trackTable, on=[ "file", "animalId" ] )
+    minFrame = targets["minFrame"].fillna( np.iinfo( np.int32 ).min ).to_numpy( dtype=np.int64 )
+    maxFrame = targets["maxFrame"].fillna( np.iinfo( np.int32 ).max ).to_numpy( dtype=np.int64 )
+    stepKey = stepTrack.astype( np.int64 ) * ( 1 << 33 ) + stepFrame
+    trackKey = targets["track"].to_numpy( dtype=np.int64 ) * ( 1 << 33 )
+    first = np.searchsorted( stepKey, trackKey + minFrame, side="left" )
+    last = np.searchsorted( stepKey, trackKey + maxFrame, side="left" )
+    last = np.maximum( last, first )
+
+    result = targets[ [ "file", "window", "animalId" ] ].copy()
+    result["distance"] = ( cumulative[last] - cumulative[first] ) * targets["scaleFactor"].to_numpy()
+    return result
+
+def getProfileData( animalTable, profileTable, distanceTable = None, fieldList = PROFILE_FIELDS ):
+    '''
+    profileData[file][window][rfid] as computed by computeProfile ( ComputeMeasuresIdentityProfileOneMouseAutomatic ):
+    metadata of the animal ( fields of fieldList ), eventName + " TotalLen", " Nb" and " MeanDur", and totalDistance (in m).
+    '''
+    profileData = {}
+    animalDic = { ( row["file"], row["animalId"] ): row for row in animalTable.to_dict( "records" ) }
+
+    # group: sorted RFIDs of the animals of the file
+    groupDic = {}
+    for file, table in animalTable.groupby( "file", sort=False ):
+        groupDic[file] = "_".join( sorted( str( rfid ) for rfid in table["RFID"] ) )
+
+    def getAnimalData( file, window, animalId ):
+        animal = animalDic[file, animalId]
+        windowData = profileData.setdefault( file, {} ).setdefault( window, {} )
+        if animal["RFID"] not in windowData:
+            valueDic = { "animal": animal["name"], "file": animal["path"], "rfid": animal["RFID"], "genotype": animal["genotype"], "sex": animal["sex"], "group": groupDic[file], "strain": animal["strain"], "age": animal["age"] }
+            windowData[animal["RFID"]] = { field: valueDic[field] for field in fieldList }
+        return windowData[animal["RFID"]]
+
+    for row in profileTable.to_dict( "records" ):
+        animalData = getAnimalData( row["file"], row["window"], row["animalId"] )
+        animalData[row["eventName"] + " TotalLen"] = int( row["TotalLen"] )
+        animalData[row["eventName"] + " Nb"] = int( row["Nb"] )
+        animalData[row["eventName"] + " MeanDur"] = row["MeanDur"] if row["Nb"] > 0 else 0
+
+    if distanceTable is not None:
+        for row in distanceTable.to_dict( "records" ):
+            getAnimalData( row["file"], row["window"], row["animalId"] )["totalDistance"] = row["distance"] / 100
+
+    return profileData
+
+
+class ExperimentStore():
+
+    def __init__(self, folder ):
+
+        self.folder = folder
+        self.manifestFile = os.path.join( folder, "manifest.json" )
+        self.partCache = {}
+        self.manifest = { "version": STORE_VERSION, "files": {} }
+        if os.path.isfile( self.manifestFile ):
+            with open( self.manifestFile ) as f:
+                self.manifest = json.load( f )
+
+    def saveManifest(self):
+        os.makedirs( self.folder, exist_ok = True )
+        # write then rename, so that the manifest is never partially written
+        tmpFile = self.manifestFile + ".tmp"
+        with open( tmpFile, "w" ) as f:
+            json.dump( self.manifest, f, indent=4 )
+        os.replace( tmpFile, self.manifestFile )
+
+    def getPartFile(self, fileKey ):
+        name = os.path.splitext( os.path.basename( fileKey ) )[0]
+        return os.path.join( self.folder, "{}_{}.npz".format( name, hashlib.sha1( fileKey.encode( "utf-8" ) ).hexdigest()[:12] ) )
+
+    def getFileList(self, experiment = None ):
+        return [ entry["path"] for entry in self.manifest["files"].values() if experiment == None or entry["experiment"] == experiment ]
+
+    def isUpToDate(self, file, experiment ):
+        entry = self.manifest["files"].get( getFileKey( file ) )
+        if entry == None or entry["version"] != STORE_VERSION or entry["experiment"] != experiment:
+            return False
+        return entry["state"] == getFileState( file ) and os.path.isfile( entry["part"] )
+
+    def addFiles(self, fileList, experiment = None, withDetection = True ):
+        '''
+        adds the databases to the store ( again if they changed since they were added ).
+        experiment: name of the experiment of the files, by default the name of the folder of each file.
+        withDetection = False does not store the detections ( no distance computation ).
+        '''
+        for file in fileList:
+            fileExperiment = experiment if experiment != None else os.path.basename( os.path.dirname( getFileKey( file ) ) )
+            if self.isUpToDate( file, fileExperiment ):
+                print( "Experiment store: {} already in store".format( file ) )
+                continue
+            self.addFile( file, fileExperiment, withDetection )
+            self.saveManifest()
+
+    def addFile(self, file, experiment, withDetection ):
+
+        # AnimalPool imports ColumnarExport
+        from lmtanalysis.Animal import AnimalPool
+
+        print( "Experiment store: adding {} ( experiment {} )".format( file, experiment ) )
+        fileKey = getFileKey( file )
+        state = getFileState( file )
+        connection = getReadOnlyConnection( file )
+
+        pool = AnimalPool()
+        pool.loadAnimals( connection )
+        animalList = []
+        for animal in sorted( pool.getAnimalList(), key=lambda animal: animal.baseId ):
+            animalData = { "animalId": animal.baseId, "scaleFactor": animal.parameters.scaleFactor }
+            for field in ANIMAL_FIELDS:
+                value = getattr( animal, field )
+                animalData[field] = value if value == None or isinstance( value, ( int, float ) ) else str( value )
+            animalList.append( animalData )
+
+        nameList, eventTable = loadEventRows( connection )
+
+        # nights: the "night" events of any animal, merged
+        nightRows = eventTable[ eventTable[:, 0] == nameList.index( "night" ) ] if "night" in nameList else eventTable[:0]
+        groups, nightStarts, nightEnds = normalizeGroupedIntervals( np.zeros( len( nightRows ), dtype=np.int64 ), nightRows[:, 5], nightRows[:, 6] )
+
+        if withDetection:
+            columns = getDetectionColumns( connection )
+        else:
+            columns = { "animalId": np.zeros( 0, dtype=np.int64 ), "frame": np.zeros( 0, dtype=np.int64 ), "massX": np.zeros( 0 ), "massY": np.zeros( 0 ) }
+
+        partFile = self.getPartFile( fileKey )
+        os.makedirs( self.folder, exist_ok = True )
+        tmpFile = partFile[:-4] + "_tmp.npz"
+        np.savez( tmpFile, eventName = np.array( nameList, dtype=str ), event = eventTable,
+                  nightStart = nightStarts, nightEnd = nightEnds,
+                  detectionAnimalId = columns["animalId"].astype( np.int32 ), detectionFrame = columns["frame"].astype( np.int32 ),
+                  detectionMassX = columns["massX"], detectionMassY = columns["massY"] )
+        os.replace( tmpFile, partFile )
+
+        self.partCache.pop( fileKey, None )
+        self.manifest["files"][fileKey] = { "path": str( file ), "experiment": experiment, "state": state, "version": STORE_VERSION,
+                                            "part": partFile, "animals": animalList, "withDetection": withDetection }
+
+    def removeFiles(self, fileList ):
+        for file in fileList:
+            entry = self.manifest["files"].pop( getFileKey( file ), None )
+            if entry != None and os.path.isfile( entry["part"] ):
+                os.remove( entry["part"] )
+            self.partCache.pop( getFileKey( file ), None )
+        self.saveManifest()
+
+    def getPart(self, fileKey ):
+        if fileKey not in self.partCache:
+            with np.load( self.manifest["files"][fileKey]["part"] ) as data:
+                self.partCache[fileKey] = { key: data[key] for key in data.files }
+        return self.partCache[fileKey]
+
+    def getFileKeyList(self, fileList = None ):
+        if fileList == None:
+            return list( self.manifest["files"].keys() )
+        return [ getFileKey( file ) for file in fileList ]
+
+    def getAnimalTable(self, fileList = None ):
+        '''
+        one row per animal: experiment, file, path, animalId, scaleFactor and the fields of ANIMAL_FIELDS.
+        file is the key of the database in the store (its real path), path the name it was added with.
+        '''
+        rowList = []
+        for fileKey in self.getFileKeyList( fileList ):
+            entry = self.manifest["files"][fileKey]
+            for animalData in entry["animals"]:
+                rowList.append( dict( animalData, experiment = entry["experiment"], file = fileKey, path = entry["path"] ) )
+        return pd.DataFrame( rowList, columns = [ "experiment", "file", "path", "animalId", "scaleFactor" ] + list( ANIMAL_FIELDS ) )
+
+    def getEventTable(self, eventNameList = None, fileList = None ):
+        '''
+        one row per event: experiment, file, eventName, idA, idB, idC, idD ( 0 for no animal ), startFrame, endFrame
+        '''
+        tableList = []
+        for fileKey in self.getFileKeyList( fileList ):
+            part = self.getPart( fileKey )
+            nameList = [ str( name ) for name in part["eventName"] ]
+            event = part["event"]
+            if eventNameList != None:
+                event = event[ np.isin( event[:, 0], [ i for i, name in enumerate( nameList ) if name in eventNameList ] ) ]
+            table = pd.DataFrame( event[:, 1:], columns = [ "idA", "idB", "idC", "idD", "startFrame", "endFrame" ] )
+            table.insert( 0, "eventName", pd.Categorical.from_codes( event[:, 0], categories = nameList ) if len( nameList ) > 0 else pd.Categorical( [] ) )
+            table.insert( 0, "file", fileKey )
+            table.insert( 0, "experiment", self.manifest["files"][fileKey]["experiment"] )
+            tableList.append( table )
+
+        if len( tableList ) == 0:
+            return pd.DataFrame( columns = [ "experiment", "file", "eventName", "idA", "idB", "idC", "idD", "startFrame", "endFrame" ] )
+        # the event names of the files are different categories
+        table = pd.concat( tableList, ignore_index = True )
+        table["eventName"] = table["eventName"].astype( str )
+        return table
+
+    def getNightTable(self, fileList = None ):
+        '''
+        one row per night: experiment, file, night ( from 1 ), startFrame, endFrame
+        '''
+        tableList = []
+        for fileKey in self.getFileKeyList( fileList ):
+            part = self.getPart( fileKey )
+            tableList.append( pd.DataFrame( { "experiment": self.manifest["files"][fileKey]["experiment"], "file": fileKey,
+                                              "night": np.arange( 1, len( part["nightStart"] ) + 1 ), "startFrame": part["nightStart"], "endFrame": part["nightEnd"] } ) )
+        if len( tableList ) == 0:
+            return pd.DataFrame( columns = [ "experiment", "file", "night", "startFrame", "endFrame" ] )
+        return pd.concat( tableList, ignore_index = True )
+
+    def getDetectionTable(self, fileList = None ):
+        '''
+        one row per detection: experiment, file, animalId, frame, massX, massY
+        '''
+        tableList = []
+        for fileKey in self.getFileKeyList( fileList ):
+            part = self.getPart( fileKey )
+            tableList.append( pd.DataFrame( { "experiment": self.manifest["files"][fileKey]["experiment"], "file": fileKey,
+                                              "animalId": part["detectionAnimalId"].astype( np.int64 ), "frame": part["detectionFrame"].astype( np.int64 ),
+                                              "massX": part["detectionMassX"], "massY": part["detectionMassY"] } ) )
+        if len( tableList ) == 0:
+            return pd.DataFrame( columns = [ "experiment", "file", "animalId", "frame", "massX", "massY" ] )
+        return pd.concat( tableList, ignore_index = True )
+
+    def getWindowTable(self, minFrame = None, maxFrame = None, nights = False, fileList = None ):
+        '''
+        windows of the profiles: [minFrame, maxFrame] of each file ( window 0 ), or with nights = True,
+        the nights of each file in [minFrame, maxFrame] ( windows 1, 2... ), as in the night option of the profile script.
+        '''
+        fileKeyList = self.getFileKeyList( fileList )
+        if not nights:
+            return pd.DataFrame( { "file": fileKeyList, "window": 0, "minFrame": np.nan if minFrame == None else minFrame, "maxFrame": np.nan if maxFrame == None else maxFrame } )
+
+        nightTable = self.getNightTable( fileKeyList )
+        starts = nightTable["startFrame"].to_numpy( dtype=np.float64 )
+        ends = nightTable["endFrame"].to_numpy( dtype=np.float64 )
+        if minFrame != None:
+            starts = np.maximum( starts, minFrame )
+        if maxFrame != None:
+            ends = np.minimum( ends, maxFrame )
+        windowTable = pd.DataFrame( { "file": nightTable["file"], "minFrame": starts, "maxFrame": ends } )[ starts <= ends ]
+        windowTable.insert( 1, "window", windowTable.groupby( "file" ).cumcount() + 1 )
+        return windowTable.reset_index( drop = True )
+
+    def computeProfiles(self, eventNameList, windowTable, withDistance = True ):
+        '''
+        profiles of all the animals of the files of windowTable ( see getWindowTable ), for all the files at once.
+        returns profileData[path][window][rfid] ( see getProfileData )
+        '''
+        fileList = list( dict.fromkeys( windowTable["file"] ) )
+        animalTable = self.getAnimalTable( fileList )
+        profileTable = getEventProfileTable( self.getEventTable( eventNameList, fileList ), windowTable, animalTable, eventNameList )
+
+        distanceTable = None
+        if withDistance:
+            distanceTable = getDistanceTable( self.getDetectionTable( fileList ), windowTable, animalTable )
+
+        profileData = getProfileData( animalTable, profileTable, distanceTable )
+        # keyed by the names the files were added with
+        pathDic = dict( zip( animalTable["file"], animalTable["path"] ) )
+        return { pathDic.get( file, file ): data for file, data in profileData.items() }
+
+
+class TestExperimentStore ( unittest.TestCase ):
+
+    def assertSameProfiles(self, profileData, referenceData ):
+        self.assertEqual( sorted( profileData ), sorted( referenceData ) )
+        for window in referenceData:
+            self.assertEqual( sorted( profileData[window] ), sorted( referenceData[window] ) )
+            for rfid, data in referenceData[window].items():
+                self.assertEqual( sorted( profileData[window][rfid] ), sorted( data ) )
+                for key, value in data.items():
+                    if key == "totalDistance":
+                        self.assertAlmostEqual( profileData[window][rfid][key], value, places=6 )
+                    else:
+                        self.assertEqual( profileData[window][rfid][key], value, ( window, rfid, key ) )
+
+    def assertSameProfilesAsEngine(self, store, fileList, eventNameList ):
+        '''
+        profiles of the store and of ProfileEngine ( one file at a time, from the databases ) for a window and for the nights
+        '''
+        from lmtanalysis.ProfileEngine import computeFileProfile, getWindowList
+
+        for nights in ( False, True ):
+            profileData = store.computeProfiles( eventNameList, store.getWindowTable( minFrame = 500, maxFrame = 5499, nights = nights ) )
+            self.assertEqual( sorted( profileData ), sorted( fileList ) )
+            for file in fileList:
+                connection = getReadOnlyConnection( file )
+                windowList = getWindowList( connection, 500, 5499, nights )
+                connection.close()
+                self.assertEqual( len( windowList ), 2 if nights else 1 )
+                self.assertSameProfiles( profileData[file], computeFileProfile( file, windowList, eventNameList ) )
+
+    def test_SameProfilesAsProfileEngine(self):
+
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        eventNameList = [ "Stop", "Contact", "Approach", "Break contact", "Nothing" ]
+        with tempfile.TemporaryDirectory() as folder:
+            fileList = [ os.path.join( folder, "test{}.sqlite".format( n ) ) for n in range( 2 ) ]
+            with contextlib.redirect_stdout( io.StringIO() ):
+                for n, file in enumerate( fileList ):
+                    createSyntheticDatabase( file, nbFrame = 6000, withMask = False, seed = 10 + n )
+                    connection = sqlite3.connect( file )
+                    # two nights, one of them in two parts
+                    connection.executemany( "INSERT INTO EVENT ( NAME, STARTFRAME, ENDFRAME ) VALUES ( 'night', ?, ? )", [ ( 0, 1999 ), ( 3000, 3999 ), ( 4000, 6999 ) ] )
+                    connection.commit()
+                    connection.close()
+
+                store = ExperimentStore( os.path.join( folder, "store" ) )
+                store.addFiles( fileList, experiment = "test" )
+                self.assertSameProfilesAsEngine( store, fileList, eventNameList )
+
+                # a file changed since it was added is read again, the other one is not
+                connection = sqlite3.connect( fileList[1] )
+                connection.execute( "DELETE FROM EVENT WHERE NAME='Stop' AND IDANIMALA=1 AND STARTFRAME>=3000" )
+                connection.execute( "INSERT INTO EVENT ( NAME, STARTFRAME, ENDFRAME, IDANIMALA ) VALUES ( 'Nothing', 1000, 1100, 2 )" )
+                connection.commit()
+                connection.close()
+                self.assertFalse( store.isUpToDate( fileList[1], "test" ) )
+                partTime = os.stat( store.manifest["files"][getFileKey( fileList[0] )]["part"] ).st_mtime_ns
+
+                output = io.StringIO()
+                with contextlib.redirect_stdout( output ):
+                    ExperimentStore( os.path.join( folder, "store" ) ).addFiles( fileList, experiment = "test" )
+                store = ExperimentStore( os.path.join( folder, "store" ) )
+                self.assertSameProfilesAsEngine( store, fileList, eventNameList )
+                self.assertEqual( os.stat( store.manifest["files"][getFileKey( fileList[0] )]["part"] ).st_mtime_ns, partTime )
+                profileData = store.computeProfiles( eventNameList, store.getWindowTable( minFrame = 500, maxFrame = 5499 ) )
+
+        self.assertIn( "{} already in store".format( fileList[0] ), output.getvalue() )
+        self.assertNotIn( "{} already in store".format( fileList[1] ), output.getvalue() )
+        # the new event of the changed file is in its profile
+        self.assertEqual( [ data["Nothing Nb"] for data in profileData[fileList[1]][0].values() ], [ 0, 1, 0, 0 ] )
+
+if __name__ == '__main__':
+    unittest.main()
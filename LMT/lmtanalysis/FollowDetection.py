@@ -0,0 +1,166 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Follow detection for BuildEventFollowZone, computed with numpy instead of a loop over the frames.
+
+The direction vector (back to front) and the heading of each animal are computed once. A follows B at t when:
+    - A and B are detected at t and go the same way (scalar product of their direction vectors >= 0)
+    - B was where A is at t (distance <= FOLLOW_DISTANCE_MAX_PIX) at one frame of [t - FOLLOW_CORRIDOR_DURATION, t],
+    going the same way as A at t, with a heading less than FOLLOW_MAX_ANGLE apart.
+
+The frames where A and B go the same way are selected first, then each frame of the corridor is tested for all of
+them at once (one step per frame of the corridor instead of one step per frame and per frame of the corridor).
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+
+from lmtanalysis.PairGeometry import getDetectionArrays
+
+
+class FollowTrack():
+    '''
+    frames, mass center, direction vector and heading of the detections of an animal
+    '''
+    def __init__(self, animal ):
+
+        data = getDetectionArrays( animal )
+        self.frames = data["frame"]
+        self.massX = data["massX"]
+        self.massY = data["massY"]
+        self.vectX = data["frontX"] - data["backX"]
+        self.vectY = data["frontY"] - data["backY"]
+        self.heading = np.arctan2( self.vectY, self.vectX )
+
+    def getIndex(self, frames ):
+        '''
+        index of the detection of each frame, -1 if the animal is not detected
+        '''
+        if len( self.frames ) == 0:
+            return np.full( len( frames ), -1, dtype=np.int64 )
+        index = np.minimum( np.searchsorted( self.frames, frames ), len( self.frames ) - 1 )
+        return np.where( self.frames[index] == frames, index, -1 )
+
+
+class FollowEngine():
+
+    def __init__(self, pool, parameters ):
+        '''
+        the detections of the pool must be loaded (and filtered).
+        '''
+        self.parameters = parameters
+        self.trackDic = {}
+        for animalId, animal in pool.animalDictionary.items():
+            self.trackDic[animalId] = FollowTrack( animal )
+
+    def getFollowFrames(self, idA, idB ):
+        '''
+        frames where A follows B
+        '''
+        trackA = self.trackDic[idA]
+        trackB = self.trackDic[idB]
+
+        # frames where A and B are detected and go the same way
+        indexB = np.arange( len( trackB.frames ) )
+        indexA = trackA.getIndex( trackB.frames )
+        detected = indexA >= 0
+        indexA = indexA[detected]
+        indexB = indexB[detected]
+        sameWay = trackA.vectX[indexA] * trackB.vectX[indexB] + trackA.vectY[indexA] * trackB.vectY[indexB] >= 0
+        indexA = indexA[sameWay]
+        frames = trackB.frames[indexB[sameWay]]
+
+        massX = trackA.massX[indexA]
+        massY = trackA.massY[indexA]
+        vectX = trackA.vectX[indexA]
+        vectY = trackA.vectY[indexA]
+        heading = trackA.heading[indexA]
+
+        follow = np.zeros( len( frames ), dtype=bool )
+        for delay in range( self.parameters.FOLLOW_CORRIDOR_DURATION + 1 ):
+
+            # position of B delay frames before, for the frames not yet found
+            test = np.flatnonzero( ~follow )
+            indexPast = trackB.getIndex( frames[test] - delay )
+            found = indexPast >= 0
+            test = test[found]
+            indexPast = indexPast[found]
+
+            distance = np.hypot( massX[test] - trackB.massX[indexPast], massY[test] - trackB.massY[indexPast] )
+            sameWay = vectX[test] * trackB.vectX[indexPast] + vectY[test] * trackB.vectY[indexPast] >= 0
+            angle = trackB.heading[indexPast] - heading[test]
+            angleDifference = np.fabs( np.arctan2( np.sin( angle ), np.cos( angle ) ) )
+
+            follow[ test[ ( distance <= self.parameters.FOLLOW_DISTANCE_MAX_PIX ) & sameWay & ( angleDifference <= self.parameters.FOLLOW_MAX_ANGLE ) ] ] = True
+
+        return frames[follow]
+
+
+class TestFollowEngine ( unittest.TestCase ):
+
+    def addFollowers(self, connection, nbFrame ):
+        '''
+        animals 2 and 3 follow animal 1: their detections are the ones of animal 1 some frames before, with noise
+        '''
+        rng = np.random.default_rng( 3 )
+        rows = connection.execute( "SELECT FRAMENUMBER, MASS_X, MASS_Y, FRONT_X, FRONT_Y, BACK_X, BACK_Y FROM DETECTION WHERE ANIMALID=1" ).fetchall()
+        leaderDic = { row[0]: row[1:] for row in rows }
+        for animalId, delay, noise in ( ( 2, 8, 6.0 ), ( 3, 25, 10.0 ) ):
+            connection.execute( "DELETE FROM DETECTION WHERE ANIMALID=?", ( animalId, ) )
+            rowList = []
+            for t in range( nbFrame ):
+                if t - delay in leaderDic and rng.random() > 0.03:
+                    values = np.array( leaderDic[t - delay], dtype=float ) + rng.normal( 0, noise, 6 )
+                    rowList.append( ( t, animalId, *values.tolist() ) )
+            connection.executemany( "INSERT INTO DETECTION ( FRAMENUMBER, ANIMALID, MASS_X, MASS_Y, FRONT_X, FRONT_Y, BACK_X, BACK_Y ) VALUES ( ?,?,?,?,?,?,?,? )", rowList )
+        connection.commit()
+
+    def test_SameFramesAsIsAFollowingB(self):
+
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.AnimalType import AnimalType
+        from lmtanalysis.Parameters import getAnimalTypeParameters
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+        from lmtanalysis.BuildEventFollowZone import isAFollowingB
+
+        parameters = getAnimalTypeParameters( AnimalType.MOUSE )
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, withMask = False, seed = 3 )
+                connection = sqlite3.connect( file )
+                try:
+                    self.addFollowers( connection, 6000 )
+                    # detections filtered as BuildEventFollowZone does
+                    pool = AnimalPool( )
+                    pool.loadAnimals( connection )
+                    pool.loadDetection( start = 0, end = 5999 )
+                    pool.filterDetectionByInstantSpeed( parameters.SPEED_THRESHOLD_LOW*parameters.FOLLOW_SPEED_MULTIPLICATOR_THRESHOLD , 1000 )
+                    pool.filterDetectionToKeepOnlyHeadTailDetection()
+                finally:
+                    connection.close()
+
+        engine = FollowEngine( pool, parameters )
+        nbFollowFrame = 0
+        for idA in pool.animalDictionary:
+            for idB in pool.animalDictionary:
+                if idA == idB:
+                    continue
+                dicA = pool.animalDictionary[idA].detectionDictionary
+                dicB = pool.animalDictionary[idB].detectionDictionary
+                referenceFrames = [ t for t in sorted( dicB ) if isAFollowingB( t, dicA, dicB, parameters ) ]
+                self.assertEqual( engine.getFollowFrames( idA, idB ).tolist(), referenceFrames, ( idA, idB ) )
+                nbFollowFrame += len( referenceFrames )
+
+        # the followers are found
+        self.assertTrue( nbFollowFrame > 1000 )
+
+if __name__ == '__main__':
+    unittest.main()
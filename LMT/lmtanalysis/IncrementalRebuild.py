@@ -0,0 +1,354 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Incremental rebuild of the events of a database that is still recording.
+
+The last frame processed by Rebuild_All_Events is read in the LOG table. Only the end of the file is rebuilt:
+
+    contextStart             boundary               last processed frame            last frame
+        |------- halo ----------|------- halo ----------|---- new frames ---------------|
+
+- events stored after the boundary are removed, events crossing it are cut at the boundary.
+- the stored events after contextStart are set aside, so that the builders reading the events of the context only
+  find the new ones.
+- the builders run from contextStart so that they have the context they need (see BuildEventScheduler.getCumulativeHalos).
+- the new events before the boundary are removed, the ones crossing it are cut at the boundary, the stored events
+  set aside are restored, and the new events starting at the boundary are merged with the stored events ending just before it
+  (the metadata of both are merged, see mergeMetaData).
+
+The new events are the ones with an id above the last id of the table before the rebuild: the EVENT table must be
+created with AUTOINCREMENT so that the ids of the deleted events are not given again (see Event.hasEventIdSequence).
+A full rebuild is done otherwise.
+
+An incremental rebuild interrupted after prepare() is followed by a full rebuild: the "Incremental rebuild" log
+written by prepare() is then the last one, and no frame is considered processed.
+
+The halo is taken on both sides of the last processed frame: events that end close to the end of the previous
+rebuild can change with the new frames (length filters, merges, look-ahead).
+
+All the builders must declare their halo. The builders declaring usesWindowStatistics (mean body length) compute
+their statistics over the frames rebuilt instead of the whole window: their new events, and the events of the
+builders consuming them (ApproachRear), can differ slightly from the ones of a full rebuild.
+'''
+
+import io
+import os
+import json
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.Event import EventTransaction, hasEventIdSequence
+from lmtanalysis import BuildEventScheduler
+from lmtanalysis.RebuildCheckpoint import logIncrementalRebuild, FLUSH_LOG_PROCESS, INCREMENTAL_LOG_PROCESS
+
+''' name of the process logged in the LOG table at the end of a rebuild '''
+REBUILD_LOG_PROCESS = "Rebuild all events"
+
+''' columns of the stored events set aside during the rebuild '''
+EVENT_COLUMNS = [ "ID", "NAME", "DESCRIPTION", "STARTFRAME", "ENDFRAME", "IDANIMALA", "IDANIMALB", "IDANIMALC", "IDANIMALD", "METADATA" ]
+
+
+def getLastProcessedFrame( connection ):
+    '''
+    last frame processed by the last rebuild, or None. A flush or an incremental rebuild logged after the last
+    rebuild means that a rebuild was interrupted: the events are then not complete up to any frame.
+    '''
+    lastFrame = None
+    for log in TaskLogger( connection ).logList:
+        if log.process == REBUILD_LOG_PROCESS and log.tmax != None:
+            lastFrame = int( log.tmax )
+        elif log.process in ( FLUSH_LOG_PROCESS, INCREMENTAL_LOG_PROCESS ):
+            lastFrame = None
+    return lastFrame
+
+def getLastFrame( connection ):
+    ''' last frame recorded in the base, or None '''
+    cursor = connection.cursor()
+    cursor.execute( "SELECT MAX(FRAMENUMBER) FROM FRAME" )
+    lastFrame = cursor.fetchall()[0][0]
+    cursor.close()
+    return lastFrame
+
+def logRebuild( connection, tmin, tmax ):
+    TaskLogger( connection ).addLog( REBUILD_LOG_PROCESS, tmin=tmin, tmax=tmax )
+
+def mergeMetaData( storedMetaData, newMetaData ):
+    '''
+    METADATA of a stored event extended by a new event: the keys of the new event are added to the ones of the stored
+    event. When one of them is not a dictionary, the stored one is kept unless it is empty.
+    '''
+    try:
+        stored = json.loads( storedMetaData ) if storedMetaData != None else None
+        new = json.loads( newMetaData ) if newMetaData != None else None
+    except ValueError:
+        return storedMetaData
+    if isinstance( stored, dict ) and isinstance( new, dict ):
+        stored.update( new )
+        return json.dumps( stored )
+    if not stored and new != None:
+        return newMetaData
+    return storedMetaData
+
+
+class IncrementalRebuild():
+
+    def __init__(self, connection, eventClassList, minT, maxT ):
+
+        self.connection = connection
+        self.lastProcessedFrame = getLastProcessedFrame( connection )
+
+        lastFrame = getLastFrame( connection )
+        self.endFrame = maxT if lastFrame == None else min( maxT, lastFrame )
+
+        self.undeclaredList = [ ev for ev in eventClassList if not BuildEventScheduler.isDeclared( ev ) ]
+        self.noHaloList = [ ev for ev in eventClassList if not BuildEventScheduler.hasHalo( ev ) ]
+        # builders using statistics of the whole window, and the builders consuming their events
+        self.windowStatisticsList = [ ev for ev in eventClassList if getattr( ev, "usesWindowStatistics", False ) ]
+        statisticsEventNameList = [ eventName for ev in self.windowStatisticsList for eventName in getattr( ev, "producedEvents", [] ) ]
+        for ev in BuildEventScheduler.getDownstreamEventClassList( eventClassList, statisticsEventNameList ):
+            if ev not in self.windowStatisticsList:
+                self.windowStatisticsList.append( ev )
+        self.eventNameList = []
+        for ev in eventClassList:
+            if BuildEventScheduler.isDeclared( ev ):
+                self.eventNameList.extend( ev.producedEvents )
+
+        self.halo = None
+        if len( self.noHaloList ) == 0:
+            self.halo = max( BuildEventScheduler.getCumulativeHalos( eventClassList ).values(), default=0 )
+
+        self.boundaryFrame = None
+        self.contextStartFrame = None
+        if self.lastProcessedFrame != None and self.halo != None:
+            self.boundaryFrame = max( minT, self.lastProcessedFrame + 1 - self.halo )
+            self.contextStartFrame = max( minT, self.boundaryFrame - self.halo )
+
+        self.maxEventId = None
+        self.contextEventList = []
+
+    def canAppend(self):
+        '''
+        an incremental rebuild needs a previous rebuild, event ids that are not reused, and builders declaring the events
+        they produce and their halo.
+        '''
+        if self.lastProcessedFrame == None:
+            print( "Incremental rebuild: no complete previous rebuild in the LOG table." )
+            return False
+        if not hasEventIdSequence( self.connection ):
+            print( "Incremental rebuild: the event ids can be reused (EVENT without AUTOINCREMENT)." )
+            return False
+        if len( self.undeclaredList ) > 0:
+            print( "Incremental rebuild: produced events unknown for", [ ev.__name__ for ev in self.undeclaredList ] )
+            return False
+        if len( self.noHaloList ) > 0:
+            print( "Incremental rebuild: halo unknown for", [ ev.__name__ for ev in self.noHaloList ] )
+            return False
+        return True
+
+    def hasNewFrames(self):
+        return self.endFrame > self.lastProcessedFrame
+
+    def _getNameCondition(self):
+        return "NAME IN ({})".format( ",".join( "?" * len( self.eventNameList ) ) )
+
+    def prepare(self):
+        '''
+        removes the stored events after the boundary and cuts the ones crossing it.
+        The stored events after the context start are removed too, and kept in contextEventList until finish().
+        '''
+        print( "Incremental rebuild: last processed frame: {} boundary: {} context start: {} end: {}".format( self.lastProcessedFrame, self.boundaryFrame, self.contextStartFrame, self.endFrame ) )
+        if len( self.windowStatisticsList ) > 0:
+            print( "Incremental rebuild: statistics computed from the context start for", [ ev.__name__ for ev in self.windowStatisticsList ] )
+
+        # the checkpoints of the windows are no longer valid
+        logIncrementalRebuild( self.connection, self.boundaryFrame, self.endFrame )
+
+        cursor = self.connection.cursor()
+        cursor.execute( "SELECT MAX(ID) FROM EVENT" )
+        self.maxEventId = cursor.fetchall()[0][0] or 0
+
+        with EventTransaction( self.connection ):
+            cursor.execute( "DELETE FROM EVENT WHERE {} AND STARTFRAME>=?".format( self._getNameCondition() ), self.eventNameList + [ self.boundaryFrame ] )
+            print( "Incremental rebuild: {} events removed after the boundary".format( cursor.rowcount ) )
+            cursor.execute( "UPDATE EVENT SET ENDFRAME=? WHERE {} AND ENDFRAME>=?".format( self._getNameCondition() ), [ self.boundaryFrame - 1 ] + self.eventNameList + [ self.boundaryFrame ] )
+
+            # the builders read the events of the context: only the new ones must be found there
+            cursor.execute( "SELECT {} FROM EVENT WHERE {} AND ENDFRAME>=?".format( ",".join( EVENT_COLUMNS ), self._getNameCondition() ), self.eventNameList + [ self.contextStartFrame ] )
+            self.contextEventList = cursor.fetchall()
+            cursor.execute( "DELETE FROM EVENT WHERE {} AND ENDFRAME>=?".format( self._getNameCondition() ), self.eventNameList + [ self.contextStartFrame ] )
+            print( "Incremental rebuild: {} events set aside in the context".format( len( self.contextEventList ) ) )
+        cursor.close()
+
+    def finish(self):
+        '''
+        keeps the new events only from the boundary, restores the stored events of the context, and merges the events
+        crossing the boundary.
+        '''
+        cursor = self.connection.cursor()
+        newCondition = "{} AND ID>?".format( self._getNameCondition() )
+        newParameters = self.eventNameList + [ self.maxEventId ]
+
+        with EventTransaction( self.connection ):
+
+            cursor.execute( "DELETE FROM EVENT WHERE {} AND ENDFRAME<?".format( newCondition ), newParameters + [ self.boundaryFrame ] )
+            cursor.execute( "UPDATE EVENT SET STARTFRAME=? WHERE {} AND STARTFRAME<?".format( newCondition ), [ self.boundaryFrame ] + newParameters + [ self.boundaryFrame ] )
+            cursor.executemany( "INSERT INTO EVENT ( {} ) VALUES ( {} )".format( ",".join( EVENT_COLUMNS ), ",".join( "?" * len( EVENT_COLUMNS ) ) ), self.contextEventList )
+
+            # stored events ending just before the boundary
+            cursor.execute( "SELECT ID, METADATA, NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD FROM EVENT WHERE {} AND ID<=? AND ENDFRAME=?".format( self._getNameCondition() ), newParameters + [ self.boundaryFrame - 1 ] )
+            storedDic = { tuple( row[2:] ): row[:2] for row in cursor.fetchall() }
+
+            # new events starting at the boundary
+            cursor.execute( "SELECT ID, NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, ENDFRAME, METADATA FROM EVENT WHERE {} AND STARTFRAME=?".format( newCondition ), newParameters + [ self.boundaryFrame ] )
+            updateList = []
+            deleteList = []
+            for row in cursor.fetchall():
+                stored = storedDic.get( tuple( row[1:6] ) )
+                if stored != None:
+                    storedId, storedMetaData = stored
+                    updateList.append( ( row[6], mergeMetaData( storedMetaData, row[7] ), storedId ) )
+                    deleteList.append( ( row[0], ) )
+
+            cursor.executemany( "UPDATE EVENT SET ENDFRAME=?, METADATA=? WHERE ID=?", updateList )
+            cursor.executemany( "DELETE FROM EVENT WHERE ID=?", deleteList )
+            print( "Incremental rebuild: {} events merged at the boundary".format( len( updateList ) ) )
+
+        cursor.close()
+
+
+class TestIncrementalRebuild ( unittest.TestCase ):
+
+    def getEventClassList(self):
+        ''' builders of Rebuild_All_Events, without the ones using window statistics and the ones consuming their events '''
+        from lmtanalysis import BuildEventDetection, BuildEventOralOralContact, BuildEventOralGenitalContact, BuildEventSideBySide, BuildEventSideBySideOpposite, \
+            BuildEventTrain2, BuildEventTrain3, BuildEventTrain4, BuildEventMove, BuildEventFollowZone, BuildEventRear5, BuildEventCenterPeripheryLocation, \
+            BuildEventRearCenterPeriphery, BuildEventGetAway, BuildEventGroup2, BuildEventGroup3, BuildEventGroup4, BuildEventGroup3MakeBreak, \
+            BuildEventGroup4MakeBreak, BuildEventStop, BuildEventApproachContact, BuildEventNest3, BuildEventNest4, BuildEventMoveSpeedCategories, BuildEventLongChase
+
+        return [ BuildEventDetection, BuildEventOralOralContact, BuildEventOralGenitalContact, BuildEventSideBySide, BuildEventSideBySideOpposite,
+                 BuildEventTrain2, BuildEventTrain3, BuildEventTrain4, BuildEventMove, BuildEventFollowZone, BuildEventRear5, BuildEventCenterPeripheryLocation,
+                 BuildEventRearCenterPeriphery, BuildEventGetAway, BuildEventGroup2, BuildEventGroup3, BuildEventGroup4, BuildEventGroup3MakeBreak,
+                 BuildEventGroup4MakeBreak, BuildEventStop, BuildEventApproachContact, BuildEventNest3, BuildEventNest4, BuildEventMoveSpeedCategories, BuildEventLongChase ]
+
+    def rebuild(self, file, eventClassList, incremental = False ):
+        '''
+        rebuild in one window as Rebuild_All_Events.process does. returns True if the rebuild was incremental
+        '''
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.AnimalType import AnimalType
+        from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache
+        from lmtanalysis.RebuildCheckpoint import logFlush
+
+        connection = sqlite3.connect( file )
+        try:
+            flushEventTimeLineCache()
+            endFrame = getLastFrame( connection )
+            incrementalRebuild = None
+            if incremental:
+                incrementalRebuild = IncrementalRebuild( connection, eventClassList, 0, endFrame )
+                if not incrementalRebuild.canAppend():
+                    incrementalRebuild = None
+
+            startFrame = 0
+            if incrementalRebuild != None:
+                incrementalRebuild.prepare()
+                startFrame = incrementalRebuild.contextStartFrame
+            else:
+                with EventTransaction( connection, deferDelete=True ):
+                    for ev in eventClassList:
+                        ev.flush( connection )
+                    logFlush( connection )
+
+            pool = AnimalPool( )
+            pool.loadAnimals( connection )
+            pool.loadDetection( start = startFrame, end = endFrame )
+            BuildEventScheduler.reBuildEvents( connection, file, eventClassList, startFrame, endFrame, pool = pool, animalType = AnimalType.MOUSE )
+
+            if incrementalRebuild != None:
+                incrementalRebuild.finish()
+            logRebuild( connection, 0, endFrame )
+        finally:
+            flushEventTimeLineCache()
+            connection.close()
+
+        return incrementalRebuild != None
+
+    def getEvents(self, file ):
+        connection = sqlite3.connect( file )
+        rows = connection.execute( "SELECT NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, STARTFRAME, ENDFRAME, METADATA FROM EVENT" ).fetchall()
+        connection.close()
+        return sorted( rows, key=lambda row: tuple( str( value ) for value in row ) )
+
+    def test_SameEventsAsFullRebuild(self):
+
+        import shutil
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        eventClassList = self.getEventClassList()
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "full.sqlite" )
+            appendedFile = os.path.join( folder, "appended.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 10000, withMask = False, contactDensity = 0.6, seed = 9 )
+                shutil.copy( file, appendedFile )
+
+                # the recording of appendedFile is stopped at frame 6000, and rebuilt
+                connection = sqlite3.connect( appendedFile )
+                for table in ( "DETECTION", "FRAME" ):
+                    connection.execute( "CREATE TABLE {0}_LATER AS SELECT * FROM {0} WHERE FRAMENUMBER>6000".format( table ) )
+                    connection.execute( "DELETE FROM {} WHERE FRAMENUMBER>6000".format( table ) )
+                connection.commit()
+                connection.close()
+                self.assertFalse( self.rebuild( appendedFile, eventClassList, incremental = True ) )
+
+                # the recording goes on: only its end is rebuilt
+                connection = sqlite3.connect( appendedFile )
+                for table in ( "DETECTION", "FRAME" ):
+                    connection.execute( "INSERT INTO {0} SELECT * FROM {0}_LATER".format( table ) )
+                    connection.execute( "DROP TABLE {}_LATER".format( table ) )
+                connection.commit()
+                connection.close()
+                self.assertTrue( self.rebuild( appendedFile, eventClassList, incremental = True ) )
+
+                self.rebuild( file, eventClassList )
+                eventList = self.getEvents( file )
+                appendedEventList = self.getEvents( appendedFile )
+
+        # events crossing the end of the first rebuild
+        self.assertTrue( any( row[5] <= 6000 < row[6] for row in eventList ) )
+        self.assertEqual( appendedEventList, eventList )
+
+    def test_FullRebuildWhenEventIdsAreReused(self):
+
+        from lmtanalysis import BuildEventStop
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 3000, withMask = False, seed = 9 )
+                # EVENT created as the tracker may do, without AUTOINCREMENT
+                connection = sqlite3.connect( file )
+                connection.execute( "ALTER TABLE EVENT RENAME TO EVENT_AUTOINCREMENT" )
+                connection.execute( "CREATE TABLE EVENT ( ID INTEGER PRIMARY KEY, NAME TEXT, DESCRIPTION TEXT, STARTFRAME INTEGER, ENDFRAME INTEGER, IDANIMALA INTEGER, IDANIMALB INTEGER, IDANIMALC INTEGER, IDANIMALD INTEGER, METADATA TEXT )" )
+                connection.execute( "INSERT INTO EVENT SELECT * FROM EVENT_AUTOINCREMENT" )
+                connection.execute( "DROP TABLE EVENT_AUTOINCREMENT" )
+                connection.commit()
+                connection.close()
+
+                self.rebuild( file, [ BuildEventStop ] )
+                self.assertFalse( self.rebuild( file, [ BuildEventStop ], incremental = True ) )
+
+    def test_MergeMetaData(self):
+
+        self.assertEqual( json.loads( mergeMetaData( '{"a": 1}', '{"b": 2}' ) ), { "a": 1, "b": 2 } )
+        self.assertEqual( mergeMetaData( "null", '{"b": 2}' ), '{"b": 2}' )
+        self.assertEqual( mergeMetaData( None, '{"b": 2}' ), '{"b": 2}' )
+        self.assertEqual( mergeMetaData( '{"a": 1}', "null" ), '{"a": 1}' )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Interval algebra on event timelines.
+
+A set of intervals is a pair of numpy arrays ( starts, ends ). Ends are inclusive, like Event.endFrame.
+All functions return normalized intervals: sorted, without overlap, and with adjacent intervals merged
+( [10,20] and [21,30] become [10,30] ), which is what EventTimeLine.reBuildWithDictionary produces.
+The cost depends on the number of events, not on the number of frames they cover.
+'''
+
+import numpy as np
+
+
+def emptyIntervals():
+    return np.zeros( 0, dtype=np.int64 ), np.zeros( 0, dtype=np.int64 )
+
+def normalizeIntervals( starts, ends ):
+    '''
+    sorts the intervals, removes empty ones (start > end) and merges overlapping or adjacent intervals.
+    '''
+    starts = np.asarray( starts, dtype=np.int64 )
+    ends = np.asarray( ends, dtype=np.int64 )
+
+    keep = starts <= ends
+    starts = starts[keep]
+    ends = ends[keep]
+
+    if len( starts ) == 0:
+        return emptyIntervals()
+
+    order = np.argsort( starts, kind="stable" )
+    starts = starts[order]
+    ends = np.maximum.accumulate( ends[order] )
+
+    # a new group begins when the start is after the end (+1 for adjacency) of everything before it
+    newGroup = np.empty( len( starts ), dtype=bool )
+    newGroup[0] = True
+    newGroup[1:] = starts[1:] > ends[:-1] + 1
+
+    groupStart = np.flatnonzero( newGroup )
+    groupEnd = np.append( groupStart[1:] - 1, len( starts ) - 1 )
+
+    return starts[groupStart], ends[groupEnd]
+
+def normalizeGroupedIntervals( groups, starts, ends, maxGap = 0 ):
+    '''
+    normalizeIntervals for many sets of intervals at once: groups gives the set (integer >= 0) of each interval.
+    maxGap > 0 also merges the intervals of a set separated by maxGap frames or less ( see mergeIntervalGaps ).
+    returns ( groups, starts, ends ), sorted by group then start.
+    '''
+    groups = np.asarray( groups, dtype=np.int64 )
+    starts = np.asarray( starts, dtype=np.int64 )
+    ends = np.asarray( ends, dtype=np.int64 )
+
+    keep = starts <= ends
+    if not keep.any():
+        return np.zeros( 0, dtype=np.int64 ), *emptyIntervals()
+
+    # each group is moved to its own range of frames, with a gap large enough so that groups are never merged
+    origin = int( starts[keep].min() )
+    span = int( ends[keep].max() ) - origin + maxGap + 2
+    shift = groups * span - origin
+    starts, ends = mergeIntervalGaps( np.where( keep, starts + shift, 1 ), np.where( keep, ends + shift, 0 ), maxGap )
+
+    groups = starts // span
+    shift = groups * span - origin
+    return groups, starts - shift, ends - shift
+
+def intervalsFromFrames( frames ):
+    '''
+    builds intervals from a collection of frames ( for instance the keys of an event dictionary )
+    '''
+    frames = np.unique( np.asarray( frames, dtype=np.int64 ) )
+
+    if len( frames ) == 0:
+        return emptyIntervals()
+
+    breaks = np.flatnonzero( np.diff( frames ) != 1 )
+    starts = np.append( frames[0], frames[breaks+1] )
+    ends = np.append( frames[breaks], frames[-1] )
+    return starts, ends
+
+def intervalsToFrames( starts, ends ):
+    '''
+    returns all the frames covered by the intervals (sorted)
+    '''
+    starts, ends = normalizeIntervals( starts, ends )
+    lengths = ends - starts + 1
+    if len( lengths ) == 0:
+        return np.zeros( 0, dtype=np.int64 )
+    offsets = np.repeat( starts - np.cumsum( np.append( 0, lengths[:-1] ) ), lengths )
+    return np.arange( lengths.sum(), dtype=np.int64 ) + offsets
+
+def _covers( starts, ends, points ):
+    '''
+    for each point, True if it is inside one of the (normalized) intervals
+    '''
+    index = np.searchsorted( starts, points, side="right" ) - 1
+    inside = index >= 0
+    inside[inside] = ends[index[inside]] >= points[inside]
+    return inside
+
+def _combine( startsA, endsA, startsB, endsB, operator ):
+    '''
+    applies a boolean operator frame by frame, evaluated only at the boundaries of the intervals.
+    '''
+    startsA, endsA = normalizeIntervals( startsA, endsA )
+    startsB, endsB = normalizeIntervals( startsB, endsB )
+
+    points = np.unique( np.concatenate( ( startsA, endsA + 1, startsB, endsB + 1 ) ) )
+    if len( points ) < 2:
+        return emptyIntervals()
+
+    keep = operator( _covers( startsA, endsA, points ), _covers( startsB, endsB, points ) )[:-1]
+
+    return normalizeIntervals( points[:-1][keep], points[1:][keep] - 1 )
+
+def unionIntervals( startsA, endsA, startsB, endsB ):
+    return normalizeIntervals( np.concatenate( ( startsA, startsB ) ), np.concatenate( ( endsA, endsB ) ) )
+
+def intersectIntervals( startsA, endsA, startsB, endsB ):
+    return _combine( startsA, endsA, startsB, endsB, np.logical_and )
+
+def subtractIntervals( startsA, endsA, startsB, endsB ):
+    '''
+    A minus B
+    '''
+    return _combine( startsA, endsA, startsB, endsB, lambda a, b: a & ~b )
+
+def clipIntervals( starts, ends, minFrame=None, maxFrame=None ):
+    '''
+    keeps only the part of the intervals between minFrame and maxFrame (included)
+    '''
+    starts = np.asarray( starts, dtype=np.int64 )
+    ends = np.asarray( ends, dtype=np.int64 )
+    if minFrame != None:
+        starts = np.maximum( starts, minFrame )
+    if maxFrame != None:
+        ends = np.minimum( ends, maxFrame )
+    return normalizeIntervals( starts, ends )
+
+def complementIntervals( starts, ends, minFrame, maxFrame ):
+    '''
+    frames between minFrame and maxFrame (included) that are not in the intervals
+    '''
+    return subtractIntervals( np.array( [minFrame] ), np.array( [maxFrame] ), starts, ends )
+
+def dilateIntervals( starts, ends, numberOfFrame ):
+    starts = np.asarray( starts, dtype=np.int64 )
+    ends = np.asarray( ends, dtype=np.int64 )
+    return normalizeIntervals( starts - numberOfFrame, ends + numberOfFrame )
+
+def erodeIntervals( starts, ends, numberOfFrame ):
+    '''
+    shrinks each (normalized) interval by numberOfFrame on both sides. Intervals that become empty are removed.
+    '''
+    starts, ends = normalizeIntervals( starts, ends )
+    return normalizeIntervals( starts + numberOfFrame, ends - numberOfFrame )
+
+def mergeIntervalGaps( starts, ends, maxGap ):
+    '''
+    merges intervals separated by maxGap frames or less
+    '''
+    starts, ends = normalizeIntervals( starts, ends )
+    if len( starts ) == 0:
+        return starts, ends
+
+    newGroup = np.empty( len( starts ), dtype=bool )
+    newGroup[0] = True
+    newGroup[1:] = starts[1:] - ends[:-1] - 1 > maxGap
+
+    groupStart = np.flatnonzero( newGroup )
+    groupEnd = np.append( groupStart[1:] - 1, len( starts ) - 1 )
+
+    return starts[groupStart], ends[groupEnd]
+
+def filterIntervalsByLength( starts, ends, minLength ):
+    '''
+    keeps intervals with a duration ( end - start + 1 ) of at least minLength
+    '''
+    starts = np.asarray( starts, dtype=np.int64 )
+    ends = np.asarray( ends, dtype=np.int64 )
+    keep = ends - starts + 1 >= minLength
+    return starts[keep], ends[keep]
+
+def totalIntervalLength( starts, ends ):
+    starts, ends = normalizeIntervals( starts, ends )
+    return int( ( ends - starts + 1 ).sum() )
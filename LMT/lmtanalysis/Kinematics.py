@@ -0,0 +1,178 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Kinematics of an animal computed once from its detections.
+
+The mass center of the detections is placed on a dense frame axis ( from the first to the last detection )
+and the frame to frame distance, the speed and the vertical speed are computed with numpy for all the frames.
+Animal.getSpeed, getVerticalSpeed, getDistance and getSpeedOverTimePeriod answer from these arrays.
+
+Cumulative sums of these arrays (built on first use) give the statistics of any frame interval in constant time
+( see intervalStats ).
+'''
+
+import numpy as np
+
+''' distance (in pixels) between two consecutive frames above which the move is considered as a tracking jump '''
+MAX_DISTANCE_BETWEEN_FRAMES = 85.5
+
+
+class Kinematics():
+
+    def __init__(self, animal ):
+
+        self.signature = animal.getDetectionSignature()
+        self.scaleFactor = animal.parameters.scaleFactor
+
+        frames, massX, massY, massZ = getMassArrays( animal )
+
+        self.startFrame = int( frames[0] ) if len( frames ) > 0 else 0
+        nbFrame = int( frames[-1] ) - self.startFrame + 1 if len( frames ) > 0 else 0
+
+        index = frames - self.startFrame
+        self.x = np.full( nbFrame, np.nan )
+        self.y = np.full( nbFrame, np.nan )
+        self.z = np.full( nbFrame, np.nan )
+        self.x[index] = massX
+        self.y[index] = massY
+        self.z[index] = massZ
+        self.detected = ~np.isnan( self.x )
+
+        # step i: move from frame startFrame+i to startFrame+i+1 (in pixels), 0 when not valid
+        step = np.hypot( np.diff( self.x ), np.diff( self.y ) )
+        self.stepValid = ~np.isnan( step ) & ( step <= MAX_DISTANCE_BETWEEN_FRAMES )
+        self.stepDistance = np.where( self.stepValid, step, 0 )
+
+        # speed at frame t uses t-1 and t+1 (in cm per second), nan when not available
+        self.speed = np.full( nbFrame, np.nan )
+        self.verticalSpeed = np.full( nbFrame, np.nan )
+        if nbFrame > 2:
+            self.speed[1:-1] = np.hypot( self.x[2:] - self.x[:-2], self.y[2:] - self.y[:-2] ) * self.scaleFactor / ( 2 / 30 )
+            self.verticalSpeed[1:-1] = ( self.z[2:] - self.z[:-2] ) / 2
+
+        self.cumulativeDic = None
+        self.zoneCumulativeDic = {}
+
+    def getIndex(self, t ):
+        ''' index of frame t in the arrays, or None if t is outside '''
+        i = t - self.startFrame
+        if i < 0 or i >= len( self.x ):
+            return None
+        return i
+
+    def getSpeed(self, t ):
+        i = self.getIndex( t )
+        if i == None:
+            return None
+        speed = self.speed[i]
+        if np.isnan( speed ):
+            return None
+        return float( speed )
+
+    def getVerticalSpeed(self, t ):
+        i = self.getIndex( t )
+        if i == None:
+            return None
+        verticalSpeed = self.verticalSpeed[i]
+        if np.isnan( verticalSpeed ):
+            return None
+        return float( verticalSpeed )
+
+    def getSpeedArray(self, tmin, tmax ):
+        '''
+        speeds of the frames of [tmin, tmax] where the speed is available
+        '''
+        start = max( tmin - self.startFrame, 0 )
+        end = min( tmax - self.startFrame + 1, len( self.speed ) )
+        if end <= start:
+            return np.zeros( 0 )
+        speed = self.speed[start:end]
+        return speed[ ~np.isnan( speed ) ]
+
+    def getDistance(self, tmin, tmax ):
+        '''
+        distance (in pixels) of the moves t -> t+1 for t in [tmin, tmax[, tracking jumps excluded
+        '''
+        start = max( tmin - self.startFrame, 0 )
+        end = min( tmax - self.startFrame, len( self.stepDistance ) )
+        if end <= start:
+            return 0
+        return float( self.stepDistance[start:end].sum() )
+
+    def getCumulativeDic(self):
+        '''
+        cumulative sums, with a leading 0: sum of array[0:k] is cumulative[k]
+        '''
+        if self.cumulativeDic == None:
+            speedValid = ~np.isnan( self.speed )
+            self.cumulativeDic = {
+                "distance": np.concatenate( ( [0], np.cumsum( self.stepDistance ) ) ),
+                "nbDetection": np.concatenate( ( [0], np.cumsum( self.detected ) ) ),
+                "speedSum": np.concatenate( ( [0], np.cumsum( np.where( speedValid, self.speed, 0 ) ) ) ),
+                "nbSpeed": np.concatenate( ( [0], np.cumsum( speedValid ) ) )
+                }
+        return self.cumulativeDic
+
+    def getZoneCumulative(self, zone ):
+        '''
+        cumulative number of frames with the mass center in zone = ( xa, ya, xb, yb ) ( pixels, borders included )
+        '''
+        xa, ya, xb, yb = zone
+        x1, x2 = min( xa, xb ), max( xa, xb )
+        y1, y2 = min( ya, yb ), max( ya, yb )
+        if ( x1, y1, x2, y2 ) not in self.zoneCumulativeDic:
+            inZone = ( self.x >= x1 ) & ( self.x <= x2 ) & ( self.y >= y1 ) & ( self.y <= y2 )
+            self.zoneCumulativeDic[x1, y1, x2, y2] = np.concatenate( ( [0], np.cumsum( inZone ) ) )
+        return self.zoneCumulativeDic[x1, y1, x2, y2]
+
+    def intervalStats(self, starts, ends, zone = None ):
+        '''
+        statistics of the frame intervals [start, end] (included), for arrays of starts and ends:
+        distance: distance (in pixels) of the moves between frames of the interval (same as getDistance( start, end ))
+        nbDetection: number of frames with a detection
+        speedSum, nbSpeed: sum and number of the speeds available (same frames as getSpeedOverTimePeriod)
+        nbFrameInZone: number of frames with the mass center in zone (only if zone is given)
+        '''
+        starts = np.asarray( starts, dtype=np.int64 ) - self.startFrame
+        ends = np.asarray( ends, dtype=np.int64 ) - self.startFrame
+        nbFrame = len( self.x )
+        cumulativeDic = self.getCumulativeDic()
+
+        # frames of [start, end]
+        frameStart = np.clip( starts, 0, nbFrame )
+        frameEnd = np.maximum( np.clip( ends + 1, 0, nbFrame ), frameStart )
+        # moves t -> t+1 for t in [start, end[
+        stepStart = np.clip( starts, 0, len( self.stepDistance ) )
+        stepEnd = np.maximum( np.clip( ends, 0, len( self.stepDistance ) ), stepStart )
+
+        stats = {}
+        stats["distance"] = cumulativeDic["distance"][stepEnd] - cumulativeDic["distance"][stepStart]
+        for key in ( "nbDetection", "speedSum", "nbSpeed" ):
+            stats[key] = cumulativeDic[key][frameEnd] - cumulativeDic[key][frameStart]
+        if zone != None:
+            zoneCumulative = self.getZoneCumulative( zone )
+            stats["nbFrameInZone"] = zoneCumulative[frameEnd] - zoneCumulative[frameStart]
+
+        return stats
+
+
+def getMassArrays( animal ):
+    '''
+    frames and mass center coordinates of the detections of an animal, sorted by frame.
+    massZ is nan for light loaded detections.
+    '''
+    store = animal.detectionStore
+    if store != None:
+        frames = store.getFrames()
+        massZ = np.full( len( frames ), np.nan ) if store.lightLoad else store.getArray( "massZ" )
+        return frames, store.getArray( "massX" ), store.getArray( "massY" ), massZ
+
+    frames = sorted( animal.detectionDictionary.keys() )
+    detectionList = [ animal.detectionDictionary[t] for t in frames ]
+    massX = np.array( [ detection.massX for detection in detectionList ], dtype=np.float64 )
+    massY = np.array( [ detection.massY for detection in detectionList ], dtype=np.float64 )
+    massZ = np.array( [ getattr( detection, "massZ", None ) for detection in detectionList ], dtype=np.float64 )
+
+    return np.array( frames, dtype=np.int64 ), massX, massY, massZ
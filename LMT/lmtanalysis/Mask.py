@@ -7,6 +7,7 @@ Created on 12 sept. 2017
 import math
 from lmtanalysis.Measure import *
 import zlib
+import numpy as np
 from lxml import etree
 
 import matplotlib
@@ -44,40 +45,48 @@ class Mask():
         self.y = y 
         self.width = w
         self.height = h        
+        self.array = None
+        self._points = None
         self.unzip( boolMaskData )
         self.color = color
         
         #mask = Mask( x , y , w , h , boolMaskData, self.getColor() )
 
     
+    @property
+    def pointsX(self):
+        return self.getPoints()[0]
+
+    @property
+    def pointsY(self):
+        return self.getPoints()[1]
+
+    def getPoints(self):
+        '''
+        lists of the x and y coordinates of the points of the mask ( y is negated ), computed on first use
+        '''
+        if self._points == None:
+            if self.array is None:
+                self._points = ( [], [] )
+            else:
+                rows, columns = np.nonzero( self.array )
+                self._points = ( ( columns + self.x ).tolist(), ( -( rows + self.y ) ).tolist() )
+        return self._points
+
     def getPerimeter(self ):
-        
-        dicA = {}
+        '''
+        number of points of the mask with at least one of their 8 neighbours outside of the mask
+        '''
+        if self.array is None:
+            return 0
 
-        def isOnPerimeter( x , y ):
-            
-            nonlocal dicA
+        padded = np.pad( self.array, 1 )
+        interior = np.ones( self.array.shape, dtype=bool )
+        for dy in range( 3 ):
+            for dx in range( 3 ):
+                interior &= padded[ dy:dy+self.height, dx:dx+self.width ]
 
-            for xx in range( -1,2 ):
-                for yy in range( -1,2 ):
-                    if ( x+xx , y+ yy ) not in dicA:
-                        return True                
-            
-        # create a mask map
-        for i in range( len( self.pointsX ) ):
-            dicA[(self.pointsX[i], self.pointsY[i])] = True
-            
-        nbPointPerimeter = 0
-        
-        for i in range( len ( self.pointsX ) ):
-            
-            x = self.pointsX[i]
-            y = self.pointsY[i]
-            
-            if isOnPerimeter( x , y ):
-                nbPointPerimeter+=1
-            
-        return nbPointPerimeter
+        return int( np.count_nonzero( self.array & ~interior ) )
         
         
         
@@ -89,7 +98,7 @@ class Mask():
             return None
         '''
         try:
-            area = len( self.pointsX )
+            area = self.getNbPoint()
             '''
             circularity = 4.0 * area / ( self.getPerimeter() * longAxis );
             '''
@@ -130,41 +139,25 @@ class Mask():
         return False
             
     def getNbPoint(self):
-        return len( self.pointsX )
+        if self.array is None:
+            return 0
+        return int( np.count_nonzero( self.array ) )
     
     def unzip(self, maskDataZipped ):
         
-        # re fill 0 and put space instead of : separator
         if maskDataZipped == None:
             return    
-        s = maskDataZipped.split(":")
-        s2 = ""
-        for value in s:
-            if ( len(value) == 1 ):
-                s2+="0"
-            s2+=value+" "
-            
-        #print ( s2 )
-        #print ("************")
-        b = bytearray.fromhex( s2 )
-        
-        #print("uncompressed: ")
-        uncompressed= zlib.decompress( b )
-        
-        #print ( uncompressed )
-                    
-        self.pointsX= []
-        self.pointsY= []
-                
-        index = 0
-        for y in range( self.y , self.y+ self.height ):
-            for x in range( self.x , self.x+ self.width ):
-                        
-                if ( uncompressed[index] == 1 ):
-                    self.pointsX.append( x )
-                    self.pointsY.append( -y )
-                
-                index+=1
-                
-        
-        
\ No newline at end of file
+
+        self.array = decodeMaskData( maskDataZipped, self.width, self.height )
+        self._points = None
+
+
+def decodeMaskData( maskDataZipped, width, height ):
+    '''
+    decodes the boolMaskData of a mask: hexadecimal bytes separated by ":" ( "0" written "0", not "00" ),
+    zlib compressed, one byte ( 0 or 1 ) per pixel of the bounding box, line by line.
+    returns a boolean numpy array of shape ( height, width ).
+    '''
+    compressed = bytes( int( value, 16 ) for value in maskDataZipped.split(":") if value != "" )
+    uncompressed = np.frombuffer( zlib.decompress( compressed ), dtype=np.uint8 )
+    return ( uncompressed[ :width*height ] == 1 ).reshape( height, width )
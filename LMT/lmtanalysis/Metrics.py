@@ -0,0 +1,281 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Timing and counters of the analysis, recorded as nested spans.
+
+A MetricSpan is a Chronometer ( getTimeInS, printTimeInS ) which is also recorded when the metrics are enabled:
+
+    enableMetrics()
+    with MetricSpan( "Window", tmin=0, tmax=oneDay ):
+        addMetricCounter( "framesProcessed", oneDay )
+        ...
+    exportMetrics( "rebuild_metrics.jsonl" )
+
+A span started while another one is running is its child (path "File/Window/lmtanalysis.BuildEventStop/Load event").
+A span can also be used without "with": it starts when it is created and ends with stop().
+Counters are added to all the running spans, so a span gets the counters of its children.
+The resident memory (RSS) is sampled when spans start and end (and every sampleInterval seconds if given):
+peakRSS is the highest sample during the span.
+
+Each ended span gives a record: name, path, depth, attributes, start (time stamp), duration, selfDuration
+(duration minus the duration of its children), counters, rss (at the end) and peakRSS.
+Records are exported as json lines (.jsonl) or csv (.csv).
+
+When the metrics are disabled (default), spans only measure their own time and nothing is recorded.
+'''
+
+import os
+import csv
+import json
+import time
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+metricEnable_ = False
+metricRecordList_ = []
+metricSpanStack_ = []
+metricCounterDico_ = {}
+metricSampler_ = None
+metricProcess_ = None
+
+def getRSS():
+    ''' resident memory of the process in bytes, or None if psutil is not available '''
+    global metricProcess_
+    if psutil == None:
+        return None
+    # a new process object after a fork
+    if metricProcess_ == None or metricProcess_.pid != os.getpid():
+        metricProcess_ = psutil.Process()
+    return metricProcess_.memory_info().rss
+
+def isMetricsEnabled():
+    return metricEnable_
+
+def enableMetrics( sampleInterval = None ):
+    '''
+    starts recording the spans and counters.
+    sampleInterval: period (in seconds) of the RSS sampling in a background thread (None: only when spans start and end).
+    '''
+    global metricEnable_, metricSampler_
+    metricEnable_ = True
+
+    if sampleInterval != None and metricSampler_ == None:
+        metricSampler_ = RSSSampler( sampleInterval )
+        metricSampler_.start()
+
+def disableMetrics():
+    global metricEnable_, metricSampler_
+    metricEnable_ = False
+    if metricSampler_ != None:
+        metricSampler_.stop()
+        metricSampler_ = None
+
+def resetMetrics():
+    ''' removes the records and the counters, and forgets the running spans '''
+    metricRecordList_.clear()
+    metricSpanStack_.clear()
+    metricCounterDico_.clear()
+
+def addMetricCounter( name, value = 1 ):
+    if not metricEnable_:
+        return
+    metricCounterDico_[name] = metricCounterDico_.get( name, 0 ) + value
+    for span in metricSpanStack_:
+        span.counters[name] = span.counters.get( name, 0 ) + value
+
+def sampleRSS():
+    ''' samples the resident memory for the running spans '''
+    rss = getRSS()
+    if rss == None:
+        return None
+    for span in list( metricSpanStack_ ):
+        if span.peakRSS == None or rss > span.peakRSS:
+            span.peakRSS = rss
+    return rss
+
+def getMetricRecords():
+    return metricRecordList_
+
+def getMetricCounters():
+    ''' totals of the counters since the last reset '''
+    return dict( metricCounterDico_ )
+
+
+class MetricSpan():
+
+    def __init__(self, name, **attributes ):
+
+        self.name = name
+        self.attributes = attributes
+        self.counters = {}
+        self.peakRSS = None
+        self.childDuration = 0
+        self.parent = None
+        self.running = True
+        self.recorded = metricEnable_
+
+        if self.recorded:
+            if len( metricSpanStack_ ) > 0:
+                self.parent = metricSpanStack_[-1]
+            metricSpanStack_.append( self )
+            sampleRSS()
+
+        self.startTime = time.time()
+        self.t = time.perf_counter()
+
+    def getPath(self):
+        if self.parent == None:
+            return self.name
+        return self.parent.getPath() + "/" + self.name
+
+    def getDepth(self):
+        if self.parent == None:
+            return 0
+        return self.parent.getDepth() + 1
+
+    def getTimeInS(self):
+        if not self.running:
+            return self.duration
+        return time.perf_counter() - self.t
+
+    def getTimeInMS(self):
+        return self.getTimeInS() * 1000
+
+    def __str__(self):
+        if len( self.attributes ) == 0:
+            return self.name
+        return self.name + " " + " ".join( "{}: {}".format( key, value ) for key, value in self.attributes.items() )
+
+    def printTimeInS(self):
+        print ( "[Chrono " , str( self ) , " ] " , self.getTimeInS() , " seconds")
+
+    def printTimeInMS(self):
+        print ( "[Chrono " , str( self ) , " ] " , self.getTimeInMS() , " milliseconds")
+
+    def stop(self):
+        '''
+        ends the span and records it. Returns the duration in seconds.
+        '''
+        if not self.running:
+            return self.duration
+
+        recorded = self.recorded and self in metricSpanStack_
+        if recorded:
+            # children not stopped (exception) end with their parent
+            while metricSpanStack_[-1] != self:
+                metricSpanStack_[-1].stop()
+
+        self.duration = time.perf_counter() - self.t
+        self.running = False
+        if not recorded:
+            return self.duration
+
+        rss = sampleRSS()
+        metricSpanStack_.pop()
+
+        if self.parent != None:
+            self.parent.childDuration += self.duration
+
+        metricRecordList_.append( { "name": self.name,
+                                   "path": self.getPath(),
+                                   "depth": self.getDepth(),
+                                   "attributes": self.attributes,
+                                   "start": self.startTime,
+                                   "duration": self.duration,
+                                   "selfDuration": self.duration - self.childDuration,
+                                   "counters": self.counters,
+                                   "rss": rss,
+                                   "peakRSS": self.peakRSS } )
+        return self.duration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback ):
+        self.stop()
+        return False
+
+
+class RSSSampler( threading.Thread ):
+
+    def __init__(self, interval ):
+        super().__init__( daemon = True )
+        self.interval = interval
+        self.stopEvent = threading.Event()
+
+    def run(self):
+        while not self.stopEvent.wait( self.interval ):
+            sampleRSS()
+
+    def stop(self):
+        self.stopEvent.set()
+
+
+def exportMetrics( file, append = False ):
+    '''
+    writes the records in file: one json object per line if file ends with .jsonl, csv if it ends with .csv
+    (one column per attribute and per counter).
+    '''
+    mode = "a" if append else "w"
+
+    if str( file ).endswith( ".csv" ):
+
+        attributeList = []
+        counterList = []
+        for record in metricRecordList_:
+            for key in record["attributes"]:
+                if key not in attributeList:
+                    attributeList.append( key )
+            for key in record["counters"]:
+                if key not in counterList:
+                    counterList.append( key )
+
+        columnList = [ "name", "path", "depth", "start", "duration", "selfDuration", "rss", "peakRSS" ]
+        with open( file, mode, newline="" ) as csvFile:
+            writer = csv.writer( csvFile )
+            writer.writerow( columnList + attributeList + counterList )
+            for record in metricRecordList_:
+                row = [ record[column] for column in columnList ]
+                row += [ record["attributes"].get( key ) for key in attributeList ]
+                row += [ record["counters"].get( key ) for key in counterList ]
+                writer.writerow( row )
+
+    else:
+
+        with open( file, mode ) as jsonFile:
+            for record in metricRecordList_:
+                jsonFile.write( json.dumps( record, default=str ) + "\n" )
+
+    print( "Metrics: {} records saved in {}".format( len( metricRecordList_ ), file ) )
+
+def getMetricSummary( maxDepth = None ):
+    '''
+    records grouped by path: number, total duration, total self duration, highest peakRSS and counters.
+    '''
+    summary = {}
+    for record in metricRecordList_:
+        if maxDepth != None and record["depth"] > maxDepth:
+            continue
+        entry = summary.setdefault( record["path"], { "count": 0, "duration": 0, "selfDuration": 0, "peakRSS": None, "counters": {} } )
+        entry["count"] += 1
+        entry["duration"] += record["duration"]
+        entry["selfDuration"] += record["selfDuration"]
+        if record["peakRSS"] != None and ( entry["peakRSS"] == None or record["peakRSS"] > entry["peakRSS"] ):
+            entry["peakRSS"] = record["peakRSS"]
+        for key, value in record["counters"].items():
+            entry["counters"][key] = entry["counters"].get( key, 0 ) + value
+    return summary
+
+def printMetricSummary( maxDepth = None ):
+    ''' prints the paths sorted by total duration '''
+    summary = getMetricSummary( maxDepth )
+    print( "Metrics summary:" )
+    for path, entry in sorted( summary.items(), key=lambda item: -item[1]["duration"] ):
+        peakRSS = "" if entry["peakRSS"] == None else "{:.0f} MB".format( entry["peakRSS"] / 1e6 )
+        print( "{:80} x{:<6} {:10.2f} s (self {:10.2f} s) {:>10} {}".format( path, entry["count"], entry["duration"], entry["selfDuration"], peakRSS, entry["counters"] ) )
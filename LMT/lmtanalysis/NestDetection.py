@@ -0,0 +1,329 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Nests for BuildEventNest3 and BuildEventNest4, computed with per-frame bit arrays instead of a graph per frame.
+
+For each frame of [tmin, tmax]:
+    detected: one bit per detected animal
+    stopped: one bit per animal with a "Stop" event
+    adjacency: one bit per pair of detected animals in contact (6 bits for 4 animals, see ContactGroups.py)
+
+The connected components are read in a table computed once for all the adjacency bitmasks (64 for 4 animals).
+
+Anonymous detections are merged with numpy: anonymous detections closer than DISTANCE_CONTACT_MASS_CENTER form
+clusters, and a cluster links all the animals closer than DISTANCE_CONTACT_MASS_CENTER to one of its detections
+(their pairs are added to the adjacency). A cluster linked to no animal is a group of its own. As in the graph of
+the previous version, an anonymous detection linked to nothing is not part of any group, but it still counts as
+an animal of the frame for the nest 4.
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import itertools
+import sqlite3
+import numpy as np
+
+from lmtanalysis.ContactGroups import getContactGroups
+from lmtanalysis.EventTimeLineCache import loadEventTimeLinesCached
+from lmtanalysis.Interval import intervalsFromFrames
+from lmtanalysis.Kinematics import getMassArrays
+
+''' at most 2^15 adjacency bitmasks in the component table '''
+MAX_NB_ANIMAL = 6
+
+
+def getComponentTable( nbAnimal ):
+    '''
+    table[adjacency, i]: bitmask of the animals of the connected component of animal i, for each adjacency bitmask
+    (pairs in the order of itertools.combinations)
+    '''
+    pairList = list( itertools.combinations( range( nbAnimal ), 2 ) )
+    table = np.zeros( ( 1 << len( pairList ), nbAnimal ), dtype=np.int64 )
+
+    for adjacency in range( 1 << len( pairList ) ):
+        component = [ 1 << i for i in range( nbAnimal ) ]
+        # merge the components of each pair in contact
+        for p, ( i, j ) in enumerate( pairList ):
+            if adjacency >> p & 1 and component[i] != component[j]:
+                merged = component[i] | component[j]
+                for k in range( nbAnimal ):
+                    if merged >> k & 1:
+                        component[k] = merged
+        table[adjacency] = component
+
+    return table
+
+def getPairTable( nbAnimal ):
+    '''
+    table[animals]: bitmask of the pairs of animals included in the bitmask animals
+    '''
+    pairList = list( itertools.combinations( range( nbAnimal ), 2 ) )
+    table = np.zeros( 1 << nbAnimal, dtype=np.int64 )
+
+    for animals in range( 1 << nbAnimal ):
+        for p, ( i, j ) in enumerate( pairList ):
+            if animals >> i & 1 and animals >> j & 1:
+                table[animals] |= 1 << p
+
+    return table
+
+class NestDetector():
+
+    def __init__(self, connection, file, pool, tmin, tmax, parameters ):
+        '''
+        the detections of the pool and its anonymous detections must be loaded.
+        '''
+        animalList = pool.getAnimalList()
+        if len( animalList ) > MAX_NB_ANIMAL:
+            raise ValueError( "Nest detection: at most {} animals".format( MAX_NB_ANIMAL ) )
+
+        self.tmin = tmin
+        self.tmax = tmax
+        self.animalIdList = sorted( pool.animalDictionary.keys() )
+        self.indexDic = { animalId: i for i, animalId in enumerate( self.animalIdList ) }
+        # order of the animals in the pool: the order of the nodes in the graph of the previous version
+        self.rankList = [ 0 ] * len( self.animalIdList )
+        for rank, animal in enumerate( animalList ):
+            self.rankList[ self.indexDic[animal.baseId] ] = rank
+
+        nbAnimal = len( self.animalIdList )
+        nbFrame = max( tmax - tmin + 1, 0 )
+        self.componentTable = getComponentTable( nbAnimal )
+        self.pairTable = getPairTable( nbAnimal )
+
+        self.detected = np.zeros( nbFrame, dtype=np.int64 )
+        self.stopped = np.zeros( nbFrame, dtype=np.int64 )
+        stopDic = loadEventTimeLinesCached( connection, file, [ ( "Stop", animalId ) for animalId in self.animalIdList ], minFrame=tmin, maxFrame=tmax )
+        massArrayList = []
+        for i, animalId in enumerate( self.animalIdList ):
+            frames, massX, massY, massZ = getMassArrays( pool.animalDictionary[animalId] )
+            massArrayList.append( ( frames, massX, massY ) )
+            frames = frames[ ( frames >= tmin ) & ( frames <= tmax ) ]
+            self.detected[ frames - tmin ] |= 1 << i
+
+            stopStarts, stopEnds = stopDic[ "Stop", animalId ].getIntervals()
+            self.stopped |= self.getIntervalMask( stopStarts, stopEnds ).astype( np.int64 ) << i
+
+        contactGroups = getContactGroups( connection, file, self.animalIdList, tmin, tmax )
+        self.adjacency = contactGroups.adjacency.astype( np.int64 ) & self.pairTable[ self.detected ]
+
+        # anonymous detections
+        self.anonymousTouched = np.zeros( nbFrame, dtype=np.int64 )
+        self.nbAnonymousGroup = np.zeros( nbFrame, dtype=np.int64 )
+        self.nbAnonymousAlone = np.zeros( nbFrame, dtype=np.int64 )
+        self.mergeAnonymousDetection( pool.getAnonymousDetectionIndex().restrict( tmin, tmax ), massArrayList, parameters )
+
+        # component of each animal, and number of groups in the frame
+        self.component = self.componentTable[ self.adjacency ]
+        nbAnimalGroup = np.zeros( nbFrame, dtype=np.int64 )
+        for i in range( nbAnimal ):
+            # an animal is counted for its group if it is the first animal of the group
+            isFirst = ( self.component[:, i] & ( ( 1 << i ) - 1 ) ) == 0
+            nbAnimalGroup += ( ( self.detected >> i & 1 ) == 1 ) & isFirst
+        self.nbGroup = nbAnimalGroup + self.nbAnonymousGroup
+
+        # animals alone in their group (without anonymous detection)
+        self.aloneBits = np.zeros( nbFrame, dtype=np.int64 )
+        for i in range( nbAnimal ):
+            alone = ( self.component[:, i] == 1 << i ) & ( ( ( self.detected & ~self.anonymousTouched ) >> i & 1 ) == 1 )
+            self.aloneBits |= alone.astype( np.int64 ) << i
+
+    def getIntervalMask(self, starts, ends ):
+        ''' for each frame of the window: the frame is in one of the intervals '''
+        nbFrame = len( self.detected )
+        change = np.zeros( nbFrame + 1, dtype=np.int64 )
+        np.add.at( change, np.clip( starts - self.tmin, 0, nbFrame ), 1 )
+        np.add.at( change, np.clip( ends - self.tmin + 1, 0, nbFrame ), -1 )
+        return np.cumsum( change[:-1] ) > 0
+
+    def mergeAnonymousDetection(self, anonymousIndex, massArrayList, parameters ):
+        '''
+        adds the links made by the anonymous detections (AnonymousDetectionIndex of the window) to the adjacency.
+        '''
+        nbDetection = len( anonymousIndex )
+        if nbDetection == 0:
+            return
+
+        frames = anonymousIndex.detectionFrame
+        distanceContact = parameters.DISTANCE_CONTACT_MASS_CENTER
+
+        # animals close to each anonymous detection
+        animalBits = np.zeros( nbDetection, dtype=np.int64 )
+        for i, ( animalFrames, animalMassX, animalMassY ) in enumerate( massArrayList ):
+            pointIndex, detectionIndex = anonymousIndex.getDetectionsWithinRadius( animalFrames, animalMassX, animalMassY, distanceContact )
+            np.bitwise_or.at( animalBits, detectionIndex, 1 << i )
+
+        # close anonymous detections of the same frame
+        edgeA, edgeB = anonymousIndex.getClosePairs( distanceContact )
+
+        # clusters: each detection gets the smallest index of its cluster
+        label = np.arange( nbDetection )
+        while len( edgeA ) > 0:
+            newLabel = label.copy()
+            np.minimum.at( newLabel, edgeA, label[edgeB] )
+            np.minimum.at( newLabel, edgeB, label[edgeA] )
+            if np.array_equal( newLabel, label ):
+                break
+            label = newLabel
+
+        clusterBits = np.zeros( nbDetection, dtype=np.int64 )
+        np.bitwise_or.at( clusterBits, label, animalBits )
+        clusterSize = np.bincount( label, minlength=nbDetection )
+
+        hasEdge = animalBits != 0
+        hasEdge[edgeA] = True
+        hasEdge[edgeB] = True
+        np.add.at( self.nbAnonymousAlone, frames[~hasEdge] - self.tmin, 1 )
+
+        root = np.flatnonzero( label == np.arange( nbDetection ) )
+        rootFrames = frames[root] - self.tmin
+        rootBits = clusterBits[root]
+        np.bitwise_or.at( self.adjacency, rootFrames, self.pairTable[ rootBits ] )
+        np.bitwise_or.at( self.anonymousTouched, rootFrames, rootBits )
+        anonymousGroup = ( rootBits == 0 ) & ( clusterSize[root] > 1 )
+        np.add.at( self.nbAnonymousGroup, rootFrames[anonymousGroup], 1 )
+
+    def getNest4Intervals(self):
+        '''
+        all the animals of the frame (detected or anonymous) form one group, and the detected animals are stopped.
+        '''
+        nest = ( self.nbGroup == 1 ) & ( self.nbAnonymousAlone == 0 ) & ( ( self.detected & ~self.stopped ) == 0 )
+        return intervalsFromFrames( np.flatnonzero( nest ) + self.tmin )
+
+    def getNest3Intervals(self, animalId ):
+        '''
+        two groups: the animal is alone (without anonymous detection), and the other animals, stopped, form the other group.
+        '''
+        i = self.indexDic[animalId]
+        bit = 1 << i
+
+        others = self.detected & ~bit
+        othersStopped = ( others & ~self.stopped ) == 0
+
+        # two animals alone: the group of the animal first in the pool is taken as the biggest one
+        laterBits = sum( 1 << j for j in range( len( self.animalIdList ) ) if self.rankList[j] > self.rankList[i] )
+        otherAloneLater = ( others != 0 ) & ( ( others & ( others - 1 ) ) == 0 ) & ( ( others & self.aloneBits & laterBits ) == others ) & ( self.nbAnonymousGroup == 0 )
+
+        nest = ( self.nbGroup == 2 ) & ( ( self.aloneBits & bit ) != 0 ) & othersStopped & ~otherAloneLater
+        return intervalsFromFrames( np.flatnonzero( nest ) + self.tmin )
+
+
+class TestNestDetector ( unittest.TestCase ):
+
+    def getReferenceFrames(self, connection, file, tmin, tmax, parameters ):
+        '''
+        frames of Nest3 ( animal id -> frames ) and of Nest4 computed with a graph per frame, as BuildEventNest3 and
+        BuildEventNest4 did before NestDetector
+        '''
+        import networkx as nx
+        from lmtanalysis.Animal import AnimalPool, Animal
+        from lmtanalysis.Event import EventTimeLine
+
+        pool = AnimalPool( )
+        pool.loadAnimals( connection )
+        pool.loadDetection( start = tmin, end = tmax, lightLoad = True )
+        pool.loadAnonymousDetection( start = tmin, end = tmax )
+        animalList = pool.getAnimalList()
+
+        contact = {}
+        for idA, idB in itertools.permutations( range( 1, 5 ), 2 ):
+            contact[idA, idB] = EventTimeLine( connection, "Contact", idA, idB, minFrame=tmin, maxFrame=tmax ).getDictionary()
+        stopDictionary = {}
+        for idA in range( 1, 5 ):
+            stopDictionary[idA] = EventTimeLine( connection, "Stop", idA, minFrame=tmin, maxFrame=tmax ).getDictionary()
+
+        nest3FrameDic = { idA: set() for idA in range( 1, 5 ) }
+        nest4FrameSet = set()
+        for t in range( tmin, tmax + 1 ):
+
+            animalDetectedList = [ animal for animal in animalList if t in animal.detectionDictionary ]
+            anonymousDetectionList = pool.getAnonymousDetection( t )
+
+            graph = nx.Graph()
+            for animal in animalDetectedList:
+                graph.add_node( animal )
+            for animalA in animalDetectedList:
+                for animalB in animalDetectedList:
+                    if animalA != animalB and t in contact[animalA.baseId, animalB.baseId]:
+                        graph.add_edge( animalA, animalB )
+
+            nbAnimalAtT = len( animalDetectedList )
+            if anonymousDetectionList != None:
+                nbAnimalAtT += len( anonymousDetectionList )
+                for detectionA in anonymousDetectionList:
+                    for detectionB in anonymousDetectionList:
+                        if detectionA != detectionB:
+                            distance = detectionA.getDistanceTo( detectionB, parameters )
+                            if distance != None and distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
+                                graph.add_edge( detectionA, detectionB )
+                for detection in anonymousDetectionList:
+                    for animal in animalDetectedList:
+                        distance = detection.getDistanceTo( animal.getDetectionAt( t ), parameters )
+                        if distance != None and distance < parameters.DISTANCE_CONTACT_MASS_CENTER:
+                            graph.add_edge( animal, detection )
+
+            listCC = sorted( nx.connected_components( graph ), key=len, reverse=True )
+
+            # Nest3
+            if len( listCC ) == 2:
+                if all( t in stopDictionary[animal.baseId] for animal in listCC[0] if isinstance( animal, Animal ) ):
+                    if len( listCC[1] ) == 1:
+                        animal = list( listCC[1] )[0]
+                        if isinstance( animal, Animal ):
+                            nest3FrameDic[animal.baseId].add( t )
+
+            # Nest4
+            if nbAnimalAtT == 0:
+                nest4FrameSet.add( t )
+            elif len( listCC ) > 0 and len( listCC[0] ) == nbAnimalAtT:
+                if all( t in stopDictionary[animal.baseId] for animal in animalDetectedList ):
+                    nest4FrameSet.add( t )
+
+        return nest3FrameDic, nest4FrameSet
+
+    def test_SameNestsAsGraphPerFrame(self):
+
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.AnimalType import AnimalType
+        from lmtanalysis.Parameters import getAnimalTypeParameters
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+        from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache
+
+        def getFrames( intervals ):
+            return { t for start, end in zip( *intervals ) for t in range( int( start ), int( end ) + 1 ) }
+
+        parameters = getAnimalTypeParameters( AnimalType.MOUSE )
+        tmin, tmax = 0, 5999
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, dropout = 0.05, contactDensity = 0.6, withMask = False, seed = 4 )
+                connection = sqlite3.connect( file )
+                try:
+                    flushEventTimeLineCache()
+                    pool = AnimalPool( )
+                    pool.loadAnimals( connection )
+                    pool.loadDetection( start = tmin, end = tmax, lightLoad = True )
+                    pool.loadAnonymousDetection( start = tmin, end = tmax, columnar = True )
+                    nest = NestDetector( connection, file, pool, tmin, tmax, parameters )
+                    nest3FrameDic = { animalId: getFrames( nest.getNest3Intervals( animalId ) ) for animalId in range( 1, 5 ) }
+                    nest4FrameSet = getFrames( nest.getNest4Intervals() )
+
+                    referenceNest3FrameDic, referenceNest4FrameSet = self.getReferenceFrames( connection, file, tmin, tmax, parameters )
+                finally:
+                    flushEventTimeLineCache()
+                    connection.close()
+
+        # the database has nests of both kinds
+        self.assertTrue( any( len( frames ) > 0 for frames in referenceNest3FrameDic.values() ) )
+        self.assertTrue( len( referenceNest4FrameSet ) > 0 )
+        self.assertEqual( nest3FrameDic, referenceNest3FrameDic )
+        self.assertEqual( nest4FrameSet, referenceNest4FrameSet )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Geometry between the pairs of animals of a pool, computed with numpy.
+
+The detections of all the animals are aligned on a common frame axis (one row per animal, one column per frame),
+in float64 as the detections, and kept so that the contact builders working on the same pool share them. Distances
+head-head, head-tail, tail-tail, mass-mass and the scalar product of the body axes are computed for one pair at a
+time: for 4 animals over 1 day, the geometry takes about 500 MB, and each pair a few temporary arrays of 20 MB. The builders using the geometry declare usesPairGeometry = True, and the scheduler
+drops the geometry of the pool after the last of them ( see releasePairGeometry ).
+
+Values are nan when the point is not available (animal not detected, or head/tail not detected: -1 in the base),
+so any comparison with a threshold is False for these frames.
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+from lmtanalysis.Interval import intervalsFromFrames
+
+''' points available for the distances '''
+POINTS = { "mass": ( "massX", "massY" ), "front": ( "frontX", "frontY" ), "back": ( "backX", "backY" ) }
+
+
+class PairGeometry():
+
+    def __init__(self, pool ):
+
+        self.animalIdList = sorted( pool.animalDictionary.keys() )
+        self.indexDic = { animalId: i for i, animalId in enumerate( self.animalIdList ) }
+        self.signature = getDetectionSignature( pool )
+
+        frameDataList = [ getDetectionArrays( pool.animalDictionary[animalId] ) for animalId in self.animalIdList ]
+
+        if len( frameDataList ) == 0:
+            self.frames = np.zeros( 0, dtype=np.int64 )
+        else:
+            self.frames = np.unique( np.concatenate( [ data["frame"] for data in frameDataList ] ) )
+
+        nbAnimal = len( self.animalIdList )
+        nbFrame = len( self.frames )
+
+        self.data = {}
+        for field in ( "massX", "massY", "frontX", "frontY", "backX", "backY" ):
+            self.data[field] = np.full( ( nbAnimal, nbFrame ), np.nan, dtype=np.float64 )
+
+        for i, data in enumerate( frameDataList ):
+            columns = np.searchsorted( self.frames, data["frame"] )
+            for field in self.data:
+                values = np.asarray( data[field], dtype=np.float64 )
+                if field not in POINTS["mass"]:
+                    # head and tail not detected are stored as -1 in the base
+                    values = np.where( values == -1, np.nan, values )
+                self.data[field][i, columns] = values
+
+        self.headAndTailDetected = ~( np.isnan( self.data["frontX"] ) | np.isnan( self.data["frontY"] ) | np.isnan( self.data["backX"] ) | np.isnan( self.data["backY"] ) )
+
+    def getIndex(self, animalId ):
+        return self.indexDic[animalId]
+
+    def getDistance(self, pointA, pointB, idA, idB ):
+        '''
+        distance between pointA of idA and pointB of idB for each frame of self.frames ( nan for the same animal ).
+        points are "mass", "front" or "back".
+        '''
+        if idA == idB:
+            return np.full( len( self.frames ), np.nan )
+
+        i = self.getIndex( idA )
+        j = self.getIndex( idB )
+        fieldXA, fieldYA = POINTS[pointA]
+        fieldXB, fieldYB = POINTS[pointB]
+        return np.hypot( self.data[fieldXA][i] - self.data[fieldXB][j], self.data[fieldYA][i] - self.data[fieldYB][j] )
+
+    def getBodyAxisProduct(self, idA, idB ):
+        '''
+        scalar product of the body axes (back to front) of idA and idB for each frame of self.frames.
+        >= 0 when the animals look in the same direction.
+        '''
+        i = self.getIndex( idA )
+        j = self.getIndex( idB )
+        vectXA = self.data["frontX"][i] - self.data["backX"][i]
+        vectYA = self.data["frontY"][i] - self.data["backY"][i]
+        vectXB = self.data["frontX"][j] - self.data["backX"][j]
+        vectYB = self.data["frontY"][j] - self.data["backY"][j]
+        return vectXA * vectXB + vectYA * vectYB
+
+    def getHeadAndTailDetected(self, idA, idB ):
+        ''' frames where head and tail of both animals are detected '''
+        return self.headAndTailDetected[ self.getIndex( idA ) ] & self.headAndTailDetected[ self.getIndex( idB ) ]
+
+    def getIntervals(self, mask ):
+        '''
+        intervals of the frames where mask is True, for EventTimeLine.reBuildWithIntervals
+        '''
+        return intervalsFromFrames( self.frames[ mask ] )
+
+    def getNbBytes(self):
+        return sum( array.nbytes for array in self.data.values() ) + self.headAndTailDetected.nbytes + self.frames.nbytes
+
+
+def getDetectionArrays( animal ):
+    '''
+    frame and coordinates of the detections of an animal, as numpy arrays.
+    The arrays of the columnar store are used directly when available.
+    '''
+    store = animal.detectionStore
+    if store != None and not store.lightLoad:
+        return store.getArrays()
+
+    frames = sorted( animal.detectionDictionary.keys() )
+    data = { "frame": np.array( frames, dtype=np.int64 ) }
+    for field in ( "massX", "massY", "frontX", "frontY", "backX", "backY" ):
+        # light loaded detections have no head and tail
+        values = [ getattr( animal.detectionDictionary[t], field, None ) for t in frames ]
+        data[field] = np.array( values, dtype=np.float64 )
+
+    return data
+
+def getDetectionSignature( pool ):
+    ''' changes when detections are loaded or filtered '''
+    return tuple( ( animalId, animal.getDetectionSignature() ) for animalId, animal in sorted( pool.animalDictionary.items() ) )
+
+def getPairGeometry( pool ):
+    '''
+    returns the geometry of the pool, shared between the builders until the detections of the pool change.
+    '''
+    geometry = getattr( pool, "pairGeometry", None )
+    if geometry == None or geometry.signature != getDetectionSignature( pool ):
+        print( "Computing pair geometry..." )
+        geometry = PairGeometry( pool )
+        pool.pairGeometry = geometry
+        print( "Pair geometry: {} animals, {} frames".format( len( geometry.animalIdList ), len( geometry.frames ) ) )
+
+    return geometry
+
+def releasePairGeometry( pool ):
+    '''
+    drops the geometry shared by the builders of the pool (see BuildEventScheduler.reBuildEvents)
+    '''
+    if getattr( pool, "pairGeometry", None ) != None:
+        print( "Pair geometry released ({} MB)".format( round( pool.pairGeometry.getNbBytes() / 1000000, 1 ) ) )
+        pool.pairGeometry = None
+
+
+class TestPairGeometry ( unittest.TestCase ):
+
+    def test_SameFramesAsIsSideBySide(self):
+
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.AnimalType import AnimalType
+        from lmtanalysis.Parameters import getAnimalTypeParameters
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+        from lmtanalysis.BuildEventSideBySide import isSideBySide
+
+        parameters = getAnimalTypeParameters( AnimalType.MOUSE )
+        maxDistance = parameters.MAX_DISTANCE_HEAD_HEAD_GENITAL_THRESHOLD*2
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 100000, withMask = False, contactDensity = 0.6, seed = 8 )
+                connection = sqlite3.connect( file )
+                try:
+                    pool = AnimalPool( )
+                    pool.loadAnimals( connection )
+                    pool.loadDetection( start = 0, end = 99999 )
+                finally:
+                    connection.close()
+                geometry = getPairGeometry( pool )
+
+        nbSideBySideFrame = 0
+        for idA in pool.animalDictionary:
+            for idB in pool.animalDictionary:
+                if idA == idB:
+                    continue
+                # same tests as BuildEventSideBySide
+                result = geometry.getHeadAndTailDetected( idA, idB )
+                result &= geometry.getBodyAxisProduct( idA, idB ) >= 0
+                result &= geometry.getDistance( "front", "front", idA, idB ) <= maxDistance
+                result &= geometry.getDistance( "back", "back", idA, idB ) <= maxDistance
+
+                dicA = pool.animalDictionary[idA].detectionDictionary
+                dicB = pool.animalDictionary[idB].detectionDictionary
+                referenceFrames = [ t for t in sorted( dicA ) if t in dicB and isSideBySide( dicA[t], dicB[t], parameters ) ]
+                self.assertEqual( geometry.frames[ result ].tolist(), referenceFrames, ( idA, idB ) )
+                nbSideBySideFrame += len( referenceFrames )
+
+        # side by side contacts are found
+        self.assertTrue( nbSideBySideFrame > 1000 )
+
+if __name__ == '__main__':
+    unittest.main()
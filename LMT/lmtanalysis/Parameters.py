@@ -16,8 +16,5 @@ def getAnimalTypeParameters( animalType ):
         return ParametersRat()
 
     print("Error: animal type is None")
-    quit()
-    
-
-
-    return None
\ No newline at end of file
+    # an exception (instead of quitting) lets a batch process report the file and continue with the next one
+    raise ValueError( "Unknown animal type: {}".format( animalType ) )
\ No newline at end of file
@@ -0,0 +1,324 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Profiles of computeProfile and computeProfilePair ( ComputeMeasuresIdentityProfileOneMouseAutomatic ) in one pass per file.
+
+For a file, the events of all the requested names are read with one query, and the detections (mass center only)
+with one query. TotalLen, Nb and MeanDur of each event and the distance traveled are computed for all the animals
+and all the windows (nights for instance) at once, on interval arrays ( see ExperimentStore.getEventProfileTable and
+getDistanceTable ): the events of a window are clipped, merged when separated by 1 frame or less, and the events
+shorter than 3 frames are removed, as computeProfile does on each timeline.
+
+computeProfilesOverFiles processes the files in parallel processes. The results have the structure of the json files
+of the profile script:
+
+    profileData[file][window][rfid][eventName + " TotalLen"]
+
+with window 0 for [tmin, tmax], or 1, 2... for the nights of [tmin, tmax].
+'''
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import sqlite3
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from lmtanalysis.ColumnarExport import getDetectionColumns, FETCH_SIZE
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
+from lmtanalysis.ExperimentStore import getEventProfileTable, getDistanceTable, getProfileData
+from lmtanalysis.Interval import clipIntervals
+
+''' metadata of the animals in the profiles of pairs, in the order of computeProfilePair '''
+PAIR_PROFILE_FIELDS = ( "animal", "file", "rfid", "genotype", "sex", "age", "strain", "group" )
+
+
+def getWindowList( connection, minFrame, maxFrame, nights = False ):
+    '''
+    [ ( window, minFrame, maxFrame ) ]: [minFrame, maxFrame] ( window 0 ), or the nights in [minFrame, maxFrame]
+    ( windows 1, 2... ), merged and clipped as EventTimeLine( connection, "night", minFrame=minFrame, maxFrame=maxFrame )
+    '''
+    if not nights:
+        return [ ( 0, minFrame, maxFrame ) ]
+
+    query = "SELECT STARTFRAME, ENDFRAME FROM EVENT WHERE NAME='night'"
+    parameterList = []
+    if minFrame != None:
+        query += " AND ENDFRAME>=?"
+        parameterList.append( minFrame )
+    if maxFrame != None:
+        query += " AND STARTFRAME<=?"
+        parameterList.append( maxFrame )
+    cursor = connection.cursor()
+    cursor.execute( query, parameterList )
+    rows = cursor.fetchall()
+    cursor.close()
+
+    starts, ends = clipIntervals( [ row[0] for row in rows ], [ row[1] for row in rows ], minFrame, maxFrame )
+    return [ ( n + 1, start, end ) for n, ( start, end ) in enumerate( zip( starts.tolist(), ends.tolist() ) ) ]
+
+def getAnimalTable( connection, file ):
+    '''
+    animals of the file, in the order of the pool
+    '''
+    # AnimalPool imports ColumnarExport
+    from lmtanalysis.Animal import AnimalPool
+
+    pool = AnimalPool()
+    pool.loadAnimals( connection )
+    rowList = []
+    for animal in pool.getAnimalList():
+        rowList.append( { "file": file, "path": file, "animalId": animal.baseId, "scaleFactor": animal.parameters.scaleFactor, "RFID": animal.RFID,
+                          "name": animal.name, "genotype": animal.genotype, "sex": animal.sex, "age": animal.age, "strain": animal.strain } )
+    return pd.DataFrame( rowList, columns = [ "file", "path", "animalId", "scaleFactor", "RFID", "name", "genotype", "sex", "age", "strain" ] )
+
+def getEventTable( connection, file, eventNameList, minFrame, maxFrame ):
+    '''
+    events of eventNameList overlapping [minFrame, maxFrame], with one query: file, eventName, idA, startFrame, endFrame
+    '''
+    query = "SELECT NAME, IDANIMALA, STARTFRAME, ENDFRAME FROM EVENT WHERE NAME IN ({})".format( ",".join( "?" * len( eventNameList ) ) )
+    parameterList = [ str( eventName ) for eventName in eventNameList ]
+    if minFrame != None:
+        query += " AND ENDFRAME>=?"
+        parameterList.append( minFrame )
+    if maxFrame != None:
+        query += " AND STARTFRAME<=?"
+        parameterList.append( maxFrame )
+
+    cursor = connection.cursor()
+    cursor.execute( query, parameterList )
+    rowList = []
+    while True:
+        rows = cursor.fetchmany( FETCH_SIZE )
+        if len( rows ) == 0:
+            break
+        rowList += rows
+    cursor.close()
+
+    table = pd.DataFrame( rowList, columns = [ "eventName", "idA", "startFrame", "endFrame" ] )
+    table["idA"] = table["idA"].fillna( 0 ).astype( np.int64 )
+    table.insert( 0, "file", file )
+    return table
+
+def getDetectionTable( connection, file, minFrame, maxFrame ):
+    columns = getDetectionColumns( connection, minFrame, maxFrame )
+    return pd.DataFrame( { "file": file, "animalId": columns["animalId"], "frame": columns["frame"], "massX": columns["massX"], "massY": columns["massY"] } )
+
+def getWindowTable( file, windowList ):
+    return pd.DataFrame( { "file": file, "window": [ window for window, minFrame, maxFrame in windowList ],
+                           "minFrame": [ np.nan if minFrame == None else minFrame for window, minFrame, maxFrame in windowList ],
+                           "maxFrame": [ np.nan if maxFrame == None else maxFrame for window, minFrame, maxFrame in windowList ] } )
+
+def getWindowRange( windowList ):
+    ''' frames covering all the windows ( None for no limit ) '''
+    minList = [ minFrame for window, minFrame, maxFrame in windowList ]
+    maxList = [ maxFrame for window, minFrame, maxFrame in windowList ]
+    return ( None if None in minList else min( minList ) ), ( None if None in maxList else max( maxList ) )
+
+def computeFileProfile( file, windowList, eventNameList, withDistance = True ):
+    '''
+    { window: computeProfile( file, minFrame, maxFrame, eventNameList ) } for the windows ( window, minFrame, maxFrame ) of windowList
+    '''
+    connection = getReadOnlyConnection( file )
+    minFrame, maxFrame = getWindowRange( windowList )
+    windowTable = getWindowTable( file, windowList )
+    animalTable = getAnimalTable( connection, file )
+
+    profileTable = getEventProfileTable( getEventTable( connection, file, eventNameList, minFrame, maxFrame ), windowTable, animalTable, eventNameList )
+    distanceTable = None
+    if withDistance:
+        distanceTable = getDistanceTable( getDetectionTable( connection, file, minFrame, maxFrame ), windowTable, animalTable )
+
+    profileData = getProfileData( animalTable, profileTable, distanceTable ).get( file, {} )
+    return { window: profileData.get( window, {} ) for window, minFrame, maxFrame in windowList }
+
+def computeFileProfilePair( file, windowList, singleEventNameList, socialEventNameList ):
+    '''
+    { window: computeProfilePair( file, minFrame, maxFrame, singleEventNameList, socialEventNameList ) } for the windows
+    ( window, minFrame, maxFrame ) of windowList. The social events are counted for the pair ( any animal ).
+    '''
+    connection = getReadOnlyConnection( file )
+    minFrame, maxFrame = getWindowRange( windowList )
+    windowTable = getWindowTable( file, windowList )
+    animalTable = getAnimalTable( connection, file )
+
+    eventTable = getEventTable( connection, file, list( dict.fromkeys( list( singleEventNameList ) + list( socialEventNameList ) ) ), minFrame, maxFrame )
+    singleTable = getEventProfileTable( eventTable, windowTable, animalTable, singleEventNameList )
+    socialTable = getEventProfileTable( eventTable, windowTable, animalTable, socialEventNameList, perAnimal = False )
+    distanceTable = getDistanceTable( getDetectionTable( connection, file, minFrame, maxFrame ), windowTable, animalTable )
+    animalData = getProfileData( animalTable, singleTable, distanceTable, fieldList = PAIR_PROFILE_FIELDS ).get( file, {} )
+
+    # the pair, described with the animals in the order of the pool
+    animals = animalTable.to_dict( "records" )
+    pairName = "{}_{}".format( min( animal["RFID"] for animal in animals ), max( animal["RFID"] for animal in animals ) )
+    sexPair = animals[0]["sex"] if animals[0]["sex"] == animals[1]["sex"] else "mixed"
+    strainPair = animals[0]["strain"] if animals[0]["strain"] == animals[1]["strain"] else "{}_{}".format( animals[0]["strain"], animals[1]["strain"] )
+
+    result = {}
+    for window, windowMin, windowMax in windowList:
+        pairData = { "genotype": "{}_{}".format( animals[0]["genotype"], animals[1]["genotype"] ), "file": file, "animal": pairName, "sex": sexPair,
+                     "age": animals[0]["age"], "strain": strainPair, "group": pairName, "totalDistance": "totalDistance" }
+        for row in socialTable[ socialTable["window"] == window ].to_dict( "records" ):
+            pairData[row["eventName"] + " TotalLen"] = int( row["TotalLen"] )
+            pairData[row["eventName"] + " Nb"] = int( row["Nb"] )
+            pairData[row["eventName"] + " MeanDur"] = row["MeanDur"] if row["Nb"] > 0 else 0
+        # the pair is the first entry, its events are set after the ones of the animals
+        result[window] = { pairName: pairData, **animalData.get( window, {} ) }
+
+    return result
+
+def computeProfileWorker( file, minFrame, maxFrame, nights, eventNameList, socialEventNameList ):
+    '''
+    profiles of the windows of one file, in a separate process
+    '''
+    windowList = getWindowList( getReadOnlyConnection( file ), minFrame, maxFrame, nights )
+    if socialEventNameList == None:
+        return file, computeFileProfile( file, windowList, eventNameList )
+    return file, computeFileProfilePair( file, windowList, eventNameList, socialEventNameList )
+
+def computeProfilesOverFiles( files, minFrame, maxFrame, eventNameList, nights = False, socialEventNameList = None, nbWorker = 1 ):
+    '''
+    profileData[file][window] of all the files, for [minFrame, maxFrame] ( window 0 ) or its nights ( windows 1, 2... ).
+    socialEventNameList != None computes the profiles of pairs ( computeProfilePair, eventNameList being the single events ).
+    nbWorker > 1 processes the files in parallel processes.
+    '''
+    profileData = {}
+    if nbWorker <= 1:
+        for file in files:
+            file, data = computeProfileWorker( file, minFrame, maxFrame, nights, eventNameList, socialEventNameList )
+            profileData[file] = data
+        return profileData
+
+    with ProcessPoolExecutor( max_workers = nbWorker ) as executor:
+        futureList = [ executor.submit( computeProfileWorker, file, minFrame, maxFrame, nights, eventNameList, socialEventNameList ) for file in files ]
+        for future in futureList:
+            file, data = future.result()
+            print( "Profile computed:", file )
+            profileData[file] = data
+
+    return profileData
+
+
+class TestProfileEngine ( unittest.TestCase ):
+
+    def getReferenceProfile(self, connection, minT, maxT, eventNameList, perAnimal = True ):
+        '''
+        measures of computeProfile ( perAnimal ) or of the pair in computeProfilePair, computed on the timelines
+        '''
+        from lmtanalysis.Animal import AnimalPool
+        from lmtanalysis.Event import EventTimeLine
+
+        pool = AnimalPool( )
+        pool.loadAnimals( connection )
+        idList = list( pool.animalDictionary.keys() ) if perAnimal else [ None ]
+
+        profile = {}
+        for animal in idList:
+            data = {}
+            for eventName in eventNameList:
+                timeLine = EventTimeLine( connection, eventName, animal, minFrame=minT, maxFrame=maxT )
+                timeLine.mergeCloseEvents( numberOfFrameBetweenEvent=1 )
+                timeLine.removeEventsBelowLength( maxLen=3 )
+                totalLen = timeLine.getTotalLength()
+                nb = timeLine.getNumberOfEvent( minFrame=minT, maxFrame=maxT )
+                data[eventName + " TotalLen"] = totalLen
+                data[eventName + " Nb"] = nb
+                data[eventName + " MeanDur"] = 0 if nb == 0 else totalLen / nb
+            if perAnimal:
+                animalObject = pool.animalDictionary[animal]
+                animalObject.loadDetection( start=minT, end=maxT, lightLoad=True )
+                data["totalDistance"] = animalObject.getDistance( tmin=minT, tmax=maxT ) / 100
+                profile[animalObject.RFID] = data
+            else:
+                profile["pair"] = data
+        return profile
+
+    def addShortEvents(self, file, nbAnimal ):
+        '''
+        "Short" events of 1 to 6 frames separated by 0 to 3 frames, to test the merge and the length filter
+        '''
+        rng = np.random.default_rng( 5 )
+        rowList = []
+        for animalId in range( 1, nbAnimal + 1 ):
+            frame = int( rng.integers( 0, 20 ) )
+            while frame < 5900:
+                length = int( rng.integers( 1, 7 ) )
+                rowList.append( ( "Short", frame, frame + length - 1, animalId ) )
+                frame += length + int( rng.integers( 1, 5 ) ) + ( 0 if rng.random() < 0.7 else 100 )
+        connection = sqlite3.connect( file )
+        try:
+            connection.executemany( "INSERT INTO EVENT ( NAME, STARTFRAME, ENDFRAME, IDANIMALA ) VALUES ( ?,?,?,? )", rowList )
+            connection.commit()
+        finally:
+            connection.close()
+
+    def assertSameMeasures(self, engineData, referenceData ):
+        for key, value in referenceData.items():
+            if key == "totalDistance":
+                self.assertAlmostEqual( engineData[key], value, places=6 )
+            else:
+                self.assertEqual( engineData[key], value, key )
+
+    def test_SameProfileAsTimeLines(self):
+
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        eventNameList = [ "Stop", "Contact", "Approach", "Break contact", "Short", "Nothing" ]
+        windowList = [ ( 0, 0, 5999 ), ( 1, 1000, 4499 ) ]
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, withMask = False, seed = 5 )
+                self.addShortEvents( file, 4 )
+                profileData = computeFileProfile( file, windowList, eventNameList )
+                connection = getReadOnlyConnection( file )
+                try:
+                    referenceData = { window: self.getReferenceProfile( connection, minT, maxT, eventNameList ) for window, minT, maxT in windowList }
+                finally:
+                    connection.close()
+
+        for window, minT, maxT in windowList:
+            self.assertEqual( sorted( profileData[window] ), sorted( referenceData[window] ) )
+            for rfid in referenceData[window]:
+                self.assertSameMeasures( profileData[window][rfid], referenceData[window][rfid] )
+            # the events are found
+            self.assertTrue( all( data["Contact Nb"] > 0 for data in referenceData[window].values() ) )
+
+    def test_SameProfilePairAsTimeLines(self):
+
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        singleEventNameList = [ "Stop", "Approach", "Short" ]
+        socialEventNameList = [ "Contact", "Break contact", "Short", "Nothing" ]
+        windowList = [ ( 0, 0, 5999 ), ( 1, 2000, 3999 ) ]
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbAnimal = 2, nbFrame = 6000, withMask = False, contactDensity = 0.6, seed = 6 )
+                self.addShortEvents( file, 2 )
+                profileData = computeFileProfilePair( file, windowList, singleEventNameList, socialEventNameList )
+                connection = getReadOnlyConnection( file )
+                try:
+                    referenceData = {}
+                    for window, minT, maxT in windowList:
+                        referenceData[window] = self.getReferenceProfile( connection, minT, maxT, singleEventNameList )
+                        referenceData[window]["pair"] = self.getReferenceProfile( connection, minT, maxT, socialEventNameList, perAnimal = False )["pair"]
+                finally:
+                    connection.close()
+
+        for window, minT, maxT in windowList:
+            # the pair is the first entry
+            pairName, *rfidList = profileData[window]
+            self.assertEqual( sorted( rfidList ), sorted( rfid for rfid in referenceData[window] if rfid != "pair" ) )
+            self.assertSameMeasures( profileData[window][pairName], referenceData[window]["pair"] )
+            for rfid in rfidList:
+                self.assertSameMeasures( profileData[window][rfid], referenceData[window][rfid] )
+            self.assertTrue( referenceData[window]["pair"]["Contact Nb"] > 0 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,301 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Checkpoints of Rebuild_All_Events, stored in the LOG table.
+
+Each ( builder, time window ) built is logged with the process "Checkpoint <builder>", the tmin and tmax of the window,
+and a version made of the version of the builder (module variable version, "0" by default), of a signature of
+the parameters used (animal type and parameter values) and of the last event id ( MAX(ID) FROM EVENT ) after the build.
+The start of each window is logged with the process "Rebuild window" and the last event id before the build.
+
+The events of a ( builder, window ) are the events of the builder written between the start of the window and its
+checkpoint ( event ids ). Consecutive windows share their boundary frame (tmax is included), so the events can not be
+found with their frames without removing the events of the previous window.
+
+A rebuild from scratch logs "Flush events" when the events are flushed, and an incremental rebuild logs
+"Incremental rebuild" as it changes the events of the last windows: only the checkpoints logged after the last
+of these entries are valid. A resumed rebuild removes the events written after the last checkpoint of the interrupted
+window, skips the ( builder, window ) with a valid checkpoint of the same version, and rebuilds the others, as well as
+the builders depending on them.
+'''
+
+import io
+import os
+import sys
+import sqlite3
+import tempfile
+import contextlib
+import hashlib
+import unittest
+import subprocess
+from lmtanalysis.TaskLogger import TaskLogger
+from lmtanalysis.Event import EventTransaction
+from lmtanalysis.Parameters import getAnimalTypeParameters
+from lmtanalysis import BuildEventScheduler
+from lmtanalysis.Point import Point
+
+CHECKPOINT_LOG_PREFIX = "Checkpoint "
+FLUSH_LOG_PROCESS = "Flush events"
+INCREMENTAL_LOG_PROCESS = "Incremental rebuild"
+WINDOW_LOG_PROCESS = "Rebuild window"
+
+
+def logFlush( connection ):
+    TaskLogger( connection ).addLog( FLUSH_LOG_PROCESS )
+
+def logIncrementalRebuild( connection, tmin, tmax ):
+    TaskLogger( connection ).addLog( INCREMENTAL_LOG_PROCESS, tmin=tmin, tmax=tmax )
+
+def getPlainValue( value ):
+    '''
+    value made of numbers, strings and tuples only (a Point is ( x, y )), or None if it can not be converted.
+    The repr of other objects can contain their address, which changes in each process.
+    '''
+    if value == None or isinstance( value, ( bool, int, float, str ) ):
+        return value
+    if isinstance( value, Point ):
+        return ( value.x, value.y )
+    if isinstance( value, ( list, tuple ) ):
+        valueList = [ getPlainValue( item ) for item in value ]
+        if None in valueList:
+            return None
+        return tuple( valueList )
+    return None
+
+def getMaxEventId( connection ):
+    cursor = connection.cursor()
+    cursor.execute( "SELECT MAX(ID) FROM EVENT" )
+    maxEventId = cursor.fetchall()[0][0]
+    cursor.close()
+    return maxEventId or 0
+
+def getProducedEventNameList( eventClassList ):
+    eventNameList = []
+    for ev in eventClassList:
+        eventNameList.extend( getattr( ev, "producedEvents", [] ) )
+    return eventNameList
+
+def getParameterSignature( animalType ):
+    '''
+    short hash of the animal type and of the values of its parameters ( numbers, strings, points and lists of them )
+    '''
+    parameters = getAnimalTypeParameters( animalType )
+    valueList = []
+    for key, value in sorted( vars( type( parameters ) ).items() ):
+        if key.startswith( "__" ) or callable( value ):
+            continue
+        plainValue = getPlainValue( value )
+        if plainValue != None:
+            valueList.append( ( key, plainValue ) )
+    return hashlib.sha1( repr( ( str( animalType ), valueList ) ).encode() ).hexdigest()[:10]
+
+def getCheckpointVersion( ev, animalType ):
+    return "{}:{}".format( getattr( ev, "version", "0" ), getParameterSignature( animalType ) )
+
+
+class RebuildCheckpoint():
+
+    def __init__(self, connection, animalType ):
+
+        self.connection = connection
+        self.animalType = animalType
+        # ( builder, tmin, tmax ) -> ( version, first event id (excluded), last event id )
+        self.checkpointDic = {}
+        # last window started: ( tmin, tmax ) and event id before its build
+        self.window = None
+        self.windowEventId = None
+
+        # checkpoints written after the last flush, the last one of a unit wins
+        self.taskLogger = TaskLogger( connection )
+        logList = sorted( self.taskLogger.logList, key=lambda log: log.id )
+        for log in logList:
+            if log.process in ( FLUSH_LOG_PROCESS, INCREMENTAL_LOG_PROCESS ):
+                self.checkpointDic.clear()
+                self.window = None
+                self.windowEventId = None
+            elif log.process == WINDOW_LOG_PROCESS:
+                self.window = ( int( log.tmin ), int( log.tmax ) )
+                self.windowEventId = int( log.version )
+            elif log.process != None and log.process.startswith( CHECKPOINT_LOG_PREFIX ):
+                builderName = log.process[ len( CHECKPOINT_LOG_PREFIX ): ]
+                version, separator, lastEventId = str( log.version ).rpartition( "@" )
+                if separator == "" or self.windowEventId == None:
+                    # cleared, or written without event ids: the unit is rebuilt
+                    self.checkpointDic[ builderName, int( log.tmin ), int( log.tmax ) ] = ( None, None, None )
+                    continue
+                self.checkpointDic[ builderName, int( log.tmin ), int( log.tmax ) ] = ( version, self.windowEventId, int( lastEventId ) )
+
+    def canResume(self):
+        ''' a window has been started since the last flush '''
+        return self.window != None
+
+    def isDone(self, ev, tmin, tmax ):
+        version, firstEventId, lastEventId = self.checkpointDic.get( ( ev.__name__, tmin, tmax ), ( None, None, None ) )
+        return version == getCheckpointVersion( ev, self.animalType )
+
+    def getPendingEventClassList(self, eventClassList, tmin, tmax ):
+        '''
+        builders of eventClassList to build for the window: missing or outdated checkpoint,
+        or depending on a builder rebuilt in the window.
+        '''
+        pendingList = [ ev for ev in eventClassList if not self.isDone( ev, tmin, tmax ) ]
+
+        changedEventNameList = getProducedEventNameList( pendingList )
+        downstreamList = BuildEventScheduler.getDownstreamEventClassList( eventClassList, changedEventNameList )
+
+        return [ ev for ev in eventClassList if ev in pendingList or ev in downstreamList ]
+
+    def _deleteEvents(self, cursor, eventNameList, firstEventId, lastEventId = None ):
+        query = "DELETE FROM EVENT WHERE NAME IN ({}) AND ID>?".format( ",".join( "?" * len( eventNameList ) ) )
+        parameterList = eventNameList + [ firstEventId ]
+        if lastEventId != None:
+            query += " AND ID<=?"
+            parameterList.append( lastEventId )
+        cursor.execute( query, parameterList )
+        return cursor.rowcount
+
+    def clearInterrupted(self, eventClassList ):
+        '''
+        removes the events written by the builders of the last window started after their last checkpoint (window
+        interrupted). Inside a window, the events of the builders built in parallel are committed before the checkpoint.
+        '''
+        if self.window == None:
+            return
+
+        nbEvent = 0
+        cursor = self.connection.cursor()
+        with EventTransaction( self.connection ):
+            for ev in eventClassList:
+                eventNameList = getProducedEventNameList( [ ev ] )
+                if len( eventNameList ) == 0:
+                    continue
+                firstEventId = self.windowEventId
+                version, checkpointFirstEventId, lastEventId = self.checkpointDic.get( ( ev.__name__, ) + self.window, ( None, None, None ) )
+                if checkpointFirstEventId == self.windowEventId:
+                    # built in the last window: its events are before its checkpoint
+                    firstEventId = lastEventId
+                nbEvent += self._deleteEvents( cursor, eventNameList, firstEventId )
+        cursor.close()
+        print( "Checkpoint: {} events of the interrupted window {} - {} removed".format( nbEvent, *self.window ) )
+
+    def clearWindow(self, eventClassList, tmin, tmax ):
+        '''
+        removes the events produced by the builders in the window, written by an outdated build or before
+        a builder they depend on was rebuilt. The checkpoints of these builders are cleared.
+        '''
+        nbEvent = 0
+        cursor = self.connection.cursor()
+        with EventTransaction( self.connection ):
+            for ev in eventClassList:
+                version, firstEventId, lastEventId = self.checkpointDic.get( ( ev.__name__, tmin, tmax ), ( None, None, None ) )
+                eventNameList = getProducedEventNameList( [ ev ] )
+                if firstEventId == None or len( eventNameList ) == 0:
+                    continue
+                nbEvent += self._deleteEvents( cursor, eventNameList, firstEventId, lastEventId )
+                self.taskLogger.addLog( CHECKPOINT_LOG_PREFIX + ev.__name__, version="cleared", tmin=tmin, tmax=tmax )
+                self.checkpointDic[ ev.__name__, tmin, tmax ] = ( None, None, None )
+        cursor.close()
+        print( "Checkpoint: {} events removed in window {} - {}".format( nbEvent, tmin, tmax ) )
+
+    def startWindow(self, tmin, tmax ):
+        ''' logs the start of the build of a window, with the last event id '''
+        self.window = ( tmin, tmax )
+        self.windowEventId = getMaxEventId( self.connection )
+        self.taskLogger.addLog( WINDOW_LOG_PROCESS, version=self.windowEventId, tmin=tmin, tmax=tmax )
+
+    def addCheckpoint(self, ev, tmin, tmax ):
+        version = getCheckpointVersion( ev, self.animalType )
+        lastEventId = getMaxEventId( self.connection )
+        self.taskLogger.addLog( CHECKPOINT_LOG_PREFIX + ev.__name__, version="{}@{}".format( version, lastEventId ), tmin=tmin, tmax=tmax )
+        self.checkpointDic[ ev.__name__, tmin, tmax ] = ( version, self.windowEventId, lastEventId )
+
+
+class TestRebuildCheckpoint ( unittest.TestCase ):
+
+    def test_ParameterSignatureAcrossProcesses(self):
+
+        from lmtanalysis.AnimalType import AnimalType
+
+        code = "from lmtanalysis.AnimalType import AnimalType; from lmtanalysis.RebuildCheckpoint import getParameterSignature; print( getParameterSignature( AnimalType.MOUSE ) )"
+        # the folder containing the lmtanalysis package
+        folder = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+        signatureList = [ subprocess.run( [ sys.executable, "-c", code ], cwd=folder, capture_output=True, text=True, check=True ).stdout.strip() for i in range( 2 ) ]
+
+        self.assertEqual( signatureList[0], signatureList[1] )
+        self.assertEqual( signatureList[0], getParameterSignature( AnimalType.MOUSE ) )
+
+    def rebuild(self, file, eventClassList, resume = False, crashWindow = None ):
+        '''
+        windows of 2000 frames built as Rebuild_All_Events does. The last builder of crashWindow commits its
+        events and an extra event, and raises an exception before its checkpoint.
+        '''
+        from lmtanalysis.AnimalType import AnimalType
+        from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache
+
+        connection = sqlite3.connect( file )
+        checkpoint = RebuildCheckpoint( connection, AnimalType.MOUSE )
+        if resume:
+            checkpoint.clearInterrupted( eventClassList )
+        else:
+            with EventTransaction( connection, deferDelete=True ):
+                for ev in eventClassList:
+                    ev.flush( connection )
+                logFlush( connection )
+
+        try:
+            for tmin in range( 0, 6000, 2000 ):
+                tmax = min( tmin + 2000, 5999 )
+                windowEventClassList = eventClassList
+                if resume:
+                    windowEventClassList = checkpoint.getPendingEventClassList( eventClassList, tmin, tmax )
+                    checkpoint.clearWindow( windowEventClassList, tmin, tmax )
+                checkpoint.startWindow( tmin, tmax )
+                flushEventTimeLineCache()
+
+                def built( ev ):
+                    if tmin == crashWindow and ev == eventClassList[-1]:
+                        connection.execute( "INSERT INTO EVENT( NAME, IDANIMALA, STARTFRAME, ENDFRAME ) VALUES ( ?, 1, ?, ? )", ( ev.producedEvents[0], tmin, tmin + 100 ) )
+                        connection.commit()
+                        raise MemoryError( "crash" )
+                    checkpoint.addCheckpoint( ev, tmin, tmax )
+
+                BuildEventScheduler.reBuildEvents( connection, file, windowEventClassList, tmin, tmax, animalType = AnimalType.MOUSE, builtCallback = built )
+        finally:
+            flushEventTimeLineCache()
+
+        rows = connection.execute( "SELECT NAME, IDANIMALA, IDANIMALB, IDANIMALC, IDANIMALD, STARTFRAME, ENDFRAME FROM EVENT" ).fetchall()
+        connection.close()
+        return sorted( rows, key=lambda row: tuple( str( value ) for value in row ) )
+
+    def test_ResumeAfterCrash(self):
+
+        from lmtanalysis import BuildEventDetection, BuildEventStop, BuildEventMove
+        from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+
+        eventClassList = [ BuildEventDetection, BuildEventStop, BuildEventMove ]
+        with tempfile.TemporaryDirectory() as folder:
+            file = os.path.join( folder, "test.sqlite" )
+            with contextlib.redirect_stdout( io.StringIO() ):
+                createSyntheticDatabase( file, nbFrame = 6000, seed = 1 )
+                eventList = self.rebuild( file, eventClassList )
+
+                with self.assertRaises( MemoryError ):
+                    self.rebuild( file, eventClassList, crashWindow = 2000 )
+                resumedEventList = self.rebuild( file, eventClassList, resume = True )
+
+                # a new version of a builder: it is rebuilt in all windows, with the builders depending on it
+                BuildEventStop.version = "test"
+                try:
+                    updatedEventList = self.rebuild( file, eventClassList, resume = True )
+                finally:
+                    del BuildEventStop.version
+
+        # the events of the windows boundaries are built once by each window
+        self.assertTrue( any( row[5] == 2000 for row in eventList ) )
+        self.assertEqual( resumedEventList, eventList )
+        self.assertEqual( updatedEventList, eventList )
+
+if __name__ == '__main__':
+    unittest.main()
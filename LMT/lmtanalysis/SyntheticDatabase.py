@@ -0,0 +1,351 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Synthetic LMT databases, to measure and compare the performance of the analysis on a known amount of data
+( see Benchmark.py ).
+
+The database has the tables written by LMT: ANIMAL, DETECTION (with the DATA masks), EVENT and FRAME.
+Animals move from waypoint to waypoint in the cage (one waypoint every BLOCK_LENGTH frames, then they stay still).
+For a part of the waypoints ( contactDensity ) several animals go to the same place, which gives contacts and groups.
+Detections are dropped at random ( dropout ): half of them are written as anonymous detections (ANIMALID NULL).
+
+The events built by LMT during the tracking and read by the BuildEvent modules are written too:
+Contact, Approach, Break contact, Escape contact and Stop.
+'''
+
+import sqlite3
+import zlib
+import datetime
+import numpy as np
+
+from lmtanalysis.Measure import oneSecond, oneHour
+from lmtanalysis.Event import EventTimeLine, EventTransaction
+from lmtanalysis.Interval import intervalsFromFrames
+from lmtanalysis.ParametersMouse import ParametersMouse
+from lmtanalysis.BuildDataBaseIndex import buildDataBaseIndex
+
+''' frames between two waypoints of an animal '''
+BLOCK_LENGTH = 10*oneSecond
+
+''' part of the cage used by the animals (pixels) '''
+CAGE_X = ( 130, 380 )
+CAGE_Y = ( 80, 335 )
+
+''' half length and half width of the body of the animals (pixels) '''
+BODY_HALF_LENGTH = 20
+BODY_HALF_WIDTH = 9
+
+''' radius (pixels) of the place where the animals meet '''
+MEETING_RADIUS = 20
+
+''' number of orientations of the masks (a mask is encoded once per orientation) '''
+NB_MASK_ORIENTATION = 16
+
+''' number of frames written at once '''
+WRITE_CHUNK_SIZE = 100000
+
+''' duration (frames) of the approach before a contact, and of the break after it '''
+APPROACH_LENGTH = 15
+
+''' minimal duration (frames) of a stop '''
+MIN_STOP_LENGTH = 15
+
+
+def createTables( connection ):
+
+    cursor = connection.cursor()
+    cursor.execute( "CREATE TABLE ANIMAL ( ID INTEGER PRIMARY KEY, RFID TEXT, GENOTYPE TEXT, NAME TEXT )" )
+    cursor.execute( "CREATE TABLE DETECTION ( ID INTEGER PRIMARY KEY AUTOINCREMENT, FRAMENUMBER INTEGER, ANIMALID INTEGER, MASS_X REAL, MASS_Y REAL, MASS_Z REAL, FRONT_X REAL, FRONT_Y REAL, FRONT_Z REAL, BACK_X REAL, BACK_Y REAL, BACK_Z REAL, REARING BOOLEAN, LOOK_UP BOOLEAN, LOOK_DOWN BOOLEAN, DATA TEXT )" )
+    cursor.execute( "CREATE TABLE EVENT ( ID INTEGER PRIMARY KEY AUTOINCREMENT, NAME TEXT, DESCRIPTION TEXT, STARTFRAME INTEGER, ENDFRAME INTEGER, IDANIMALA INTEGER, IDANIMALB INTEGER, IDANIMALC INTEGER, IDANIMALD INTEGER, METADATA TEXT )" )
+    cursor.execute( "CREATE TABLE FRAME ( FRAMENUMBER INTEGER PRIMARY KEY, TIMESTAMP INTEGER, NUMPARTICLE INTEGER, PAUSED INTEGER, TEMPERATURE REAL, HUMIDITY REAL, SOUND REAL, LIGHTVISIBLE REAL, LIGHTVISIBLEANDIR REAL )" )
+    cursor.close()
+
+def encodeMaskData( array ):
+    '''
+    encodes a boolean array as the boolMaskData of LMT ( see Mask.decodeMaskData )
+    '''
+    compressed = zlib.compress( array.astype( np.uint8 ).tobytes() )
+    return ":".join( "{:x}".format( value ) for value in compressed )
+
+def getMaskTemplate( angle, halfLength ):
+    '''
+    returns the width, the height, and the xml of the mask of a body oriented along angle,
+    with {x} and {y} to format with the position of the bounding box.
+    '''
+    size = int( np.ceil( max( halfLength, BODY_HALF_WIDTH ) ) ) + 1
+    y, x = np.mgrid[ -size:size+1, -size:size+1 ]
+    u = x * np.cos( angle ) + y * np.sin( angle )
+    v = - x * np.sin( angle ) + y * np.cos( angle )
+    array = ( u / halfLength ) ** 2 + ( v / BODY_HALF_WIDTH ) ** 2 <= 1
+    h, w = array.shape
+
+    xml = "<root><ROI><boundsX>{x}</boundsX><boundsY>{y}</boundsY><boundsW>" + str( w ) + "</boundsW><boundsH>" + str( h ) + "</boundsH><boolMaskData>" + encodeMaskData( array ) + "</boolMaskData></ROI></root>"
+    return w, h, xml
+
+
+class SyntheticExperiment():
+    '''
+    trajectories of the animals, computed for all the frames with numpy.
+    '''
+
+    def __init__(self, nbAnimal = 4, nbFrame = oneHour, dropout = 0.02, contactDensity = 0.3, seed = 0 ):
+
+        self.nbAnimal = nbAnimal
+        self.nbFrame = nbFrame
+        self.dropout = dropout
+        self.contactDensity = contactDensity
+        self.random = np.random.default_rng( seed )
+
+        self.computeTrajectories()
+        self.computeDetections()
+
+    def computeTrajectories(self):
+
+        rng = self.random
+        nbAnimal = self.nbAnimal
+        nbBlock = self.nbFrame // BLOCK_LENGTH + 2
+
+        # waypoint k is reached during block k
+        waypointX = rng.uniform( CAGE_X[0], CAGE_X[1], ( nbAnimal, nbBlock ) )
+        waypointY = rng.uniform( CAGE_Y[0], CAGE_Y[1], ( nbAnimal, nbBlock ) )
+        for k in range( 1, nbBlock ):
+            if nbAnimal < 2 or rng.random() >= self.contactDensity:
+                continue
+            members = rng.choice( nbAnimal, rng.integers( 2, nbAnimal + 1 ), replace=False )
+            meetingX = rng.uniform( CAGE_X[0] + MEETING_RADIUS, CAGE_X[1] - MEETING_RADIUS )
+            meetingY = rng.uniform( CAGE_Y[0] + MEETING_RADIUS, CAGE_Y[1] - MEETING_RADIUS )
+            radius = MEETING_RADIUS * np.sqrt( rng.random( len( members ) ) )
+            angle = rng.uniform( 0, 2 * np.pi, len( members ) )
+            waypointX[members, k] = meetingX + radius * np.cos( angle )
+            waypointY[members, k] = meetingY + radius * np.sin( angle )
+
+        moveDuration = rng.integers( 20, BLOCK_LENGTH - 50, ( nbAnimal, nbBlock ) )
+        rearing = rng.random( ( nbAnimal, nbBlock ) ) < 0.15
+        rearingLength = rng.integers( 15, 45, ( nbAnimal, nbBlock ) )
+
+        frames = np.arange( self.nbFrame )
+        block = frames // BLOCK_LENGTH + 1
+        inBlock = frames % BLOCK_LENGTH
+
+        # smooth move to the waypoint, then stay
+        progress = np.clip( inBlock[None, :] / moveDuration[:, block], 0, 1 )
+        progress = progress * progress * ( 3 - 2 * progress )
+
+        startX, endX = waypointX[:, block-1], waypointX[:, block]
+        startY, endY = waypointY[:, block-1], waypointY[:, block]
+        self.massX = startX + ( endX - startX ) * progress + rng.normal( 0, 0.5, ( nbAnimal, self.nbFrame ) )
+        self.massY = startY + ( endY - startY ) * progress + rng.normal( 0, 0.5, ( nbAnimal, self.nbFrame ) )
+        self.angle = np.arctan2( endY - startY, endX - startX )
+
+        # rearing after the arrival at the waypoint
+        arrival = moveDuration[:, block] + 10
+        self.rearing = rearing[:, block] & ( inBlock[None, :] >= arrival ) & ( inBlock[None, :] < arrival + rearingLength[:, block] )
+
+        halfLength = np.where( self.rearing, BODY_HALF_LENGTH * 0.6, BODY_HALF_LENGTH )
+        self.frontX = self.massX + halfLength * np.cos( self.angle )
+        self.frontY = self.massY + halfLength * np.sin( self.angle )
+        self.backX = self.massX - halfLength * np.cos( self.angle )
+        self.backY = self.massY - halfLength * np.sin( self.angle )
+        # the slope of the body ( frontZ - backZ ) is above ParametersMouse.BODY_SLOPE_THRESHOLD when rearing
+        self.massZ = np.where( self.rearing, 50, 30 ) + rng.normal( 0, 1, ( nbAnimal, self.nbFrame ) )
+        self.frontZ = np.where( self.rearing, 80, 35 ) + rng.normal( 0, 1, ( nbAnimal, self.nbFrame ) )
+        self.backZ = 25 + rng.normal( 0, 1, ( nbAnimal, self.nbFrame ) )
+
+    def computeDetections(self):
+
+        rng = self.random
+        shape = ( self.nbAnimal, self.nbFrame )
+        missing = rng.random( shape ) < self.dropout
+        self.detected = ~missing
+        self.anonymous = missing & ( rng.random( shape ) < 0.5 )
+        self.headTailDetected = rng.random( shape ) >= self.dropout
+        self.lookUp = rng.random( shape ) < 0.05
+        self.lookDown = rng.random( shape ) < 0.05
+
+    def getNbParticle(self):
+        return ( self.detected | self.anonymous ).sum( axis=0 )
+
+    def getStopFrames(self, animalIndex ):
+        ''' frames where the animal moves less than 5 pixels in 10 frames '''
+        x = self.massX[animalIndex]
+        y = self.massY[animalIndex]
+        move = np.hypot( x[10:] - x[:-10], y[10:] - y[:-10] )
+        stop = np.zeros( self.nbFrame, dtype=bool )
+        stop[5:-5] = move < 5
+        return np.flatnonzero( stop & self.detected[animalIndex] )
+
+    def getContactFrames(self, indexA, indexB ):
+        distance = np.hypot( self.massX[indexA] - self.massX[indexB], self.massY[indexA] - self.massY[indexB] )
+        contact = ( distance < ParametersMouse.DISTANCE_CONTACT_MASS_CENTER ) & self.detected[indexA] & self.detected[indexB]
+        return np.flatnonzero( contact )
+
+    def getMove(self, animalIndex, start, end ):
+        start = int( np.clip( start, 0, self.nbFrame - 1 ) )
+        end = int( np.clip( end, 0, self.nbFrame - 1 ) )
+        return np.hypot( self.massX[animalIndex, end] - self.massX[animalIndex, start], self.massY[animalIndex, end] - self.massY[animalIndex, start] )
+
+
+def writeAnimals( connection, experiment, genotypeList ):
+
+    rows = []
+    for i in range( experiment.nbAnimal ):
+        rows.append( ( i + 1, "00000000{:04d}".format( i + 1 ), genotypeList[ i % len( genotypeList ) ], "Animal{}".format( i + 1 ) ) )
+    connection.executemany( "INSERT INTO ANIMAL ( ID, RFID, GENOTYPE, NAME ) VALUES ( ?,?,?,? )", rows )
+
+def writeDetections( connection, experiment, withMask = True ):
+
+    maskList = []
+    if withMask:
+        for rearing in ( False, True ):
+            halfLength = BODY_HALF_LENGTH * 0.6 if rearing else BODY_HALF_LENGTH
+            maskList.append( [ getMaskTemplate( 2 * np.pi * i / NB_MASK_ORIENTATION, halfLength ) for i in range( NB_MASK_ORIENTATION ) ] )
+    orientation = np.round( experiment.angle / ( 2 * np.pi ) * NB_MASK_ORIENTATION ).astype( np.int64 ) % NB_MASK_ORIENTATION
+
+    query = "INSERT INTO DETECTION ( FRAMENUMBER, ANIMALID, MASS_X, MASS_Y, MASS_Z, FRONT_X, FRONT_Y, FRONT_Z, BACK_X, BACK_Y, BACK_Z, REARING, LOOK_UP, LOOK_DOWN, DATA ) VALUES ( ?,?,?,?,?,?,?,?,?,?,?,?,?,?,? )"
+    nbDetection = 0
+
+    for chunkStart in range( 0, experiment.nbFrame, WRITE_CHUNK_SIZE ):
+
+        chunkEnd = min( chunkStart + WRITE_CHUNK_SIZE, experiment.nbFrame )
+        # detections in the order of the tracker: frame by frame
+        frameIndex, animalIndex = np.nonzero( ( experiment.detected | experiment.anonymous )[:, chunkStart:chunkEnd].T )
+        frameIndex = frameIndex + chunkStart
+
+        columns = {}
+        for name in ( "massX", "massY", "massZ", "frontX", "frontY", "frontZ", "backX", "backY", "backZ" ):
+            columns[name] = np.round( getattr( experiment, name )[animalIndex, frameIndex], 1 ).tolist()
+
+        detectedList = experiment.detected[animalIndex, frameIndex].tolist()
+        headTailList = experiment.headTailDetected[animalIndex, frameIndex].tolist()
+        rearingList = experiment.rearing[animalIndex, frameIndex].tolist()
+        lookUpList = experiment.lookUp[animalIndex, frameIndex].tolist()
+        lookDownList = experiment.lookDown[animalIndex, frameIndex].tolist()
+        orientationList = orientation[animalIndex, frameIndex].tolist()
+
+        rows = []
+        for i, ( t, a ) in enumerate( zip( frameIndex.tolist(), animalIndex.tolist() ) ):
+
+            data = None
+            if withMask:
+                w, h, xml = maskList[ rearingList[i] ][ orientationList[i] ]
+                data = xml.format( x = int( columns["massX"][i] - w / 2 ), y = int( columns["massY"][i] - h / 2 ) )
+
+            if not detectedList[i]:
+                # anonymous detection: no identity, no head and tail
+                rows.append( ( t, None, columns["massX"][i], columns["massY"][i], columns["massZ"][i], -1, -1, -1, -1, -1, -1, 0, 0, 0, data ) )
+                continue
+
+            if headTailList[i]:
+                head = ( columns["frontX"][i], columns["frontY"][i], columns["frontZ"][i], columns["backX"][i], columns["backY"][i], columns["backZ"][i] )
+            else:
+                head = ( -1, -1, -1, -1, -1, -1 )
+
+            rows.append( ( t, a + 1, columns["massX"][i], columns["massY"][i], columns["massZ"][i] ) + head + ( rearingList[i], lookUpList[i], lookDownList[i], data ) )
+
+        connection.executemany( query, rows )
+        nbDetection += len( rows )
+
+    return nbDetection
+
+def writeFrames( connection, experiment, startDate ):
+
+    frames = np.arange( experiment.nbFrame )
+    timeStamp = int( startDate.timestamp() * 1000 ) + frames * 1000 // oneSecond
+
+    # light from 8:00 to 20:00
+    hour = ( startDate.hour + startDate.minute / 60 + frames / oneHour ) % 24
+    light = np.where( ( hour >= 8 ) & ( hour < 20 ), 1000, 0 )
+
+    temperature = np.round( 22 + np.sin( frames / ( 24 * oneHour ) * 2 * np.pi ), 1 )
+    rows = zip( frames.tolist(), timeStamp.tolist(), experiment.getNbParticle().tolist(), [0] * len( frames ), temperature.tolist(), [40.0] * len( frames ), [0.0] * len( frames ), light.tolist(), ( light + 100 ).tolist() )
+    connection.executemany( "INSERT INTO FRAME ( FRAMENUMBER, TIMESTAMP, NUMPARTICLE, PAUSED, TEMPERATURE, HUMIDITY, SOUND, LIGHTVISIBLE, LIGHTVISIBLEANDIR ) VALUES ( ?,?,?,?,?,?,?,?,? )", rows )
+
+def saveIntervals( connection, eventName, idA, idB, starts, ends ):
+
+    timeLine = EventTimeLine( connection, eventName, idA, idB, loadEvent=False )
+    timeLine.reBuildWithIntervals( starts, ends )
+    timeLine.saveTimeLine( connection )
+    return timeLine.getNbEvent()
+
+def writeTrackerEvents( connection, experiment ):
+    '''
+    events built by LMT during the tracking, read by the BuildEvent modules
+    '''
+    nbEvent = 0
+    escapeMove = 10 * ( APPROACH_LENGTH / oneSecond ) / ParametersMouse.scaleFactor # 10 cm/s during the break
+
+    with EventTransaction( connection ):
+
+        for a in range( experiment.nbAnimal ):
+            starts, ends = intervalsFromFrames( experiment.getStopFrames( a ) )
+            keep = ends - starts + 1 >= MIN_STOP_LENGTH
+            nbEvent += saveIntervals( connection, "Stop", a + 1, None, starts[keep], ends[keep] )
+
+        for a in range( experiment.nbAnimal ):
+            for b in range( a + 1, experiment.nbAnimal ):
+
+                starts, ends = intervalsFromFrames( experiment.getContactFrames( a, b ) )
+                nbEvent += saveIntervals( connection, "Contact", a + 1, b + 1, starts, ends )
+                nbEvent += saveIntervals( connection, "Contact", b + 1, a + 1, starts, ends )
+
+                # the animal moving the most approaches before the contact, and breaks it after
+                eventDic = { ( "Approach", a ): [], ( "Approach", b ): [], ( "Break contact", a ): [], ( "Break contact", b ): [], ( "Escape contact", a ): [], ( "Escape contact", b ): [] }
+                for start, end in zip( starts.tolist(), ends.tolist() ):
+
+                    if start - APPROACH_LENGTH >= 0:
+                        mover = a if experiment.getMove( a, start - APPROACH_LENGTH, start ) >= experiment.getMove( b, start - APPROACH_LENGTH, start ) else b
+                        eventDic[ "Approach", mover ].append( ( start - APPROACH_LENGTH, start - 1 ) )
+
+                    if end + APPROACH_LENGTH < experiment.nbFrame:
+                        moveA = experiment.getMove( a, end, end + APPROACH_LENGTH )
+                        moveB = experiment.getMove( b, end, end + APPROACH_LENGTH )
+                        mover = a if moveA >= moveB else b
+                        eventDic[ "Break contact", mover ].append( ( end + 1, end + APPROACH_LENGTH ) )
+                        if max( moveA, moveB ) > escapeMove:
+                            eventDic[ "Escape contact", mover ].append( ( end + 1, end + APPROACH_LENGTH ) )
+
+                for ( eventName, mover ), intervalList in eventDic.items():
+                    other = b if mover == a else a
+                    intervals = np.array( intervalList, dtype=np.int64 ).reshape( -1, 2 )
+                    nbEvent += saveIntervals( connection, eventName, mover + 1, other + 1, intervals[:, 0], intervals[:, 1] )
+
+    return nbEvent
+
+def createSyntheticDatabase( file, nbAnimal = 4, nbFrame = oneHour, dropout = 0.02, contactDensity = 0.3, withMask = True, seed = 0, genotypeList = [ "WT" ], startDate = None, buildIndex = True ):
+    '''
+    writes a synthetic LMT database in file (which must not exist).
+    nbFrame: duration of the experiment in frames (30 per second).
+    dropout: probability for a detection to be missing (half of the missing ones are written as anonymous detections),
+    or for the head and tail of a detection to be missing.
+    contactDensity: probability for each waypoint that a group of animals meet.
+    withMask: writes the DATA mask of the detections.
+    returns a description of the database ( nbAnimal, nbFrame, nbDetection, nbEvent ... ).
+    '''
+    if startDate == None:
+        startDate = datetime.datetime( 2026, 1, 1, 12, 0, 0 )
+
+    print( "Synthetic database: computing {} animals, {} frames".format( nbAnimal, nbFrame ) )
+    experiment = SyntheticExperiment( nbAnimal = nbAnimal, nbFrame = nbFrame, dropout = dropout, contactDensity = contactDensity, seed = seed )
+
+    connection = sqlite3.connect( file )
+    try:
+        createTables( connection )
+        writeAnimals( connection, experiment, genotypeList )
+        print( "Synthetic database: writing detections" )
+        nbDetection = writeDetections( connection, experiment, withMask = withMask )
+        writeFrames( connection, experiment, startDate )
+        connection.commit()
+        print( "Synthetic database: writing events" )
+        nbEvent = writeTrackerEvents( connection, experiment )
+        if buildIndex:
+            buildDataBaseIndex( connection )
+        connection.commit()
+    finally:
+        connection.close()
+
+    description = { "file": file, "nbAnimal": nbAnimal, "nbFrame": nbFrame, "dropout": dropout, "contactDensity": contactDensity,
+                   "withMask": withMask, "seed": seed, "nbDetection": nbDetection, "nbEvent": nbEvent }
+    print( "Synthetic database:", description )
+    return description
@@ -18,6 +18,7 @@ test in: 2478 USV event
 '''
 from datetime import date, datetime
 from tabulate import tabulate
+from lmtanalysis.EventTransactionRegistry import getEventTransaction
 
 class Log:
     
@@ -106,10 +107,14 @@ class TaskLogger:
                     
         print( query )
         cursor.execute( query )
-        self.conn.commit()
+        # inside an EventTransaction, the log is committed with the events
+        if getEventTransaction( self.conn ) == None:
+            self.conn.commit()
+        id = cursor.lastrowid
         cursor.close()    
         
-        self.loadLog()
+        # the log already loaded is completed instead of being loaded again
+        self.logList.append( Log( id, process, str( version ), date, tmin, tmax ) )
 
     
 
@@ -14,6 +14,7 @@ from random import randrange, random
 import string
 import numpy as np
 import scipy.stats
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -45,7 +46,7 @@ def getAllEvents(connection=None, file=None, ):
     if not (file or connection):
         raise ValueError("Enter file or connection")
     elif file:
-        connection = sqlite3.connect(file)
+        connection = getReadOnlyConnection(file)
 
     print( "Loading event names:", end="")
     c = connection.cursor().execute( "SELECT name FROM event GROUP BY name" )
@@ -172,17 +173,16 @@ def getDistanceBetweenPointInPx( x1 , y1, x2, y2 ):
 
 def getNumberOfFrames(file):
     """Return the number of frame for a given experiment"""
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     c = connection.cursor()
     query = "SELECT MAX(FRAMENUMBER) FROM FRAME";
     c.execute( query )
     numberOfFrames = c.fetchall()
-    connection.close()
     return int(numberOfFrames[0][0])
 
 def getStartInDatetime(file):
     """Return the start of a given experiment in a datetime format"""
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     c = connection.cursor()
     query = "SELECT MIN(TIMESTAMP) FROM FRAME";
     c.execute( query )
@@ -190,12 +190,11 @@ def getStartInDatetime(file):
     for row in rows:
         start = datetime.datetime.fromtimestamp(row[0]/1000)
 
-    connection.close()
     return start
 
 def getEndInDatetime(file):
     """Return the end of a given experiment in a datetime format"""
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     c = connection.cursor()
     query = "SELECT MAX(TIMESTAMP) FROM FRAME";
     c.execute( query )
@@ -203,7 +202,6 @@ def getEndInDatetime(file):
     for row in rows:
         end = datetime.datetime.fromtimestamp(row[0]/1000)
 
-    connection.close()
     return end
 
 
@@ -229,7 +227,7 @@ def recoverFrame(file, MyDatetime):
     Return the clothest FRAMENUMBER from a given datetime
     The datetime must have this format: dd-mm-YYYY hh:mm:ss
     """
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     c = connection.cursor()
 
     # get timedate of 1st and last frame
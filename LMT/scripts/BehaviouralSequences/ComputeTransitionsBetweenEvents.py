@@ -13,7 +13,7 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.FileUtil import *
 from lmtanalysis.Util import *
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import EventTimeLineCached, enablePersistentEventTimeLineCache
 from lmtanalysis.BehaviouralSequencesUtil import exclusiveEventList, exclusiveEventsLabels, sexList, genoList, sexListGeneral, genoListGeneral,\
     exclusiveEventListLabels
 import pandas as pd
@@ -475,6 +475,7 @@ if __name__ == '__main__':
     letterList = list(string.ascii_uppercase)
 
     print("Code launched.")
+    enablePersistentEventTimeLineCache()
 
     
 
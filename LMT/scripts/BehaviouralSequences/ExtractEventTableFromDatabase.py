@@ -13,6 +13,7 @@ from lmtanalysis.FileUtil import *
 from lmtanalysis.Util import *
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.BehaviouralSequencesUtil import exclusiveEventList, exclusiveEventsLabels, sexList, genoList
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 import pandas as pd
 import seaborn as sns
 
@@ -29,7 +30,7 @@ if __name__ == '__main__':
 
     for file in files:
         print(file)
-        connection = sqlite3.connect(file)
+        connection = getReadOnlyConnection(file)
         pool = AnimalPool()
         pool.loadAnimals(connection)
         
@@ -51,7 +52,6 @@ if __name__ == '__main__':
 
         connection.commit()
         c.close()
-        connection.close()
 
 
     print('Job done.')
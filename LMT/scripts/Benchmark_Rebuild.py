@@ -0,0 +1,58 @@
+'''
+Created on 18 oct. 2026
+
+@author: Fab
+
+Benchmark of the rebuild of all the events on a synthetic database ( see lmtanalysis/Benchmark.py ).
+
+    python Benchmark_Rebuild.py --frames 108000 --animals 4 --output benchmark.json
+
+--file uses a copy of an existing database instead of a synthetic one.
+Compare the json files of two versions of the code to find regressions.
+'''
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+from lmtanalysis.Benchmark import benchmarkFile, saveBenchmark
+from lmtanalysis.SyntheticDatabase import createSyntheticDatabase
+from lmtanalysis.Measure import oneHour
+from lmtanalysis.AnimalType import AnimalType
+
+from Rebuild_All_Events import eventClassList
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser( description="Benchmark of the rebuild of the events" )
+    parser.add_argument( "--frames", type=int, default=oneHour, help="duration of the synthetic experiment in frames" )
+    parser.add_argument( "--animals", type=int, default=4, help="number of animals" )
+    parser.add_argument( "--dropout", type=float, default=0.02, help="probability for a detection to be missing" )
+    parser.add_argument( "--contact", type=float, default=0.3, help="contact density: probability for a group of animals to meet" )
+    parser.add_argument( "--no-mask", action="store_true", help="does not write the DATA masks of the detections" )
+    parser.add_argument( "--seed", type=int, default=0 )
+    parser.add_argument( "--file", help="database to benchmark (a copy is used) instead of a synthetic one" )
+    parser.add_argument( "--output", default="benchmark.json", help="json result file" )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        file = os.path.join( directory, "benchmark.sqlite" )
+        database = None
+        if args.file != None:
+            shutil.copy( args.file, file )
+            database = { "file": args.file }
+        else:
+            database = createSyntheticDatabase( file, nbAnimal = args.animals, nbFrame = args.frames, dropout = args.dropout,
+                                                contactDensity = args.contact, withMask = not args.no_mask, seed = args.seed )
+
+        result = benchmarkFile( file, eventClassList, animalType = AnimalType.MOUSE )
+        result["database"] = database
+        saveBenchmark( result, args.output )
+
+    print( "Total: {:.1f} s, SQL: {:.1f} s, {:.0f} frames/s".format( result["total"]["time"], result["total"]["sqlTime"], result["total"]["framesPerSecond"] ) )
+    for module in sorted( result["modules"], key=lambda module: -module["time"] ):
+        print( "{:50} {:8.2f} s  SQL {:8.2f} s  {:10.0f} frames/s  {:6.0f} MB".format( module["name"], module["time"], module["sqlTime"], module["framesPerSecond"], ( module["peakRSS"] or 0 ) / 1e6 ) )
@@ -138,15 +138,11 @@ def computeSpeedDurationPerEvent(animalData, files, tmin, tmax, eventToTest=None
 def getDurationSpeedDistance(event, animal):
                     
     duration = event.duration()
-    sum = 0
-    for t in range ( event.startFrame, event.endFrame+1 ) :
-        speed = animal.getSpeed(t)
-        if ( speed != None ):
-            sum+= speed
+    stats = animal.intervalStats( event.startFrame, event.endFrame )
     
-    meanSpeed = sum / event.duration()
+    meanSpeed = stats["speedSum"] / event.duration()
     
-    distance = animal.getDistance(tmin=event.startFrame, tmax=event.endFrame)
+    distance = stats["distance"]
     
     return ( duration, meanSpeed, distance )
 
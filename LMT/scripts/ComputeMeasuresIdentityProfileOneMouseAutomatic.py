@@ -23,9 +23,11 @@ import matplotlib.patches as mpatches
 from tkinter.filedialog import askopenfilename
 from lmtanalysis.Util import getMinTMaxTAndFileNameInput, getColorGeno,\
     getColorGenoTreatment
-from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.EventTimeLineCache import EventTimeLineCached, enablePersistentEventTimeLineCache
 from lmtanalysis.FileUtil import *
 from lmtanalysis.Util import getFileNameInput, getStarsFromPvalues
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
+from lmtanalysis.ProfileEngine import computeFileProfile, computeFileProfilePair, computeProfilesOverFiles
 import statsmodels.api as sm
 import statsmodels.formula.api as smf
 import pandas
@@ -40,220 +42,28 @@ from random import randint
 from scipy.stats.morestats import shapiro
 
 def computeProfile(file, minT, maxT, behaviouralEventList):
-    
-    connection = sqlite3.connect( file )
-    
-    pool = AnimalPool( )
-    pool.loadAnimals( connection )
-    
-    indList = []
-    for animal in pool.animalDictionary.keys():
-        print("computing individual animal: {}".format(animal))
-        rfid = pool.animalDictionary[animal].RFID
-        indList.append(rfid)
-
-    sortedIndList = sorted(indList)
-    print('sorted list: ', sortedIndList)
-    groupName = sortedIndList[0]
-    for ind in sortedIndList[1:]:
-        print('ind: ', ind)
-        groupName+='_'
-        groupName+=ind
-
-    animalData = {}
-    for animal in pool.animalDictionary.keys():
-        
-        print( "computing individual animal: {}".format( animal )) 
-        rfid = pool.animalDictionary[animal].RFID
-        print( "RFID: {}".format( rfid ) )
-        animalData[rfid]= {}        
-        #store the animal
-        animalData[rfid]["animal"] = pool.animalDictionary[animal].name
-        animalObject = pool.animalDictionary[animal]
-        animalData[rfid]["file"] = file
-        animalData[rfid]["rfid"] = rfid
-        animalData[rfid]['genotype'] = pool.animalDictionary[animal].genotype
-        animalData[rfid]['sex'] = pool.animalDictionary[animal].sex
-        animalData[rfid]['group'] = groupName
-        animalData[rfid]['strain'] = pool.animalDictionary[animal].strain
-        animalData[rfid]['age'] = pool.animalDictionary[animal].age
-                
-        genoA = None
-        try:
-            genoA=pool.animalDictionary[animal].genotype
-        except:
-            pass
-                    
-        for behavEvent in behaviouralEventList:
-            
-            print( "computing individual event: {}".format(behavEvent))    
-            
-            behavEventTimeLine = EventTimeLineCached( connection, file, behavEvent, animal, minFrame=minT, maxFrame=maxT )
-            #clean the behavioural event timeline:
-            behavEventTimeLine.mergeCloseEvents(numberOfFrameBetweenEvent=1)
-            behavEventTimeLine.removeEventsBelowLength(maxLen=3)
-
-            totalEventDuration = behavEventTimeLine.getTotalLength()
-            nbEvent = behavEventTimeLine.getNumberOfEvent(minFrame = minT, maxFrame = maxT )
-            print( "total event duration: " , totalEventDuration )                
-            animalData[rfid][behavEventTimeLine.eventName+" TotalLen"] = totalEventDuration
-            animalData[rfid][behavEventTimeLine.eventName+" Nb"] = nbEvent
-            if nbEvent == 0:
-                meanDur = 0
-            else:
-                meanDur = totalEventDuration / nbEvent
-            animalData[rfid][behavEventTimeLine.eventName+" MeanDur"] = meanDur
-            
-            print(behavEventTimeLine.eventName, genoA, behavEventTimeLine.idA, totalEventDuration, nbEvent, meanDur)
-
-        #compute the total distance traveled (unit = m)
-        COMPUTE_TOTAL_DISTANCE = True
-        if ( COMPUTE_TOTAL_DISTANCE == True ):
-            animalObject.loadDetection( start=minT, end=maxT, lightLoad = True )
-            animalData[rfid]["totalDistance"] = animalObject.getDistance( tmin=minT,tmax=maxT)/100
-        else:
-            animalData[rfid]["totalDistance"] = "totalDistance"
-
-
-    connection.close()
-        
-    return animalData
+    '''
+    profile of each animal of the file between minT and maxT: behavioural events (total length, number, mean duration)
+    and total distance traveled (m). Computed in one pass over the events and detections of the file (see ProfileEngine).
+    '''
+    print("computing profile: {}".format(file))
+    return computeFileProfile(file, [(0, minT, maxT)], behaviouralEventList)[0]
 
 
 def computeProfilePair(file, minT, maxT, behaviouralEventListSingle, behaviouralEventListSocial):
-
-    print("Start computeProfilePair")
-
-    connection2 = sqlite3.connect(file)
-    print(connection2)
-
-    pool = AnimalPool()
-    pool.loadAnimals(connection2)
-
-    pair = []
-    genotype = []
-    sex = []
-    age = []
-    strain = []
-    for animal in pool.animalDictionary.keys():
-        rfid = pool.animalDictionary[animal].RFID
-        geno = pool.animalDictionary[animal].genotype
-        sexAnimal = pool.animalDictionary[animal].sex
-        ageAnimal = pool.animalDictionary[animal].age
-        strainAnimal = pool.animalDictionary[animal].strain
-        pair.append(rfid)
-        genotype.append(geno)
-        sex.append(sexAnimal)
-        age.append(ageAnimal)
-        strain.append(strainAnimal)
-
-    pairName = ('{}_{}'.format(min(pair), max(pair)))
-    genoPair = ('{}_{}'.format(genotype[0], genotype[1]))
-    agePair = age[0]
-    if sex[0] == sex[1]:
-        sexPair = sex[0]
-    else:
-        sexPair = 'mixed'
-    print('pair: ', pairName, genoPair, sexPair)
-
-    if strain[0] == strain[1]:
-        strainPair = strain[0]
-    else:
-        strainPair = '{}_{}'.format(strain[0], strain[1])
-
-    animalData = {}
-    animalData[pairName] = {}
-    animalData[pairName]['genotype'] = genoPair
-    animalData[pairName]["file"] = file
-    animalData[pairName]["animal"] = pairName
-    animalData[pairName]['sex'] = sexPair
-    animalData[pairName]['age'] = agePair
-    animalData[pairName]['strain'] = strainPair
-    animalData[pairName]['group'] = pairName
-    animalData[pairName]["totalDistance"] = "totalDistance"
-
-    for animal in pool.animalDictionary.keys():
-
-        print("computing individual animal: {}".format(animal))
-        rfid = pool.animalDictionary[animal].RFID
-        print("RFID: {}".format(rfid))
-        animalData[rfid] = {}
-        # store the animal
-        animalData[rfid]["animal"] = pool.animalDictionary[animal].name
-        animalObject = pool.animalDictionary[animal]
-        animalData[rfid]["file"] = file
-        animalData[rfid]["rfid"] = rfid
-        animalData[rfid]['genotype'] = pool.animalDictionary[animal].genotype
-        animalData[rfid]['sex'] = pool.animalDictionary[animal].sex
-        animalData[rfid]['age'] = pool.animalDictionary[animal].age
-        animalData[rfid]['strain'] = pool.animalDictionary[animal].strain
-        animalData[rfid]['group'] = pairName
-
-        #compute the profile for single behaviours
-        for behavEvent in behaviouralEventListSingle:
-
-            print("computing individual event: {}".format(behavEvent))
-
-            behavEventTimeLine = EventTimeLineCached(connection2, file, behavEvent, animal, minFrame=minT, maxFrame=maxT)
-            # clean the behavioural event timeline:
-            behavEventTimeLine.mergeCloseEvents(numberOfFrameBetweenEvent=1)
-            behavEventTimeLine.removeEventsBelowLength(maxLen=3)
-
-            totalEventDuration = behavEventTimeLine.getTotalLength()
-            nbEvent = behavEventTimeLine.getNumberOfEvent(minFrame=minT, maxFrame=maxT)
-            print("total event duration: ", totalEventDuration)
-            animalData[rfid][behavEventTimeLine.eventName + " TotalLen"] = totalEventDuration
-            animalData[rfid][behavEventTimeLine.eventName + " Nb"] = nbEvent
-            if nbEvent == 0:
-                meanDur = 0
-            else:
-                meanDur = totalEventDuration / nbEvent
-            animalData[rfid][behavEventTimeLine.eventName + " MeanDur"] = meanDur
-
-            print(behavEventTimeLine.eventName, pool.animalDictionary[animal].genotype, behavEventTimeLine.idA, totalEventDuration, nbEvent, meanDur)
-
-        # compute the total distance traveled per individual
-        COMPUTE_TOTAL_DISTANCE = True
-        if COMPUTE_TOTAL_DISTANCE == True:
-            animalObject.loadDetection(start=minT, end=maxT, lightLoad=True)
-            animalData[rfid]["totalDistance"] = animalObject.getDistance(tmin=minT, tmax=maxT) / 100
-        else:
-            animalData[rfid]["totalDistance"] = "totalDistance"
-
-    # Compute the profiles for both individuals of the pair together
-    for behavEvent in behaviouralEventListSocial:
-
-        print("computing individual event: {}".format(behavEvent))
-
-        behavEventTimeLine = EventTimeLineCached(connection2, file, behavEvent, minFrame=minT, maxFrame=maxT)
-        # clean the behavioural event timeline:
-        behavEventTimeLine.mergeCloseEvents(numberOfFrameBetweenEvent=1)
-        behavEventTimeLine.removeEventsBelowLength(maxLen=3)
-
-        totalEventDuration = behavEventTimeLine.getTotalLength()
-        nbEvent = behavEventTimeLine.getNumberOfEvent(minFrame=minT, maxFrame=maxT)
-        print("total event duration: ", totalEventDuration)
-        animalData[pairName][behavEventTimeLine.eventName + " TotalLen"] = totalEventDuration
-        animalData[pairName][behavEventTimeLine.eventName + " Nb"] = nbEvent
-        if nbEvent == 0:
-            meanDur = 0
-        else:
-            meanDur = totalEventDuration / nbEvent
-        animalData[pairName][behavEventTimeLine.eventName + " MeanDur"] = meanDur
-
-
-        print(behavEventTimeLine.eventName, genoPair, pairName, totalEventDuration, nbEvent, meanDur)
-
-    connection2.close()
-
-    return animalData
+    '''
+    profile of each animal of the pair (single events and total distance), and of the pair (social events of both
+    animals together). Computed in one pass over the events and detections of the file (see ProfileEngine).
+    '''
+    print("computing profile of the pair: {}".format(file))
+    return computeFileProfilePair(file, [(0, minT, maxT)], behaviouralEventListSingle, behaviouralEventListSocial)[0]
 
 
 def computeProfilePairFromPause(file, experimentDuration, behaviouralEventListSingle, behaviouralEventListSocial):
 
     print("Start computeProfilePair")
 
-    connection2 = sqlite3.connect(file)
+    connection2 = getReadOnlyConnection(file)
     print(connection2)
 
     pool = AnimalPool()
@@ -384,8 +194,6 @@ def computeProfilePairFromPause(file, experimentDuration, behaviouralEventListSi
 
         print(behavEventTimeLine.eventName, genoPair, pairName, totalEventDuration, nbEvent, meanDur)
 
-    connection2.close()
-
     return animalData
 
 
@@ -1867,6 +1675,7 @@ def plotZScoreProfileAutoHorizontal(ax, cat, koDataframe, night, eventListForTes
 if __name__ == '__main__':
     
     print("Code launched.")
+    enablePersistentEventTimeLineCache()
     # set font
     from matplotlib import rc, gridspec
 
@@ -1895,52 +1704,29 @@ if __name__ == '__main__':
             
             nightComputation = input("Compute profile only during night events (Y or N)? ")
 
+            if nightComputation == "N":
+                #Compute profile2 data of all the files, in parallel
+                profileDataFiles = computeProfilesOverFiles(files, tmin, tmax, behaviouralEventOneMouse, nights=False, nbWorker=min(len(files), os.cpu_count()))
+                extensionName = 'no_night'
+            elif nightComputation == "Y":
+                profileDataFiles = computeProfilesOverFiles(files, tmin, tmax, ['longChase'], nights=True, nbWorker=min(len(files), os.cpu_count()))
+                extensionName = 'over_night'
+            else:
+                print("You did not use the suggested answers.")
+                break
+
             for file in files:
                 #initialize the result dic
                 profileData = {}
-                
+                profileData[file] = profileDataFiles[file]
+
                 print(file)
                 #get the path and the name of file
                 head, tail = os.path.split(file)
-                
-                connection = sqlite3.connect( file )
-
-                profileData[file] = {}
-
-                pool = AnimalPool( )
-                pool.loadAnimals( connection )
-
-                if nightComputation == "N":
-                    minT = tmin
-                    maxT = tmax
-                    n = 0
-                    #extension = tail[-24:-6]
-                    extension = f'no_night_{os.path.splitext(os.path.basename(tail))[0]}'
-                    print('extension: ', extension)
-                
-                    #Compute profile2 data and save them in a text file
-                    profileData[file][n] = computeProfile(file = file, minT=minT, maxT=maxT, behaviouralEventList=behaviouralEventOneMouse)
-                    
-
-                if nightComputation == "Y":
-                    nightEventTimeLine = EventTimeLineCached( connection, file, "night", minFrame=tmin, maxFrame=tmax )
-                    n = 1
-                    #extension = tail[-24:-6]
-                    extension = f'over_night_{os.path.splitext(os.path.basename(tail))[0]}'
-                    print('extension: ', extension)
-
-                    for eventNight in nightEventTimeLine.getEventList():
-                        minT = eventNight.startFrame
-                        maxT = eventNight.endFrame
-                        print("Night: ", n)
-                        #Compute profile2 data and save them in a text file
-                        profileData[file][n] = computeProfile(file=file, minT=minT, maxT=maxT, behaviouralEventList=['longChase'])
-                        
-                        n+=1
-                        print("Profile data saved.")
-                else:
-                    print("You did not use the suggested answers.")
-                    break
+                #extension = tail[-24:-6]
+                extension = f'{extensionName}_{os.path.splitext(os.path.basename(tail))[0]}'
+                print('extension: ', extension)
+                print("Profile data saved.")
                 
                 # Create a json file to store the computation
                 with open( f"{head}/profile_data_{extension}_{tmin}_{tmax}_longChase.json", 'w') as fp:
@@ -1958,40 +1744,26 @@ if __name__ == '__main__':
             
             nightComputation = input("Compute profile only during night events (Y or N)? ")
 
+            if nightComputation == "N":
+                extensionName = 'no_night'
+            elif nightComputation == "Y":
+                extensionName = 'over_night'
+            else:
+                print("You did not use the suggested answers.")
+                break
+
+            #Compute profile2 data of all the files, in parallel
+            profileDataFiles = computeProfilesOverFiles(files, tmin, tmax, behaviouralEventOneMouseSingle, nights=(nightComputation == "Y"),
+                                                        socialEventNameList=behaviouralEventOneMouseSocial, nbWorker=min(len(files), os.cpu_count()))
+
             for file in files:
                 profileData = {}
                 #get the path and the name of file
                 head, tail = os.path.split(file)
                 print(file)
-                profileData[file] = {}
-
-                if nightComputation == "N":
-                    minT = tmin
-                    maxT = tmax
-                    n = 0
-                    extension = 'no_night_{}'.format(os.path.splitext(os.path.basename(tail))[0])
-                    #Compute profile2 data and save them in a text file
-                    profileData[file][n] = computeProfilePair(file = file, minT=minT, maxT=maxT, behaviouralEventListSingle=behaviouralEventOneMouseSingle, behaviouralEventListSocial=behaviouralEventOneMouseSocial)
-                    
-                    
-                if nightComputation == "Y":
-                    connection = sqlite3.connect(file)
-                    nightEventTimeLine = EventTimeLineCached( connection, file, "night", minFrame=tmin, maxFrame=tmax )
-                    connection.close()
-                    n = 1
-                    extension = 'over_night_{}'.format(os.path.splitext(os.path.basename(tail))[0])
-                    for eventNight in nightEventTimeLine.getEventList():
-                        minT = eventNight.startFrame
-                        maxT = eventNight.endFrame
-                        print("Night: ", n)
-                        #Compute profile2 data and save them in a text file
-                        profileData[file][n] = computeProfilePair(file=file, minT=minT, maxT=maxT, behaviouralEventListSingle=behaviouralEventOneMouseSingle, behaviouralEventListSocial=behaviouralEventOneMouseSocial)
-                        
-                        n+=1
-                        print("Profile data saved.")
-                else:
-                    print("You did not use the suggested answers.")
-                    break
+                profileData[file] = profileDataFiles[file]
+                extension = '{}_{}'.format(extensionName, os.path.splitext(os.path.basename(tail))[0])
+                print("Profile data saved.")
                 
                 # Create a json file to store the computation
                 print('#############################')
@@ -2029,9 +1801,8 @@ if __name__ == '__main__':
                     
                     
                 if nightComputation == "Y":
-                    connection = sqlite3.connect(file)
+                    connection = getReadOnlyConnection(file)
                     nightEventTimeLine = EventTimeLineCached( connection, file, "night", minFrame=tmin, maxFrame=tmax )
-                    connection.close()
                     n = 1
                     extension = 'over_night_{}'.format(os.path.splitext(os.path.basename(tail))[0])
                     for eventNight in nightEventTimeLine.getEventList():
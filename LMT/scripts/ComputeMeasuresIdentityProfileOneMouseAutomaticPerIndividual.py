@@ -33,6 +33,7 @@ from matplotlib.offsetbox import TextArea, DrawingArea, OffsetImage, AnnotationB
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 from lmtanalysis.BehaviouralSequencesUtil import genoList
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 from scipy.stats.morestats import wilcoxon
 import os
 from scipy.stats._morestats import shapiro
@@ -40,7 +41,7 @@ from scipy.stats._morestats import shapiro
 
 def computeProfilePerIndividual(file, minT, maxT, genoList, categoryList, behaviouralEventListTwoMice):
     
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     
     pool = AnimalPool( )
     pool.loadAnimals( connection )
@@ -112,7 +113,6 @@ def computeProfilePerIndividual(file, minT, maxT, genoList, categoryList, behavi
                 
                 print(behavEventTimeLine.eventName, genoA, behavEventTimeLine.idA, genoB, behavEventTimeLine.idB, totalEventDuration, nbEvent, meanDur)
 
-    connection.close()
         
     return animalData
 
@@ -702,7 +702,7 @@ if __name__ == '__main__':
                 head, tail = os.path.split(file)
                 
                 print(file)
-                connection = sqlite3.connect( file )
+                connection = getReadOnlyConnection( file )
 
                 profileData[file] = {}
 
@@ -16,6 +16,7 @@ from lmtanalysis import BuildEventTrain3, BuildEventTrain4, BuildEventFollowZone
 
 from tkinter.filedialog import askopenfilename
 from lmtanalysis.Util import getMinTMaxTAndFileNameInput
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -44,7 +45,7 @@ if __name__ == '__main__':
     for file in files:
         
         print(file)
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
         
         pool = AnimalPool( )
         pool.loadAnimals( connection )
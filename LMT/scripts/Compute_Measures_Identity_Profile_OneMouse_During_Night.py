@@ -18,6 +18,7 @@ from tkinter.filedialog import askopenfilename
 from lmtanalysis.Util import getMinTMaxTAndFileNameInput
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.FileUtil import getFilesToProcess
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -38,7 +39,7 @@ if __name__ == '__main__':
     for file in files:
         
         print(file)
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
         
         pool = AnimalPool( )
         pool.loadAnimals( connection )
@@ -18,6 +18,7 @@ from tkinter.filedialog import askopenfilename
 from lmtanalysis.Util import getMinTMaxTAndFileNameInput, level
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.FileUtil import getFilesToProcess, addJitter
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 from scipy.stats import mannwhitneyu
 import pandas as pd
 
@@ -27,7 +28,7 @@ def computeProfilePairs(files, tmin, tmax, text_file, animalDic ):
     for file in files:
 
         print(file)
-        connection = sqlite3.connect(file)
+        connection = getReadOnlyConnection(file)
 
         pool = AnimalPool()
         pool.loadAnimals(connection)
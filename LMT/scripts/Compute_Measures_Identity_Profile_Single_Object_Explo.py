@@ -14,6 +14,7 @@ from lmtanalysis.Measure import *
 from tkinter.filedialog import askopenfilename
 from lmtanalysis.Util import getMinTMaxTAndFileNameInput
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -32,7 +33,7 @@ if __name__ == '__main__':
     for file in files:
         
         print(file)
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
         
         pool = AnimalPool( )
         pool.loadAnimals( connection )
@@ -106,7 +107,6 @@ if __name__ == '__main__':
                 text_file.write( "{}\t".format( animal[kAnimal][kEvent] ) )
             text_file.write( "\n" );
 
-        connection.close()
         print ("done.")
             
          
@@ -24,6 +24,7 @@ import os
 from lmtanalysis.FileUtil import getFilesToProcess
 
 from lmtanalysis.Util import convert_to_d_h_m_s, getMinTMaxTAndFileNameInput
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -36,7 +37,7 @@ def frameToTimeTicker(x, pos):
 def plotNightTimeLine ( file ):
     
     print(file)
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
     
     nightTimeLineList = []
     
@@ -80,7 +81,7 @@ if __name__ == '__main__':
 
         print( expName )
         
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
     
         pool = AnimalPool( )
         pool.loadAnimals( connection )
@@ -183,6 +184,5 @@ if __name__ == '__main__':
         plt.close( fig )
         #print( "Showing figure...")
         #plt.show()
-        connection.close()
         
     text_file.close()
\ No newline at end of file
@@ -19,6 +19,7 @@ import os
 from lmtanalysis.FileUtil import getFilesToProcess
 from lmtanalysis.Util import convert_to_d_h_m_s, getMinTMaxTInput
 from lmtanalysis.Parameters import getAnimalTypeParameters
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 
 
 
@@ -40,7 +41,7 @@ if __name__ == '__main__':
         expName = file[-22:-7]
         print( expName )
         
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
     
         pool = AnimalPool( )
         pool.loadAnimals( connection )
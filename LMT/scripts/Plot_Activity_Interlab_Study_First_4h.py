@@ -24,6 +24,7 @@ import os
 from lmtanalysis.FileUtil import getFilesToProcess
 
 from lmtanalysis.Util import convert_to_d_h_m_s, getMinTMaxTAndFileNameInput
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 from scripts.PlotTimeLineActivity import frameToTimeTicker
 
 
@@ -57,7 +58,7 @@ if __name__ == '__main__':
         expName = file[-30:-23]
         print( expName )
         
-        connection = sqlite3.connect( file )
+        connection = getReadOnlyConnection( file )
     
         pool = AnimalPool( )
         pool.loadAnimals( connection )
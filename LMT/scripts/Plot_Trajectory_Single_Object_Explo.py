@@ -18,6 +18,7 @@ from matplotlib.patches import *
 from matplotlib.collections import PatchCollection
 from lmtanalysis.Util import *
 from lmtanalysis.Measure import *
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 from matplotlib import patches
 
 def plotNoseTrajectory( ax , animal, title , color = None, colorTitle = 'black' ):
@@ -134,7 +135,7 @@ def buildFigTrajectorySingleObjectExploMalesFemales(files, numberMaleFiles, numb
     nRow = {'male': 0, 'female': 0}  # initialisation of the row
 
     for file in files:
-        connection = sqlite3.connect(file)  # connection to the database
+        connection = getReadOnlyConnection(file)  # connection to the database
 
         pool = AnimalPool()
         pool.loadAnimals(connection)  # upload all the animals from the database
@@ -155,7 +156,6 @@ def buildFigTrajectorySingleObjectExploMalesFemales(files, numberMaleFiles, numb
                 axRight = axesM[nRow['male'], 1]
             plotTrajectoriesInBothPhases(pool, animal, durationPhase1, durationPhase2, axLeft, axRight)
             nRow['male'] += 1
-            connection.close()
 
         if animal.sex == 'female':
             # set the axes. Check the number of file to get the dimension of axes and grab the correct ones.
@@ -168,7 +168,6 @@ def buildFigTrajectorySingleObjectExploMalesFemales(files, numberMaleFiles, numb
             plotTrajectoriesInBothPhases(pool, animal, durationPhase1, durationPhase2, axLeft, axRight)
             nRow['female'] += 1
 
-            connection.close()
 
     if (numberMaleFiles == 0) & (numberFemaleFiles != 0):
         figF.tight_layout(pad=2, h_pad=4, w_pad=0)  # reduce the margins to the minimum
@@ -198,7 +197,7 @@ if __name__ == '__main__':
     numberMaleFiles = 0
     numberFemaleFiles = 0
     for file in files:
-        connection = sqlite3.connect(file)  # connection to the database
+        connection = getReadOnlyConnection(file)  # connection to the database
         pool = AnimalPool()
         pool.loadAnimals(connection)  # upload all the animals from the database
         animal = pool.animalDictionary[1]
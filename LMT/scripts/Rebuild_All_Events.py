@@ -22,13 +22,22 @@ from tkinter.filedialog import askopenfilename
 from lmtanalysis.TaskLogger import TaskLogger
 import sys
 import traceback
+import os
+import contextlib
+import importlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from lmtanalysis.FileUtil import getFilesToProcess
 from lmtanalysis.EventTimeLineCache import flushEventTimeLineCache,\
-    disableEventTimeLineCache
+    disableEventTimeLineCache, setEventTimeLineCacheBudget, printEventTimeLineCacheStats
 
 
 from lmtanalysis.EventTimeLineCache import EventTimeLineCached
 from lmtanalysis.AnimalType import AnimalType
+from lmtanalysis import BuildEventScheduler
+from lmtanalysis.IncrementalRebuild import IncrementalRebuild, logRebuild, getLastFrame
+from lmtanalysis.RebuildCheckpoint import RebuildCheckpoint, logFlush
+from lmtanalysis.Metrics import MetricSpan, addMetricCounter, enableMetrics, resetMetrics, exportMetrics, printMetricSummary
 
 
 ''' minT and maxT to process the analysis (in frame) '''
@@ -43,6 +52,19 @@ windowT = 1*oneDay
 
 USE_CACHE_LOAD_DETECTION_CACHE = True
 
+''' part of the memory (per file) given to the event cache, and events never evicted from it '''
+EVENT_CACHE_MEMORY_RATIO = 0.25
+EVENT_CACHE_PIN_LIST = [ "Contact", "Detection" ]
+
+''' number of processes used to build independent events of a time window at the same time (1: sequential) '''
+NB_BUILDER_WORKER = 1
+
+''' minimum available memory (in GB) to start one more file when processing files in parallel '''
+MIN_AVAILABLE_MEMORY_PER_FILE_GB = 6
+
+''' timings and counters of each file are saved in <file>_metrics.jsonl ("csv" for <file>_metrics.csv, None: not saved), see Metrics.py '''
+METRICS_FORMAT = "jsonl"
+
 class FileProcessException(Exception):
     pass
 
@@ -89,16 +111,37 @@ def flushEvents( connection ):
 
     print("Flushing events...")
 
-    for ev in eventClassList:
+    chrono = Chronometer( "Flushing events" )
 
-        chrono = Chronometer( "Flushing event " + str(ev) )
-        ev.flush( connection );
-        chrono.printTimeInS()
+    # deletes of all builders are grouped in a single DELETE ... WHERE NAME IN (...)
+    with EventTransaction( connection, deferDelete=True ):
+        for ev in eventClassList:
+            ev.flush( connection );
+        # checkpoints written before are no longer valid
+        logFlush( connection )
 
+    chrono.printTimeInS()
 
-def processTimeWindow( connection, file, currentMinT , currentMaxT ):
 
+def processTimeWindow( connection, file, currentMinT , currentMaxT, checkpoint = None, resume = False ):
+    '''
+    checkpoint: RebuildCheckpoint recording each builder built in the window.
+    resume: only builds the builders without a valid checkpoint for the window (and the ones depending on them).
+    '''
     global animalType
+
+    windowEventClassList = eventClassList
+    if resume:
+        windowEventClassList = checkpoint.getPendingEventClassList( eventClassList, currentMinT, currentMaxT )
+        if len( windowEventClassList ) == 0:
+            print( "Window {} - {} already built.".format( currentMinT, currentMaxT ) )
+            return
+        print( "Resuming window {} - {} with:".format( currentMinT, currentMaxT ), [ ev.__name__ for ev in windowEventClassList ] )
+        checkpoint.clearWindow( windowEventClassList, currentMinT, currentMaxT )
+
+    if checkpoint != None:
+        checkpoint.startWindow( currentMinT, currentMaxT )
+
     CheckWrongAnimal.check( connection, tmin=currentMinT, tmax=currentMaxT )
 
     # Warning: enabling this process (CorrectDetectionIntegrity) will alter the database permanently
@@ -117,28 +160,37 @@ def processTimeWindow( connection, file, currentMinT , currentMaxT ):
         animalPool.loadDetection( start = currentMinT, end = currentMaxT )
         print("Caching load of animal detection done.")
 
-    for ev in eventClassList:
-
-        chrono = Chronometer( str( ev ) )
-        ev.reBuildEvent( connection, file, tmin=currentMinT, tmax=currentMaxT, pool = animalPool, animalType = animalType )
-        chrono.printTimeInS()
+    builtCallback = None
+    if checkpoint != None:
+        builtCallback = lambda ev: checkpoint.addCheckpoint( ev, currentMinT, currentMaxT )
 
+    BuildEventScheduler.reBuildEvents( connection, file, windowEventClassList, currentMinT, currentMaxT, pool = animalPool, animalType = animalType, nbWorker = NB_BUILDER_WORKER, builtCallback = builtCallback )
 
 
-def process( file ):
 
+def process( file, nbWorker = 1, incremental = False, resume = False ):
+    '''
+    nbWorker: number of files processed at the same time on this computer. The memory is shared between them.
+    incremental: only rebuilds the frames recorded since the last rebuild (see IncrementalRebuild.py). A full rebuild
+    is done if the file has never been rebuilt.
+    resume: continues an interrupted rebuild: events are not flushed, and the ( builder, time window ) already built
+    with the same version and parameters are skipped (see RebuildCheckpoint.py).
+    '''
     print(file)
 
     mem = virtual_memory()
-    availableMemoryGB = mem.total / 1000000000
-    print( "Total memory on computer: (GB)", availableMemoryGB )
+    availableMemoryGB = mem.total / 1000000000 / nbWorker
+    print( "Total memory on computer: (GB)", mem.total / 1000000000, " memory per file: (GB)", availableMemoryGB )
 
     if availableMemoryGB < 10:
-        print( "Not enough memory to use cache load of events.")
-        disableEventTimeLineCache()
+        print( "Small amount of memory: limiting the event cache.")
+        setEventTimeLineCacheBudget( int( availableMemoryGB * 1000000000 * EVENT_CACHE_MEMORY_RATIO ), pinList = EVENT_CACHE_PIN_LIST )
 
 
-    chronoFullFile = Chronometer("File " + file )
+    if METRICS_FORMAT != None:
+        enableMetrics()
+        resetMetrics()
+    chronoFullFile = MetricSpan( "File", file=file )
 
     connection = sqlite3.connect( file )
 
@@ -160,28 +212,74 @@ def process( file ):
     #animalPool.buildSensorData(file)
 
     currentT = minT
+    endT = maxT
+    # last frame of the base when the rebuild starts: frames recorded later are rebuilt by the next incremental rebuild
+    lastProcessedFrame = maxT
+    lastFrame = getLastFrame( connection )
+    if lastFrame != None:
+        lastProcessedFrame = min( maxT, lastFrame )
+
+    incrementalRebuild = None
+    if incremental:
+        incrementalRebuild = IncrementalRebuild( connection, eventClassList, minT, maxT )
+        if not incrementalRebuild.canAppend():
+            print( "Full rebuild of", file )
+            incrementalRebuild = None
+        elif not incrementalRebuild.hasNewFrames():
+            print( "No new frame since the last rebuild of", file )
+            chronoFullFile.stop()
+            return
+        else:
+            currentT = incrementalRebuild.contextStartFrame
+            endT = incrementalRebuild.endFrame
+            lastProcessedFrame = endT
+
+    checkpoint = None
+    if incrementalRebuild == None:
+        checkpoint = RebuildCheckpoint( connection, animalType )
+    if resume and incrementalRebuild != None:
+        print( "Resume is not used for an incremental rebuild." )
+        resume = False
 
     try:
 
-        flushEvents( connection )
+        if incrementalRebuild != None:
+            incrementalRebuild.prepare()
+        elif resume and checkpoint.canResume():
+            print( "Resuming rebuild of", file )
+            checkpoint.clearInterrupted( eventClassList )
+        else:
+            if resume:
+                resume = False
+                print( "No checkpoint to resume from: full rebuild of", file )
+            flushEvents( connection )
 
-        while currentT < maxT:
+        while currentT < endT:
 
             currentMinT = currentT
             currentMaxT = currentT+ windowT
-            if ( currentMaxT > maxT ):
-                currentMaxT = maxT
+            if ( currentMaxT > endT ):
+                currentMaxT = endT
 
-            chronoTimeWindowFile = Chronometer("File "+ file+ " currentMinT: "+ str(currentMinT)+ " currentMaxT: " + str(currentMaxT) );
-            processTimeWindow( connection, file, currentMinT, currentMaxT )
+            chronoTimeWindowFile = MetricSpan( "Window", file=file, tmin=currentMinT, tmax=currentMaxT )
+            addMetricCounter( "framesProcessed", currentMaxT - currentMinT + 1 )
+            processTimeWindow( connection, file, currentMinT, currentMaxT, checkpoint = checkpoint, resume = resume )
+            chronoTimeWindowFile.stop()
             chronoTimeWindowFile.printTimeInS()
 
             currentT += windowT
 
+        if incrementalRebuild != None:
+            incrementalRebuild.finish()
 
+        logRebuild( connection, minT, lastProcessedFrame )
 
+        chronoFullFile.stop()
         print("Full file process time: ")
         chronoFullFile.printTimeInS()
+        printEventTimeLineCacheStats()
+        # file, windows and builders
+        printMetricSummary( maxDepth = 2 )
 
 
         TEST_WINDOWING_COMPUTATION = False
@@ -231,10 +329,142 @@ def process( file ):
 
         raise FileProcessException()
 
+    finally:
 
+        chronoFullFile.stop()
+        if METRICS_FORMAT != None:
+            exportMetrics( file + "_metrics." + METRICS_FORMAT )
 
-def processAll():
-    
+
+
+def processDownstreamOfEvents( file, changedEventNameList ):
+    '''
+    rebuilds only the builders depending (directly or not) on the events of changedEventNameList,
+    for instance after a correction of the "Contact" events.
+    '''
+    global eventClassList
+
+    fullEventClassList = eventClassList
+    eventClassList = BuildEventScheduler.getDownstreamEventClassList( fullEventClassList, changedEventNameList )
+    print( "Builders to rebuild:", [ ev.__name__ for ev in eventClassList ] )
+
+    try:
+        process( file )
+    finally:
+        eventClassList = fullEventClassList
+
+def processFileWorker( file, aType, eventClassNameList, minTArg, maxTArg, windowTArg, nbWorker, incremental = False, resume = False ):
+    '''
+    processes one file in a worker process. Output is written in the log file next to the database.
+    The configuration of the parent process is passed as arguments as modules can't be sent to other processes.
+    Returns ( file, success, duration in s, log file )
+    '''
+    global minT, maxT, windowT
+
+    setAnimalType( aType )
+    setEventClassList( [ importlib.import_module( name ) for name in eventClassNameList ] )
+    minT = minTArg
+    maxT = maxTArg
+    windowT = windowTArg
+
+    logFile = file + "_rebuild.log"
+    chrono = Chronometer( "File " + file )
+    success = True
+
+    with open( logFile, "w" ) as log, contextlib.redirect_stdout( log ), contextlib.redirect_stderr( log ):
+        try:
+            print ( "Processing file" , file )
+            process( file, nbWorker = nbWorker, incremental = incremental, resume = resume )
+        except FileProcessException:
+            print ( "STOP PROCESSING FILE " + file , file=sys.stderr  )
+            success = False
+        except:
+            traceback.print_exc()
+            success = False
+
+    return ( file, success, chrono.getTimeInS(), logFile )
+
+def processFilesInParallel( files, nbWorker, incremental = False, resume = False ):
+    '''
+    processes files with a pool of nbWorker processes.
+    A new file is started only if MIN_AVAILABLE_MEMORY_PER_FILE_GB are available (or if no other file is running).
+    A failing file does not stop the batch. If a worker process dies (killed when out of memory for instance), the pool
+    is broken: the files running are reported as failed, and the other files are processed with a new pool.
+    Returns the list of results of processFileWorker ( duration None for the files of a broken pool )
+    '''
+    eventClassNameList = [ ev.__name__ for ev in eventClassList ]
+    pendingFiles = list( files )
+    runningFutures = {}
+    resultList = []
+
+    executor = ProcessPoolExecutor( max_workers = nbWorker )
+    try:
+
+        while len( pendingFiles ) > 0 or len( runningFutures ) > 0:
+
+            brokenPool = False
+
+            # admit new files while there is a free worker and enough memory
+            while len( pendingFiles ) > 0 and len( runningFutures ) < nbWorker:
+                availableMemoryGB = virtual_memory().available / 1000000000
+                if len( runningFutures ) > 0 and availableMemoryGB < MIN_AVAILABLE_MEMORY_PER_FILE_GB:
+                    print( "Available memory (GB):", availableMemoryGB, "waiting for a file to finish before starting a new one." )
+                    break
+                file = pendingFiles[0]
+                try:
+                    future = executor.submit( processFileWorker, file, animalType, eventClassNameList, minT, maxT, windowT, nbWorker, incremental, resume )
+                except BrokenProcessPool:
+                    # a worker died since the last wait: the file is submitted to the next pool
+                    brokenPool = True
+                    break
+                pendingFiles.pop( 0 )
+                print ( "Starting file" , file , "( log in" , file + "_rebuild.log )" )
+                runningFutures[future] = file
+
+            doneFutures, notDoneFutures = wait( list( runningFutures.keys() ), timeout = 60, return_when = FIRST_COMPLETED )
+
+            for future in doneFutures:
+                file = runningFutures.pop( future )
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # the worker process itself died (out of memory for instance)
+                    print( "Worker failure:", file, e, file=sys.stderr )
+                    resultList.append( ( file, False, None, file + "_rebuild.log" ) )
+                    brokenPool = True
+                    continue
+                except Exception as e:
+                    print( "Worker failure:", file, e, file=sys.stderr )
+                    resultList.append( ( file, False, None, file + "_rebuild.log" ) )
+                    continue
+                resultList.append( result )
+                file, success, duration, logFile = result
+                if success:
+                    print( "File done:", file, "in", duration, "seconds" )
+                else:
+                    print ( "STOP PROCESSING FILE " + file + " (see " + logFile + ")" , file=sys.stderr  )
+
+            if brokenPool:
+                # all the files running in the pool are lost
+                for future, file in runningFutures.items():
+                    print ( "STOP PROCESSING FILE " + file + " (worker pool broken)" , file=sys.stderr  )
+                    resultList.append( ( file, False, None, file + "_rebuild.log" ) )
+                runningFutures.clear()
+                executor.shutdown( wait = False, cancel_futures = True )
+                print( "Worker pool broken: starting a new pool for the", len( pendingFiles ), "remaining files." )
+                executor = ProcessPoolExecutor( max_workers = nbWorker )
+
+    finally:
+        executor.shutdown()
+
+    return resultList
+
+def processAll( nbWorker = 1, incremental = False, resume = False ):
+    '''
+    nbWorker: number of files processed in parallel (each file is a separate database).
+    incremental: only rebuilds the frames recorded since the last rebuild of each file (experiments still running).
+    resume: continues interrupted rebuilds, skipping what is already built (see RebuildCheckpoint.py).
+    '''
     global eventClassList
     
     files = getFilesToProcess()
@@ -243,12 +473,15 @@ def processAll():
 
     if ( files != None ):
 
-        for file in files:
-            try:
-                print ( "Processing file" , file )
-                process( file )
-            except FileProcessException:
-                print ( "STOP PROCESSING FILE " + file , file=sys.stderr  )
+        if nbWorker > 1:
+            processFilesInParallel( files, nbWorker, incremental = incremental, resume = resume )
+        else:
+            for file in files:
+                try:
+                    print ( "Processing file" , file )
+                    process( file, incremental = incremental, resume = resume )
+                except FileProcessException:
+                    print ( "STOP PROCESSING FILE " + file , file=sys.stderr  )
 
     chronoFullBatch.printTimeInS()
     print( "*** ALL JOBS DONE ***")
@@ -267,8 +500,13 @@ if __name__ == '__main__':
 
     print("Code launched.")
     setAnimalType( AnimalType.MOUSE )
-    
-    processAll()
+
+    # --resume: continue interrupted rebuilds, --incremental: only rebuild the frames recorded since the last rebuild
+    # --workers N: number of files processed in parallel
+    nbWorker = 1
+    if "--workers" in sys.argv:
+        nbWorker = int( sys.argv[ sys.argv.index( "--workers" ) + 1 ] )
+    processAll( nbWorker = nbWorker, incremental = "--incremental" in sys.argv, resume = "--resume" in sys.argv )
     print('Job done.')
 
 
@@ -14,6 +14,7 @@ from lmtanalysis import BuildEventTrain3, BuildEventTrain4, BuildEventTrain2, Bu
     BuildEventApproachRear, BuildEventGroup2, BuildEventGroup3, BuildEventGroup4, BuildEventOralGenitalContact, \
     BuildEventStop, BuildEventWaterPoint,  \
     BuildEventMove, BuildEventGroup3MakeBreak, BuildEventGroup4MakeBreak
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
     
 import matplotlib.gridspec as gridspec
 from tkinter.filedialog import askopenfilename
@@ -249,7 +250,7 @@ def graphIdentity( file ):
     '''
     
     print(file)
-    connection = sqlite3.connect( file )
+    connection = getReadOnlyConnection( file )
 
     pool = AnimalPool( )
     pool.loadAnimals( connection )
@@ -13,6 +13,7 @@ from lmtanalysis.Event import *
 from lmtanalysis.Measure import *
 from lmtanalysis.FileUtil import getFilesToProcess
 from lmtanalysis.Util import convert_to_d_h_m_s, getMinTMaxTAndFileNameInput
+from lmtanalysis.DatabaseConnection import getReadOnlyConnection
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -70,7 +71,7 @@ def findLastFrameFromTime(file, time):
 
 def plotNightTimeLine(file):
     print(file)
-    connection = sqlite3.connect(file)
+    connection = getReadOnlyConnection(file)
 
     nightTimeLineList = []
 
@@ -94,7 +95,7 @@ def plotNightTimeLine(file):
 
 def plotActivityPerAnimalWholeExperiment(file, timeBin):
     print(file)
-    connection = sqlite3.connect(file)
+    connection = getReadOnlyConnection(file)
 
     pool = AnimalPool()
     pool.loadAnimals(connection)
@@ -153,12 +154,11 @@ def plotActivityPerAnimalWholeExperiment(file, timeBin):
 
     plt.show()
 
-    connection.close()
 
 
 def extractActivityPerAnimalWholeExperiment(file, timeBin):
     print(file)
-    connection = sqlite3.connect(file)
+    connection = getReadOnlyConnection(file)
 
     pool = AnimalPool()
     pool.loadAnimals(connection)
@@ -191,21 +191,17 @@ def extractActivityPerAnimalWholeExperiment(file, timeBin):
         for time, distance in zip(timeLine, activity[rfid]):
             results[rfid][f"t{time}"] = distance
 
-    connection.close()
-
     return {'timeLine': timeLine, 'totalDistance': totalDistance, 'activity':activity, 'startTime': startTime.strftime("%d/%m/%Y %H:%M:%S.%f"), 'results': results}
 
 
 def extractActivityPerAnimalStartEndInput(file, tmin, tmax):
-    connection = sqlite3.connect(file)
+    connection = getReadOnlyConnection(file)
 
     pool = AnimalPool()
     pool.loadAnimals(connection)
 
     pool.loadDetection(start=tmin, end=tmax, lightLoad=True)
 
-    connection.close()
-
     return pool
 
 